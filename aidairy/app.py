@@ -5,18 +5,60 @@ Main Streamlit Application
 
 import streamlit as st
 import pandas as pd
-from datetime import datetime, date
+import numpy as np
+from datetime import datetime, date, timedelta
 import matplotlib.pyplot as plt
 import os
+import io
+import time
+import shutil
+import tempfile
+import zipfile
 from utils.db import (
-    init_database, add_customer, get_all_customers, get_customer_by_id,
-    update_customer, delete_customer, add_entry, get_entries
+    init_database, add_customer, get_all_customers,
+    update_customer, delete_customer, get_entries, set_billing_cycle, set_subscription_qty,
+    set_customer_location,
+    count_customers, get_entry_totals, get_recent_entries, search_customers, get_customers_by_ids,
+    read_snapshot, SHIFTS
 )
 from utils.billing import (
-    calculate_monthly_billing, generate_pdf_invoice,
+    calculate_monthly_billing, calculate_billing, calculate_cycle_billing,
+    get_period_label, BILLING_CYCLES, generate_pdf_invoice, generate_combined_pdf,
     generate_excel_invoice, generate_csv_invoice,
-    send_whatsapp_bill, get_whatsapp_link
+    send_whatsapp_bill, get_whatsapp_link, get_rate_label
 )
+from utils.invoices import (
+    close_month, is_month_closed, get_closed_billing, get_invoice_artifact, get_customer_invoice_pdf,
+    get_pending_reissues, reissue_closed_month, get_invoice_history
+)
+from utils.ledger import (
+    PAYMENT_METHODS, record_payment, get_due_list, get_customer_balance, get_customer_ledger
+)
+from utils.reconciliation import reconcile_statement, apply_reconciliation, format_allocations
+from utils.outbox import (
+    FakeTransport, PyWhatKitTransport, enqueue_bills, get_outbox_summary, get_outbox_messages,
+    retry_failed, clear_sent, start_dispatcher, stop_dispatcher, is_dispatcher_running
+)
+from utils.html_invoices import render_summary_html, write_invoice_site
+from utils.register import generate_register_excel, generate_register_csv
+from utils.statements import (
+    generate_customer_statements, generate_customer_statement_pdf,
+    get_period_statement, generate_period_statement_excel, generate_period_statement_pdf
+)
+from utils.analytics import get_data_bounds, get_daily_trend, get_monthly_trend, get_yearly_summary, get_top_customers
+from utils.segments import (
+    SEGMENT_KINDS, SEGMENT_KIND_LABELS, create_segment, delete_segment, get_segments, format_segment,
+    get_customer_segments, set_customer_segments, add_customers_to_segment, remove_customers_from_segment,
+    resolve_segment_customers
+)
+from utils.route_sheets import generate_route_sheets, BASIS_LABELS
+from utils.entry_grid import load_entry_grid, diff_entry_grid, save_entry_grid
+from utils.entry_writer import save_entry
+from utils.routing import optimize_routes
+from utils.bulk_customers import change_rates, upsert_customers, delete_customers, archive_customers
+from utils.importer import import_entries, import_customers
+from utils.rate_simulator import load_simulation_base, simulate_rate_change
+from utils.pricing import get_customer_slabs, set_customer_slabs, format_slab_breakdown
 from utils.forecasting import (
     predict_next_day_quantity, get_forecast_dataframe, get_forecast_summary
 )
@@ -64,6 +106,26 @@ if 'db_initialized' not in st.session_state:
     init_database()
     st.session_state.db_initialized = True
 
+CUSTOMER_PICKER_LIMIT = 20  # matches fetched and sent to the browser per search
+
+def customer_picker(label: str, key: str, customer_ids=None, format_func=None):
+    """
+    Search-as-you-type customer picker: a search box and a selectbox of the top matches
+    Only the matches are fetched and sent, however many customers there are.
+    customer_ids limits the choice (e.g. to billed customers). Returns the customer dict or None
+    """
+    query = st.text_input(
+        f"🔍 Search {label}", key=f"{key}_search", placeholder="Type part of a name or mobile number"
+    )
+    matches = search_customers(query, CUSTOMER_PICKER_LIMIT, customer_ids)
+    if not matches:
+        st.caption("No matching customers")
+        return None
+    by_id = {c['id']: c for c in matches}
+    format_func = format_func or (lambda c: f"{c['name']} ({c['mobile_number']})" if c.get('mobile_number') else c['name'])
+    selected_id = st.selectbox(label, list(by_id.keys()), format_func=lambda cid: format_func(by_id[cid]), key=key)
+    return by_id[selected_id]
+
 # Main header
 st.markdown('<h1 class="main-header">🐄 SmartDairy</h1>', unsafe_allow_html=True)
 st.markdown('<p class="sub-header">AI Powered Digital Dairy Management System</p>', unsafe_allow_html=True)
@@ -72,7 +134,7 @@ st.markdown('<p class="sub-header">AI Powered Digital Dairy Management System</p
 st.sidebar.title("📋 Navigation")
 page = st.sidebar.radio(
     "Select Page",
-    ["🏠 Dashboard", "👥 Customer Management", "🥛 Daily Milk Entry", "💰 Monthly Billing", "🤖 AI Forecasting"]
+    ["🏠 Dashboard", "👥 Customer Management", "🥛 Daily Milk Entry", "💰 Monthly Billing", "📈 Analytics", "🧮 Rate Simulator", "📥 Data Import", "🤖 AI Forecasting"]
 )
 
 # Dashboard Page
@@ -80,34 +142,32 @@ if page == "🏠 Dashboard":
     st.header("📊 Dashboard")
     
     # Get statistics
-    customers = get_all_customers()
-    entries = get_entries()
+    totals = get_entry_totals()
     
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Total Customers", len(customers))
+        st.metric("Total Customers", count_customers())
     
     with col2:
-        st.metric("Total Entries", len(entries))
+        st.metric("Total Entries", totals['entries'])
     
     with col3:
-        total_litres = sum(e['quantity'] for e in entries)
-        st.metric("Total Litres", f"{total_litres:.2f} L")
+        st.metric("Total Litres", f"{totals['litres']:.2f} L")
     
     with col4:
-        total_revenue = sum(e['quantity'] * e['price_per_ltr'] for e in entries)
-        st.metric("Total Revenue", f"₹{total_revenue:.2f}")
+        st.metric("Total Revenue", f"₹{totals['revenue']:.2f}")
     
     st.divider()
     
     # Recent entries table
-    if entries:
+    recent_entries = get_recent_entries(10)
+    if recent_entries:
         st.subheader("Recent Entries")
-        recent_entries = entries[:10]  # Show last 10 entries
         df_recent = pd.DataFrame(recent_entries)
-        df_recent = df_recent[['entry_date', 'customer_name', 'quantity', 'price_per_ltr']]
-        df_recent.columns = ['Date', 'Customer', 'Quantity (L)', 'Rate (₹/L)']
+        df_recent = df_recent[['entry_date', 'shift', 'customer_name', 'quantity', 'price_per_ltr']]
+        df_recent['shift'] = df_recent['shift'].str.title()
+        df_recent.columns = ['Date', 'Shift', 'Customer', 'Quantity (L)', 'Rate (₹/L)']
         st.dataframe(df_recent, use_container_width=True, hide_index=True)
     else:
         st.info("No entries found. Start adding milk entries!")
@@ -116,7 +176,9 @@ if page == "🏠 Dashboard":
 elif page == "👥 Customer Management":
     st.header("👥 Customer Management")
     
-    tab1, tab2, tab3 = st.tabs(["➕ Add Customer", "📋 View Customers", "✏️ Update/Delete Customer"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(
+        ["➕ Add Customer", "📋 View Customers", "✏️ Update/Delete Customer", "🏷️ Segments", "🧰 Bulk Actions"]
+    )
     
     with tab1:
         st.subheader("Add New Customer")
@@ -129,10 +191,11 @@ elif page == "👥 Customer Management":
             if submit:
                 if name.strip():
                     mobile_clean = mobile.strip() if mobile.strip() else None
-                    if add_customer(name.strip(), price, mobile_clean):
+                    success, message = add_customer(name.strip(), price, mobile_clean)
+                    if success:
                         st.success(f"✅ Customer '{name}' added successfully!")
                     else:
-                        st.error("❌ Customer with this name already exists!")
+                        st.error(f"❌ {message}")
                 else:
                     st.warning("⚠️ Please enter a valid customer name")
     
@@ -154,14 +217,16 @@ elif page == "👥 Customer Management":
     
     with tab3:
         st.subheader("Update or Delete Customer")
-        customers = get_all_customers()
+        has_customers = count_customers() > 0
+        customer = None
+        if has_customers:
+            customer = customer_picker(
+                "Select Customer", "manage_customer",
+                format_func=lambda c: f"{c['name']} (₹{c['price_per_ltr']}/L)"
+            )
         
-        if customers:
-            customer_options = {f"{c['name']} (₹{c['price_per_ltr']}/L)": c['id'] for c in customers}
-            selected_customer = st.selectbox("Select Customer", list(customer_options.keys()))
-            customer_id = customer_options[selected_customer]
-            
-            customer = get_customer_by_id(customer_id)
+        if customer:
+            customer_id = customer['id']
             
             with st.form("update_customer_form"):
                 new_name = st.text_input("Customer Name", value=customer['name'])
@@ -178,80 +243,372 @@ elif page == "👥 Customer Management":
                 if update_btn:
                     if new_name.strip():
                         mobile_clean = new_mobile.strip() if new_mobile.strip() else None
-                        if update_customer(customer_id, new_name.strip(), new_price, mobile_clean):
+                        success, message = update_customer(customer_id, new_name.strip(), new_price, mobile_clean)
+                        if success:
                             st.success("✅ Customer updated successfully!")
                             st.rerun()
                         else:
-                            st.error("❌ Update failed. Customer name might already exist.")
+                            st.error(f"❌ Update failed: {message}")
                     else:
                         st.warning("⚠️ Please enter a valid customer name")
                 
                 if delete_btn:
-                    if delete_customer(customer_id):
+                    success, message = delete_customer(customer_id)
+                    if success:
                         st.success("✅ Customer deleted successfully!")
                         st.rerun()
                     else:
-                        st.error("❌ Failed to delete customer. Customer might have entries.")
-        else:
+                        st.error(f"❌ Failed to delete customer: {message}")
+            
+            # Per-customer billing cycle
+            st.divider()
+            st.subheader("🗓️ Billing Cycle")
+            with st.form("billing_cycle_form"):
+                current_cycle = customer.get('billing_cycle') or 'monthly'
+                new_cycle = st.selectbox("Cycle", BILLING_CYCLES, index=BILLING_CYCLES.index(current_cycle))
+                col1, col2 = st.columns(2)
+                with col1:
+                    anchor_value = datetime.strptime(customer['cycle_anchor'], '%Y-%m-%d').date() if customer.get('cycle_anchor') else None
+                    new_anchor = st.date_input("Cycle start (weekly/fortnightly)", value=anchor_value)
+                with col2:
+                    new_cutoff = st.number_input(
+                        "Cut-off day of month (custom)", min_value=1, max_value=31,
+                        value=int(customer.get('cycle_cutoff_day') or 25)
+                    )
+                if st.form_submit_button("💾 Save Billing Cycle"):
+                    anchor_str = new_anchor.strftime('%Y-%m-%d') if new_anchor and new_cycle in ('weekly', 'fortnightly') else None
+                    cutoff = int(new_cutoff) if new_cycle == 'custom' else None
+                    if set_billing_cycle(customer_id, new_cycle, anchor_str, cutoff):
+                        st.success("✅ Billing cycle saved!")
+                    else:
+                        st.error("❌ Failed to save billing cycle")
+            
+            # Fixed daily quantity; route sheets fall back to the forecast without one
+            st.divider()
+            st.subheader("🥛 Daily Subscription")
+            with st.form("subscription_form"):
+                new_subscription = st.number_input(
+                    "Litres per day (0 = use forecast)", min_value=0.0,
+                    value=float(customer.get('subscription_qty') or 0.0), step=0.25
+                )
+                if st.form_submit_button("💾 Save Subscription"):
+                    if set_subscription_qty(customer_id, new_subscription or None):
+                        st.success("✅ Subscription saved!")
+                    else:
+                        st.error("❌ Failed to save subscription")
+            
+            # Delivery location for route ordering
+            st.divider()
+            st.subheader("📍 Delivery Location")
+            with st.form("location_form"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    new_latitude = st.number_input(
+                        "Latitude", min_value=-90.0, max_value=90.0, format="%.6f",
+                        value=customer.get('latitude'), placeholder="e.g., 18.520430"
+                    )
+                with col2:
+                    new_longitude = st.number_input(
+                        "Longitude", min_value=-180.0, max_value=180.0, format="%.6f",
+                        value=customer.get('longitude'), placeholder="e.g., 73.856743"
+                    )
+                st.caption("Leave both empty to clear the location.")
+                if st.form_submit_button("💾 Save Location"):
+                    if set_customer_location(customer_id, new_latitude, new_longitude):
+                        st.success("✅ Location saved!")
+                    else:
+                        st.error("❌ Enter both latitude and longitude, or neither")
+            
+            # Route, society, customer type and tags
+            all_segments = get_segments()
+            if all_segments:
+                st.divider()
+                st.subheader("🏷️ Segments")
+                segment_labels = {s['id']: format_segment(s) for s in all_segments}
+                with st.form("customer_segments_form"):
+                    chosen_segments = st.multiselect(
+                        "Member Of", list(segment_labels), format_func=lambda sid: segment_labels[sid],
+                        default=[s['id'] for s in get_customer_segments(customer_id)]
+                    )
+                    if st.form_submit_button("💾 Save Segments"):
+                        if set_customer_segments(customer_id, chosen_segments):
+                            st.success("✅ Segments saved!")
+                        else:
+                            st.error("❌ Failed to save segments")
+            
+            # Volume-slab pricing for bulk customers
+            st.divider()
+            st.subheader("📐 Slab Pricing")
+            st.caption("The last slab must be open-ended: leave its 'Upto Litres' empty. Remove all rows to use the flat price.")
+            current_slabs = get_customer_slabs(customer_id)
+            df_slabs = pd.DataFrame(current_slabs, columns=['upto_litres', 'rate'])
+            df_slabs.columns = ['Upto Litres', 'Rate (₹/L)']
+            edited_slabs = st.data_editor(
+                df_slabs, num_rows="dynamic", use_container_width=True,
+                key=f"slab_editor_{customer_id}"
+            )
+            if st.button("💾 Save Slab Pricing"):
+                slabs = []
+                for _, row in edited_slabs.dropna(subset=['Rate (₹/L)']).iterrows():
+                    upto = None if pd.isna(row['Upto Litres']) else float(row['Upto Litres'])
+                    slabs.append((upto, float(row['Rate (₹/L)'])))
+                success, message = set_customer_slabs(customer_id, slabs)
+                if success:
+                    st.success(f"✅ {message}")
+                else:
+                    st.error(f"❌ {message}")
+        elif not has_customers:
             st.info("No customers available to update or delete.")
 
+    with tab4:
+        st.subheader("Customer Segments")
+        st.caption("Group customers by route, society, customer type or any tag to bill, export and send per group.")
+        with st.form("add_segment_form"):
+            col1, col2 = st.columns(2)
+            with col1:
+                segment_kind = st.selectbox("Kind", SEGMENT_KINDS, format_func=lambda k: SEGMENT_KIND_LABELS[k])
+            with col2:
+                segment_name = st.text_input("Name", placeholder="e.g., Route 5, Green Park, Hotel")
+            if st.form_submit_button("➕ Add Segment", type="primary"):
+                success, message = create_segment(segment_kind, segment_name)
+                if success:
+                    st.success(f"✅ {message}")
+                else:
+                    st.error(f"❌ {message}")
+        
+        all_segments = get_segments()
+        if all_segments:
+            df_segments = pd.DataFrame(all_segments)[['kind', 'name', 'customers']]
+            df_segments['kind'] = df_segments['kind'].map(SEGMENT_KIND_LABELS)
+            df_segments.columns = ['Kind', 'Name', 'Customers']
+            st.dataframe(df_segments, use_container_width=True, hide_index=True)
+            
+            segment_labels = {s['id']: format_segment(s) for s in all_segments}
+            managed_segment = st.selectbox("Manage Segment", list(segment_labels), format_func=lambda sid: segment_labels[sid])
+            member_customer = customer_picker("Customer", "segment_member")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                if st.button("➕ Add to Segment", disabled=member_customer is None):
+                    add_customers_to_segment(managed_segment, [member_customer['id']])
+                    st.success(f"✅ {member_customer['name']} added to {segment_labels[managed_segment]}")
+            with col2:
+                if st.button("➖ Remove from Segment", disabled=member_customer is None):
+                    if remove_customers_from_segment(managed_segment, [member_customer['id']]):
+                        st.success(f"✅ {member_customer['name']} removed from {segment_labels[managed_segment]}")
+                    else:
+                        st.info(f"{member_customer['name']} is not in {segment_labels[managed_segment]}")
+            with col3:
+                if st.button("🗑️ Delete Segment"):
+                    if delete_segment(managed_segment):
+                        st.success("✅ Segment deleted")
+                        st.rerun()
+        else:
+            st.info("No segments yet. Add a route, society or customer type above.")
+
+    with tab5:
+        st.subheader("Bulk Actions")
+        st.caption("Change rates, remove or add many customers at once. Each action is saved in one step.")
+        bulk_scope = st.radio("Apply To", ["All Customers", "Segments", "Selected Customers"], horizontal=True)
+        bulk_ids = None
+        if bulk_scope == "Segments":
+            bulk_segments = get_segments()
+            bulk_segment_labels = {s['id']: f"{format_segment(s)} ({s['customers']})" for s in bulk_segments}
+            chosen_segments = st.multiselect(
+                "🏷️ Segments", list(bulk_segment_labels), format_func=lambda sid: bulk_segment_labels[sid],
+                key="bulk_segments"
+            )
+            bulk_ids = resolve_segment_customers(chosen_segments)
+        elif bulk_scope == "Selected Customers":
+            # Offer the current matches plus whatever is already chosen
+            chosen = st.session_state.get('bulk_customers', [])
+            bulk_query = st.text_input("🔍 Search Customers", key="bulk_customers_search",
+                                       placeholder="Type part of a name or mobile number")
+            options = list(dict.fromkeys(chosen + [c['id'] for c in search_customers(bulk_query, CUSTOMER_PICKER_LIMIT)]))
+            bulk_names = {c['id']: c['name'] for c in get_customers_by_ids(options)}
+            bulk_ids = st.multiselect("Customers", options, format_func=lambda cid: bulk_names.get(cid, str(cid)),
+                                      key="bulk_customers")
+        st.caption(f"{count_customers() if bulk_ids is None else len(bulk_ids)} customer(s) selected")
+        
+        st.markdown("#### 💹 Change Rates")
+        with st.form("bulk_rate_form"):
+            rate_change_labels = {"Percentage Change": 'percent', "₹ per Litre Change": 'flat', "New Flat Rate": 'rate'}
+            rate_change = rate_change_labels[st.radio("Change", list(rate_change_labels.keys()), horizontal=True)]
+            rate_value = st.number_input("Value (% / ₹ per litre / new ₹ rate)", value=0.0, step=0.5,
+                                         help="Percentage and ₹ changes apply to slab rates too; a new flat rate replaces slab charts")
+            if st.form_submit_button("💹 Apply Rate Change", type="primary"):
+                if bulk_ids is not None and not bulk_ids:
+                    st.warning("⚠️ No customers selected")
+                else:
+                    success, message = change_rates(rate_change, rate_value, bulk_ids)
+                    if success:
+                        st.success(f"✅ {message}")
+                    else:
+                        st.error(f"❌ {message}")
+        
+        st.markdown("#### 🗑️ Archive or Delete")
+        with st.form("bulk_remove_form"):
+            removal = st.radio("Action", ["📦 Archive (keep entries and payments in the archive)", "🗑️ Delete Permanently"])
+            confirm_removal = st.checkbox("Remove the selected customers with all their entries, payments and invoices")
+            if st.form_submit_button("Remove Customers"):
+                if bulk_ids is None:
+                    st.warning("⚠️ Choose segments or customers to remove")
+                elif not bulk_ids:
+                    st.warning("⚠️ No customers selected")
+                elif not confirm_removal:
+                    st.warning("⚠️ Tick the confirmation box first")
+                else:
+                    remove = archive_customers if removal.startswith("📦") else delete_customers
+                    success, message = remove(bulk_ids)
+                    if success:
+                        st.success(f"✅ {message}")
+                    else:
+                        st.error(f"❌ {message}")
+        
+        st.markdown("#### ✏️ Add or Update Customers")
+        st.caption("Rows are matched by name: existing customers are updated, new names are added. "
+                   "Empty mobile or subscription cells keep the stored values.")
+        df_upsert = st.data_editor(
+            pd.DataFrame({
+                'name': pd.Series(dtype=str), 'price_per_ltr': pd.Series(dtype=float),
+                'mobile_number': pd.Series(dtype=str), 'subscription_qty': pd.Series(dtype=float)
+            }),
+            num_rows="dynamic", hide_index=True, use_container_width=True, key="bulk_upsert",
+            column_config={
+                'name': st.column_config.TextColumn("Customer Name"),
+                'price_per_ltr': st.column_config.NumberColumn("Price per Litre (₹)", min_value=0.0, step=0.5),
+                'mobile_number': st.column_config.TextColumn("Mobile Number"),
+                'subscription_qty': st.column_config.NumberColumn("Subscription (L/day)", min_value=0.0, step=0.25)
+            }
+        )
+        df_upsert = df_upsert.dropna(how='all')
+        if st.button("💾 Save Customers", disabled=df_upsert.empty):
+            success, message = upsert_customers(df_upsert)
+            if success:
+                st.success(f"✅ {message}")
+            else:
+                st.error(f"❌ {message}")
+
 # Daily Milk Entry Page
 elif page == "🥛 Daily Milk Entry":
     st.header("🥛 Daily Milk Entry")
     
-    customers = get_all_customers()
-    
-    if not customers:
+    if not count_customers():
         st.warning("⚠️ Please add customers first before entering milk data!")
     else:
-        with st.form("milk_entry_form"):
-            col1, col2, col3 = st.columns(3)
+        entry_mode = st.radio("Entry Mode", ["📝 Single Entry", "📋 Grid Entry"], horizontal=True)
+        
+        if entry_mode == "📝 Single Entry":
+            # The picker sits outside the form so the matches refresh while typing
+            entry_customer = customer_picker("Select Customer *", "entry_customer")
             
-            with col1:
-                customer_options = {c['name']: c['id'] for c in customers}
-                selected_customer_name = st.selectbox("Select Customer *", list(customer_options.keys()))
-                customer_id = customer_options[selected_customer_name]
+            with st.form("milk_entry_form"):
+                col1, col2, col3 = st.columns(3)
             
-            with col2:
-                quantity = st.number_input("Quantity (Litres) *", min_value=0.0, value=0.0, step=0.1)
+                with col1:
+                    quantity = st.number_input("Quantity (Litres) *", min_value=0.0, value=0.0, step=0.1)
             
-            with col3:
-                entry_date = st.date_input("Entry Date *", value=date.today())
+                with col2:
+                    entry_date = st.date_input("Entry Date *", value=date.today())
             
-            submit = st.form_submit_button("➕ Add Entry", type="primary")
+                with col3:
+                    entry_shift = st.selectbox("Shift *", SHIFTS, format_func=str.title)
             
-            if submit:
-                if quantity > 0:
-                    if add_entry(customer_id, entry_date.strftime('%Y-%m-%d'), quantity):
-                        st.success(f"✅ Entry added successfully for {selected_customer_name}!")
+                submit = st.form_submit_button("➕ Add Entry", type="primary")
+            
+                if submit and entry_customer is None:
+                    st.warning("⚠️ Please select a customer")
+                elif submit:
+                    customer_id = entry_customer['id']
+                    selected_customer_name = entry_customer['name']
+                    if quantity > 0:
+                        # Through the shared writer: concurrent sessions are committed together
+                        saved, message = save_entry(customer_id, entry_date.strftime('%Y-%m-%d'), quantity, entry_shift)
+                        if saved:
+                            st.success(f"✅ {entry_shift.title()} entry saved for {selected_customer_name}!")
+                        else:
+                            st.error(f"❌ Failed to add entry: {message}")
                     else:
-                        st.error("❌ Failed to add entry. Entry might already exist for this date.")
-                else:
-                    st.warning("⚠️ Please enter a valid quantity")
+                        st.warning("⚠️ Please enter a valid quantity")
+        
+        else:
+            # Grid entry: a whole round prefilled with stored, subscription or forecast
+            # quantities; saving writes only the cells that differ from what is stored
+            routes = get_segments('route')
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                grid_date = st.date_input("Entry Date", value=date.today(), key="grid_date")
+            with col2:
+                grid_shift = st.selectbox("Shift", SHIFTS, format_func=str.title, key="grid_shift")
+            with col3:
+                route_labels = {r['id']: r['name'] for r in routes}
+                grid_route = st.selectbox(
+                    "Roster", [None] + list(route_labels),
+                    format_func=lambda rid: "All Customers" if rid is None else f"Route: {route_labels[rid]}"
+                )
+            
+            grid = load_entry_grid(grid_date, grid_shift, grid_route)
+            if len(grid['customer_ids']) == 0:
+                st.info("No customers on this roster.")
+            else:
+                stored = grid['stored']
+                df_grid = pd.DataFrame({
+                    'Customer': grid['names'],
+                    'Stored (L)': stored,
+                    'Quantity (L)': np.where(np.isnan(stored), grid['suggested'], stored),
+                    'Basis': np.where(np.isnan(stored), [BASIS_LABELS[b] for b in grid['basis']], 'Stored')
+                })
+                st.caption("Rows without a stored entry are prefilled with the subscription (morning) or forecast. "
+                           "Clear a quantity or set it to 0 to record no delivery.")
+                # The save counter resets the editor once its edits are stored
+                save_count = st.session_state.get('grid_saves', 0)
+                edited_grid = st.data_editor(
+                    df_grid,
+                    column_config={
+                        'Quantity (L)': st.column_config.NumberColumn(min_value=0.0, step=0.25, format="%.2f"),
+                        'Stored (L)': st.column_config.NumberColumn(format="%.2f")
+                    },
+                    disabled=['Customer', 'Stored (L)', 'Basis'],
+                    hide_index=True, use_container_width=True,
+                    key=f"entry_grid_{grid_date}_{grid_shift}_{grid_route}_{save_count}"
+                )
+                changes = diff_entry_grid(grid['customer_ids'], stored, edited_grid['Quantity (L)'].to_numpy(dtype=float))
+                st.write(f"**Pending:** {len(changes['upserts'])} to save, {len(changes['deletes'])} to remove")
+                
+                if st.button("💾 Save Grid", type="primary", disabled=not (changes['upserts'] or changes['deletes'])):
+                    success, message = save_entry_grid(grid_date, grid_shift, changes['upserts'], changes['deletes'])
+                    if success:
+                        st.session_state.grid_saves = save_count + 1
+                        st.success(f"✅ {message}")
+                        st.rerun()
+                    else:
+                        st.error(f"❌ {message}")
         
         st.divider()
         
         # Filter and display entries
         st.subheader("📋 View Entries")
         
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         with col1:
             start_date = st.date_input("Start Date (Optional)", value=None)
         with col2:
             end_date = st.date_input("End Date (Optional)", value=None)
+        with col3:
+            view_shift = st.selectbox("Shift", [None] + SHIFTS, format_func=lambda s: "All Shifts" if s is None else s.title())
         
         # Get filtered entries
         start_str = start_date.strftime('%Y-%m-%d') if start_date else None
         end_str = end_date.strftime('%Y-%m-%d') if end_date else None
         
-        entries = get_entries(start_str, end_str)
+        entries = get_entries(start_str, end_str, view_shift)
         
         if entries:
             df = pd.DataFrame(entries)
-            df = df[['entry_date', 'customer_name', 'quantity', 'price_per_ltr']]
-            df.columns = ['Date', 'Customer', 'Quantity (L)', 'Rate (₹/L)']
+            df = df[['entry_date', 'shift', 'customer_name', 'quantity', 'price_per_ltr']]
+            df['shift'] = df['shift'].str.title()
+            df.columns = ['Date', 'Shift', 'Customer', 'Quantity (L)', 'Rate (₹/L)']
             df['Amount (₹)'] = df['Quantity (L)'] * df['Rate (₹/L)']
-            df = df[['Date', 'Customer', 'Quantity (L)', 'Rate (₹/L)', 'Amount (₹)']]
+            df = df[['Date', 'Shift', 'Customer', 'Quantity (L)', 'Rate (₹/L)', 'Amount (₹)']]
             
             st.dataframe(df, use_container_width=True, hide_index=True)
             
@@ -265,22 +622,178 @@ elif page == "🥛 Daily Milk Entry":
             )
         else:
             st.info("No entries found for the selected date range.")
+        
+        st.divider()
+        
+        # Morning delivery sheets, one PDF and CSV per route
+        st.subheader("🚚 Route Sheets")
+        routes = get_segments('route')
+        if not routes:
+            st.info("Create 'Route' segments under Customer Management to print route sheets.")
+        else:
+            col1, col2 = st.columns(2)
+            with col1:
+                sheet_date = st.date_input("Delivery Date", value=date.today() + timedelta(days=1), key="route_sheet_date")
+            with col2:
+                route_labels = {r['id']: f"{r['name']} ({r['customers']})" for r in routes}
+                chosen_routes = st.multiselect(
+                    "Routes (empty = all)", list(route_labels), format_func=lambda rid: route_labels[rid]
+                )
+            st.caption("Expected quantity is the customer's subscription, else the average of their last 7 deliveries.")
+            
+            # Stop order: customers with a location are ordered to shorten the drive
+            with st.expander("🧭 Optimize Stop Order"):
+                st.caption("Orders located customers from the depot (or the route's outermost stop); customers without a location stay at the end.")
+                col1, col2 = st.columns(2)
+                with col1:
+                    depot_latitude = st.number_input("Depot Latitude (optional)", min_value=-90.0, max_value=90.0,
+                                                     format="%.6f", value=None, key="depot_latitude")
+                with col2:
+                    depot_longitude = st.number_input("Depot Longitude (optional)", min_value=-180.0, max_value=180.0,
+                                                      format="%.6f", value=None, key="depot_longitude")
+                if st.button("🧭 Optimize Routes"):
+                    depot = None
+                    if depot_latitude is not None and depot_longitude is not None:
+                        depot = (depot_latitude, depot_longitude)
+                    with st.spinner("Ordering stops..."):
+                        optimized = optimize_routes(chosen_routes or None, depot)
+                    df_routes = pd.DataFrame(optimized)[['route_name', 'stops', 'located', 'previous_km', 'optimized_km']]
+                    df_routes.columns = ['Route', 'Stops', 'With Location', 'Previous (km)', 'Optimized (km)']
+                    st.dataframe(df_routes.round(2), use_container_width=True, hide_index=True)
+                    st.success("✅ Stop order saved; route sheets now follow it.")
+            
+            if st.button("🖨️ Generate Route Sheets (ZIP)"):
+                with st.spinner("Rendering route sheets..."):
+                    sheet_dir = tempfile.mkdtemp(prefix="route_sheets_")
+                    sheet_paths = generate_route_sheets(sheet_date, sheet_dir, chosen_routes or None)
+                    zip_buffer = io.BytesIO()
+                    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+                        for sheet_path in sheet_paths:
+                            archive.write(sheet_path, os.path.basename(sheet_path))
+                    shutil.rmtree(sheet_dir, ignore_errors=True)
+                if sheet_paths:
+                    st.download_button(
+                        label=f"⬇️ Download {len(sheet_paths) // 2} Route Sheets",
+                        data=zip_buffer.getvalue(),
+                        file_name=f"route_sheets_{sheet_date.strftime('%Y%m%d')}.zip",
+                        mime="application/zip"
+                    )
+                else:
+                    st.info("The selected routes have no customers.")
 
 # Monthly Billing Page
 elif page == "💰 Monthly Billing":
     st.header("💰 Monthly Billing")
     
-    col1, col2 = st.columns(2)
-    with col1:
-        year = st.selectbox("Select Year", range(2020, 2030), index=datetime.now().year - 2020)
-    with col2:
-        month = st.selectbox("Select Month", range(1, 13), index=datetime.now().month - 1)
+    period_mode = st.radio(
+        "Billing Period",
+        ["Calendar Month", "Date Range", "Customer Billing Cycles"],
+        horizontal=True
+    )
     
-    if st.button("📊 Calculate Billing", type="primary"):
-        billing_data = calculate_monthly_billing(year, month)
+    if period_mode == "Calendar Month":
+        col1, col2 = st.columns(2)
+        with col1:
+            year = st.selectbox("Select Year", range(2020, 2030), index=datetime.now().year - 2020)
+        with col2:
+            month = st.selectbox("Select Month", range(1, 13), index=datetime.now().month - 1)
+        file_tag = f"{year}_{month:02d}"
+        
+        # Month close: freeze invoices into snapshots; late entries are reissued as deltas
+        month_closed = is_month_closed(year, month)
+        if month_closed:
+            pending = get_pending_reissues(year, month)
+            st.info(f"🔒 {datetime(year, month, 1).strftime('%B %Y')} is closed. "
+                    f"{len(pending)} invoice(s) pending reissue from late or edited entries.")
+            if pending and st.button(f"🔁 Reissue {len(pending)} Invoice(s)"):
+                result = reissue_closed_month(year, month)
+                if result['reissued']:
+                    df_reissued = pd.DataFrame(result['reissued'])[['name', 'version', 'previous_amount', 'total_amount', 'delta_amount']]
+                    df_reissued.columns = ['Customer', 'Version', 'Previous (₹)', 'New (₹)', 'Delta (₹)']
+                    st.success(f"✅ Reissued {len(result['reissued'])} invoice(s); {result['unchanged']} unchanged")
+                    st.dataframe(df_reissued, use_container_width=True, hide_index=True)
+                else:
+                    st.success(f"✅ No changes; {result['unchanged']} invoice(s) unchanged")
+            with st.expander("📜 Invoice history"):
+                history = get_invoice_history(year, month)
+                if history:
+                    df_history = pd.DataFrame(history)[['name', 'version', 'total_litres', 'total_amount', 'delta_amount', 'is_current', 'issued_at']]
+                    df_history.columns = ['Customer', 'Version', 'Litres', 'Amount (₹)', 'Delta (₹)', 'Current', 'Issued At']
+                    st.dataframe(df_history, use_container_width=True, hide_index=True)
+        elif st.button("🔒 Close Month"):
+            success, message = close_month(year, month)
+            if success:
+                st.success(f"✅ {message}")
+                st.rerun()
+            else:
+                st.warning(f"⚠️ {message}")
+    elif period_mode == "Date Range":
+        col1, col2 = st.columns(2)
+        with col1:
+            range_start = st.date_input("From", value=date.today().replace(day=1))
+        with col2:
+            range_end = st.date_input("To", value=date.today())
+        file_tag = f"{range_start.strftime('%Y%m%d')}_{range_end.strftime('%Y%m%d')}"
+    else:
+        cycle_as_of = st.date_input("Bill last completed cycle as of", value=date.today())
+        st.caption("Each customer is billed for their own last completed cycle (set per customer in Customer Management).")
+    
+    # Optional segment filter: bill, export and send for one route, society or customer type
+    segment_ids = []
+    all_segments = get_segments()
+    if all_segments:
+        segment_labels = {s['id']: f"{format_segment(s)} ({s['customers']})" for s in all_segments}
+        segment_ids = st.multiselect(
+            "🏷️ Limit to Segments", list(segment_labels), format_func=lambda sid: segment_labels[sid],
+            help="Segments of the same kind are combined (route A or B); different kinds narrow down (route A and hotels)"
+        )
+    segment_customers = resolve_segment_customers(segment_ids) if segment_ids else None
+    if segment_ids and period_mode != "Customer Billing Cycles":
+        file_tag += "_segments_" + "-".join(str(sid) for sid in segment_ids)
+    
+    calculate_clicked = st.button("📊 Calculate Billing", type="primary")
+    
+    # Keep the results on screen for the same period across reruns, so the export and
+    # send buttons below (which rerun the script) still find them
+    billing_request = (period_mode, str(cycle_as_of) if period_mode == "Customer Billing Cycles" else file_tag,
+                       tuple(segment_ids))
+    if calculate_clicked:
+        st.session_state.billing_request = billing_request
+    show_billing = st.session_state.get('billing_request') == billing_request
+    
+    if show_billing and period_mode == "Customer Billing Cycles":
+        cycle_results = calculate_cycle_billing(cycle_as_of, segments=segment_ids)
+        if cycle_results:
+            df_cycles = pd.DataFrame([{
+                'Period': get_period_label(b),
+                'Customers': b['total_customers'],
+                'Total Litres': round(sum(c['total_litres'] for c in b['customers']), 2),
+                'Total Amount (₹)': round(b['grand_total'], 2)
+            } for b in cycle_results])
+            st.dataframe(df_cycles, use_container_width=True, hide_index=True)
+            for b in cycle_results:
+                with st.expander(f"{get_period_label(b)} - {b['total_customers']} customers"):
+                    df_period = pd.DataFrame(b['customers'])[['name', 'deliveries', 'total_litres', 'total_amount']]
+                    df_period.columns = ['Customer Name', 'Deliveries', 'Total Litres', 'Total Amount (₹)']
+                    st.dataframe(df_period, use_container_width=True, hide_index=True)
+        else:
+            st.warning("⚠️ No entries found for any customer's last completed cycle")
+    
+    elif show_billing:
+        if period_mode == "Calendar Month" and month_closed:
+            # Closed months are served from their invoice snapshots, not recomputed
+            billing_data = get_closed_billing(year, month, segment_customers)
+        else:
+            # Totals, rates and slab charts from one read-only snapshot of the database
+            with read_snapshot():
+                if period_mode == "Calendar Month":
+                    billing_data = calculate_monthly_billing(year, month, segments=segment_ids)
+                else:
+                    billing_data = calculate_billing(range_start, range_end, segments=segment_ids)
+        period_label = get_period_label(billing_data)
         
         if billing_data['customers']:
-            st.success(f"✅ Billing calculated for {datetime(year, month, 1).strftime('%B %Y')}")
+            st.success(f"✅ Billing calculated for {period_label}")
             
             # Display summary
             col1, col2, col3 = st.columns(3)
@@ -297,66 +810,156 @@ elif page == "💰 Monthly Billing":
             # Display billing table
             st.subheader("Billing Details")
             df_billing = pd.DataFrame(billing_data['customers'])
-            df_billing = df_billing[['name', 'total_litres', 'price_per_ltr', 'total_amount']]
-            df_billing.columns = ['Customer Name', 'Total Litres', 'Rate/Litre (₹)', 'Total Amount (₹)']
+            df_billing['rate_label'] = [get_rate_label(c) for c in billing_data['customers']]
+            df_billing['slab_text'] = [format_slab_breakdown(c['slab_breakdown']) for c in billing_data['customers']]
+            df_billing = df_billing[['name', 'total_litres', 'rate_label', 'total_amount', 'slab_text']]
+            df_billing.columns = ['Customer Name', 'Total Litres', 'Rate/Litre (₹)', 'Total Amount (₹)', 'Slab Breakdown']
             st.dataframe(df_billing, use_container_width=True, hide_index=True)
             
             st.divider()
             
             # Export buttons
             st.subheader("📥 Export Invoice")
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                if st.button("📄 Generate PDF Invoice"):
-                    pdf_path = generate_pdf_invoice(billing_data, "invoice.pdf")
-                    with open(pdf_path, "rb") as pdf_file:
+            if period_mode == "Calendar Month" and month_closed and not segment_ids:
+                # Re-downloads come straight from the stored snapshot artifacts
+                st.caption("🔒 Downloads are served from the closed-month snapshot")
+                col1, col2, col3 = st.columns(3)
+                artifact_buttons = [
+                    (col1, 'pdf', "⬇️ Download PDF", "application/pdf"),
+                    (col2, 'xlsx', "⬇️ Download Excel", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+                    (col3, 'csv', "⬇️ Download CSV", "text/csv")
+                ]
+                for col, fmt, label, mime in artifact_buttons:
+                    with col:
                         st.download_button(
-                            label="⬇️ Download PDF",
-                            data=pdf_file.read(),
-                            file_name=f"invoice_{year}_{month:02d}.pdf",
-                            mime="application/pdf"
+                            label=label,
+                            data=get_invoice_artifact(year, month, fmt),
+                            file_name=f"invoice_{file_tag}.{fmt}",
+                            mime=mime
                         )
+            else:
+                col1, col2, col3, col4 = st.columns(4)
             
-            with col2:
-                if st.button("📊 Generate Excel Invoice"):
-                    excel_path = generate_excel_invoice(billing_data, "invoice.xlsx")
-                    with open(excel_path, "rb") as excel_file:
-                        st.download_button(
-                            label="⬇️ Download Excel",
-                            data=excel_file.read(),
-                            file_name=f"invoice_{year}_{month:02d}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
+                with col1:
+                    if st.button("📄 Generate PDF Invoice"):
+                        pdf_path = generate_pdf_invoice(billing_data, "invoice.pdf")
+                        with open(pdf_path, "rb") as pdf_file:
+                            st.download_button(
+                                label="⬇️ Download PDF",
+                                data=pdf_file.read(),
+                                file_name=f"invoice_{file_tag}.pdf",
+                                mime="application/pdf"
+                            )
             
-            with col3:
-                if st.button("📋 Generate CSV Invoice"):
-                    csv_path = generate_csv_invoice(billing_data, "invoice.csv")
-                    with open(csv_path, "rb") as csv_file:
-                        st.download_button(
-                            label="⬇️ Download CSV",
-                            data=csv_file.read(),
-                            file_name=f"invoice_{year}_{month:02d}.csv",
-                            mime="text/csv"
-                        )
+                with col2:
+                    if st.button("📊 Generate Excel Invoice"):
+                        excel_path = generate_excel_invoice(billing_data, "invoice.xlsx")
+                        with open(excel_path, "rb") as excel_file:
+                            st.download_button(
+                                label="⬇️ Download Excel",
+                                data=excel_file.read(),
+                                file_name=f"invoice_{file_tag}.xlsx",
+                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                            )
             
+                with col3:
+                    if st.button("📋 Generate CSV Invoice"):
+                        csv_path = generate_csv_invoice(billing_data, "invoice.csv")
+                        with open(csv_path, "rb") as csv_file:
+                            st.download_button(
+                                label="⬇️ Download CSV",
+                                data=csv_file.read(),
+                                file_name=f"invoice_{file_tag}.csv",
+                                mime="text/csv"
+                            )
+
+            # One printable PDF with a page per customer, for door-to-door delivery
+            if st.button("🖨️ Generate Print Pack (All Customer Invoices)"):
+                with st.spinner("Generating print pack..."):
+                    print_path = generate_combined_pdf(billing_data, "all_invoices.pdf")
+                with open(print_path, "rb") as print_file:
+                    st.download_button(
+                        label="⬇️ Download Print Pack",
+                        data=print_file.read(),
+                        file_name=f"all_invoices_{file_tag}.pdf",
+                        mime="application/pdf"
+                    )
+
+            # HTML invoices from templates/invoice_template.html
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button(
+                    label="🌐 Download HTML Invoice",
+                    data=render_summary_html(billing_data),
+                    file_name=f"invoice_{file_tag}.html",
+                    mime="text/html"
+                )
+            with col2:
+                if st.button("🗂️ Build HTML Invoice Pages"):
+                    site_dir = os.path.join("html_invoices", file_tag)
+                    result = write_invoice_site(billing_data, site_dir)
+                    st.success(
+                        f"✅ {result['written']} pages written, {result['unchanged']} unchanged, "
+                        f"{result['removed']} removed in {site_dir}"
+                    )
+
+            # Collection register: one row per customer, one column per day
+            if period_mode == "Calendar Month":
+                col1, col2 = st.columns(2)
+                with col1:
+                    if st.button("📒 Generate Register (Excel)"):
+                        register_path = generate_register_excel(year, month, "register.xlsx", segment_customers)
+                        with open(register_path, "rb") as register_file:
+                            st.download_button(
+                                label="⬇️ Download Register (Excel)",
+                                data=register_file.read(),
+                                file_name=f"register_{file_tag}.xlsx",
+                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                            )
+                with col2:
+                    if st.button("📒 Generate Register (CSV)"):
+                        register_path = generate_register_csv(year, month, "register.csv", segment_customers)
+                        with open(register_path, "rb") as register_file:
+                            st.download_button(
+                                label="⬇️ Download Register (CSV)",
+                                data=register_file.read(),
+                                file_name=f"register_{file_tag}.csv",
+                                mime="text/csv"
+                            )
+                
+                # Daily statements: one PDF per customer with a calendar of deliveries
+                if st.button("📅 Generate All Customer Statements (ZIP)"):
+                    with st.spinner("Rendering statements..."):
+                        statement_dir = tempfile.mkdtemp(prefix="statements_")
+                        statement_paths = generate_customer_statements(year, month, statement_dir, segment_customers)
+                        zip_buffer = io.BytesIO()
+                        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+                            for statement_path in statement_paths:
+                                archive.write(statement_path, os.path.basename(statement_path))
+                        shutil.rmtree(statement_dir, ignore_errors=True)
+                    st.download_button(
+                        label=f"⬇️ Download {len(statement_paths)} Statements",
+                        data=zip_buffer.getvalue(),
+                        file_name=f"statements_{file_tag}.zip",
+                        mime="application/zip"
+                    )
+
             st.divider()
-            
+
             # WhatsApp sending section
             st.subheader("📱 Send Bills via WhatsApp")
             st.info("💡 Select a customer below to send their bill via WhatsApp. Make sure WhatsApp Web is open in your browser.")
             
             # Customer selection for WhatsApp
-            customer_list = billing_data['customers']
-            if customer_list:
-                customer_names = [f"{c['name']} - ₹{c['total_amount']:.2f}" for c in customer_list]
-                selected_customer_idx = st.selectbox(
-                    "Select Customer to Send Bill",
-                    range(len(customer_names)),
-                    format_func=lambda x: customer_names[x]
+            billed_customers = {c['id']: c for c in billing_data['customers']}
+            picked_customer = None
+            if billed_customers:
+                picked_customer = customer_picker(
+                    "Select Customer to Send Bill", "whatsapp_customer", customer_ids=list(billed_customers),
+                    format_func=lambda c: f"{c['name']} - ₹{billed_customers[c['id']]['total_amount']:.2f}"
                 )
-                
-                selected_customer = customer_list[selected_customer_idx]
+            if picked_customer:
+                selected_customer = billed_customers[picked_customer['id']]
                 
                 col1, col2 = st.columns(2)
                 
@@ -384,21 +987,540 @@ elif page == "💰 Monthly Billing":
                     st.caption(f"📞 Mobile: {selected_customer['mobile_number']}")
                 else:
                     st.caption("⚠️ No mobile number registered for this customer")
+                
+                if period_mode == "Calendar Month":
+                    statement_pdf = generate_customer_statement_pdf(year, month, selected_customer['id'])
+                    if statement_pdf:
+                        st.download_button(
+                            label="📅 Download Daily Statement",
+                            data=statement_pdf,
+                            file_name=f"statement_{file_tag}_{selected_customer['id']}.pdf",
+                            mime="application/pdf"
+                        )
+                
+                if period_mode == "Calendar Month" and month_closed:
+                    st.download_button(
+                        label="⬇️ Download This Customer's Invoice",
+                        data=get_customer_invoice_pdf(year, month, selected_customer['id']),
+                        file_name=f"invoice_{file_tag}_{selected_customer['id']}.pdf",
+                        mime="application/pdf"
+                    )
+            
+            # Bulk sending through the outbox (runs in the background)
+            with st.expander("📤 Send All Bills (Outbox)"):
+                st.caption("Bills are queued and sent in the background under a rate limit; failed sends are retried.")
+                transports = {
+                    "WhatsApp Web (pywhatkit)": PyWhatKitTransport,
+                    "Test mode (nothing is sent)": FakeTransport
+                }
+                col1, col2 = st.columns(2)
+                with col1:
+                    transport_name = st.selectbox("Send Using", list(transports.keys()))
+                with col2:
+                    rate_per_minute = st.number_input("Messages per Minute", min_value=1, max_value=120, value=4)
+                
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    if st.button("📥 Queue Bills for All Customers", use_container_width=True):
+                        queued, skipped = enqueue_bills(billing_data)
+                        st.success(f"✅ Queued {queued} bills ({skipped} skipped: no mobile number or already sent)")
+                with col2:
+                    if is_dispatcher_running():
+                        if st.button("⏹️ Stop Sending", use_container_width=True):
+                            stop_dispatcher()
+                            st.info("Sending will stop after the current batch")
+                    elif st.button("▶️ Start Sending", type="primary", use_container_width=True):
+                        success, message = start_dispatcher(transports[transport_name](), rate_per_minute=rate_per_minute)
+                        if success:
+                            st.success(f"✅ {message}")
+                        else:
+                            st.warning(message)
+                with col3:
+                    if st.button("🔄 Refresh Status", use_container_width=True):
+                        st.rerun()
+                
+                outbox_summary = get_outbox_summary()
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("Queued", outbox_summary['queued'])
+                col2.metric("Sending", outbox_summary['sending'])
+                col3.metric("Sent", outbox_summary['sent'])
+                col4.metric("Failed", outbox_summary['failed'])
+                
+                if outbox_summary['failed'] and st.button("🔁 Retry Failed"):
+                    st.success(f"✅ {retry_failed()} messages queued again")
+                if outbox_summary['sent'] and st.button("🧹 Clear Sent Messages"):
+                    st.success(f"✅ {clear_sent()} messages removed")
+                
+                outbox_messages = get_outbox_messages()
+                if outbox_messages:
+                    df_outbox = pd.DataFrame(outbox_messages)[
+                        ['customer_name', 'mobile_number', 'period_label', 'status', 'attempts', 'last_error', 'sent_at']
+                    ]
+                    df_outbox.columns = ['Customer', 'Mobile', 'Period', 'Status', 'Attempts', 'Last Error', 'Sent At']
+                    st.dataframe(df_outbox, use_container_width=True, hide_index=True)
         else:
-            st.warning(f"⚠️ No entries found for {datetime(year, month, 1).strftime('%B %Y')}")
+            st.warning(f"⚠️ No entries found for {period_label}")
+    
+    # Multi-month statements (quarterly / annual) from the monthly rollup
+    st.divider()
+    st.subheader("🗓️ Multi-Month Statements")
+    today = date.today()
+    fy_start_year = today.year if today.month >= 4 else today.year - 1
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        span_start_year = st.selectbox("From Year", range(2020, 2030), index=fy_start_year - 2020, key="span_start_year")
+    with col2:
+        span_start_month = st.selectbox("From Month", range(1, 13), index=3, key="span_start_month")
+    with col3:
+        span_end_year = st.selectbox("To Year", range(2020, 2030), index=fy_start_year + 1 - 2020, key="span_end_year")
+    with col4:
+        span_end_month = st.selectbox("To Month", range(1, 13), index=2, key="span_end_month")
+    
+    if (span_end_year, span_end_month) < (span_start_year, span_start_month):
+        st.warning("⚠️ 'To' month must not be before 'From' month")
+    else:
+        with read_snapshot():
+            statement = get_period_statement(span_start_year, span_start_month, span_end_year, span_end_month)
+        span_tag = f"{span_start_year}{span_start_month:02d}_{span_end_year}{span_end_month:02d}"
+        if len(statement['ids']):
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Customers", len(statement['ids']))
+            with col2:
+                st.metric("Total Amount", f"₹{statement['grand_total']:.2f}")
+            
+            month_titles = [datetime.strptime(m, '%Y-%m').strftime('%b %Y') for m in statement['months']]
+            df_statement = pd.DataFrame(statement['amounts'].round(2), columns=month_titles)
+            df_statement.insert(0, 'Customer', statement['names'])
+            df_statement['Total (₹)'] = statement['total_amounts'].round(2)
+            st.dataframe(df_statement, use_container_width=True, hide_index=True)
+            st.caption("Closed months show the invoiced amount; open months are priced at current rates.")
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("📊 Generate Statement Workbook"):
+                    statement_path = generate_period_statement_excel(statement, "statement.xlsx")
+                    with open(statement_path, "rb") as statement_file:
+                        st.download_button(
+                            label="⬇️ Download Statement (Excel)",
+                            data=statement_file.read(),
+                            file_name=f"statement_{span_tag}.xlsx",
+                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                        )
+            with col2:
+                statement_rows = {customer_id: row for row, customer_id in enumerate(statement['ids'].tolist())}
+                statement_customer = customer_picker(
+                    "Customer Statement (PDF)", "span_statement_customer", customer_ids=list(statement_rows)
+                )
+                if statement_customer:
+                    statement_row = statement_rows[statement_customer['id']]
+                    statement_buffer = io.BytesIO()
+                    generate_period_statement_pdf(statement, statement_row, statement_buffer)
+                    st.download_button(
+                        label="⬇️ Download Customer Statement",
+                        data=statement_buffer.getvalue(),
+                        file_name=f"statement_{span_tag}_{statement['ids'][statement_row]}.pdf",
+                        mime="application/pdf"
+                    )
+        else:
+            st.info("No deliveries in the selected months")
+    
+    # Payments and customer ledger
+    st.divider()
+    st.subheader("📒 Payments & Ledger")
+    ledger_tab1, ledger_tab2, ledger_tab3, ledger_tab4 = st.tabs(
+        ["📋 Due List", "💵 Record Payment", "📒 Customer Ledger", "🏦 Reconcile Statement"]
+    )
+    
+    with ledger_tab1:
+        due_list = get_due_list()
+        if due_list:
+            df_due = pd.DataFrame(due_list)[['name', 'mobile_number', 'invoiced', 'paid', 'balance', 'last_payment_on']]
+            df_due.columns = ['Customer', 'Mobile', 'Invoiced (₹)', 'Paid (₹)', 'Outstanding (₹)', 'Last Payment']
+            st.metric("Total Outstanding", f"₹{df_due['Outstanding (₹)'].sum():.2f}")
+            st.dataframe(df_due, use_container_width=True, hide_index=True)
+        else:
+            st.info("No outstanding balances. Close a month to issue invoices.")
+    
+    with ledger_tab2:
+        if count_customers():
+            # Picker outside the form so the matches refresh while typing
+            payment_customer = customer_picker("Customer", "payment_customer")
+            with st.form("record_payment_form"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    payment_amount = st.number_input("Amount (₹)", min_value=0.0, value=0.0, step=10.0)
+                    payment_date = st.date_input("Paid On", value=date.today())
+                with col2:
+                    payment_method = st.selectbox("Method", PAYMENT_METHODS)
+                    payment_reference = st.text_input("Reference (UTR / cheque no.)")
+                if st.form_submit_button("💵 Record Payment", type="primary") and payment_customer:
+                    success, message = record_payment(
+                        payment_customer['id'], payment_amount,
+                        payment_date.strftime('%Y-%m-%d'), payment_method,
+                        payment_reference.strip() or None
+                    )
+                    if success:
+                        st.success(f"✅ {message}")
+                    else:
+                        st.error(f"❌ {message}")
+        else:
+            st.info("No customers found.")
+    
+    with ledger_tab3:
+        ledger_customer = customer_picker("Select Customer", "ledger_customer") if count_customers() else None
+        if ledger_customer:
+            ledger_customer_id = ledger_customer['id']
+            balance = get_customer_balance(ledger_customer_id)
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Invoiced", f"₹{balance['invoiced']:.2f}")
+            with col2:
+                st.metric("Paid", f"₹{balance['paid']:.2f}")
+            with col3:
+                st.metric("Outstanding", f"₹{balance['balance']:.2f}")
+            ledger = get_customer_ledger(ledger_customer_id)
+            if ledger:
+                df_ledger = pd.DataFrame(ledger)
+                df_ledger.columns = ['Date', 'Description', 'Debit (₹)', 'Credit (₹)', 'Balance (₹)']
+                st.dataframe(df_ledger, use_container_width=True, hide_index=True)
+            else:
+                st.info("No invoices or payments for this customer yet.")
+    
+    with ledger_tab4:
+        st.caption("Upload a bank/UPI statement CSV (date, narration/description, credit/amount, reference columns).")
+        statement_file = st.file_uploader("Statement CSV", type=["csv"], key="statement_upload")
+        if statement_file is not None:
+            try:
+                proposals = reconcile_statement(statement_file)
+            except ValueError as e:
+                st.error(f"❌ {e}")
+                proposals = None
+            if proposals is not None:
+                matched = proposals['customer_id'].notna()
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Credits", len(proposals))
+                with col2:
+                    st.metric("Matched", int(matched.sum()))
+                with col3:
+                    st.metric("Already Recorded", int(proposals['duplicate'].sum()))
+                df_proposals = proposals.copy()
+                df_proposals['allocations'] = [format_allocations(a) for a in df_proposals['allocations']]
+                df_proposals = df_proposals[['date', 'description', 'amount', 'reference', 'customer_name',
+                                             'match_method', 'score', 'allocations', 'unallocated', 'duplicate']]
+                df_proposals.columns = ['Date', 'Description', 'Amount (₹)', 'Reference', 'Customer',
+                                        'Matched By', 'Score', 'Proposed Allocation', 'Advance (₹)', 'Duplicate']
+                st.dataframe(df_proposals, use_container_width=True, hide_index=True)
+                undated = proposals.loc[proposals['date'].isna(), 'line_no'].tolist()
+                if undated:
+                    st.warning(f"⚠️ {len(undated)} credit(s) have a date that could not be read and will not be "
+                               f"recorded (statement line(s) {', '.join(map(str, undated))})")
+                if st.button("✅ Record Matched Payments", type="primary"):
+                    success, message = apply_reconciliation(proposals)
+                    if success:
+                        st.success(f"✅ {message}")
+                    else:
+                        st.error(f"❌ {message}")
 
 # AI Forecasting Page
+# Analytics Page
+elif page == "📈 Analytics":
+    st.header("📈 Analytics")
+    
+    bounds = get_data_bounds()
+    if bounds is None:
+        st.info("No entries found. Start adding milk entries!")
+    else:
+        range_options = {"Last 12 Months": 1, "Last 3 Years": 3, "Last 5 Years": 5, "All Time": None}
+        selected_range = st.selectbox("Range", list(range_options.keys()), index=1)
+        years_back = range_options[selected_range]
+        range_end = bounds['last']
+        if years_back is None:
+            range_start = bounds['first']
+        else:
+            # First day of the month (12 * years_back - 1) months before the latest one
+            first_month = range_end.year * 12 + range_end.month - 1 - (12 * years_back - 1)
+            range_start = max(bounds['first'], date(first_month // 12, first_month % 12 + 1, 1))
+        
+        load_start = time.perf_counter()
+        # The three views come from one snapshot, so their totals agree
+        with read_snapshot():
+            daily = get_daily_trend(range_start, range_end)
+            monthly = get_monthly_trend(range_start.strftime('%Y-%m'), range_end.strftime('%Y-%m'))
+            yearly = get_yearly_summary()
+        load_ms = (time.perf_counter() - load_start) * 1000
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Litres", f"{monthly['litres'].sum():,.0f} L")
+        with col2:
+            st.metric("Revenue", f"₹{monthly['revenue'].sum():,.0f}")
+        with col3:
+            latest_growth = monthly['revenue_growth'][-1] if len(monthly['months']) > 1 else float('nan')
+            st.metric(
+                f"Revenue {datetime.strptime(monthly['months'][-1], '%Y-%m').strftime('%b %Y')}",
+                f"₹{monthly['revenue'][-1]:,.0f}",
+                None if latest_growth != latest_growth else f"{latest_growth:+.1%} vs previous month"
+            )
+        with col4:
+            st.metric("Active Customers (latest month)", int(monthly['active_customers'][-1]))
+        
+        st.subheader("🥛 Daily Litres")
+        df_daily = pd.DataFrame(
+            {'Litres': daily['litres'], '7-Day Average': daily['moving_avg']},
+            index=pd.to_datetime(daily['days'])
+        )
+        st.line_chart(df_daily)
+        
+        st.subheader("💰 Monthly Revenue")
+        month_index = pd.to_datetime(monthly['months'])
+        st.bar_chart(pd.DataFrame({'Revenue (₹)': monthly['revenue']}, index=month_index))
+        df_monthly = pd.DataFrame({
+            'Month': month_index.strftime('%b %Y'),
+            'Litres': monthly['litres'].round(2),
+            'Revenue (₹)': monthly['revenue'].round(2),
+            'Litres vs Prev. Month': pd.Series(monthly['litres_growth'] * 100).round(1),
+            'Revenue vs Prev. Month': pd.Series(monthly['revenue_growth'] * 100).round(1),
+            'YTD Revenue (₹)': monthly['ytd_revenue'].round(2),
+            'Active Customers': monthly['active_customers']
+        })
+        st.dataframe(
+            df_monthly.iloc[::-1], use_container_width=True, hide_index=True,
+            column_config={
+                'Litres vs Prev. Month': st.column_config.NumberColumn(format="%+.1f%%"),
+                'Revenue vs Prev. Month': st.column_config.NumberColumn(format="%+.1f%%")
+            }
+        )
+        
+        st.subheader("📅 Yearly Summary")
+        df_yearly = pd.DataFrame(yearly)
+        df_yearly['litres_growth'] = (df_yearly['litres_growth'].astype(float) * 100).round(1)
+        df_yearly['litres'] = df_yearly['litres'].round(2)
+        df_yearly.columns = ['Year', 'Litres', 'Deliveries', 'Active Customers', 'Litres vs Prev. Year', 'Customer Change']
+        st.dataframe(
+            df_yearly, use_container_width=True, hide_index=True,
+            column_config={'Litres vs Prev. Year': st.column_config.NumberColumn(format="%+.1f%%")}
+        )
+        
+        st.subheader("🏆 Top Customers")
+        col1, col2 = st.columns(2)
+        with col1:
+            ranking_year = st.selectbox("Year", [int(row['year']) for row in reversed(yearly)])
+        with col2:
+            top_n = st.slider("Show Top", min_value=5, max_value=50, value=10, step=5)
+        top_customers = get_top_customers(ranking_year, top_n)
+        if top_customers:
+            df_top = pd.DataFrame(top_customers)
+            df_top['share'] = (df_top['share'] * 100).round(1)
+            df_top['change'] = ((df_top['litres'] / df_top['previous_litres'] - 1) * 100).round(1)
+            df_top = df_top[['rank', 'name', 'litres', 'deliveries', 'share', 'change', 'revenue']]
+            df_top['litres'] = df_top['litres'].round(2)
+            df_top['revenue'] = df_top['revenue'].round(2)
+            df_top.columns = ['Rank', 'Customer', 'Litres', 'Deliveries', 'Share (%)', 'Litres vs Prev. Year', 'Revenue (₹)']
+            st.dataframe(
+                df_top, use_container_width=True, hide_index=True,
+                column_config={'Litres vs Prev. Year': st.column_config.NumberColumn(format="%+.1f%%")}
+            )
+        
+        st.caption(f"Trends loaded from rollup tables in {load_ms:.0f} ms. Revenue is at current rates.")
+
+# Rate Simulator Page
+elif page == "🧮 Rate Simulator":
+    st.header("🧮 What-If Rate Simulator")
+    st.caption("Re-price past deliveries under a proposed rate change. Base revenue uses current rates.")
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        months_back = st.slider("Months of History", min_value=1, max_value=36, value=12)
+    with col2:
+        reload_base = st.button("🔄 Reload Data")
+    
+    # History is loaded once per span; changing the proposal only re-prices the cached arrays
+    base_key = (months_back, date.today().isoformat())
+    if reload_base or st.session_state.get('simulation_base_key') != base_key:
+        with read_snapshot():
+            st.session_state.simulation_base = load_simulation_base(months_back)
+        st.session_state.simulation_base_key = base_key
+    base = st.session_state.simulation_base
+    
+    if len(base.row_litres) == 0:
+        st.info("No deliveries in the selected months")
+    else:
+        change_labels = {
+            "Percentage Change": 'percent', "₹ per Litre Change": 'flat',
+            "New Flat Rate": 'rate', "New Slab Chart": 'slabs'
+        }
+        change_type = change_labels[st.radio("Proposed Change", list(change_labels.keys()), horizontal=True)]
+        
+        change_value = 0.0
+        proposed_slabs = None
+        if change_type == 'percent':
+            change_value = st.slider("Change (%)", min_value=-20.0, max_value=30.0, value=5.0, step=0.5)
+        elif change_type == 'flat':
+            change_value = st.slider("Change (₹/L)", min_value=-10.0, max_value=15.0, value=2.0, step=0.5)
+        elif change_type == 'rate':
+            change_value = st.slider("New Rate (₹/L)", min_value=20.0, max_value=120.0,
+                                     value=float(round(base.rates.mean())), step=0.5)
+        else:
+            df_chart = st.data_editor(
+                pd.DataFrame({'Up To (L/month)': [50.0, None], 'Rate (₹/L)': [float(round(base.rates.mean())), float(round(base.rates.mean())) - 2]}),
+                num_rows="dynamic", hide_index=True, key="simulator_slabs"
+            )
+            proposed_slabs = [
+                (None if pd.isna(row['Up To (L/month)']) else float(row['Up To (L/month)']), float(row['Rate (₹/L)']))
+                for _, row in df_chart.iterrows() if not pd.isna(row['Rate (₹/L)'])
+            ]
+        
+        all_segments = get_segments()
+        segment_options = ["All Customers", "Flat-Rate Customers", "Slab Customers"] + [
+            f"Customers at ₹{rate:.2f}/L" for rate in np.unique(base.rates)
+        ] + (["Segments"] if all_segments else []) + ["Selected Customers"]
+        segment = st.selectbox("Apply To", segment_options)
+        slab_ids = base.slab_customers
+        if segment == "All Customers":
+            segment_ids = None
+        elif segment == "Segments":
+            # A route, society or customer type (same filter as billing)
+            segment_labels = {s['id']: f"{format_segment(s)} ({s['customers']})" for s in all_segments}
+            chosen_segments = st.multiselect(
+                "🏷️ Segments", list(segment_labels), format_func=lambda sid: segment_labels[sid],
+                key="simulator_segments",
+                help="Segments of the same kind are combined (route A or B); different kinds narrow down (route A and hotels)"
+            )
+            segment_ids = resolve_segment_customers(chosen_segments, base.ids.tolist())
+        elif segment == "Flat-Rate Customers":
+            segment_ids = base.ids[~np.isin(base.ids, slab_ids)]
+        elif segment == "Slab Customers":
+            segment_ids = slab_ids
+        elif segment == "Selected Customers":
+            # Offer the current matches plus whatever is already chosen
+            chosen = st.session_state.get('simulator_customers', [])
+            simulator_query = st.text_input("🔍 Search Customers", key="simulator_customers_search",
+                                            placeholder="Type part of a name or mobile number")
+            matches = search_customers(simulator_query, CUSTOMER_PICKER_LIMIT, base.ids.tolist())
+            options = list(dict.fromkeys(chosen + [c['id'] for c in matches]))
+            names = dict(zip(base.ids.tolist(), base.names))
+            segment_ids = st.multiselect("Customers", options, format_func=lambda cid: names[cid],
+                                         key="simulator_customers")
+        else:
+            segment_rate = float(segment.split("₹")[1].split("/")[0])
+            segment_ids = base.ids[np.isclose(base.rates, segment_rate)]
+        
+        try:
+            result = simulate_rate_change(base, change_type, change_value, proposed_slabs, segment_ids)
+        except ValueError as e:
+            st.error(f"❌ {str(e)}")
+            result = None
+        
+        if result:
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Current Revenue", f"₹{result['total_base']:,.0f}")
+            with col2:
+                st.metric("Proposed Revenue", f"₹{result['total_proposed']:,.0f}")
+            with col3:
+                delta_share = result['total_delta'] / result['total_base'] if result['total_base'] else 0.0
+                st.metric("Difference", f"₹{result['total_delta']:+,.0f}", f"{delta_share:+.1%}")
+            with col4:
+                st.metric("Customers Affected", result['customers_affected'])
+            
+            st.subheader("📅 Revenue by Month")
+            month_index = pd.to_datetime(base.months)
+            st.bar_chart(pd.DataFrame(
+                {'Current (₹)': result['month_base'], 'Proposed (₹)': result['month_proposed']}, index=month_index
+            ), stack=False)
+            
+            st.subheader("👥 Revenue by Customer")
+            df_impact = pd.DataFrame({
+                'Customer': base.names,
+                'Current Rate (₹/L)': base.rates,
+                'Current (₹)': result['customer_base'].round(2),
+                'Proposed (₹)': result['customer_proposed'].round(2),
+                'Difference (₹)': result['customer_delta'].round(2)
+            })
+            df_impact = df_impact.iloc[np.argsort(-np.abs(result['customer_delta']), kind='stable')]
+            st.dataframe(df_impact, use_container_width=True, hide_index=True)
+
+elif page == "📥 Data Import":
+    st.header("📥 Data Import")
+    st.caption("Load customers or past milk entries from a CSV or Excel file. "
+               "Run a dry run first to see what would be imported.")
+    
+    import_kind = st.radio("Import", ["🥛 Milk Entries", "👥 Customers"], horizontal=True)
+    if import_kind == "🥛 Milk Entries":
+        st.info("Columns: **Customer**, **Date** (YYYY-MM-DD or DD-MM-YYYY), **Quantity** (litres), "
+                "optional **Shift** (morning/evening). A later row for the same customer, day and shift wins.")
+    else:
+        st.info("Columns: **Name**, **Price per Ltr**, optional **Mobile Number** and **Subscription** (L/day). "
+                "Existing customers are updated.")
+    
+    uploaded = st.file_uploader("File", type=['csv', 'xlsx'])
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        dry_run = st.checkbox("Dry Run (validate only)", value=True)
+    create_customers = False
+    default_rate = None
+    if import_kind == "🥛 Milk Entries":
+        with col2:
+            create_customers = st.checkbox("Create Unknown Customers")
+        with col3:
+            default_rate = st.number_input("Rate for New Customers (₹/L)", min_value=0.0, value=50.0, step=1.0,
+                                           disabled=not create_customers)
+    
+    if st.button("📥 Validate" if dry_run else "📥 Import", type="primary", disabled=uploaded is None):
+        try:
+            with st.spinner("Importing..."):
+                if import_kind == "🥛 Milk Entries":
+                    report = import_entries(uploaded, dry_run=dry_run, create_customers=create_customers,
+                                            default_rate=default_rate)
+                else:
+                    report = import_customers(uploaded, dry_run=dry_run)
+            st.session_state.import_report = report
+        except ValueError as e:
+            st.error(f"❌ {str(e)}")
+            st.session_state.pop('import_report', None)
+    
+    report = st.session_state.get('import_report')
+    if report:
+        verb = "Would import" if report['dry_run'] else "Imported"
+        if report['dry_run']:
+            st.info(f"Dry run: {verb.lower()} {report['imported']:,} of {report['rows']:,} rows "
+                    f"in {report['seconds']:.1f} s. Nothing was written.")
+        else:
+            st.success(f"✅ {verb} {report['imported']:,} of {report['rows']:,} rows in {report['seconds']:.1f} s")
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Valid Rows", f"{report['imported']:,}")
+        with col2:
+            st.metric("Rejected Rows", f"{report['rejected']:,}")
+        with col3:
+            st.metric("Duplicates (later row kept)", f"{report['duplicates']:,}")
+        with col4:
+            st.metric("New Customers", f"{report['new_customers']:,}")
+        if report['first_date']:
+            st.write(f"**Dates:** {report['first_date']} to {report['last_date']}")
+        
+        if report['errors']:
+            st.subheader("⚠️ Rejected Rows")
+            st.dataframe(pd.DataFrame({'Reason': list(report['errors'].keys()),
+                                       'Rows': list(report['errors'].values())}),
+                         use_container_width=True, hide_index=True)
+            st.caption(f"First {len(report['samples'])} rejected rows (Row = line in the file)")
+            st.dataframe(pd.DataFrame(report['samples']), use_container_width=True, hide_index=True)
+
 elif page == "🤖 AI Forecasting":
     st.header("🤖 AI Forecasting - Milk Quantity Prediction")
     
-    customers = get_all_customers()
+    has_customers = count_customers() > 0
+    forecast_customer = customer_picker("Select Customer", "forecast_customer") if has_customers else None
     
-    if not customers:
+    if not has_customers:
         st.warning("⚠️ Please add customers and entries first!")
-    else:
-        customer_options = {c['name']: c['id'] for c in customers}
-        selected_customer_name = st.selectbox("Select Customer", list(customer_options.keys()))
-        customer_id = customer_options[selected_customer_name]
+    elif forecast_customer:
+        customer_id = forecast_customer['id']
+        selected_customer_name = forecast_customer['name']
         
         window_size = st.slider("Moving Average Window (Days)", min_value=3, max_value=30, value=7, step=1)
         
@@ -0,0 +1,92 @@
+"""
+Benchmark: Analytics page queries on five years of rollups
+Run from the aidairy folder: python benchmarks/bench_analytics.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# utils.db creates smartdairy.db in the working directory on import; keep it out of the project
+os.chdir(tempfile.mkdtemp(prefix="smartdairy_bench_"))
+
+from utils.db import init_database, get_db_connection
+from utils.analytics import get_data_bounds, get_daily_trend, get_monthly_trend, get_yearly_summary, get_top_customers
+
+N_CUSTOMERS = 2_000
+FIRST_DAY, N_DAYS = date(2021, 1, 1), 5 * 365 + 1
+SLAB_SHARE = 0.05
+TARGET_MS = 200
+
+def build_database(seed: int = 42):
+    """Load customers and five years of rollup rows directly (the triggers would produce the same)"""
+    init_database()
+    rng = np.random.default_rng(seed)
+    days = [FIRST_DAY + timedelta(days=i) for i in range(N_DAYS)]
+    months = sorted({d.strftime('%Y-%m') for d in days})
+    years = sorted({str(d.year) for d in days})
+    conn = get_db_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO customers (id, name, price_per_ltr) VALUES (?, ?, ?)",
+            [(i, f"Customer {i:06d}", float(rng.choice([48.0, 50.0, 52.0]))) for i in range(1, N_CUSTOMERS + 1)]
+        )
+        conn.executemany(
+            "INSERT INTO daily_totals (day, litres, deliveries) VALUES (?, ?, ?)",
+            [(d.isoformat(), float(rng.normal(3000, 200)), int(rng.integers(1700, 1900))) for d in days]
+        )
+        yearly = {}
+        for month in months:
+            litres = np.round(rng.gamma(2.0, 30.0, N_CUSTOMERS), 1)
+            conn.executemany(
+                "INSERT INTO customer_monthly (customer_id, month, litres, deliveries) VALUES (?, ?, ?, ?)",
+                zip(range(1, N_CUSTOMERS + 1), [month] * N_CUSTOMERS, litres.tolist(),
+                    rng.integers(20, 31, N_CUSTOMERS).tolist())
+            )
+            yearly[month[:4]] = yearly.get(month[:4], 0) + litres
+        conn.executemany(
+            "INSERT INTO customer_yearly (customer_id, year, litres, deliveries) VALUES (?, ?, ?, ?)",
+            [(i + 1, year, float(yearly[year][i]), 300) for year in years for i in range(N_CUSTOMERS)]
+        )
+        slab_customers = rng.choice(N_CUSTOMERS, int(N_CUSTOMERS * SLAB_SHARE), replace=False) + 1
+        conn.executemany(
+            "INSERT INTO price_slabs (customer_id, slab_order, upto_litres, rate) VALUES (?, ?, ?, ?)",
+            [(int(c), i, upto, rate) for c in slab_customers for i, (upto, rate) in enumerate([(50.0, 50.0), (None, 46.0)])]
+        )
+    conn.close()
+
+def load_page():
+    """The queries one render of the Analytics page runs (all-time range)"""
+    bounds = get_data_bounds()
+    get_daily_trend(bounds['first'], bounds['last'])
+    get_monthly_trend(bounds['first'].strftime('%Y-%m'), bounds['last'].strftime('%Y-%m'))
+    get_yearly_summary()
+    get_top_customers(bounds['last'].year, 10)
+
+def main():
+    build_database()
+    print(f"{N_CUSTOMERS:,} customers x {N_DAYS} days of rollups")
+
+    for label, func in [
+        ("daily trend  ", lambda: get_daily_trend(FIRST_DAY, FIRST_DAY + timedelta(days=N_DAYS - 1))),
+        ("monthly trend", lambda: get_monthly_trend('2021-01', '2025-12')),
+        ("yearly       ", get_yearly_summary),
+        ("top 10       ", lambda: get_top_customers(2025, 10)),
+    ]:
+        start = time.perf_counter()
+        func()
+        print(f"{label}: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    timings = []
+    for _ in range(5):
+        start = time.perf_counter()
+        load_page()
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"page queries: best {min(timings):.1f} ms, mean {np.mean(timings):.1f} ms (target {TARGET_MS} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark: 500 concurrent requests from an asyncio service
+Each request is a dashboard snapshot, a day's entries, a month's range totals, a
+forecast or an entry save. Compared: calling the blocking functions from coroutines,
+asyncio.to_thread (default pool, a new connection per call) and utils.async_db.
+A heartbeat task measures how long the event loop is kept from running.
+Run from the aidairy folder: python benchmarks/bench_async_db.py [requests]
+"""
+
+import os
+import sys
+import asyncio
+import random
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# utils.db creates smartdairy.db in the working directory on import; keep it out of the project
+os.chdir(tempfile.mkdtemp(prefix="smartdairy_bench_"))
+
+from datetime import date, timedelta
+from utils import db, async_db
+from utils.db import init_database, get_db_connection
+from utils.forecasting import get_forecast_summary
+
+N_REQUESTS = 500
+N_CUSTOMERS = 2_000
+HISTORY_DAYS = 90
+HISTORY_END = date(2026, 3, 1)
+WRITE_DAYS_FROM = date(2030, 1, 1)
+
+def build_database(seed: int = 42):
+    """Customers with three months of morning entries"""
+    init_database()
+    rng = np.random.default_rng(seed)
+    conn = get_db_connection()
+    with conn:
+        conn.executemany("INSERT INTO customers (name, price_per_ltr) VALUES (?, 50.0)",
+                         [(f"Customer {i:05d}",) for i in range(1, N_CUSTOMERS + 1)])
+        for offset in range(1, HISTORY_DAYS + 1):
+            day = (HISTORY_END - timedelta(days=offset)).isoformat()
+            conn.executemany(
+                "INSERT INTO entries (customer_id, entry_date, quantity) VALUES (?, ?, ?)",
+                zip(range(1, N_CUSTOMERS + 1), [day] * N_CUSTOMERS,
+                    np.round(rng.uniform(0.5, 5.0, N_CUSTOMERS), 1).tolist())
+            )
+    conn.close()
+
+def make_requests(n_requests: int, seed: int = 7):
+    """(kind, args) per request"""
+    rng = random.Random(seed)
+    requests = []
+    for i in range(n_requests):
+        day = HISTORY_END - timedelta(days=rng.randint(1, HISTORY_DAYS))
+        kind = rng.choices(['dashboard', 'day', 'range', 'forecast', 'save'], [3, 3, 2, 1, 1])[0]
+        if kind == 'day':
+            args = (day.isoformat(), day.isoformat())
+        elif kind == 'range':
+            args = ((day - timedelta(days=30)).isoformat(), day.isoformat())
+        elif kind == 'forecast':
+            args = (rng.randint(1, N_CUSTOMERS),)
+        elif kind == 'save':
+            args = (i % N_CUSTOMERS + 1, (WRITE_DAYS_FROM + timedelta(days=i // N_CUSTOMERS)).isoformat(), 2.0)
+        else:
+            args = ()
+        requests.append((kind, args))
+    return requests
+
+def blocking_dashboard():
+    return {'customers': db.count_customers(), 'totals': db.get_entry_totals(),
+            'recent_entries': db.get_recent_entries(10)}
+
+BLOCKING = {'dashboard': blocking_dashboard, 'day': db.get_entries, 'range': db.get_range_totals,
+            'forecast': get_forecast_summary, 'save': db.add_entry}
+
+async def call_blocking(kind, args):
+    return BLOCKING[kind](*args)
+
+async def call_to_thread(kind, args):
+    if kind == 'dashboard':
+        await asyncio.gather(asyncio.to_thread(db.count_customers), asyncio.to_thread(db.get_entry_totals),
+                             asyncio.to_thread(db.get_recent_entries, 10))
+        return
+    return await asyncio.to_thread(BLOCKING[kind], *args)
+
+ASYNC = {'dashboard': async_db.dashboard_snapshot, 'day': async_db.get_entries, 'range': async_db.get_range_totals,
+         'forecast': async_db.get_forecast_summary, 'save': async_db.save_entry}
+
+async def call_async_db(kind, args):
+    return await ASYNC[kind](*args)
+
+async def run_mode(call, requests):
+    """All requests at once; returns (wall seconds, response times, longest loop stall)"""
+    stalls = []
+    done = asyncio.Event()
+
+    async def heartbeat():
+        while not done.is_set():
+            before = time.perf_counter()
+            await asyncio.sleep(0.005)
+            stalls.append(time.perf_counter() - before - 0.005)
+
+    async def timed(kind, args):
+        # From the moment all requests arrived, so time spent queued counts
+        await call(kind, args)
+        return time.perf_counter() - start
+
+    ticker = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(timed(kind, args) for kind, args in requests))
+    wall = time.perf_counter() - start
+    done.set()
+    await ticker
+    return wall, np.array(latencies) * 1000, max(stalls, default=0.0) * 1000
+
+async def cancellation_check():
+    """Cancel a long scan mid-query; returns ms until the worker is free again"""
+    def scan():
+        return get_db_connection().execute(
+            "SELECT COUNT(*) FROM entries a JOIN entries b ON a.quantity = b.quantity"
+        ).fetchone()
+    pool = async_db.get_async_database()
+    task = asyncio.create_task(pool.run(scan))
+    await asyncio.sleep(0.2)
+    start = time.perf_counter()
+    task.cancel()
+    # Every worker must be free for this to finish
+    await asyncio.gather(*(async_db.count_customers() for _ in range(pool.workers)))
+    return (time.perf_counter() - start) * 1000
+
+def clear_writes():
+    conn = get_db_connection()
+    with conn:
+        conn.execute("DELETE FROM entries WHERE entry_date >= ?", (WRITE_DAYS_FROM.isoformat(),))
+    conn.close()
+
+def main(n_requests: int = N_REQUESTS):
+    build_database()
+    requests = make_requests(n_requests)
+    print(f"{n_requests} concurrent requests, {N_CUSTOMERS:,} customers x {HISTORY_DAYS} days")
+    for name, call in (("blocking calls", call_blocking), ("asyncio.to_thread", call_to_thread),
+                       ("async_db", call_async_db)):
+        clear_writes()
+        wall, latencies, stall = asyncio.run(run_mode(call, requests))
+        print(f"  {name:17s}: {wall:6.2f} s, {n_requests / wall:6,.0f} req/s, p50 {np.percentile(latencies, 50):7.1f} ms, "
+              f"p99 {np.percentile(latencies, 99):7.1f} ms, longest loop stall {stall:7.1f} ms")
+    print(f"  cancelled scan freed its worker in {asyncio.run(cancellation_check()):.1f} ms")
+    async_db.close_async_database()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else N_REQUESTS)
@@ -0,0 +1,69 @@
+"""
+Benchmark: concurrent entry submissions, one connection per write vs the shared writer
+Run from the aidairy folder: python benchmarks/bench_entry_writer.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# utils.db creates smartdairy.db in the working directory on import; keep it out of the project
+os.chdir(tempfile.mkdtemp(prefix="smartdairy_bench_"))
+
+from datetime import date, timedelta
+from utils.db import init_database, get_db_connection, add_entry
+from utils.entry_writer import save_entry, stop_entry_writer
+
+N_CUSTOMERS = 2_000
+WRITES_PER_SESSION = 200
+SESSIONS = [1, 8, 32]
+FIRST_DAY = date(2026, 1, 1)
+
+def build_database():
+    """Customers only; every run writes fresh days"""
+    init_database()
+    conn = get_db_connection()
+    with conn:
+        conn.executemany("INSERT INTO customers (name, price_per_ltr) VALUES (?, 50.0)",
+                         [(f"Customer {i:05d}",) for i in range(1, N_CUSTOMERS + 1)])
+    conn.close()
+
+def run_sessions(write, sessions: int, day_offset: int):
+    """Each session thread writes its own customers for one day; returns (seconds, failures)"""
+    day = (FIRST_DAY + timedelta(days=day_offset)).isoformat()
+    failures = []
+
+    def session(index: int):
+        for n in range(WRITES_PER_SESSION):
+            customer_id = (index * WRITES_PER_SESSION + n) % N_CUSTOMERS + 1
+            if not write(customer_id, day, 1.5, 'morning'):
+                failures.append(customer_id)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, len(failures)
+
+def main():
+    build_database()
+    writers = {
+        'add_entry (connection per write)': add_entry,
+        'save_entry (shared writer)': lambda *args: save_entry(*args)[0],
+    }
+    offset = 0
+    for sessions in SESSIONS:
+        for label, write in writers.items():
+            seconds, failed = run_sessions(write, sessions, offset)
+            offset += 1
+            total = sessions * WRITES_PER_SESSION
+            print(f"{sessions:2d} sessions, {label:34s}: {total / seconds:8,.0f} writes/s, {failed} failed")
+    stop_entry_writer()
+
+if __name__ == "__main__":
+    main()
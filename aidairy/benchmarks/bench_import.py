@@ -0,0 +1,67 @@
+"""
+Benchmark: importing 5 million historical entries from a CSV file
+Run from the aidairy folder: python benchmarks/bench_import.py [rows]
+"""
+
+import os
+import sys
+import resource
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# utils.db creates smartdairy.db in the working directory on import; keep it out of the project
+os.chdir(tempfile.mkdtemp(prefix="smartdairy_bench_"))
+
+from utils.db import init_database, get_db_connection
+from utils.importer import import_entries
+
+N_ROWS = 5_000_000
+N_CUSTOMERS = 5_000
+FIRST_DAY = np.datetime64('2023-01-01')
+
+def write_csv(path: str, n_rows: int, seed: int = 42):
+    """Morning and evening deliveries for every customer, day after day, with some bad rows"""
+    rng = np.random.default_rng(seed)
+    written = 0
+    with open(path, 'w') as f:
+        f.write("Customer Name,Date,Qty,Shift\n")
+        while written < n_rows:
+            rows = min(200_000, n_rows - written)
+            index = np.arange(written, written + rows)
+            slot = index // N_CUSTOMERS
+            frame = pd.DataFrame({
+                'customer': [f"Customer {i:05d}" for i in (index % N_CUSTOMERS + 1)],
+                'date': (FIRST_DAY + slot // 2).astype(str),
+                'qty': np.round(rng.uniform(0.5, 5.0, rows), 1),
+                'shift': np.where(slot % 2 == 0, 'morning', 'evening'),
+            })
+            frame.loc[rng.random(rows) < 0.001, 'qty'] = -1
+            frame.to_csv(f, header=False, index=False)
+            written += rows
+
+def main(n_rows: int = N_ROWS):
+    init_database()
+    conn = get_db_connection()
+    with conn:
+        conn.executemany("INSERT INTO customers (name, price_per_ltr) VALUES (?, 50.0)",
+                         [(f"Customer {i:05d}",) for i in range(1, N_CUSTOMERS + 1)])
+    conn.close()
+
+    start = time.perf_counter()
+    write_csv('entries.csv', n_rows)
+    print(f"wrote {n_rows:,} rows ({os.path.getsize('entries.csv') / 1e6:.0f} MB) "
+          f"in {time.perf_counter() - start:.1f} s")
+
+    for dry_run in (True, False):
+        report = import_entries('entries.csv', dry_run=dry_run)
+        print(f"{'dry run' if dry_run else 'import '}: {report['seconds']:.1f} s "
+              f"({report['rows'] / report['seconds']:,.0f} rows/s), {report['imported']:,} valid, "
+              f"{report['rejected']:,} rejected, {report['duplicates']:,} duplicates")
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak memory {peak_mb:.0f} MB")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else N_ROWS)
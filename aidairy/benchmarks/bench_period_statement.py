@@ -0,0 +1,60 @@
+"""
+Benchmark: 12-month statement for 50k customers from the monthly rollup
+Run from the aidairy folder: python benchmarks/bench_period_statement.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# utils.db creates smartdairy.db in the working directory on import; keep it out of the project
+os.chdir(tempfile.mkdtemp(prefix="smartdairy_bench_"))
+
+from utils.db import init_database, get_db_connection
+from utils.statements import get_period_statement
+
+N_CUSTOMERS = 50_000
+MONTHS = [f"2025-{m:02d}" for m in range(4, 13)] + [f"2026-{m:02d}" for m in range(1, 4)]
+SLAB_SHARE = 0.1
+
+def build_database(seed: int = 42):
+    """Bulk-load customers and their monthly rollup rows directly (no entries needed)"""
+    init_database()
+    rng = np.random.default_rng(seed)
+    conn = get_db_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO customers (id, name, price_per_ltr) VALUES (?, ?, ?)",
+            [(i, f"Customer {i:06d}", float(rng.choice([48.0, 50.0, 52.0]))) for i in range(1, N_CUSTOMERS + 1)]
+        )
+        for month in MONTHS:
+            litres = np.round(rng.gamma(2.0, 30.0, N_CUSTOMERS), 1)
+            conn.executemany(
+                "INSERT INTO customer_monthly (customer_id, month, litres, deliveries) VALUES (?, ?, ?, ?)",
+                zip(range(1, N_CUSTOMERS + 1), [month] * N_CUSTOMERS, litres.tolist(),
+                    rng.integers(20, 31, N_CUSTOMERS).tolist())
+            )
+        slab_customers = rng.choice(N_CUSTOMERS, int(N_CUSTOMERS * SLAB_SHARE), replace=False) + 1
+        conn.executemany(
+            "INSERT INTO price_slabs (customer_id, slab_order, upto_litres, rate) VALUES (?, ?, ?, ?)",
+            [(int(c), i, upto, rate) for c in slab_customers for i, (upto, rate) in enumerate([(50.0, 50.0), (None, 46.0)])]
+        )
+    conn.close()
+
+def main():
+    build_database()
+    print(f"{N_CUSTOMERS:,} customers x {len(MONTHS)} months")
+
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        statement = get_period_statement(2025, 4, 2026, 3)
+        timings.append(time.perf_counter() - start)
+    print(f"get_period_statement: best {min(timings):.2f} s, mean {np.mean(timings):.2f} s")
+    print(f"grand total: ₹{statement['grand_total']:,.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: what-if re-pricing of 12 months for 50k customers
+Run from the aidairy folder: python benchmarks/bench_rate_simulator.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# utils.db creates smartdairy.db in the working directory on import; keep it out of the project
+os.chdir(tempfile.mkdtemp(prefix="smartdairy_bench_"))
+
+from utils.db import init_database, get_db_connection
+from utils.rate_simulator import load_simulation_base, simulate_rate_change
+
+N_CUSTOMERS = 50_000
+MONTHS = [f"2025-{m:02d}" for m in range(4, 13)] + [f"2026-{m:02d}" for m in range(1, 4)]
+AS_OF = date(2026, 3, 31)
+SLAB_SHARE = 0.1
+
+def build_database(seed: int = 42):
+    """Bulk-load customers and their monthly rollup rows directly (no entries needed)"""
+    init_database()
+    rng = np.random.default_rng(seed)
+    conn = get_db_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO customers (id, name, price_per_ltr) VALUES (?, ?, ?)",
+            [(i, f"Customer {i:06d}", float(rng.choice([48.0, 50.0, 52.0]))) for i in range(1, N_CUSTOMERS + 1)]
+        )
+        for month in MONTHS:
+            conn.executemany(
+                "INSERT INTO customer_monthly (customer_id, month, litres, deliveries) VALUES (?, ?, ?, ?)",
+                zip(range(1, N_CUSTOMERS + 1), [month] * N_CUSTOMERS,
+                    np.round(rng.gamma(2.0, 30.0, N_CUSTOMERS), 1).tolist(), [30] * N_CUSTOMERS)
+            )
+        slab_customers = rng.choice(N_CUSTOMERS, int(N_CUSTOMERS * SLAB_SHARE), replace=False) + 1
+        conn.executemany(
+            "INSERT INTO price_slabs (customer_id, slab_order, upto_litres, rate) VALUES (?, ?, ?, ?)",
+            [(int(c), i, upto, rate) for c in slab_customers for i, (upto, rate) in enumerate([(50.0, 50.0), (None, 46.0)])]
+        )
+    conn.close()
+
+def best_ms(func, repeat: int = 5) -> float:
+    """Best wall time of a few runs in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+def main():
+    build_database()
+    print(f"{N_CUSTOMERS:,} customers x {len(MONTHS)} months")
+
+    start = time.perf_counter()
+    base = load_simulation_base(len(MONTHS), AS_OF)
+    print(f"load base (once): {(time.perf_counter() - start) * 1000:.0f} ms, {len(base.row_litres):,} customer-months")
+
+    segment = base.ids[base.rates == 50.0]
+    for label, kwargs in [
+        ("+5 %           ", {'change_type': 'percent', 'value': 5.0}),
+        ("+₹2 segment    ", {'change_type': 'flat', 'value': 2.0, 'customer_ids': segment}),
+        ("₹55 flat       ", {'change_type': 'rate', 'value': 55.0}),
+        ("new slab chart ", {'change_type': 'slabs', 'slabs': [(30.0, 54.0), (90.0, 51.0), (None, 48.0)]}),
+    ]:
+        result = simulate_rate_change(base, **kwargs)
+        print(f"{label}: {best_ms(lambda: simulate_rate_change(base, **kwargs)):.0f} ms, "
+              f"delta ₹{result['total_delta']:,.0f} on ₹{result['total_base']:,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: matching 10k statement lines against 50k customers
+Run from the aidairy folder: python benchmarks/bench_reconciliation.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# utils.db creates smartdairy.db in the working directory on import; keep it out of the project
+os.chdir(tempfile.mkdtemp(prefix="smartdairy_bench_"))
+
+from utils.reconciliation import CustomerMatchIndex, match_transactions
+
+N_CUSTOMERS = 50_000
+N_LINES = 10_000
+
+FIRST_NAMES = ['Ramesh', 'Suresh', 'Sita', 'Gita', 'Mohan', 'Sohan', 'Anil', 'Sunil', 'Priya', 'Kavita',
+               'Rajesh', 'Mukesh', 'Asha', 'Usha', 'Vijay', 'Ajay', 'Neha', 'Pooja', 'Amit', 'Rohit']
+LAST_NAMES = ['Kumar', 'Sharma', 'Verma', 'Gupta', 'Singh', 'Yadav', 'Patel', 'Mehta', 'Joshi', 'Reddy',
+              'Nair', 'Iyer', 'Das', 'Bose', 'Jain', 'Agarwal', 'Mishra', 'Pandey', 'Tiwari', 'Chauhan']
+
+SYLLABLES = ['ra', 'ma', 'sh', 'ka', 'vi', 'no', 'de', 'pu', 'la', 'ti', 'go', 'bh', 'an', 'ch', 'ya', 'su',
+             'ne', 'ri', 'po', 'ku', 'ba', 'dh', 'mo', 'ga', 'te', 'li', 'vo', 'je', 'ha', 'si', 'ru', 'pe']
+
+def build_customers(rng):
+    """Synthetic customers with mostly unique names and some mobile numbers"""
+    customers = []
+    balances = {}
+    for i in range(N_CUSTOMERS):
+        # First + last name plus a random locality/father's name to make names mostly distinct
+        locality = ''.join(rng.choice(SYLLABLES, 3))
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {locality}"
+        mobile = f"9{rng.integers(100000000, 999999999)}" if rng.random() < 0.6 else None
+        customers.append({'id': i + 1, 'name': name, 'mobile_number': mobile})
+        balances[i + 1] = float(rng.integers(200, 5000))
+    return customers, balances
+
+def build_statement(rng, customers, balances):
+    """Mixed statement lines: mobile in narration, exact amounts, names, and noise"""
+    lines = []
+    for i in range(N_LINES):
+        customer = customers[rng.integers(0, N_CUSTOMERS)]
+        kind = rng.random()
+        if kind < 0.3 and customer['mobile_number']:
+            text, amount = f"UPI/CR/{customer['mobile_number']}@ybl", float(rng.integers(100, 3000))
+        elif kind < 0.5:
+            text, amount = "UPI/CR/PAYMENT", balances[customer['id']]
+        elif kind < 0.9:
+            text, amount = f"NEFT {customer['name'].upper()} SBIN000123", float(rng.integers(100, 3000))
+        else:
+            text, amount = f"CASH DEPOSIT {i}", float(rng.integers(100, 3000))
+        lines.append({'line_no': i + 1, 'date': '2026-10-01', 'description': text,
+                      'amount': amount, 'reference': f"UTR{i:08d}", 'expected_id': customer['id']})
+    return pd.DataFrame(lines)
+
+def main():
+    rng = np.random.default_rng(7)
+    customers, balances = build_customers(rng)
+    statement = build_statement(rng, customers, balances)
+
+    start = time.perf_counter()
+    index = CustomerMatchIndex(customers, balances)
+    print(f"index build ({N_CUSTOMERS:,} customers): {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    matches = match_transactions(statement, index)
+    elapsed = time.perf_counter() - start
+    print(f"match ({N_LINES:,} lines): {elapsed:.2f} s ({N_LINES / elapsed:,.0f} lines/s)")
+    print(matches['match_method'].replace('', 'unmatched').value_counts().to_string())
+
+    matched = matches[matches['customer_id'].notna()]
+    correct = (matched['customer_id'] == matched['expected_id']).sum()
+    print(f"correct matches: {correct:,} / {len(matched):,}")
+
+if __name__ == "__main__":
+    main()
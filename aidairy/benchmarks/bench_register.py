@@ -0,0 +1,65 @@
+"""
+Benchmark: monthly register export for 50k customers x 31 days
+Run from the aidairy folder: python benchmarks/bench_register.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+import resource
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# utils.db creates smartdairy.db in the working directory on import; keep it out of the project
+os.chdir(tempfile.mkdtemp(prefix="smartdairy_bench_"))
+
+from utils.db import init_database, get_db_connection
+from utils.register import generate_register_csv, generate_register_excel
+
+N_CUSTOMERS = 50_000
+YEAR, MONTH, N_DAYS = 2026, 1, 31
+DELIVERY_SHARE = 0.9  # share of customer-days with a delivery
+
+def build_database(seed: int = 42):
+    """Bulk-load synthetic customers and a month of entries"""
+    init_database()
+    rng = np.random.default_rng(seed)
+    conn = get_db_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO customers (id, name, price_per_ltr) VALUES (?, ?, ?)",
+            [(i, f"Customer {i:06d}", float(rng.choice([48.0, 50.0, 52.0]))) for i in range(1, N_CUSTOMERS + 1)]
+        )
+        for day in range(1, N_DAYS + 1):
+            delivered = np.flatnonzero(rng.random(N_CUSTOMERS) < DELIVERY_SHARE) + 1
+            quantities = np.round(rng.uniform(0.5, 5.0, len(delivered)), 1)
+            conn.executemany(
+                "INSERT INTO entries (customer_id, entry_date, quantity) VALUES (?, ?, ?)",
+                zip(delivered.tolist(), [f"{YEAR}-{MONTH:02d}-{day:02d}"] * len(delivered), quantities.tolist())
+            )
+    conn.close()
+
+def peak_rss_mib() -> float:
+    """Peak resident memory of this process so far (Linux reports KiB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure(label, func, *args):
+    """Run an export and report time and growth of the peak resident memory"""
+    before = peak_rss_mib()
+    start = time.perf_counter()
+    path = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {elapsed:.1f} s, peak RSS +{peak_rss_mib() - before:.1f} MiB, "
+          f"{os.path.getsize(path) / 2**20:.1f} MiB file")
+
+def main():
+    start = time.perf_counter()
+    build_database()
+    print(f"loaded {N_CUSTOMERS:,} customers x {N_DAYS} days in {time.perf_counter() - start:.1f} s")
+
+    measure("register CSV  ", generate_register_csv, YEAR, MONTH, "register.csv")
+    measure("register Excel", generate_register_excel, YEAR, MONTH, "register.xlsx")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark: month-end register export while entries keep being saved
+A writer process saves evening entries into the exported month throughout each run.
+Compared: the register read over separate connections (as before snapshots), on a
+read-only snapshot, and on an in-memory copy. Reported: export time, the writer's
+latency while the export runs, the largest WAL size during it, and whether the register's
+TOTAL row matches the sum of its rows.
+Run from the aidairy folder: python benchmarks/bench_report_snapshot.py [customers]
+"""
+
+import os
+import sys
+import csv
+import tempfile
+import threading
+import time
+import multiprocessing
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# utils.db creates smartdairy.db in the working directory on import; keep it out of the project
+os.chdir(tempfile.mkdtemp(prefix="smartdairy_bench_"))
+
+from datetime import date, timedelta
+from utils.db import init_database, get_db_connection, add_entry, read_snapshot
+from utils.register import iter_register_rows, get_day_totals, generate_register_csv, _month_bounds
+
+N_CUSTOMERS = 20_000
+YEAR, MONTH = 2026, 1
+
+def build_database(n_customers: int, seed: int = 42):
+    """A month of morning entries for every customer"""
+    init_database()
+    rng = np.random.default_rng(seed)
+    conn = get_db_connection()
+    with conn:
+        conn.executemany("INSERT INTO customers (name, price_per_ltr) VALUES (?, 50.0)",
+                         [(f"Customer {i:06d}",) for i in range(1, n_customers + 1)])
+        start, end = _month_bounds(YEAR, MONTH)
+        for offset in range((end - start).days + 1):
+            day = (start + timedelta(days=offset)).isoformat()
+            conn.executemany(
+                "INSERT INTO entries (customer_id, entry_date, quantity) VALUES (?, ?, ?)",
+                zip(range(1, n_customers + 1), [day] * n_customers,
+                    np.round(rng.uniform(0.5, 5.0, n_customers), 1).tolist())
+            )
+    conn.close()
+
+def writer(db_dir: str, n_customers: int, stop, results: multiprocessing.Queue):
+    """Save evening entries (new rows in the exported month) until told to stop"""
+    os.chdir(db_dir)
+    start_day = date(YEAR, MONTH, 1)
+    latencies = []
+    sequence = 0
+    while not stop.is_set():
+        begin = time.perf_counter()
+        add_entry(sequence % n_customers + 1, (start_day + timedelta(days=sequence // n_customers % 28)).isoformat(),
+                  1.0, 'evening')
+        latencies.append(time.perf_counter() - begin)
+        sequence += 1
+        time.sleep(0.002)
+    results.put(latencies)
+
+def export_separate() -> bool:
+    """Rows and day totals over separate connections; returns whether they agree"""
+    start, end = _month_bounds(YEAR, MONTH)
+    column_sums = np.zeros((end - start).days + 1)
+    for chunk in iter_register_rows(start, end):
+        for row in chunk:
+            column_sums += [q or 0.0 for q in row['daily']]
+    return np.allclose(column_sums, get_day_totals(start, end))
+
+def export_csv(in_memory: bool) -> bool:
+    """The CSV register on a snapshot; returns whether its TOTAL row matches its rows"""
+    with read_snapshot(in_memory=in_memory):
+        generate_register_csv(YEAR, MONTH, "register.csv")
+    with open("register.csv", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    n_days = len(rows[0]) - 5
+    column_sums = np.zeros(n_days)
+    for row in rows[1:-1]:
+        column_sums += [float(q) if q else 0.0 for q in row[2:2 + n_days]]
+    return np.allclose(column_sums, [float(q) for q in rows[-1][2:2 + n_days]], atol=1e-3)
+
+def sample_wal(running: threading.Event, sizes: list):
+    """Record the WAL file size every 10 ms while the export runs"""
+    while running.is_set():
+        try:
+            sizes.append(os.path.getsize("smartdairy.db-wal"))
+        except OSError:
+            pass
+        time.sleep(0.01)
+
+def clear_evening_entries():
+    conn = get_db_connection()
+    with conn:
+        conn.execute("DELETE FROM entries WHERE shift = 'evening'")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+def main(n_customers: int = N_CUSTOMERS):
+    build_database(n_customers)
+    print(f"register of {n_customers:,} customers x 31 days, one process saving entries meanwhile")
+    modes = (("separate connections", export_separate), ("read-only snapshot", lambda: export_csv(False)),
+             ("in-memory copy", lambda: export_csv(True)))
+    for name, export in modes:
+        clear_evening_entries()
+        stop = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        process = multiprocessing.Process(target=writer, args=(os.getcwd(), n_customers, stop, results))
+        process.start()
+        time.sleep(0.5)
+        wal_sizes = [0]
+        exporting = threading.Event()
+        sampler = threading.Thread(target=sample_wal, args=(exporting, wal_sizes))
+        exporting.set()
+        sampler.start()
+        start = time.perf_counter()
+        consistent = export()
+        elapsed = time.perf_counter() - start
+        exporting.clear()
+        sampler.join()
+        wal_mb = max(wal_sizes) / 1e6
+        stop.set()
+        latencies = np.array(results.get()) * 1000
+        process.join()
+        print(f"  {name:20s}: {elapsed:5.2f} s, writes p50 {np.percentile(latencies, 50):5.1f} ms "
+              f"p99 {np.percentile(latencies, 99):6.1f} ms ({len(latencies):,} saved), "
+              f"WAL up to {wal_mb:5.1f} MB, totals {'consistent' if consistent else 'MISMATCH'}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else N_CUSTOMERS)
@@ -0,0 +1,76 @@
+"""
+Benchmark: morning route sheets for 200 routes x 100 customers
+Run from the aidairy folder: python benchmarks/bench_route_sheets.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# utils.db creates smartdairy.db in the working directory on import; keep it out of the project
+os.chdir(tempfile.mkdtemp(prefix="smartdairy_bench_"))
+
+from datetime import date, timedelta
+from utils.db import init_database, get_db_connection
+from utils.route_sheets import generate_route_sheets, load_route_sheets
+
+N_ROUTES = 200
+CUSTOMERS_PER_ROUTE = 100
+N_DAYS = 14
+SUBSCRIPTION_SHARE = 0.3
+DELIVERY_DATE = date(2026, 3, 1)
+
+def build_database(seed: int = 42):
+    """Bulk-load customers on routes with two weeks of entries before the delivery date"""
+    init_database()
+    rng = np.random.default_rng(seed)
+    n_customers = N_ROUTES * CUSTOMERS_PER_ROUTE
+    ids = np.arange(1, n_customers + 1)
+    subscription = np.where(rng.random(n_customers) < SUBSCRIPTION_SHARE,
+                            np.round(rng.uniform(0.5, 3.0, n_customers), 1), np.nan)
+    conn = get_db_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO customers (id, name, price_per_ltr, mobile_number, subscription_qty) VALUES (?, ?, ?, ?, ?)",
+            [(int(i), f"Customer {i:06d}", 50.0, f"98{i:08d}", None if np.isnan(s) else float(s))
+             for i, s in zip(ids, subscription)]
+        )
+        conn.executemany(
+            "INSERT INTO segments (id, kind, name) VALUES (?, 'route', ?)",
+            [(r, f"Route {r:03d}") for r in range(1, N_ROUTES + 1)]
+        )
+        conn.executemany(
+            "INSERT INTO customer_segments (segment_id, customer_id) VALUES (?, ?)",
+            zip(((ids - 1) // CUSTOMERS_PER_ROUTE + 1).tolist(), ids.tolist())
+        )
+        for offset in range(1, N_DAYS + 1):
+            day = (DELIVERY_DATE - timedelta(days=offset)).isoformat()
+            quantities = np.round(rng.uniform(0.5, 5.0, n_customers), 1)
+            conn.executemany(
+                "INSERT INTO entries (customer_id, entry_date, quantity) VALUES (?, ?, ?)",
+                zip(ids.tolist(), [day] * n_customers, quantities.tolist())
+            )
+    conn.close()
+
+def main():
+    start = time.perf_counter()
+    build_database()
+    print(f"loaded {N_ROUTES} routes x {CUSTOMERS_PER_ROUTE} customers x {N_DAYS} days "
+          f"in {time.perf_counter() - start:.1f} s")
+
+    start = time.perf_counter()
+    sheets = load_route_sheets(DELIVERY_DATE)
+    print(f"rosters + forecasts: {time.perf_counter() - start:.2f} s")
+
+    for workers in sorted({1, os.cpu_count() or 1}):
+        output_dir = tempfile.mkdtemp(prefix="route_sheets_")
+        start = time.perf_counter()
+        paths = generate_route_sheets(DELIVERY_DATE, output_dir, workers=workers)
+        print(f"generate_route_sheets (workers={workers}): {time.perf_counter() - start:.1f} s, "
+              f"{len(paths)} files, {sum(len(s['names']) for s in sheets):,} lines")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Benchmark: slab pricing of monthly totals for 100k customers
+Run from the aidairy folder: python benchmarks/bench_slab_pricing.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# utils.db creates smartdairy.db in the working directory on import; keep it out of the project
+os.chdir(tempfile.mkdtemp(prefix="smartdairy_bench_"))
+
+from utils.pricing import SlabTable, price_litres, breakdown_by_row
+
+N_CUSTOMERS = 100_000
+SLAB_SHARE = 0.3  # share of customers on a slab chart
+
+def build_inputs(seed: int = 42):
+    """Synthetic month totals and 3-slab charts for a share of the customers"""
+    rng = np.random.default_rng(seed)
+    customer_ids = np.arange(1, N_CUSTOMERS + 1, dtype=np.int64)
+    litres = rng.gamma(2.0, 200.0, N_CUSTOMERS)
+    flat_rates = rng.choice([48.0, 50.0, 52.0, 55.0], N_CUSTOMERS)
+
+    slab_customers = np.sort(rng.choice(customer_ids, int(N_CUSTOMERS * SLAB_SHARE), replace=False))
+    rows = []
+    for cid in slab_customers.tolist():
+        rows.extend([(cid, 500.0, 50.0), (cid, 1000.0, 47.0), (cid, None, 45.0)])
+    return customer_ids, litres, flat_rates, SlabTable.from_rows(rows)
+
+def main():
+    customer_ids, litres, flat_rates, slabs = build_inputs()
+    print(f"{N_CUSTOMERS:,} customers, {len(slabs):,} slab rows")
+
+    timings = []
+    for _ in range(5):
+        start = time.perf_counter()
+        amounts, breakdown = price_litres(customer_ids, litres, flat_rates, slabs)
+        timings.append(time.perf_counter() - start)
+    print(f"price_litres:     best {min(timings) * 1000:.1f} ms, mean {np.mean(timings) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    per_row = breakdown_by_row(breakdown, len(customer_ids))
+    print(f"breakdown_by_row: {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"({sum(1 for b in per_row if b):,} slab-priced customers)")
+    print(f"grand total: ₹{amounts.sum():,.2f}")
+
+if __name__ == "__main__":
+    main()
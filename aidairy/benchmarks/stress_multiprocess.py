@@ -0,0 +1,118 @@
+"""
+Stress test: several app processes sharing one database file
+Each worker process runs a mix of reads (a day's entries, range totals, customer
+count) and entry writes for a fixed time. Every write it reports as saved is checked
+against the database afterwards, so any lost write shows up.
+Run from the aidairy folder: python benchmarks/stress_multiprocess.py [workers] [seconds]
+"""
+
+import os
+import sys
+import random
+import tempfile
+import time
+import multiprocessing
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# utils.db creates smartdairy.db in the working directory on import; keep it out of the project
+os.chdir(tempfile.mkdtemp(prefix="smartdairy_stress_"))
+
+from datetime import date, timedelta
+from utils.db import init_database, get_db_connection, add_entry, get_entries, get_range_totals, count_customers
+
+N_WORKERS = 4
+DURATION = 10.0  # seconds
+WRITE_SHARE = 0.3
+N_CUSTOMERS = 500
+HISTORY_DAYS = 60
+HISTORY_END = date(2026, 3, 1)
+WRITE_DAYS_FROM = date(2030, 1, 1)  # stress writes go to their own days, so they can be counted
+
+def build_database(seed: int = 42):
+    """Customers with two months of morning entries to read"""
+    init_database()
+    rng = np.random.default_rng(seed)
+    conn = get_db_connection()
+    with conn:
+        conn.executemany("INSERT INTO customers (name, price_per_ltr) VALUES (?, 50.0)",
+                         [(f"Customer {i:05d}",) for i in range(1, N_CUSTOMERS + 1)])
+        for offset in range(1, HISTORY_DAYS + 1):
+            day = (HISTORY_END - timedelta(days=offset)).isoformat()
+            conn.executemany(
+                "INSERT INTO entries (customer_id, entry_date, quantity) VALUES (?, ?, ?)",
+                zip(range(1, N_CUSTOMERS + 1), [day] * N_CUSTOMERS,
+                    np.round(rng.uniform(0.5, 5.0, N_CUSTOMERS), 1).tolist())
+            )
+    conn.close()
+
+def worker(index: int, db_dir: str, duration: float, results: multiprocessing.Queue):
+    """Mixed reads and writes until the time is up; reports latencies and saved writes"""
+    os.chdir(db_dir)
+    rng = random.Random(index)
+    latencies = {'read': [], 'write': []}
+    saved, failed = [], 0
+    sequence = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        if rng.random() < WRITE_SHARE:
+            # Each worker writes its own block of days, so every write is a distinct entry
+            customer_id = sequence % N_CUSTOMERS + 1
+            day = (WRITE_DAYS_FROM + timedelta(days=index * 1000 + sequence // N_CUSTOMERS)).isoformat()
+            if add_entry(customer_id, day, 2.0, 'morning')[0]:
+                saved.append((customer_id, day, 'morning'))
+            else:
+                failed += 1
+            sequence += 1
+            latencies['write'].append(time.perf_counter() - start)
+        else:
+            day = HISTORY_END - timedelta(days=rng.randint(1, HISTORY_DAYS))
+            choice = rng.random()
+            if choice < 0.5:
+                get_entries(day.isoformat(), day.isoformat())
+            elif choice < 0.9:
+                get_range_totals((day - timedelta(days=30)).isoformat(), day.isoformat())
+            else:
+                count_customers()
+            latencies['read'].append(time.perf_counter() - start)
+    results.put((latencies, saved, failed))
+
+def main(n_workers: int = N_WORKERS, duration: float = DURATION):
+    build_database()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(i, os.getcwd(), duration, results)) for i in range(n_workers)]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    saved = {write for _, writes, _ in reports for write in writes}
+    failed = sum(f for _, _, f in reports)
+    conn = get_db_connection()
+    stored = set(map(tuple, conn.execute(
+        "SELECT customer_id, entry_date, shift FROM entries WHERE entry_date >= ?", (WRITE_DAYS_FROM.isoformat(),)
+    ).fetchall()))
+    rollup_mismatches = conn.execute("""
+        SELECT COUNT(*) FROM (SELECT entry_date, SUM(quantity) AS litres, COUNT(*) AS n FROM entries GROUP BY entry_date) e
+        LEFT JOIN daily_totals t ON t.day = e.entry_date
+        WHERE t.day IS NULL OR ABS(t.litres - e.litres) > 1e-6 OR t.deliveries != e.n
+    """).fetchone()[0]
+    conn.close()
+
+    print(f"{n_workers} processes for {duration:.0f} s ({elapsed:.1f} s wall)")
+    for kind in ('read', 'write'):
+        times = np.array([t for latencies, _, _ in reports for t in latencies[kind]]) * 1000
+        if len(times):
+            print(f"  {kind:5s}: {len(times):7,} ops, {len(times) / elapsed:7,.0f}/s, "
+                  f"p50 {np.percentile(times, 50):6.1f} ms, p99 {np.percentile(times, 99):7.1f} ms, "
+                  f"max {times.max():7.1f} ms")
+    print(f"  writes saved {len(saved):,}, failed {failed}, lost {len(saved - stored)}, "
+          f"rollup mismatches {rollup_mismatches}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else N_WORKERS,
+         float(sys.argv[2]) if len(sys.argv) > 2 else DURATION)
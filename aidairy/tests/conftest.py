@@ -0,0 +1,36 @@
+"""
+Shared fixtures for the SmartDairy tests
+Every test runs in its own temporary folder with a fresh smartdairy.db
+"""
+
+import os
+import sys
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# utils.db creates smartdairy.db in the working directory on import; keep it out of the project
+os.chdir(tempfile.mkdtemp(prefix="smartdairy_tests_"))
+
+from utils.db import init_database, get_db_connection
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    """A fresh, empty database in the test's own folder"""
+    monkeypatch.chdir(tmp_path)
+    init_database()
+    return tmp_path / "smartdairy.db"
+
+@pytest.fixture
+def make_customer():
+    """Insert a customer and return its id"""
+    def make(name: str, price_per_ltr: float = 50.0, mobile_number=None) -> int:
+        conn = get_db_connection()
+        with conn:
+            customer_id = conn.execute(
+                "INSERT INTO customers (name, price_per_ltr, mobile_number) VALUES (?, ?, ?)",
+                (name, price_per_ltr, mobile_number)
+            ).lastrowid
+        conn.close()
+        return customer_id
+    return make
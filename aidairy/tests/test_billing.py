@@ -0,0 +1,81 @@
+"""
+Tests for range billing from the per-customer prefix sums, and billing cycles
+"""
+
+import random
+from datetime import date, timedelta
+import pytest
+from utils.billing import calculate_billing, get_billing_period, get_last_completed_period
+from utils.db import add_entry, get_db_connection, get_range_totals
+
+def brute_force_totals(start: str, end: str) -> dict:
+    """Litres and entry count per customer, summed straight from entries"""
+    conn = get_db_connection()
+    rows = conn.execute(
+        "SELECT customer_id, SUM(quantity), COUNT(*) FROM entries WHERE entry_date BETWEEN ? AND ? GROUP BY customer_id",
+        (start, end)
+    ).fetchall()
+    conn.close()
+    return {row[0]: (round(row[1], 3), row[2]) for row in rows}
+
+def test_range_totals_follow_inserts_edits_moves_and_deletes(make_customer):
+    rng = random.Random(7)
+    ids = [make_customer(f"Customer {i}") for i in range(5)]
+    first = date(2026, 1, 1)
+    for _ in range(300):
+        add_entry(rng.choice(ids), (first + timedelta(days=rng.randrange(60))).isoformat(),
+                  round(rng.uniform(0.5, 4.0), 1), rng.choice(['morning', 'evening']))
+    conn = get_db_connection()
+    with conn:
+        conn.execute("DELETE FROM entries WHERE id % 7 = 0")
+        conn.execute("UPDATE entries SET quantity = quantity + 1 WHERE id % 5 = 0")
+        # Moving an entry to another day (where that day and shift are free)
+        conn.execute("""
+            UPDATE OR IGNORE entries SET entry_date = date(entry_date, '+1 day') WHERE id % 11 = 0
+        """)
+    conn.close()
+
+    for _ in range(30):
+        start = first + timedelta(days=rng.randrange(-5, 60))
+        end = start + timedelta(days=rng.randrange(0, 40))
+        expected = brute_force_totals(start.isoformat(), end.isoformat())
+        totals = {t['id']: (round(t['total_litres'], 3), t['deliveries'])
+                  for t in get_range_totals(start.isoformat(), end.isoformat())}
+        assert totals == expected
+
+def test_range_boundaries_are_inclusive(make_customer):
+    asha = make_customer("Asha", 50.0)
+    for day in ('2026-01-31', '2026-02-01', '2026-02-28', '2026-03-01'):
+        add_entry(asha, day, 1.0)
+    billing = calculate_billing('2026-02-01', '2026-02-28')
+    assert [(c['total_litres'], c['deliveries'], c['total_amount']) for c in billing['customers']] == [(2.0, 2, 100.0)]
+    assert billing['grand_total'] == 100.0
+
+def test_billing_a_subset_of_customers(make_customer):
+    asha, ravi = make_customer("Asha", 50.0), make_customer("Ravi", 60.0)
+    add_entry(asha, '2026-01-05', 2.0)
+    add_entry(ravi, '2026-01-05', 1.0)
+    billing = calculate_billing('2026-01-01', '2026-01-31', [ravi])
+    assert [c['id'] for c in billing['customers']] == [ravi]
+    assert billing['grand_total'] == 60.0
+
+def test_customers_without_entries_in_range_are_not_billed(make_customer):
+    asha = make_customer("Asha")
+    add_entry(asha, '2026-01-05', 2.0)
+    assert calculate_billing('2026-02-01', '2026-02-28')['customers'] == []
+
+@pytest.mark.parametrize("cycle, as_of, anchor, cutoff, expected", [
+    ('monthly', '2026-02-14', None, None, ('2026-02-01', '2026-02-28')),
+    ('weekly', '2026-01-14', '2026-01-05', None, ('2026-01-12', '2026-01-18')),
+    ('fortnightly', '2026-01-04', '2026-01-05', None, ('2025-12-22', '2026-01-04')),
+    ('custom', '2026-02-10', None, 25, ('2026-01-26', '2026-02-25')),
+    ('custom', '2026-02-26', None, 25, ('2026-02-26', '2026-03-25')),
+    ('custom', '2026-03-10', None, 31, ('2026-03-01', '2026-03-31')),
+])
+def test_billing_period(cycle, as_of, anchor, cutoff, expected):
+    start, end = get_billing_period(cycle, as_of, anchor, cutoff)
+    assert (start.isoformat(), end.isoformat()) == expected
+
+def test_last_completed_period_ends_before_the_current_one():
+    start, end = get_last_completed_period('custom', '2026-03-10', None, 25)
+    assert (start.isoformat(), end.isoformat()) == ('2026-01-26', '2026-02-25')
@@ -0,0 +1,137 @@
+"""Tests for write transactions, busy retries and write error reasons"""
+
+import sqlite3
+import threading
+import time
+import pytest
+from utils import db
+from utils.db import (
+    write_transaction, add_customer, update_customer, delete_customer, add_entry, get_db_connection
+)
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    """Short busy timeout and backoff, so lock tests run quickly"""
+    monkeypatch.setattr(db, 'DB_BUSY_TIMEOUT', 0.05)
+    monkeypatch.setattr(db, 'WRITE_RETRY_DELAY', 0.05)
+
+@pytest.fixture
+def attempts(monkeypatch):
+    """Connections write_transaction opens: one per attempt"""
+    opened = []
+    original = db.get_db_connection
+
+    def counting():
+        opened.append(1)
+        return original()
+
+    monkeypatch.setattr(db, 'get_db_connection', counting)
+    return opened
+
+def hold_write_lock(seconds: float) -> threading.Thread:
+    """Take the write lock on another connection and keep it for `seconds`"""
+    ready = threading.Event()
+
+    def hold():
+        conn = sqlite3.connect(db.DB_PATH)
+        conn.execute("BEGIN IMMEDIATE")
+        ready.set()
+        time.sleep(seconds)
+        conn.rollback()
+        conn.close()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    ready.wait()
+    return thread
+
+def test_write_transaction_retries_until_the_lock_is_free(fast_retries, make_customer, attempts):
+    customer_id = make_customer("Ramesh")
+    runs = []
+
+    def work(conn):
+        runs.append(1)
+        conn.execute("UPDATE customers SET price_per_ltr = 55 WHERE id = ?", (customer_id,))
+
+    holder = hold_write_lock(0.2)
+    write_transaction(work)
+    holder.join()
+    assert len(attempts) > 1
+    # The lock is taken before work runs, so work runs once, holding it
+    assert len(runs) == 1
+    assert db.get_customer_by_id(customer_id)['price_per_ltr'] == 55
+
+def test_write_transaction_gives_up_after_the_last_retry(fast_retries, attempts):
+    runs = []
+
+    def work(conn):
+        runs.append(1)
+        conn.execute("INSERT INTO customers (name, price_per_ltr) VALUES ('Suresh', 50)")
+
+    holder = hold_write_lock(2.0)
+    with pytest.raises(sqlite3.OperationalError):
+        write_transaction(work, retries=3)
+    holder.join()
+    assert len(attempts) == 3
+    assert runs == []
+
+def test_write_transaction_reads_under_the_write_lock(make_customer):
+    customer_id = make_customer("Ramesh")
+
+    def work(conn):
+        # Another writer cannot start before this work commits
+        with pytest.raises(sqlite3.OperationalError):
+            other = sqlite3.connect(db.DB_PATH, timeout=0.05)
+            try:
+                other.execute("BEGIN IMMEDIATE")
+            finally:
+                other.close()
+        conn.execute("UPDATE customers SET price_per_ltr = 60 WHERE id = ?", (customer_id,))
+
+    write_transaction(work)
+    assert db.get_customer_by_id(customer_id)['price_per_ltr'] == 60
+
+def test_write_transaction_does_not_retry_other_errors():
+    attempts = []
+
+    def work(conn):
+        attempts.append(1)
+        conn.execute("INSERT INTO entries (customer_id, entry_date, quantity) VALUES (999, '2026-01-01', 1)")
+
+    with pytest.raises(sqlite3.IntegrityError):
+        write_transaction(work)
+    assert len(attempts) == 1
+
+def test_write_transaction_rolls_back_on_error(make_customer):
+    customer_id = make_customer("Ramesh")
+
+    def work(conn):
+        conn.execute("DELETE FROM customers WHERE id = ?", (customer_id,))
+        raise ValueError("stop")
+
+    with pytest.raises(ValueError):
+        write_transaction(work)
+    assert db.get_customer_by_id(customer_id) is not None
+
+def test_write_reasons(make_customer):
+    customer_id = make_customer("Ramesh")
+    assert add_customer("Suresh", 50.0) == (True, "Customer 'Suresh' added")
+    assert add_customer("Ramesh", 50.0) == (False, "A customer with this name already exists")
+    assert update_customer(customer_id, "Suresh", 50.0) == (False, "A customer with this name already exists")
+    assert update_customer(999, "Nobody", 50.0) == (False, "Customer not found")
+    assert add_entry(999, "2026-01-01", 2.0) == (False, "Customer not found")
+    assert add_entry(customer_id, "2026-01-01", 2.0, 'night') == (False, "Unknown shift: night")
+    assert add_entry(customer_id, "2026-01-01", 2.0) == (True, "Entry saved")
+    assert delete_customer(customer_id) == (True, "Customer deleted with 1 entry")
+    assert delete_customer(customer_id) == (False, "Customer not found")
+
+def test_busy_database_is_reported(fast_retries, make_customer):
+    customer_id = make_customer("Ramesh")
+    holder = hold_write_lock(2.0)
+    success, message = add_entry(customer_id, "2026-01-01", 2.0)
+    holder.join()
+    assert not success
+    assert message == "The database is busy; please try again"
+    conn = get_db_connection()
+    assert conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 0
+    conn.close()
@@ -0,0 +1,33 @@
+"""
+Tests that bills, the collection register and statements count deliveries the same way
+"""
+
+from datetime import date
+from utils.billing import calculate_billing
+from utils.db import add_entry, get_monthly_entries
+from utils.register import iter_register_rows
+from utils.statements import load_month_arrays
+
+def test_both_shifts_of_a_day_count_everywhere(make_customer):
+    asha = make_customer("Asha")
+    add_entry(asha, '2026-01-05', 2.0, 'morning')
+    add_entry(asha, '2026-01-05', 1.0, 'evening')
+    add_entry(asha, '2026-01-06', 2.0, 'morning')
+
+    billed = calculate_billing('2026-01-01', '2026-01-31')['customers'][0]
+    register = [row for chunk in iter_register_rows(date(2026, 1, 1), date(2026, 1, 31)) for row in chunk][0]
+    statement = load_month_arrays(2026, 1)
+    assert billed['deliveries'] == register['deliveries'] == statement['deliveries'][0] == 3
+    assert billed['total_litres'] == register['total_litres'] == statement['totals'][0] == 5.0
+    assert register['daily'][4] == 3.0
+
+def test_customer_without_entries_has_no_deliveries(make_customer):
+    make_customer("Asha")
+    register = [row for chunk in iter_register_rows(date(2026, 1, 1), date(2026, 1, 31)) for row in chunk]
+    assert [(row['deliveries'], row['total_litres'], row['total_amount']) for row in register] == [(0, 0.0, 0.0)]
+
+def test_monthly_entries_cover_exactly_the_month(make_customer):
+    asha = make_customer("Asha")
+    for day in ('2026-01-31', '2026-02-01', '2026-02-28', '2026-03-01'):
+        add_entry(asha, day, 1.0)
+    assert [e['entry_date'] for e in get_monthly_entries(2026, 2)] == ['2026-02-01', '2026-02-28']
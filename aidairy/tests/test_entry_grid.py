@@ -0,0 +1,46 @@
+"""
+Tests for grid entry: only changed cells are written
+"""
+
+import math
+from datetime import date
+from utils.db import add_entry, get_db_connection
+from utils.entry_grid import diff_entry_grid, load_entry_grid, save_entry_grid
+
+NaN = float('nan')
+
+def test_diff_finds_new_changed_and_cleared_cells():
+    diff = diff_entry_grid([1, 2, 3, 4, 5, 6], [NaN, 2.0, 2.0, 2.0, 2.0, NaN], [1.5, 2.0, 2.5, NaN, 0.0, NaN])
+    assert diff == {'upserts': [(1, 1.5), (3, 2.5)], 'deletes': [4, 5]}
+
+def test_diff_of_an_unchanged_grid_is_empty():
+    assert diff_entry_grid([1, 2], [1.0, NaN], [1.0, None]) == {'upserts': [], 'deletes': []}
+
+def test_negative_quantity_clears_the_cell():
+    assert diff_entry_grid([1], [2.0], [-1.0]) == {'upserts': [], 'deletes': [1]}
+
+def test_save_writes_the_diff_for_one_shift(make_customer):
+    asha, ravi, meena = make_customer("Asha"), make_customer("Ravi"), make_customer("Meena")
+    day = date(2026, 1, 5)
+    add_entry(ravi, day.isoformat(), 2.0, 'morning')
+    add_entry(meena, day.isoformat(), 1.0, 'morning')
+    add_entry(meena, day.isoformat(), 1.0, 'evening')
+
+    grid = load_entry_grid(day, 'morning')
+    assert grid['names'] == ["Asha", "Meena", "Ravi"]
+    stored = dict(zip(grid['customer_ids'].tolist(), grid['stored'].tolist()))
+    assert math.isnan(stored[asha]) and stored[ravi] == 2.0
+
+    edited = {asha: 1.5, meena: NaN, ravi: 2.0}
+    diff = diff_entry_grid(grid['customer_ids'], grid['stored'], [edited[cid] for cid in grid['customer_ids'].tolist()])
+    assert save_entry_grid(day, 'morning', diff['upserts'], diff['deletes']) == (True, "Saved 1 entry, removed 1")
+
+    conn = get_db_connection()
+    rows = conn.execute("SELECT customer_id, shift, quantity FROM entries ORDER BY customer_id, shift").fetchall()
+    conn.close()
+    # Meena's evening entry is another shift and is left alone
+    assert [tuple(row) for row in rows] == [(asha, 'morning', 1.5), (ravi, 'morning', 2.0), (meena, 'evening', 1.0)]
+
+def test_save_without_changes_or_with_unknown_shift():
+    assert save_entry_grid(date(2026, 1, 5), 'morning', [], []) == (True, "No changes to save")
+    assert save_entry_grid(date(2026, 1, 5), 'noon', [(1, 1.0)], []) == (False, "Unknown shift: noon")
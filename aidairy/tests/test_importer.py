@@ -0,0 +1,125 @@
+"""
+Tests for the CSV importer: reasons for skipped rows, and rollups after a chunked import
+"""
+
+import io
+import pytest
+from utils.db import (
+    get_db_connection, get_range_totals, add_entry, rebuild_entry_prefix, rebuild_rollups, ENTRY_ROLLUP_TRIGGERS
+)
+from utils.importer import import_entries, import_customers
+
+def csv_file(text: str) -> io.StringIO:
+    return io.StringIO(text.strip() + "\n")
+
+def entry_count() -> int:
+    conn = get_db_connection()
+    count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+    conn.close()
+    return count
+
+def test_rejected_entry_rows_are_counted_by_reason(make_customer):
+    make_customer("Asha")
+    report = import_entries(csv_file("""
+Customer,Date,Qty,Shift
+Asha,2026-01-01,2.0,morning
+,2026-01-02,2.0,morning
+Ravi,2026-01-02,2.0,morning
+Asha,31-02-2026,2.0,morning
+Asha,2999-01-01,2.0,morning
+Asha,2026-01-03,-1,morning
+Asha,2026-01-04,2000,morning
+Asha,2026-01-05,2.0,noon
+"""), file_format='csv')
+    assert report['imported'] == 1
+    assert report['rejected'] == 7
+    assert report['errors'] == {'missing customer': 1, 'unknown customer': 1, 'invalid date': 1,
+                                'date in the future': 1, 'invalid quantity': 2, 'invalid shift': 1}
+    assert [sample['row'] for sample in report['samples']] == [3, 4, 5, 6, 7, 8, 9]
+    assert entry_count() == 1
+
+def test_shift_aliases_and_repeated_rows(make_customer):
+    make_customer("Asha")
+    report = import_entries(csv_file("""
+Name,Date,Litres,Session
+asha,01/01/2026,2.0,AM
+Asha,2026-01-01,3.0,pm
+Asha,2026-01-01,2.5,
+"""), file_format='csv')
+    assert report['rejected'] == 0
+    assert report['imported'] == 3
+    assert report['duplicates'] == 1
+    assert entry_count() == 2
+    assert get_range_totals('2026-01-01', '2026-01-01')[0]['total_litres'] == 5.5
+
+def test_dry_run_writes_nothing(make_customer):
+    make_customer("Asha")
+    report = import_entries(csv_file("Customer,Date,Qty\nAsha,2026-01-01,2.0\nNew,2026-01-01,1.0"),
+                            file_format='csv', dry_run=True, create_customers=True, default_rate=45.0)
+    assert report['imported'] == 2 and report['new_customers'] == 1
+    assert entry_count() == 0
+
+DERIVED_TABLES = ['entry_prefix', 'daily_totals', 'customer_monthly', 'customer_yearly']
+
+def derived_rows(cursor) -> dict:
+    """Rows of the prefix-sum and rollup tables, floats rounded"""
+    return {table: sorted(tuple(round(v, 6) if isinstance(v, float) else v for v in row)
+                          for row in cursor.execute(f"SELECT * FROM {table}"))
+            for table in DERIVED_TABLES}
+
+def test_chunked_import_keeps_rollups_and_triggers(make_customer):
+    asha, ravi = make_customer("Asha"), make_customer("Ravi")
+    # Existing entries before, inside and after the imported days, one of them replaced
+    for customer_id, day, litres in ((asha, '2025-12-30', 1.0), (asha, '2026-01-04', 9.0), (ravi, '2026-02-10', 2.0)):
+        add_entry(customer_id, day, litres)
+    rows = [f"{name},2026-01-{day:02d},{1.0 + day / 10},{shift}"
+            for day in range(1, 11) for name in ("Asha", "Ravi") for shift in ("morning", "evening")]
+    rows.append("Asha,2026-01-02,5.0,morning")  # repeated key: the later row wins
+    report = import_entries(csv_file("Customer,Date,Qty,Shift\n" + "\n".join(rows)), file_format='csv', chunk_size=7)
+    assert report['imported'] == 41 and report['duplicates'] == 1
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    stored = derived_rows(cursor)
+    # The same tables recomputed from scratch
+    cursor.execute("BEGIN")
+    rebuild_entry_prefix(cursor)
+    rebuild_rollups(cursor)
+    expected = derived_rows(cursor)
+    conn.rollback()
+    triggers = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    conn.close()
+    assert stored == expected
+    assert set(ENTRY_ROLLUP_TRIGGERS) <= triggers
+    assert get_range_totals('2026-01-02', '2026-01-02')[0]['total_litres'] == 5.0 + 1.2
+
+def test_failed_chunked_import_keeps_the_chunks_before_it(make_customer):
+    make_customer("Asha")
+    source = csv_file("Customer,Date,Qty\n" + "\n".join(f"Asha,2026-01-{day:02d},1.5" for day in range(1, 5))
+                      + "\n\"Asha,2026-01-05")  # unterminated quote: the last chunk cannot be read
+    with pytest.raises(Exception):
+        import_entries(source, file_format='csv', chunk_size=2)
+    assert entry_count() == 4
+    assert get_range_totals('2026-01-01', '2026-01-31')[0]['total_litres'] == 6.0
+
+def test_rejected_customer_rows_are_counted_by_reason(make_customer):
+    make_customer("Asha")
+    report = import_customers(csv_file("""
+Name,Rate,Mobile,Subscription
+Asha,52,98765 43210,
+Ravi,50,,1.5
+,50,,
+Meena,0,,
+Kiran,50,12ab,
+Devi,50,,-1
+Ravi,55,,
+"""), file_format='csv')
+    assert report['errors'] == {'missing name': 1, 'invalid price': 1, 'invalid mobile number': 1,
+                                'invalid subscription': 1}
+    assert report['imported'] == 3
+    assert report['duplicates'] == 1
+    assert report['new_customers'] == 1
+    conn = get_db_connection()
+    prices = dict(conn.execute("SELECT name, price_per_ltr FROM customers").fetchall())
+    conn.close()
+    assert prices == {'Asha': 52.0, 'Ravi': 55.0}
@@ -0,0 +1,98 @@
+"""
+Tests for month close and reissue: snapshots, deltas and closing races
+"""
+
+from utils import invoices
+from utils.db import add_entry, get_db_connection
+from utils.invoices import (
+    close_month, is_month_closed, get_closed_billing, get_pending_reissues, reissue_closed_month,
+    get_invoice_history, get_invoice_artifact
+)
+
+def stored_artifacts(year: int, month: int) -> int:
+    conn = get_db_connection()
+    count = conn.execute("SELECT COUNT(*) FROM invoice_artifacts WHERE year = ? AND month = ?",
+                         (year, month)).fetchone()[0]
+    conn.close()
+    return count
+
+def test_close_snapshots_every_customer(make_customer):
+    asha, ravi = make_customer("Asha", 50.0), make_customer("Ravi", 60.0)
+    add_entry(asha, '2026-01-05', 2.0)
+    add_entry(ravi, '2026-01-06', 1.0)
+    assert close_month(2026, 1) == (True, "Closed with 2 invoices")
+    assert is_month_closed(2026, 1)
+    amounts = {c['id']: c['total_amount'] for c in get_closed_billing(2026, 1)['customers']}
+    assert amounts == {asha: 100.0, ravi: 60.0}
+    assert stored_artifacts(2026, 1) == 3
+
+def test_close_twice_or_empty_month_is_refused(make_customer):
+    add_entry(make_customer("Asha"), '2026-01-05', 2.0)
+    assert close_month(2026, 2) == (False, "No entries found for this month")
+    assert close_month(2026, 1)[0]
+    assert close_month(2026, 1) == (False, "This month is already closed")
+
+def test_month_closed_by_another_session_while_rendering(make_customer, monkeypatch):
+    add_entry(make_customer("Asha"), '2026-01-05', 2.0)
+    render = invoices._render_artifacts
+
+    def render_while_another_session_closes(billing_data):
+        artifacts = render(billing_data)
+        monkeypatch.setattr(invoices, '_render_artifacts', render)
+        assert close_month(2026, 1)[0]
+        return artifacts
+
+    monkeypatch.setattr(invoices, '_render_artifacts', render_while_another_session_closes)
+    assert close_month(2026, 1) == (False, "This month is already closed")
+    assert len(get_invoice_history(2026, 1)) == 1
+
+def test_entry_saved_while_rendering_is_in_the_snapshot(make_customer, monkeypatch):
+    asha = make_customer("Asha")
+    add_entry(asha, '2026-01-05', 2.0)
+    render = invoices._render_artifacts
+
+    def render_while_an_entry_is_saved(billing_data):
+        add_entry(asha, '2026-01-06', 1.0)
+        return render(billing_data)
+
+    monkeypatch.setattr(invoices, '_render_artifacts', render_while_an_entry_is_saved)
+    assert close_month(2026, 1)[0]
+    assert get_closed_billing(2026, 1)['customers'][0]['total_litres'] == 3.0
+    assert get_pending_reissues(2026, 1) == []
+    # The exports rendered from the older figures were not kept
+    assert stored_artifacts(2026, 1) == 0
+    monkeypatch.setattr(invoices, '_render_artifacts', render)
+    assert get_invoice_artifact(2026, 1, 'csv')
+    assert stored_artifacts(2026, 1) == 3
+
+def test_reissue_carries_the_delta(make_customer):
+    asha, ravi = make_customer("Asha", 50.0), make_customer("Ravi", 60.0)
+    add_entry(asha, '2026-01-05', 2.0)
+    add_entry(ravi, '2026-01-06', 1.0)
+    close_month(2026, 1)
+
+    add_entry(asha, '2026-01-07', 1.5)
+    add_entry(ravi, '2026-01-06', 1.0)  # same quantity again: flagged, but unchanged
+    assert get_pending_reissues(2026, 1) == [asha, ravi]
+    summary = reissue_closed_month(2026, 1)
+    assert summary['unchanged'] == 1
+    assert [(r['customer_id'], r['version'], r['previous_amount'], r['total_amount'], r['delta_amount'])
+            for r in summary['reissued']] == [(asha, 2, 100.0, 175.0, 75.0)]
+    assert get_pending_reissues(2026, 1) == []
+    assert stored_artifacts(2026, 1) == 0
+
+    history = [(h['version'], h['delta_amount'], h['is_current']) for h in get_invoice_history(2026, 1)
+               if h['customer_id'] == asha]
+    assert history == [(2, 75.0, 1), (1, 100.0, 0)]
+
+def test_reissue_after_all_entries_removed_is_a_zero_invoice(make_customer):
+    asha = make_customer("Asha", 50.0)
+    add_entry(asha, '2026-01-05', 2.0)
+    close_month(2026, 1)
+    conn = get_db_connection()
+    with conn:
+        conn.execute("DELETE FROM entries WHERE customer_id = ?", (asha,))
+    conn.close()
+    reissued = reissue_closed_month(2026, 1)['reissued']
+    assert [(r['total_amount'], r['delta_amount']) for r in reissued] == [(0.0, -100.0)]
+    assert get_closed_billing(2026, 1)['customers'] == []
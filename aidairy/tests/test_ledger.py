@@ -0,0 +1,66 @@
+"""
+Tests for payments and the customer ledger's running balances
+"""
+
+from utils.db import add_entry
+from utils.invoices import close_month, reissue_closed_month
+from utils.ledger import (
+    record_payment, delete_payment, get_customer_balance, get_due_list, get_customer_ledger,
+    get_payments
+)
+
+def test_balance_follows_invoices_and_payments(make_customer):
+    asha = make_customer("Asha", 50.0)
+    add_entry(asha, '2026-01-05', 4.0)
+    close_month(2026, 1)
+    assert get_customer_balance(asha)['balance'] == 200.0
+
+    assert record_payment(asha, 150.0, '2026-02-03', 'UPI', 'TXN1') == (True, "Payment of ₹150.00 recorded")
+    balance = get_customer_balance(asha)
+    assert (balance['invoiced'], balance['paid'], balance['balance'], balance['last_payment_on']) == \
+        (200.0, 150.0, 50.0, '2026-02-03')
+
+    # A late entry reissues the invoice; only the delta is added to the balance
+    add_entry(asha, '2026-01-06', 2.0)
+    reissue_closed_month(2026, 1)
+    assert get_customer_balance(asha)['balance'] == 150.0
+
+def test_deleting_a_payment_restores_the_balance(make_customer):
+    asha = make_customer("Asha", 50.0)
+    add_entry(asha, '2026-01-05', 4.0)
+    close_month(2026, 1)
+    record_payment(asha, 200.0, '2026-02-03')
+    assert get_customer_balance(asha)['balance'] == 0.0
+    payment_id = get_payments(asha)[0]['id']
+    assert delete_payment(payment_id)
+    assert get_customer_balance(asha)['balance'] == 200.0
+    assert not delete_payment(payment_id)
+
+def test_invalid_payments_are_refused(make_customer):
+    assert record_payment(make_customer("Asha"), 0) == (False, "Payment amount must be greater than zero")
+    assert record_payment(999, 10.0) == (False, "Customer not found")
+
+def test_customer_without_invoices_owes_nothing(make_customer):
+    assert get_customer_balance(make_customer("Asha"))['balance'] == 0.0
+
+def test_due_list_is_largest_first(make_customer):
+    asha, ravi, meena = make_customer("Asha", 50.0), make_customer("Ravi", 50.0), make_customer("Meena", 50.0)
+    for customer_id, litres in ((asha, 2.0), (ravi, 6.0), (meena, 4.0)):
+        add_entry(customer_id, '2026-01-05', litres)
+    close_month(2026, 1)
+    record_payment(meena, 200.0, '2026-02-01')
+    assert [(row['name'], row['balance']) for row in get_due_list()] == [("Ravi", 300.0), ("Asha", 100.0)]
+
+def test_ledger_running_balance(make_customer):
+    asha = make_customer("Asha", 50.0)
+    add_entry(asha, '2026-01-05', 4.0)
+    close_month(2026, 1)
+    record_payment(asha, 50.0, '2999-01-01', 'Cash')
+    record_payment(asha, 30.0, '2999-01-02', 'UPI', 'REF9')
+    ledger = get_customer_ledger(asha)
+    assert [(line['description'], line['debit'], line['credit'], line['balance']) for line in ledger] == [
+        ('Invoice 2026-01', 200.0, 0, 200.0),
+        ('Payment - Cash', 0, 50.0, 150.0),
+        ('Payment - UPI (REF9)', 0, 30.0, 120.0),
+    ]
+    assert ledger[-1]['balance'] == get_customer_balance(asha)['balance']
@@ -0,0 +1,97 @@
+"""
+Tests for the WhatsApp outbox: claims held by a running dispatcher are never sent twice
+"""
+
+import asyncio
+import pytest
+from utils import outbox
+from utils.billing import calculate_billing
+from utils.db import get_db_connection, add_entry
+from utils.outbox import FakeTransport, dispatch_outbox
+
+def queue_message(customer_id: int, key: str) -> int:
+    conn = get_db_connection()
+    with conn:
+        message_id = conn.execute(
+            "INSERT INTO outbox (customer_id, mobile_number, message, dedupe_key) VALUES (?, '919876543210', 'Bill', ?)",
+            (customer_id, key)
+        ).lastrowid
+    conn.close()
+    return message_id
+
+def claim(message_id: int, owner: str, age_seconds: int = 0):
+    conn = get_db_connection()
+    with conn:
+        conn.execute(
+            "UPDATE outbox SET status = 'sending', claimed_by = ?, claimed_at = datetime('now', ?) WHERE id = ?",
+            (owner, f"-{age_seconds} seconds", message_id)
+        )
+    conn.close()
+
+def status_of(message_id: int) -> str:
+    conn = get_db_connection()
+    status = conn.execute("SELECT status FROM outbox WHERE id = ?", (message_id,)).fetchone()[0]
+    conn.close()
+    return status
+
+def run_dispatcher() -> dict:
+    return asyncio.run(dispatch_outbox(FakeTransport(), rate_per_minute=60_000))
+
+def test_dispatcher_sends_queued_messages(make_customer):
+    message_id = queue_message(make_customer("Asha"), "a")
+    assert run_dispatcher() == {'sent': 1, 'failed': 0}
+    assert status_of(message_id) == 'sent'
+
+def test_fresh_claim_of_a_running_dispatcher_is_left_alone(make_customer):
+    message_id = queue_message(make_customer("Asha"), "a")
+    owner = outbox._new_owner()
+    outbox._active_owners.add(owner)
+    try:
+        claim(message_id, owner)
+        assert run_dispatcher() == {'sent': 0, 'failed': 0}
+        assert status_of(message_id) == 'sending'
+    finally:
+        outbox._active_owners.discard(owner)
+
+def test_fresh_claim_on_another_host_is_left_alone(make_customer):
+    message_id = queue_message(make_customer("Asha"), "a")
+    claim(message_id, "other-host:1:abcd1234")
+    assert run_dispatcher() == {'sent': 0, 'failed': 0}
+    assert status_of(message_id) == 'sending'
+
+def test_expired_claim_is_sent(make_customer):
+    message_id = queue_message(make_customer("Asha"), "a")
+    claim(message_id, "other-host:1:abcd1234", age_seconds=outbox.SEND_LEASE_SECONDS + 1)
+    assert run_dispatcher() == {'sent': 1, 'failed': 0}
+    assert status_of(message_id) == 'sent'
+
+def test_claim_of_a_stopped_dispatcher_is_sent(make_customer):
+    message_id = queue_message(make_customer("Asha"), "a")
+    # An earlier run in this process that is no longer active
+    claim(message_id, outbox._new_owner())
+    assert run_dispatcher() == {'sent': 1, 'failed': 0}
+    assert status_of(message_id) == 'sent'
+
+def test_lost_claim_is_not_sent(make_customer):
+    message_id = queue_message(make_customer("Asha"), "a")
+    owner = outbox._new_owner()
+    claim(message_id, "other-host:1:abcd1234")
+    assert not outbox._renew_claim(message_id, owner)
+    assert outbox._renew_claim(message_id, "other-host:1:abcd1234")
+
+def test_requeueing_a_bill_being_sent_keeps_the_claim(make_customer):
+    customer_id = make_customer("Asha", mobile_number="9876543210")
+    add_entry(customer_id, '2026-01-05', 2.0)
+    billing_data = calculate_billing('2026-01-01', '2026-01-31')
+    assert outbox.enqueue_bills(billing_data) == (1, 0)
+    message_id = outbox.get_outbox_messages()[0]['id']
+    claim(message_id, "other-host:1:abcd1234")
+    assert outbox.enqueue_bills(billing_data) == (0, 1)
+    assert status_of(message_id) == 'sending'
+
+def test_transport_without_send_cannot_be_created():
+    class SilentTransport(outbox.WhatsAppTransport):
+        name = 'silent'
+
+    with pytest.raises(TypeError):
+        SilentTransport()
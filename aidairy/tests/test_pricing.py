@@ -0,0 +1,56 @@
+"""Tests for volume-slab pricing"""
+
+import numpy as np
+import pytest
+from utils.db import add_entry, get_entry_totals
+from utils.pricing import SlabTable, validate_slabs, price_litres, set_customer_slabs, load_slab_table
+
+def test_validate_slabs_accepts_open_ended_chart():
+    assert validate_slabs([(500, 50.0), (None, 45.0)]) is None
+
+@pytest.mark.parametrize("slabs", [
+    [],
+    [(500, 50.0), (1000, 45.0)],      # last slab has a limit
+    [(None, 50.0), (None, 45.0)],     # open-ended slab before the last
+    [(500, 50.0), (400, 45.0), (None, 40.0)],  # limits not increasing
+    [(500, -1.0), (None, 45.0)],      # negative rate
+])
+def test_validate_slabs_rejects(slabs):
+    assert validate_slabs(slabs) is not None
+
+def test_set_customer_slabs_refuses_limited_last_slab(make_customer):
+    customer_id = make_customer("Hotel")
+    success, _ = set_customer_slabs(customer_id, [(500, 50.0), (1000, 45.0)])
+    assert not success
+    assert len(load_slab_table([customer_id])) == 0
+
+def test_price_litres_across_slab_boundaries():
+    slabs = SlabTable.from_rows([(1, 500, 50.0), (1, None, 45.0)])
+    amounts, breakdown = price_litres([1, 1, 1, 2], [0, 500, 1500, 100], [60.0, 60.0, 60.0, 60.0], slabs)
+    assert amounts.tolist() == [0.0, 25_000.0, 25_000.0 + 1000 * 45.0, 6_000.0]
+    # Only slabs carrying litres are reported
+    assert breakdown['row'].tolist() == [1, 2, 2]
+
+def test_litres_above_a_limited_last_slab_use_its_rate():
+    # A chart stored with a limit on its last slab must not bill the excess at ₹0
+    slabs = SlabTable.from_rows([(1, 500, 50.0), (1, 1000, 45.0)])
+    amounts, _ = price_litres([1], [1500], [60.0], slabs)
+    assert amounts[0] == pytest.approx(500 * 50.0 + 1000 * 45.0)
+
+def test_several_customers_and_flat_rate_rows():
+    slabs = SlabTable.from_rows([(2, 100, 10.0), (2, None, 5.0), (3, None, 7.0)])
+    amounts, _ = price_litres([3, 1, 2], [10, 10, 150], [1.0, 2.0, 3.0], slabs)
+    np.testing.assert_allclose(amounts, [70.0, 20.0, 1000.0 + 250.0])
+
+def test_entry_totals_price_slab_customers_per_month(make_customer):
+    flat = make_customer("Asha", 50.0)
+    slab = make_customer("Ravi", 60.0)
+    assert set_customer_slabs(slab, [(10, 60.0), (None, 50.0)])[0]
+    add_entry(flat, '2026-01-05', 4.0)
+    add_entry(slab, '2026-01-05', 15.0)
+    add_entry(slab, '2026-02-05', 5.0)
+    totals = get_entry_totals()
+    assert totals['entries'] == 3
+    assert totals['litres'] == 24.0
+    # Each month is priced on its own: 10 L at 60 + 5 L at 50, then 5 L at 60
+    assert totals['revenue'] == 4 * 50.0 + (10 * 60.0 + 5 * 50.0) + 5 * 60.0
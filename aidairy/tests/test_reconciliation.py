@@ -0,0 +1,70 @@
+"""Tests for bank/UPI statement reconciliation"""
+
+import io
+from utils.db import get_db_connection
+from utils.reconciliation import (
+    parse_statement, match_transactions, load_match_index, reconcile_statement, apply_reconciliation
+)
+
+def statement_file(lines):
+    return io.StringIO("Date,Narration,Credit,Ref No\n" + "\n".join(lines) + "\n")
+
+def payment_count() -> int:
+    conn = get_db_connection()
+    count = conn.execute("SELECT COUNT(*) FROM payments").fetchone()[0]
+    conn.close()
+    return count
+
+def test_parse_keeps_credits_and_flags_unreadable_dates():
+    statement = parse_statement(statement_file([
+        "05/09/2026,UPI from Ramesh,500,R1",
+        "bad,UPI from Suresh,300,R2",
+        "06/09/2026,ATM withdrawal,-200,R3",
+    ]))
+    assert statement['reference'].tolist() == ['R1', 'R2']
+    assert statement['date'].tolist() == ['2026-09-05', None]
+
+def test_match_by_mobile_and_by_name(make_customer):
+    ramesh = make_customer("Ramesh Patil", mobile_number="9876543210")
+    sweets = make_customer("Shree Ganesh Sweets")
+    matches = match_transactions(parse_statement(statement_file([
+        "05/09/2026,UPI/9876543210/payment,500,R1",
+        "05/09/2026,NEFT SHREE GANESH SWEETS MILK BILL,1200,R2",
+        "05/09/2026,UPI from unknown person,100,R3",
+    ])), load_match_index())
+    assert matches['customer_id'].tolist()[:2] == [ramesh, sweets]
+    assert matches['match_method'].tolist() == ['mobile', 'name', '']
+
+def test_undated_line_does_not_block_the_statement(make_customer):
+    make_customer("Ramesh Patil", mobile_number="9876543210")
+    proposals = reconcile_statement(statement_file([
+        "05/09/2026,UPI/9876543210/payment,500,R1",
+        "bad,UPI/9876543210/payment,300,R2",
+    ]))
+    success, message = apply_reconciliation(proposals)
+    assert success, message
+    assert payment_count() == 1
+
+def test_reference_repeated_in_file_or_already_recorded_is_skipped(make_customer):
+    make_customer("Ramesh Patil", mobile_number="9876543210")
+    lines = [
+        "05/09/2026,UPI/9876543210/payment,500,R1",
+        "05/09/2026,UPI/9876543210/payment,500,R1",
+    ]
+    proposals = reconcile_statement(statement_file(lines))
+    assert proposals['duplicate'].tolist() == [False, True]
+    assert apply_reconciliation(proposals)[0]
+    assert payment_count() == 1
+
+    # The same statement again: everything is already recorded
+    proposals = reconcile_statement(statement_file(lines))
+    assert proposals['duplicate'].tolist() == [True, True]
+    assert apply_reconciliation(proposals)[0]
+    assert payment_count() == 1
+
+def test_applying_stale_proposals_twice_records_once(make_customer):
+    make_customer("Ramesh Patil", mobile_number="9876543210")
+    proposals = reconcile_statement(statement_file(["05/09/2026,UPI/9876543210/payment,500,R1"]))
+    assert apply_reconciliation(proposals)[0]
+    assert apply_reconciliation(proposals)[0]
+    assert payment_count() == 1
@@ -0,0 +1,16 @@
+"""
+Tests for printable route sheets
+"""
+
+import io
+from utils.route_sheets import render_route_sheet
+
+def test_route_sheet_escapes_route_name():
+    sheet = {
+        'route_id': 1, 'route_name': "Zone <A", 'delivery_date': '2026-01-05',
+        'customer_ids': [1], 'names': ["Asha"], 'mobiles': [None],
+        'expected': [2.0], 'basis': ['subscription']
+    }
+    buffer = io.BytesIO()
+    render_route_sheet(sheet, buffer)
+    assert buffer.getvalue().startswith(b"%PDF")
@@ -0,0 +1,23 @@
+"""
+Tests for customer statement PDFs
+"""
+
+import io
+from utils.db import add_entry
+from utils.statements import (
+    generate_customer_statement_pdf, get_period_statement, generate_period_statement_pdf
+)
+
+def test_monthly_statement_escapes_customer_name(make_customer):
+    customer = make_customer("Ram <b>Shop & Sons")
+    add_entry(customer, '2026-01-05', 2.0)
+    pdf = generate_customer_statement_pdf(2026, 1, customer)
+    assert pdf.startswith(b"%PDF")
+
+def test_period_statement_escapes_customer_name(make_customer):
+    customer = make_customer("Pat <i")
+    add_entry(customer, '2026-02-03', 1.5)
+    statement = get_period_statement(2026, 1, 2026, 3, [customer])
+    buffer = io.BytesIO()
+    generate_period_statement_pdf(statement, 0, buffer)
+    assert buffer.getvalue().startswith(b"%PDF")
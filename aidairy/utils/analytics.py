@@ -0,0 +1,226 @@
+"""
+Analytics utility module for SmartDairy
+Trend and ranking queries for the Analytics page. Everything is read from the
+daily_totals, customer_monthly and customer_yearly rollups (kept current by triggers
+on entries); window functions do the moving averages, growth and rankings in SQL
+"""
+
+import json
+import numpy as np
+from datetime import date
+from typing import Dict, List, Optional
+from utils.db import get_db_connection
+from utils.pricing import load_slab_table, price_litres
+
+def get_data_bounds() -> Optional[Dict]:
+    """First and last delivery day in the rollups, or None when there are no entries"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(day), MAX(day) FROM daily_totals")
+    first, last = cursor.fetchone()
+    conn.close()
+    if first is None:
+        return None
+    return {'first': date.fromisoformat(first), 'last': date.fromisoformat(last)}
+
+def get_daily_trend(start: date, end: date, window: int = 7) -> Dict:
+    """
+    Dairy-wide litres per delivery day with a trailing moving average
+    The average spans `window` calendar days, so days without deliveries count as zero
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    # Read `window` days ahead of the range so the first averages are complete
+    cursor.execute(
+        """
+        SELECT day, litres, deliveries, moving_avg FROM (
+            SELECT day, litres, deliveries,
+                   SUM(litres) OVER (
+                       ORDER BY julianday(day) RANGE BETWEEN :span PRECEDING AND CURRENT ROW
+                   ) / :window AS moving_avg
+            FROM daily_totals
+            WHERE day BETWEEN date(:start, '-' || :span || ' days') AND :end
+        )
+        WHERE day >= :start
+        ORDER BY day
+        """,
+        {'start': start.isoformat(), 'end': end.isoformat(), 'window': window, 'span': window - 1}
+    )
+    rows = cursor.fetchall()
+    conn.close()
+
+    return {
+        'days': [r[0] for r in rows],
+        'litres': np.array([r[1] for r in rows], dtype=np.float64),
+        'deliveries': np.array([r[2] for r in rows], dtype=np.int64),
+        'moving_avg': np.array([r[3] for r in rows], dtype=np.float64)
+    }
+
+def get_monthly_trend(first_month: str, last_month: str) -> Dict:
+    """
+    Litres, deliveries, active customers and revenue per month ('YYYY-MM' bounds)
+    Revenue is at current rates like calculate_billing. Flat-rate customers are summed
+    in SQL; the few slab customers are priced per month with price_litres.
+    Growth columns are vs the previous month; ytd_* run from January of each year.
+    """
+    params = {'first': first_month, 'last': last_month}
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(
+        """
+        WITH monthly AS (
+            SELECT cm.month,
+                   SUM(cm.litres) AS litres,
+                   SUM(cm.deliveries) AS deliveries,
+                   COUNT(*) AS active,
+                   SUM(CASE WHEN cm.customer_id IN (SELECT customer_id FROM price_slabs)
+                            THEN 0 ELSE cm.litres * c.price_per_ltr END) AS flat_revenue
+            FROM customer_monthly cm
+            JOIN customers c ON c.id = cm.customer_id
+            WHERE cm.month BETWEEN :first AND :last
+            GROUP BY cm.month
+        )
+        SELECT month, litres, deliveries, active, flat_revenue,
+               litres / LAG(litres) OVER (ORDER BY month) - 1 AS litres_growth,
+               SUM(litres) OVER (PARTITION BY substr(month, 1, 4) ORDER BY month) AS ytd_litres
+        FROM monthly
+        ORDER BY month
+        """,
+        params
+    )
+    rows = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT cm.customer_id, cm.month, cm.litres, c.price_per_ltr
+        FROM customer_monthly cm
+        JOIN customers c ON c.id = cm.customer_id
+        WHERE cm.month BETWEEN :first AND :last
+          AND cm.customer_id IN (SELECT customer_id FROM price_slabs)
+        """,
+        params
+    )
+    slab_rows = cursor.fetchall()
+    conn.close()
+
+    months = [r[0] for r in rows]
+    revenue = np.array([r[4] for r in rows], dtype=np.float64)
+    if slab_rows:
+        slab_ids = np.array([r[0] for r in slab_rows], dtype=np.int64)
+        amounts, _ = price_litres(
+            slab_ids,
+            np.array([r[2] for r in slab_rows], dtype=np.float64),
+            np.array([r[3] for r in slab_rows], dtype=np.float64),
+            load_slab_table(np.unique(slab_ids).tolist())
+        )
+        month_index = {m: i for i, m in enumerate(months)}
+        revenue += np.bincount(
+            [month_index[r[1]] for r in slab_rows], weights=amounts, minlength=len(months)
+        )
+
+    # Revenue growth and YTD need the slab amounts, so they are finished here
+    revenue_growth = np.full(len(months), np.nan)
+    if len(months) > 1:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            revenue_growth[1:] = revenue[1:] / revenue[:-1] - 1
+    years = np.array([m[:4] for m in months])
+    ytd_revenue = np.zeros(len(months))
+    for year in set(years.tolist()):
+        in_year = np.flatnonzero(years == year)
+        ytd_revenue[in_year] = np.cumsum(revenue[in_year])
+
+    return {
+        'months': months,
+        'litres': np.array([r[1] for r in rows], dtype=np.float64),
+        'deliveries': np.array([r[2] for r in rows], dtype=np.int64),
+        'active_customers': np.array([r[3] for r in rows], dtype=np.int64),
+        'revenue': revenue,
+        'litres_growth': np.array([np.nan if r[5] is None else r[5] for r in rows], dtype=np.float64),
+        'revenue_growth': revenue_growth,
+        'ytd_litres': np.array([r[6] for r in rows], dtype=np.float64),
+        'ytd_revenue': ytd_revenue
+    }
+
+def get_yearly_summary() -> List[Dict]:
+    """Litres, deliveries and active customers per year with growth vs the previous year"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        WITH yearly AS (
+            SELECT cy.year, SUM(cy.litres) AS litres, SUM(cy.deliveries) AS deliveries, COUNT(*) AS active_customers
+            FROM customer_yearly cy
+            JOIN customers c ON c.id = cy.customer_id
+            GROUP BY cy.year
+        )
+        SELECT year, litres, deliveries, active_customers,
+               litres / LAG(litres) OVER (ORDER BY year) - 1 AS litres_growth,
+               active_customers - LAG(active_customers) OVER (ORDER BY year) AS customer_change
+        FROM yearly
+        ORDER BY year
+        """
+    )
+    summary = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return summary
+
+def get_top_customers(year: int, limit: int = 10) -> List[Dict]:
+    """
+    Customers ranked by litres taken in a year (ties share a rank)
+    Each row has rank, id, name, litres, deliveries, share of the year's litres,
+    previous year's litres and revenue for the year at current rates
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        WITH ranked AS (
+            SELECT cy.customer_id, cy.litres, cy.deliveries,
+                   RANK() OVER (ORDER BY cy.litres DESC) AS rank,
+                   cy.litres / SUM(cy.litres) OVER () AS share
+            FROM customer_yearly cy
+            JOIN customers c ON c.id = cy.customer_id
+            WHERE cy.year = :year
+        )
+        SELECT r.rank, c.id, c.name, c.price_per_ltr, r.litres, r.deliveries, r.share,
+               prev.litres AS previous_litres
+        FROM ranked r
+        JOIN customers c ON c.id = r.customer_id
+        LEFT JOIN customer_yearly prev ON prev.customer_id = r.customer_id AND prev.year = :previous
+        WHERE r.rank <= :limit
+        ORDER BY r.rank, c.name
+        """,
+        {'year': str(year), 'previous': str(year - 1), 'limit': limit}
+    )
+    top = [dict(row) for row in cursor.fetchall()]
+    if not top:
+        conn.close()
+        return []
+
+    # Slabs apply per month, so the year's revenue is priced month by month
+    ids = json.dumps([row['id'] for row in top])
+    cursor.execute(
+        """
+        SELECT customer_id, litres FROM customer_monthly
+        WHERE customer_id IN (SELECT value FROM json_each(?)) AND month BETWEEN ? AND ?
+        """,
+        (ids, f"{year}-01", f"{year}-12")
+    )
+    monthly = cursor.fetchall()
+    conn.close()
+
+    rates = {row['id']: row['price_per_ltr'] for row in top}
+    month_ids = np.array([r[0] for r in monthly], dtype=np.int64)
+    amounts, _ = price_litres(
+        month_ids,
+        np.array([r[1] for r in monthly], dtype=np.float64),
+        np.array([rates[c] for c in month_ids.tolist()], dtype=np.float64),
+        load_slab_table(list(rates))
+    )
+    revenue = {}
+    for customer_id, amount in zip(month_ids.tolist(), amounts.tolist()):
+        revenue[customer_id] = revenue.get(customer_id, 0.0) + amount
+    for row in top:
+        row['revenue'] = revenue.get(row['id'], 0.0)
+    return top
@@ -0,0 +1,145 @@
+"""
+Async database module for SmartDairy
+Coroutine versions of the customer, entry, billing and forecast functions for an async
+frontend or API service. Calls run on a bounded pool of worker threads, each with its
+own pinned connection, so the event loop never blocks on a query and no call opens a
+connection. Cancelling a coroutine drops a call that has not started and interrupts
+the query of one that has; entry saves go through the group-committing entry writer.
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Tuple
+from utils import db, billing, forecasting
+from utils.db import pin_connection, get_db_connection
+from utils.entry_writer import submit_entry
+
+ASYNC_DB_WORKERS = 8  # worker threads (and connections); SQLite has one writer anyway
+
+class _Call:
+    """One function call on a worker thread, interruptible while it runs"""
+
+    def __init__(self, function: Callable, args: Tuple, kwargs: Dict):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def __call__(self) -> Any:
+        conn = get_db_connection()
+        with self._lock:
+            self._conn = conn
+        try:
+            return self.function(*self.args, **self.kwargs)
+        finally:
+            with self._lock:
+                self._conn = None
+            # The connection outlives the call: never hand the next one an open transaction
+            if conn.in_transaction:
+                conn.rollback()
+
+    def interrupt(self):
+        """Abort the running query, if the call is still running"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.interrupt()
+
+class AsyncDatabase:
+    """Thread pool running database functions for coroutines"""
+
+    def __init__(self, workers: int = ASYNC_DB_WORKERS):
+        self.workers = workers
+        self._connections = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="async-db", initializer=self._pin)
+
+    def _pin(self):
+        conn = pin_connection()
+        with self._lock:
+            self._connections.append(conn)
+
+    async def run(self, function: Callable, *args, **kwargs) -> Any:
+        """Run function(*args, **kwargs) on a worker thread and return its result"""
+        call = _Call(function, args, kwargs)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        except asyncio.CancelledError:
+            call.interrupt()
+            raise
+
+    def close(self):
+        """Wait for running calls, then stop the workers and close their connections"""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.release()
+            self._connections.clear()
+
+_default = None
+_default_lock = threading.Lock()
+
+def get_async_database() -> AsyncDatabase:
+    """The process's shared pool, created on first use"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = AsyncDatabase()
+        return _default
+
+def close_async_database():
+    """Close the shared pool (a new one is created on next use)"""
+    global _default
+    with _default_lock:
+        if _default is not None:
+            _default.close()
+            _default = None
+
+def _coroutine(function: Callable) -> Callable:
+    """Coroutine running `function` on the shared pool"""
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        return await get_async_database().run(function, *args, **kwargs)
+    return wrapper
+
+# Customers
+get_all_customers = _coroutine(db.get_all_customers)
+count_customers = _coroutine(db.count_customers)
+search_customers = _coroutine(db.search_customers)
+get_customer_by_id = _coroutine(db.get_customer_by_id)
+add_customer = _coroutine(db.add_customer)
+update_customer = _coroutine(db.update_customer)
+delete_customer = _coroutine(db.delete_customer)
+
+# Entries
+get_entries = _coroutine(db.get_entries)
+get_recent_entries = _coroutine(db.get_recent_entries)
+get_entry_totals = _coroutine(db.get_entry_totals)
+get_monthly_entries = _coroutine(db.get_monthly_entries)
+get_range_totals = _coroutine(db.get_range_totals)
+
+# Billing
+calculate_billing = _coroutine(billing.calculate_billing)
+calculate_monthly_billing = _coroutine(billing.calculate_monthly_billing)
+
+# Forecasting
+predict_next_day_quantity = _coroutine(forecasting.predict_next_day_quantity)
+get_forecast_summary = _coroutine(forecasting.get_forecast_summary)
+
+async def save_entry(customer_id: int, entry_date: str, quantity: float, shift: str = 'morning') -> Tuple[bool, str]:
+    """
+    Save a milk entry through the entry writer; returns (success, message)
+    Cancelling stops the wait only: a write already queued is still committed.
+    """
+    future = submit_entry(customer_id, entry_date, quantity, shift)
+    # Shielded, so cancellation never cancels the writer's Future under it
+    return await asyncio.shield(asyncio.wrap_future(future))
+
+async def dashboard_snapshot(recent: int = 10) -> Dict:
+    """Customer count, entry totals and the latest entries, fetched concurrently"""
+    customers, totals, entries = await asyncio.gather(
+        count_customers(), get_entry_totals(), get_recent_entries(recent)
+    )
+    return {'customers': customers, 'totals': totals, 'recent_entries': entries}
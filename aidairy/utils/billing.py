@@ -3,60 +3,182 @@ Billing utility module for SmartDairy
 Handles monthly billing calculations and exports (PDF, Excel, CSV)
 """
 
+import calendar
 import pandas as pd
-from datetime import datetime
-from typing import List, Dict
+import numpy as np
+from datetime import datetime, date, timedelta
+from typing import List, Dict, Optional, Iterable, Tuple
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from reportlab.pdfgen import canvas
 import os
-from utils.db import get_monthly_entries
+from utils.db import get_range_totals, get_all_customers, get_customers_by_ids
+from utils.pricing import load_slab_table, price_litres, breakdown_by_row, format_slab_breakdown
+from utils.segments import resolve_segment_customers
 
-def calculate_monthly_billing(year: int, month: int) -> Dict:
+BILLING_CYCLES = ['monthly', 'weekly', 'fortnightly', 'custom']
+DEFAULT_CYCLE_ANCHOR = date(2024, 1, 1)  # a Monday; weekly/fortnightly cycles count from here
+LOGO_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', 'logo.png')
+COMBINED_SUMMARY_ROWS_PER_PAGE = 40
+
+def calculate_billing(start, end, customers: Optional[Iterable[int]] = None,
+                      segments: Optional[Iterable[int]] = None) -> Dict:
     """
-    Calculate monthly billing for all customers
+    Calculate billing for any date range (inclusive), optionally for a subset of customer ids
+    and/or a segment filter (segment ids, see resolve_segment_customers)
+    Range totals come from the per-customer prefix sums and are priced (flat or slab) in one
+    vectorized pass. Slabs apply to the range total, so amounts are derived from litres
+    rather than from summed per-entry amounts.
     Returns a dictionary with billing summary
     """
-    entries = get_monthly_entries(year, month)
-    
-    # Group by customer
-    customer_totals = {}
-    for entry in entries:
-        customer_id = entry['customer_id']
-        customer_name = entry['customer_name']
-        price_per_ltr = entry['price_per_ltr']
-        quantity = entry['quantity']
-        mobile_number = entry.get('mobile_number', '')
-        
-        if customer_id not in customer_totals:
-            customer_totals[customer_id] = {
-                'id': customer_id,
-                'name': customer_name,
-                'price_per_ltr': price_per_ltr,
-                'mobile_number': mobile_number,
-                'total_litres': 0.0,
-                'total_amount': 0.0
-            }
-        
-        customer_totals[customer_id]['total_litres'] += quantity
-        customer_totals[customer_id]['total_amount'] = (
-            customer_totals[customer_id]['total_litres'] * price_per_ltr
-        )
+    start_date = _as_date(start)
+    end_date = _as_date(end)
+    if segments:
+        customers = resolve_segment_customers(segments, customers)
+    totals = get_range_totals(start_date.isoformat(), end_date.isoformat(), customers)
+    
+    customer_ids = np.array([t['id'] for t in totals], dtype=np.int64)
+    litres = np.round(np.array([t['total_litres'] for t in totals], dtype=np.float64), 3)
+    flat_rates = np.array([t['price_per_ltr'] for t in totals], dtype=np.float64)
+    
+    # Only the billed customers' slab charts are read when billing a subset
+    slabs = load_slab_table(None if customers is None else customer_ids.tolist())
+    amounts, breakdown = price_litres(customer_ids, litres, flat_rates, slabs)
+    slab_breakdowns = breakdown_by_row(breakdown, len(totals))
+    
+    billed_customers = []
+    for i, total in enumerate(totals):
+        billed_customers.append({
+            'id': total['id'],
+            'name': total['name'],
+            'price_per_ltr': total['price_per_ltr'],
+            'mobile_number': total['mobile_number'] or '',
+            'deliveries': total['deliveries'],
+            'total_litres': float(litres[i]),
+            'total_amount': float(amounts[i]),
+            'slab_breakdown': slab_breakdowns[i]
+        })
     
     # Calculate grand total
-    grand_total = sum(cust['total_amount'] for cust in customer_totals.values())
+    grand_total = float(amounts.sum())
     
     return {
-        'year': year,
-        'month': month,
-        'customers': list(customer_totals.values()),
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'customers': billed_customers,
         'grand_total': grand_total,
-        'total_customers': len(customer_totals)
+        'total_customers': len(billed_customers)
     }
 
+def calculate_monthly_billing(year: int, month: int, segments: Optional[Iterable[int]] = None) -> Dict:
+    """
+    Calculate monthly billing for all customers (or those matching a segment filter)
+    Returns a dictionary with billing summary
+    """
+    start = date(year, month, 1)
+    end = date(year, month, calendar.monthrange(year, month)[1])
+    billing_data = calculate_billing(start, end, segments=segments)
+    billing_data['year'] = year
+    billing_data['month'] = month
+    return billing_data
+
+def get_billing_period(billing_cycle: str, as_of, cycle_anchor=None, cycle_cutoff_day: Optional[int] = None) -> Tuple[date, date]:
+    """
+    Return (start, end) of the billing cycle that contains as_of
+    - monthly: calendar month
+    - weekly / fortnightly: 7 / 14 day blocks counted from cycle_anchor
+    - custom: from the day after the previous cut-off up to the next cut-off day of the month
+    """
+    as_of = _as_date(as_of)
+    
+    if billing_cycle in ('weekly', 'fortnightly'):
+        length = 7 if billing_cycle == 'weekly' else 14
+        anchor = _as_date(cycle_anchor) if cycle_anchor else DEFAULT_CYCLE_ANCHOR
+        start = as_of - timedelta(days=(as_of - anchor).days % length)
+        return start, start + timedelta(days=length - 1)
+    
+    if billing_cycle == 'custom' and cycle_cutoff_day:
+        cutoff_this_month = _cutoff_date(as_of.year, as_of.month, cycle_cutoff_day)
+        if as_of <= cutoff_this_month:
+            end = cutoff_this_month
+            prev_year, prev_month = (as_of.year - 1, 12) if as_of.month == 1 else (as_of.year, as_of.month - 1)
+            start = _cutoff_date(prev_year, prev_month, cycle_cutoff_day) + timedelta(days=1)
+        else:
+            start = cutoff_this_month + timedelta(days=1)
+            next_year, next_month = (as_of.year + 1, 1) if as_of.month == 12 else (as_of.year, as_of.month + 1)
+            end = _cutoff_date(next_year, next_month, cycle_cutoff_day)
+        return start, end
+    
+    # monthly (also the fallback for a custom cycle without a cut-off day)
+    start = as_of.replace(day=1)
+    end = as_of.replace(day=calendar.monthrange(as_of.year, as_of.month)[1])
+    return start, end
+
+def get_last_completed_period(billing_cycle: str, as_of, cycle_anchor=None, cycle_cutoff_day: Optional[int] = None) -> Tuple[date, date]:
+    """Return (start, end) of the most recent billing cycle that ended before as_of"""
+    current_start, _ = get_billing_period(billing_cycle, as_of, cycle_anchor, cycle_cutoff_day)
+    return get_billing_period(billing_cycle, current_start - timedelta(days=1), cycle_anchor, cycle_cutoff_day)
+
+def calculate_cycle_billing(as_of, customers: Optional[List[Dict]] = None,
+                            segments: Optional[Iterable[int]] = None) -> List[Dict]:
+    """
+    Bill every customer for their own last completed cycle as of a date
+    Customers sharing the same period are billed together in one range query
+    A segment filter limits the run to the segment's customers
+    Returns a list of billing dictionaries, one per distinct period
+    """
+    if segments:
+        within = None if customers is None else [c['id'] for c in customers]
+        customers = get_customers_by_ids(resolve_segment_customers(segments, within))
+    elif customers is None:
+        customers = get_all_customers()
+    
+    # Group customer ids by their billing period
+    periods = {}
+    for customer in customers:
+        period = get_last_completed_period(
+            customer.get('billing_cycle') or 'monthly', as_of,
+            customer.get('cycle_anchor'), customer.get('cycle_cutoff_day')
+        )
+        periods.setdefault(period, []).append(customer['id'])
+    
+    results = []
+    for (start, end), customer_ids in sorted(periods.items()):
+        billing_data = calculate_billing(start, end, customer_ids)
+        if billing_data['customers']:
+            results.append(billing_data)
+    return results
+
+def get_period_label(billing_data: Dict) -> str:
+    """Human readable billing period, e.g. 'September 2026' or '01 Sep 2026 - 14 Sep 2026'"""
+    if 'year' in billing_data and 'month' in billing_data:
+        return datetime(billing_data['year'], billing_data['month'], 1).strftime('%B %Y')
+    start = _as_date(billing_data['start_date'])
+    end = _as_date(billing_data['end_date'])
+    return f"{start.strftime('%d %b %Y')} - {end.strftime('%d %b %Y')}"
+
+def _as_date(value) -> date:
+    """Accept date, datetime or 'YYYY-MM-DD' strings"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+def _cutoff_date(year: int, month: int, cutoff_day: int) -> date:
+    """Cut-off date within a month, clamped to the month's last day"""
+    return date(year, month, min(cutoff_day, calendar.monthrange(year, month)[1]))
+
+def get_rate_label(customer: Dict) -> str:
+    """Rate column text: the flat rate, or the effective rate for slab-priced customers"""
+    if customer.get('slab_breakdown') and customer['total_litres'] > 0:
+        return f"{customer['total_amount'] / customer['total_litres']:.2f} (slab)"
+    return f"{customer['price_per_ltr']:.2f}"
+
 def generate_pdf_invoice(billing_data: Dict, output_path: str = "invoice.pdf"):
     """Generate PDF invoice using ReportLab"""
     doc = SimpleDocTemplate(output_path, pagesize=A4)
@@ -86,7 +208,7 @@ def generate_pdf_invoice(billing_data: Dict, output_path: str = "invoice.pdf"):
     story.append(Spacer(1, 0.2*inch))
     
     # Invoice details
-    month_name = datetime(billing_data['year'], billing_data['month'], 1).strftime('%B %Y')
+    month_name = get_period_label(billing_data)
     story.append(Paragraph(f"<b>Invoice Period:</b> {month_name}", styles['Normal']))
     story.append(Paragraph(f"<b>Generated On:</b> {datetime.now().strftime('%d %B %Y, %I:%M %p')}", styles['Normal']))
     story.append(Spacer(1, 0.3*inch))
@@ -101,7 +223,7 @@ def generate_pdf_invoice(billing_data: Dict, output_path: str = "invoice.pdf"):
         table_data.append([
             customer['name'],
             f"{customer['total_litres']:.2f}",
-            f"{customer['price_per_ltr']:.2f}",
+            get_rate_label(customer),
             f"{customer['total_amount']:.2f}"
         ])
     
@@ -136,6 +258,34 @@ def generate_pdf_invoice(billing_data: Dict, output_path: str = "invoice.pdf"):
     story.append(table)
     story.append(Spacer(1, 0.3*inch))
     
+    # Slab breakdown for volume-priced customers
+    slab_customers = [c for c in billing_data['customers'] if c.get('slab_breakdown')]
+    if slab_customers:
+        story.append(Paragraph("Slab Breakdown", heading_style))
+        slab_data = [['Customer Name', 'Slab (L)', 'Litres', 'Rate (₹)', 'Amount (₹)']]
+        for customer in slab_customers:
+            for slab in customer['slab_breakdown']:
+                upto = f"{slab['upto_litres']:g}" if slab['upto_litres'] is not None else "+"
+                slab_data.append([
+                    customer['name'],
+                    f"{slab['from_litres']:g} - {upto}",
+                    f"{slab['litres']:.2f}",
+                    f"{slab['rate']:.2f}",
+                    f"{slab['amount']:.2f}"
+                ])
+        slab_table = Table(slab_data, colWidths=[2.5*inch, 1.3*inch, 1.2*inch, 1.2*inch, 1.3*inch], repeatRows=1)
+        slab_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E86AB')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ]))
+        story.append(slab_table)
+        story.append(Spacer(1, 0.3*inch))
+    
     # Footer
     story.append(Paragraph(
         "<i>This is a computer-generated invoice. Thank you for using SmartDairy!</i>",
@@ -145,6 +295,125 @@ def generate_pdf_invoice(billing_data: Dict, output_path: str = "invoice.pdf"):
     doc.build(story)
     return output_path
 
+def generate_combined_pdf(billing_data: Dict, output_path: str = "all_invoices.pdf",
+                          include_summary: bool = True):
+    """
+    Generate one print-ready PDF with an invoice page per customer
+    Pages are drawn straight onto a canvas as the customers are iterated, so no story
+    of flowables is held for the whole run. The page header (logo, title, period) is
+    drawn once as a form XObject and reused by every page. The summary is split into
+    one small table per page instead of a single huge table.
+    """
+    page_width, page_height = A4
+    margin = 0.6 * inch
+    pdf = canvas.Canvas(output_path, pagesize=A4, pageCompression=1)
+    pdf.setTitle(f"SmartDairy Invoices - {get_period_label(billing_data)}")
+
+    # Shared page header, stored once in the PDF and referenced by every page
+    pdf.beginForm('page_header')
+    if os.path.exists(LOGO_PATH):
+        pdf.drawImage(LOGO_PATH, margin, page_height - margin - 0.7*inch, width=0.7*inch, height=0.7*inch, mask='auto')
+    pdf.setFillColor(colors.HexColor('#2E86AB'))
+    pdf.setFont('Helvetica-Bold', 20)
+    pdf.drawString(margin + 0.9*inch, page_height - margin - 0.35*inch, "SmartDairy - Monthly Invoice")
+    pdf.setFillColor(colors.black)
+    pdf.setFont('Helvetica', 10)
+    pdf.drawString(margin + 0.9*inch, page_height - margin - 0.6*inch,
+                   f"Invoice Period: {get_period_label(billing_data)}")
+    pdf.setStrokeColor(colors.HexColor('#2E86AB'))
+    pdf.setLineWidth(2)
+    pdf.line(margin, page_height - margin - 0.85*inch, page_width - margin, page_height - margin - 0.85*inch)
+    pdf.setFont('Helvetica-Oblique', 8)
+    pdf.drawCentredString(page_width / 2, margin / 2,
+                          "This is a computer-generated invoice. Thank you for using SmartDairy!")
+    pdf.endForm()
+
+    content_top = page_height - margin - 1.1*inch
+
+    if include_summary:
+        header = ['Customer Name', 'Total Litres', 'Rate/Litre (₹)', 'Total Amount (₹)']
+        rows = [
+            [c['name'], f"{c['total_litres']:.2f}", get_rate_label(c), f"{c['total_amount']:.2f}"]
+            for c in billing_data['customers']
+        ]
+        rows.append(['TOTAL', '', '', f"{billing_data['grand_total']:.2f}"])
+
+        for start in range(0, len(rows), COMBINED_SUMMARY_ROWS_PER_PAGE):
+            chunk = rows[start:start + COMBINED_SUMMARY_ROWS_PER_PAGE]
+            pdf.doForm('page_header')
+            pdf.setFont('Helvetica-Bold', 14)
+            pdf.setFillColor(colors.HexColor('#1B4332'))
+            pdf.drawString(margin, content_top, "Billing Summary")
+
+            table = Table([header] + chunk, colWidths=[3*inch, 1.3*inch, 1.4*inch, 1.4*inch])
+            style = [
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E86AB')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+                ('FONTSIZE', (0, 0), (-1, -1), 9),
+                ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ]
+            if start + COMBINED_SUMMARY_ROWS_PER_PAGE >= len(rows):
+                style += [
+                    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#F77F00')),
+                    ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
+                    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+                ]
+            table.setStyle(TableStyle(style))
+            _, table_height = table.wrapOn(pdf, page_width - 2*margin, content_top)
+            table.drawOn(pdf, margin, content_top - 0.2*inch - table_height)
+            pdf.showPage()
+
+    for customer in billing_data['customers']:
+        pdf.doForm('page_header')
+
+        # Customer block
+        y = content_top
+        pdf.setFillColor(colors.HexColor('#1B4332'))
+        pdf.setFont('Helvetica-Bold', 14)
+        pdf.drawString(margin, y, customer['name'])
+        pdf.setFillColor(colors.black)
+        pdf.setFont('Helvetica', 10)
+        if customer.get('mobile_number'):
+            y -= 0.25*inch
+            pdf.drawString(margin, y, f"Mobile: {customer['mobile_number']}")
+        y -= 0.25*inch
+        pdf.drawString(margin, y, f"Deliveries: {customer.get('deliveries', 0)}")
+
+        # Bill lines
+        lines = [['Description', 'Litres', 'Rate (₹)', 'Amount (₹)']]
+        if customer.get('slab_breakdown'):
+            for slab in customer['slab_breakdown']:
+                upto = f"{slab['upto_litres']:g}" if slab['upto_litres'] is not None else "+"
+                lines.append([f"Slab {slab['from_litres']:g} - {upto} L", f"{slab['litres']:.2f}",
+                              f"{slab['rate']:.2f}", f"{slab['amount']:.2f}"])
+        else:
+            lines.append(['Milk', f"{customer['total_litres']:.2f}",
+                          f"{customer['price_per_ltr']:.2f}", f"{customer['total_amount']:.2f}"])
+        lines.append(['TOTAL', f"{customer['total_litres']:.2f}", '', f"{customer['total_amount']:.2f}"])
+
+        table = Table(lines, colWidths=[3*inch, 1.3*inch, 1.4*inch, 1.4*inch])
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E86AB')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#F77F00')),
+            ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ]))
+        _, table_height = table.wrapOn(pdf, page_width - 2*margin, y)
+        table.drawOn(pdf, margin, y - 0.3*inch - table_height)
+        pdf.showPage()
+
+    pdf.save()
+    return output_path
+
 def generate_excel_invoice(billing_data: Dict, output_path: str = "invoice.xlsx"):
     """Generate Excel invoice"""
     # Prepare data
@@ -153,7 +422,7 @@ def generate_excel_invoice(billing_data: Dict, output_path: str = "invoice.xlsx"
         data.append({
             'Customer Name': customer['name'],
             'Total Litres': round(customer['total_litres'], 2),
-            'Rate per Litre (₹)': round(customer['price_per_ltr'], 2),
+            'Rate per Litre (₹)': get_rate_label(customer),
             'Total Amount (₹)': round(customer['total_amount'], 2)
         })
     
@@ -206,7 +475,26 @@ def generate_excel_invoice(billing_data: Dict, output_path: str = "invoice.xlsx"
                     pass
             adjusted_width = min(max_length + 2, 50)
             worksheet.column_dimensions[column_letter].width = adjusted_width
-    
+
+        # Slab breakdown sheet for volume-priced customers
+        slab_rows = []
+        for customer in billing_data['customers']:
+            for slab in customer.get('slab_breakdown', []):
+                slab_rows.append({
+                    'Customer Name': customer['name'],
+                    'From (L)': slab['from_litres'],
+                    'Upto (L)': slab['upto_litres'] if slab['upto_litres'] is not None else '',
+                    'Litres': round(slab['litres'], 2),
+                    'Rate (₹)': round(slab['rate'], 2),
+                    'Amount (₹)': round(slab['amount'], 2)
+                })
+        if slab_rows:
+            pd.DataFrame(slab_rows).to_excel(writer, sheet_name='Slab Breakdown', index=False)
+            for cell in writer.sheets['Slab Breakdown'][1]:
+                cell.fill = header_fill
+                cell.font = header_font
+                cell.alignment = Alignment(horizontal='center')
+
     return output_path
 
 def generate_csv_invoice(billing_data: Dict, output_path: str = "invoice.csv"):
@@ -216,8 +504,9 @@ def generate_csv_invoice(billing_data: Dict, output_path: str = "invoice.csv"):
         data.append({
             'Customer Name': customer['name'],
             'Total Litres': round(customer['total_litres'], 2),
-            'Rate per Litre (₹)': round(customer['price_per_ltr'], 2),
-            'Total Amount (₹)': round(customer['total_amount'], 2)
+            'Rate per Litre (₹)': get_rate_label(customer),
+            'Total Amount (₹)': round(customer['total_amount'], 2),
+            'Slab Breakdown': format_slab_breakdown(customer.get('slab_breakdown', []))
         })
     
     # Add grand total
@@ -225,7 +514,8 @@ def generate_csv_invoice(billing_data: Dict, output_path: str = "invoice.csv"):
         'Customer Name': 'GRAND TOTAL',
         'Total Litres': '',
         'Rate per Litre (₹)': '',
-        'Total Amount (₹)': round(billing_data['grand_total'], 2)
+        'Total Amount (₹)': round(billing_data['grand_total'], 2),
+        'Slab Breakdown': ''
     })
     
     df = pd.DataFrame(data)
@@ -234,7 +524,15 @@ def generate_csv_invoice(billing_data: Dict, output_path: str = "invoice.csv"):
 
 def format_bill_message(customer: Dict, billing_data: Dict) -> str:
     """Format bill message for WhatsApp"""
-    month_name = datetime(billing_data['year'], billing_data['month'], 1).strftime('%B %Y')
+    month_name = get_period_label(billing_data)
+    
+    if customer.get('slab_breakdown'):
+        rate_lines = "\n".join(
+            f"💰 {slab['litres']:.2f} L @ ₹{slab['rate']:.2f} = ₹{slab['amount']:.2f}"
+            for slab in customer['slab_breakdown']
+        )
+    else:
+        rate_lines = f"💰 Rate per Litre: ₹{customer['price_per_ltr']:.2f}"
     
     message = f"""🐄 *SmartDairy - Monthly Invoice*
 
@@ -244,7 +542,7 @@ def format_bill_message(customer: Dict, billing_data: Dict) -> str:
 *Billing Details:*
 ━━━━━━━━━━━━━━━━━━━━
 📊 Total Litres: {customer['total_litres']:.2f} L
-💰 Rate per Litre: ₹{customer['price_per_ltr']:.2f}
+{rate_lines}
 💵 *Total Amount: ₹{customer['total_amount']:.2f}*
 ━━━━━━━━━━━━━━━━━━━━
 
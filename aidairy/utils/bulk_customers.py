@@ -0,0 +1,192 @@
+"""
+Bulk customer operations for SmartDairy
+Set-based changes over many customers at once: rate changes for a segment, upserts
+from a DataFrame, and deletion or archiving together with their entries. Each call is
+one transaction with one statement per table, whatever the number of customers
+"""
+
+import json
+import sqlite3
+import pandas as pd
+from typing import Iterable, Optional, Tuple
+from utils.db import write_transaction, delete_customer_rows
+
+RATE_CHANGE_TYPES = ['percent', 'flat', 'rate']
+
+# Insert new customers, update existing ones by name; mobile number and subscription
+# are only overwritten when given
+CUSTOMER_UPSERT_SQL = """
+    INSERT INTO customers (name, price_per_ltr, mobile_number, subscription_qty) VALUES (?, ?, ?, ?)
+    ON CONFLICT (name) DO UPDATE SET
+        price_per_ltr = excluded.price_per_ltr,
+        mobile_number = COALESCE(excluded.mobile_number, customers.mobile_number),
+        subscription_qty = COALESCE(excluded.subscription_qty, customers.subscription_qty)
+"""
+
+def _plural(count: int, word: str, plural: Optional[str] = None) -> str:
+    """'1 customer', '2 customers'"""
+    return f"{count:,} {word if count == 1 else plural or word + 's'}"
+
+def change_rates(change_type: str, value: float,
+                 customer_ids: Optional[Iterable[int]] = None) -> Tuple[bool, str]:
+    """
+    Apply a rate change to the chosen customers (all when None)
+    change_type is one of RATE_CHANGE_TYPES, as in the rate simulator:
+      'percent' - flat rates and slab rates change by `value` percent
+      'flat'    - flat rates and slab rates change by `value` ₹ per litre
+      'rate'    - a new flat rate of `value` ₹ per litre, replacing slab charts
+    Rates are rounded to the paisa. Nothing is written if any rate would drop to zero or below.
+    """
+    if change_type not in RATE_CHANGE_TYPES:
+        return False, f"Unknown change type: {change_type}"
+    if change_type == 'rate' and value <= 0:
+        return False, "The new rate must be above zero"
+
+    params = {'value': value}
+    customer_filter = slab_filter = ""
+    if customer_ids is not None:
+        params['ids'] = json.dumps([int(cid) for cid in customer_ids])
+        customer_filter = " WHERE id IN (SELECT value FROM json_each(:ids))"
+        slab_filter = " WHERE customer_id IN (SELECT value FROM json_each(:ids))"
+    new_rate = {'percent': "ROUND({col} * (1 + :value / 100.0), 2)", 'flat': "ROUND({col} + :value, 2)",
+                'rate': ":value"}[change_type]
+
+    def apply(conn):
+        if change_type != 'rate':
+            # Check every rate the change touches before writing any
+            lowest = conn.execute(
+                f"""
+                SELECT MIN(rate) FROM (
+                    SELECT {new_rate.format(col='price_per_ltr')} AS rate FROM customers{customer_filter}
+                    UNION ALL
+                    SELECT {new_rate.format(col='rate')} FROM price_slabs{slab_filter}
+                )
+                """,
+                params
+            ).fetchone()[0]
+            if lowest is not None and lowest <= 0:
+                raise ValueError(f"The change would bring a rate to ₹{lowest:.2f}/L; nothing was changed")
+        customers_changed = conn.execute(
+            f"UPDATE customers SET price_per_ltr = {new_rate.format(col='price_per_ltr')}{customer_filter}",
+            params
+        ).rowcount
+        if change_type == 'rate':
+            slabs_changed = conn.execute(f"DELETE FROM price_slabs{slab_filter}", params).rowcount
+            return customers_changed, f", {_plural(slabs_changed, 'slab')} removed" if slabs_changed else ""
+        slabs_changed = conn.execute(
+            f"UPDATE price_slabs SET rate = {new_rate.format(col='rate')}{slab_filter}", params
+        ).rowcount
+        return customers_changed, f", {_plural(slabs_changed, 'slab rate')} changed" if slabs_changed else ""
+
+    try:
+        customers_changed, slab_note = write_transaction(apply)
+    except ValueError as e:
+        return False, str(e)
+    except sqlite3.Error as e:
+        return False, f"Rate change failed: {e}"
+    return True, f"Updated {_plural(customers_changed, 'customer')}{slab_note}"
+
+def upsert_customers(df: pd.DataFrame) -> Tuple[bool, str]:
+    """
+    Insert or update customers from a DataFrame, matched by name
+    Columns: name, price_per_ltr, optional mobile_number and subscription_qty (empty
+    values keep the stored ones). A later row for the same name wins. Every row is
+    checked first; nothing is written if any is invalid.
+    """
+    missing = [column for column in ('name', 'price_per_ltr') if column not in df.columns]
+    if missing:
+        return False, f"Missing column(s): {', '.join(missing)}"
+    if df.empty:
+        return True, "No customers to save"
+
+    names = df['name'].astype(str).str.strip()
+    prices = pd.to_numeric(df['price_per_ltr'], errors='coerce')
+    mobiles = [None if pd.isna(m) or not str(m).strip() else str(m).strip()
+               for m in (df['mobile_number'] if 'mobile_number' in df.columns else [None] * len(df))]
+    subscriptions = pd.Series(float('nan'), index=df.index)
+    if 'subscription_qty' in df.columns:
+        subscriptions = pd.to_numeric(df['subscription_qty'], errors='coerce')
+
+    bad_rows = (names.eq('') | ~(prices > 0) | (subscriptions < 0)).to_numpy().nonzero()[0]
+    if len(bad_rows):
+        return False, (f"{_plural(len(bad_rows), 'row')} without a name, with a price not above zero "
+                       f"or a negative subscription (first: row {bad_rows[0] + 1}); nothing was saved")
+
+    rows = pd.DataFrame({'name': names, 'price': prices, 'mobile': pd.Series(mobiles, index=df.index, dtype=object),
+                         'subscription': subscriptions})
+    rows = rows.drop_duplicates('name', keep='last')
+    values = list(zip(rows['name'].tolist(), rows['price'].tolist(), rows['mobile'].tolist(),
+                      [None if pd.isna(s) else s for s in rows['subscription'].tolist()]))
+
+    def save(conn):
+        existing = conn.execute(
+            "SELECT COUNT(*) FROM customers WHERE name IN (SELECT value FROM json_each(?))",
+            (json.dumps(rows['name'].tolist()),)
+        ).fetchone()[0]
+        conn.executemany(CUSTOMER_UPSERT_SQL, values)
+        return existing
+
+    try:
+        existing = write_transaction(save)
+    except sqlite3.Error as e:
+        return False, f"Save failed: {e}"
+    return True, f"Added {_plural(len(rows) - existing, 'customer')}, updated {existing:,}"
+
+def delete_customers(customer_ids: Iterable[int]) -> Tuple[bool, str]:
+    """Delete customers with their entries, payments, invoices and segment memberships"""
+    customer_ids = [int(cid) for cid in customer_ids]
+    if not customer_ids:
+        return True, "No customers selected"
+    try:
+        customers_deleted, entries_deleted = write_transaction(
+            lambda conn: delete_customer_rows(conn.cursor(), customer_ids)
+        )
+    except sqlite3.Error as e:
+        return False, f"Delete failed: {e}"
+    return True, f"Deleted {_plural(customers_deleted, 'customer')} and {_plural(entries_deleted, 'entry', 'entries')}"
+
+def archive_customers(customer_ids: Iterable[int]) -> Tuple[bool, str]:
+    """
+    Move customers to the archive tables with their entries and payments, then delete them
+    The archived customer keeps the outstanding balance at the time of archiving.
+    """
+    customer_ids = [int(cid) for cid in customer_ids]
+    if not customer_ids:
+        return True, "No customers selected"
+    ids = json.dumps(customer_ids)
+
+    def archive(conn):
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO archived_customers (id, name, price_per_ltr, mobile_number, balance, created_at)
+            SELECT c.id, c.name, c.price_per_ltr, c.mobile_number, COALESCE(b.balance, 0), c.created_at
+            FROM customers c
+            LEFT JOIN customer_balances b ON b.customer_id = c.id
+            WHERE c.id IN (SELECT value FROM json_each(?))
+            """,
+            (ids,)
+        )
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO archived_entries (customer_id, entry_date, shift, quantity, created_at)
+            SELECT customer_id, entry_date, shift, quantity, created_at FROM entries
+            WHERE customer_id IN (SELECT value FROM json_each(?))
+            """,
+            (ids,)
+        )
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO archived_payments (id, customer_id, paid_on, amount, method, reference, created_at)
+            SELECT id, customer_id, paid_on, amount, method, reference, created_at FROM payments
+            WHERE customer_id IN (SELECT value FROM json_each(?))
+            """,
+            (ids,)
+        )
+        return delete_customer_rows(cursor, customer_ids)
+
+    try:
+        customers_archived, entries_archived = write_transaction(archive)
+    except sqlite3.Error as e:
+        return False, f"Archive failed: {e}"
+    return True, f"Archived {_plural(customers_archived, 'customer')} and {_plural(entries_archived, 'entry', 'entries')}"
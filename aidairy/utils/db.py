@@ -5,22 +5,161 @@ Handles all database operations including auto-creation of database and tables
 
 import sqlite3
 import os
-from datetime import datetime
-from typing import List, Tuple, Optional
+import calendar
+import json
+import random
+import threading
+import time
+import numpy as np
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, List, Tuple, Optional, Iterable
 
 DB_PATH = "smartdairy.db"
 
-def get_db_connection():
-    """Create and return a database connection"""
-    conn = sqlite3.connect(DB_PATH)
+# Several app processes can share the database file: readers never wait (WAL), and
+# writers wait for each other's lock up to DB_BUSY_TIMEOUT, then retry with backoff
+DB_BUSY_TIMEOUT = 10.0  # seconds
+WRITE_RETRIES = 5  # attempts of a write transaction that keeps finding the database locked
+WRITE_RETRY_DELAY = 0.05  # seconds before the first retry; doubles per attempt, with jitter
+
+# Tables holding per-customer rows (customer_id column)
+CUSTOMER_CHILD_TABLES = [
+    'entries', 'price_slabs', 'invoices', 'invoice_dirty', 'payments', 'customer_balances',
+    'customer_segments', 'outbox'
+]
+
+# Delivery rounds of a day; a customer can have one entry per day and shift
+SHIFTS = ['morning', 'evening']
+
+ENTRIES_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_id INTEGER NOT NULL,
+        entry_date DATE NOT NULL,
+        shift TEXT NOT NULL DEFAULT 'morning' CHECK (shift IN ('morning', 'evening')),
+        quantity REAL NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (customer_id) REFERENCES customers(id),
+        UNIQUE(customer_id, entry_date, shift)
+    )
+"""
+
+class PinnedConnection(sqlite3.Connection):
+    """A thread's dedicated connection: close() keeps it open for the thread's next call"""
+
+    def close(self):
+        pass
+
+    def release(self):
+        """Really close the connection"""
+        super().close()
+
+_pinned = threading.local()
+
+def _connect(**options) -> sqlite3.Connection:
+    """Open a connection with the app's settings"""
+    # Write transactions take the write lock up front (BEGIN IMMEDIATE), so two
+    # processes never both hold a read snapshot and then deadlock upgrading it
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT, isolation_level='IMMEDIATE', **options)
     conn.row_factory = sqlite3.Row
+    # Safe with WAL: a crash can't corrupt the database, commits just skip the fsync
+    conn.execute("PRAGMA synchronous = NORMAL")
+    # SQLite leaves foreign keys off per connection; without them deleting a customer
+    # would orphan its rows instead of cascading (or refusing, for entries)
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+def get_db_connection():
+    """Create and return a database connection (the thread's snapshot or pinned one, if it has one)"""
+    pinned = getattr(_pinned, 'snapshot', None) or getattr(_pinned, 'connection', None)
+    if pinned is not None:
+        return pinned
+    return _connect()
+
+def pin_connection() -> PinnedConnection:
+    """
+    Give the calling thread a dedicated connection, returned by every get_db_connection()
+    on this thread from now on. For long-lived worker threads, which then skip opening
+    a connection per call; release() closes it (from any thread).
+    """
+    conn = _connect(factory=PinnedConnection, check_same_thread=False)
+    _pinned.connection = conn
     return conn
 
+@contextmanager
+def read_snapshot(in_memory: bool = False):
+    """
+    Run reports against a read-only, consistent view of the database
+    Inside the block, get_db_connection() on this thread returns one read-only (mode=ro)
+    connection holding a single read transaction, so every query of the report sees the
+    data as it was when the block started, and nothing can write through it. With WAL,
+    data entry carries on meanwhile. in_memory=True copies the database into memory with
+    the backup API and lets go of the file straight away: for long jobs, which would
+    otherwise keep the WAL from being checkpointed, on databases that fit in memory.
+    Nested blocks share the outer snapshot.
+    """
+    if getattr(_pinned, 'snapshot', None) is not None:
+        yield _pinned.snapshot
+        return
+    source = sqlite3.connect(f"{Path(DB_PATH).resolve().as_uri()}?mode=ro", uri=True, timeout=DB_BUSY_TIMEOUT,
+                             isolation_level=None, factory=PinnedConnection)
+    if in_memory:
+        conn = sqlite3.connect(":memory:", isolation_level=None, factory=PinnedConnection)
+        source.backup(conn)
+        source.release()
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        conn = source
+        # The read transaction starts at the first read and holds its view until it ends
+        conn.execute("BEGIN")
+        conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+    conn.row_factory = sqlite3.Row
+    _pinned.snapshot = conn
+    try:
+        yield conn
+    finally:
+        _pinned.snapshot = None
+        if conn.in_transaction:
+            conn.rollback()
+        conn.release()
+
+def is_busy_error(error: sqlite3.Error) -> bool:
+    """Whether an error means another connection holds the lock (worth retrying)"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+def write_transaction(work: Callable[[sqlite3.Connection], Any], retries: int = WRITE_RETRIES) -> Any:
+    """
+    Run work(conn) as one write transaction and return its result
+    The write lock is taken before work runs, so its reads see no other writer's changes
+    until it commits, and DDL is part of the transaction. While the database stays
+    locked past the busy timeout, the transaction is rolled back and retried with
+    exponential backoff and jitter, up to `retries` attempts in all; other errors, and
+    the last busy error, are raised to the caller.
+    """
+    for attempt in range(retries):
+        conn = get_db_connection()
+        try:
+            with conn:
+                if not conn.in_transaction:
+                    conn.execute("BEGIN IMMEDIATE")
+                return work(conn)
+        except sqlite3.OperationalError as e:
+            if not is_busy_error(e) or attempt == retries - 1:
+                raise
+        finally:
+            conn.close()
+        time.sleep(WRITE_RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
+
 def init_database():
     """Initialize database and create tables if they don't exist"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
+    # Write-ahead log: readers keep reading while another process writes (persistent)
+    cursor.execute("PRAGMA journal_mode = WAL")
+    
     # Create customers table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS customers (
@@ -38,38 +177,827 @@ def init_database():
     except sqlite3.OperationalError:
         pass  # Column already exists
     
-    # Create entries table
+    # Billing cycle columns (monthly, weekly, fortnightly or custom cut-off day)
+    for column_sql in (
+        "ALTER TABLE customers ADD COLUMN billing_cycle TEXT NOT NULL DEFAULT 'monthly'",
+        "ALTER TABLE customers ADD COLUMN cycle_anchor DATE",
+        "ALTER TABLE customers ADD COLUMN cycle_cutoff_day INTEGER"
+    ):
+        try:
+            cursor.execute(column_sql)
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+    
+    # Optional delivery location (decimal degrees) used to order route stops
+    for column_sql in (
+        "ALTER TABLE customers ADD COLUMN latitude REAL",
+        "ALTER TABLE customers ADD COLUMN longitude REAL"
+    ):
+        try:
+            cursor.execute(column_sql)
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+    
+    # Fixed daily quantity for subscription customers (NULL = use the forecast on route sheets)
+    try:
+        cursor.execute("ALTER TABLE customers ADD COLUMN subscription_qty REAL")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+    
+    # Databases from before foreign keys were enforced can hold rows of deleted
+    # customers; purge them once (user_version 0 -> 1) so enforcement can start clean
+    cursor.execute("PRAGMA user_version")
+    if cursor.fetchone()[0] < 1:
+        purge_orphaned_rows(cursor)
+        cursor.execute("PRAGMA user_version = 1")
+    
+    # Trigram full-text index over customer name and mobile number for search-as-you-type
+    # pickers; external content, kept in step with customers by triggers
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'customer_search'")
+    search_index_exists = cursor.fetchone() is not None
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS customer_search USING fts5(
+                name, mobile_number, content='customers', content_rowid='id', tokenize='trigram'
+            )
+        """)
+        create_customer_search_triggers(cursor)
+        if not search_index_exists:
+            cursor.execute("INSERT INTO customer_search (customer_search) VALUES ('rebuild')")
+    except sqlite3.OperationalError:
+        pass  # SQLite built without FTS5 trigram support; search_customers falls back to LIKE
+    
+    # Create entries table (one row per customer, day and shift)
+    cursor.execute(ENTRIES_SCHEMA.format(table='entries'))
+    migrate_entries_shift(cursor)
+    
+    # Covering index for everything read by date: a day, a day's shift (filtered inside
+    # the index) and month ranges. Shifts sit after customer_id so per-customer daily
+    # totals across shifts group in index order without a sort. Per-customer reads use
+    # the unique key.
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS entries (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
+        CREATE INDEX IF NOT EXISTS idx_entries_date_customer
+        ON entries (entry_date, customer_id, shift, quantity)
+    """)
+    
+    # Per-customer running totals (prefix sums) over entry dates; any range total is
+    # two index lookups and a subtraction. Maintained incrementally by the triggers below.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS entry_prefix (
             customer_id INTEGER NOT NULL,
             entry_date DATE NOT NULL,
-            quantity REAL NOT NULL,
+            cum_litres REAL NOT NULL,
+            cum_entries INTEGER NOT NULL,
+            PRIMARY KEY (customer_id, entry_date)
+        ) WITHOUT ROWID
+    """)
+    create_entry_prefix_triggers(cursor)
+    
+    # Backfill prefix sums for databases created before they existed
+    cursor.execute("""
+        SELECT EXISTS (SELECT 1 FROM entries) AND NOT EXISTS (SELECT 1 FROM entry_prefix)
+    """)
+    if cursor.fetchone()[0]:
+        rebuild_entry_prefix(cursor)
+    
+    # Rollups at day (whole dairy), month and year (per customer) grain, maintained by
+    # triggers on entries so statements and analytics never scan the entries table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_totals (
+            day TEXT PRIMARY KEY,
+            litres REAL NOT NULL,
+            deliveries INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customer_monthly (
+            customer_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            litres REAL NOT NULL,
+            deliveries INTEGER NOT NULL,
+            PRIMARY KEY (customer_id, month)
+        ) WITHOUT ROWID
+    """)
+    
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_customer_monthly_month
+        ON customer_monthly (month, customer_id, litres, deliveries)
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customer_yearly (
+            customer_id INTEGER NOT NULL,
+            year TEXT NOT NULL,
+            litres REAL NOT NULL,
+            deliveries INTEGER NOT NULL,
+            PRIMARY KEY (customer_id, year)
+        ) WITHOUT ROWID
+    """)
+    
+    # Per-year rankings read customers in litre order straight off this index
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_customer_yearly_year
+        ON customer_yearly (year, litres DESC, customer_id)
+    """)
+    create_rollup_triggers(cursor)
+    
+    cursor.execute("""
+        SELECT EXISTS (SELECT 1 FROM entries) AND (
+            NOT EXISTS (SELECT 1 FROM daily_totals)
+            OR NOT EXISTS (SELECT 1 FROM customer_monthly)
+            OR NOT EXISTS (SELECT 1 FROM customer_yearly)
+        )
+    """)
+    if cursor.fetchone()[0]:
+        rebuild_rollups(cursor)
+    
+    # Create price_slabs table (volume-slab pricing; upto_litres NULL = open-ended last slab)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS price_slabs (
+            customer_id INTEGER NOT NULL,
+            slab_order INTEGER NOT NULL,
+            upto_litres REAL,
+            rate REAL NOT NULL,
+            PRIMARY KEY (customer_id, slab_order),
+            FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Closed billing months and their immutable per-customer invoice snapshots
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS billing_periods (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            closed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (year, month)
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS invoices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1,
+            total_litres REAL NOT NULL,
+            total_amount REAL NOT NULL,
+            delta_amount REAL NOT NULL DEFAULT 0,
+            content_hash TEXT NOT NULL,
+            details TEXT NOT NULL,
+            pdf BLOB,
+            is_current INTEGER NOT NULL DEFAULT 1,
+            issued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE,
+            UNIQUE(customer_id, year, month, version)
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_invoices_period_current
+        ON invoices (year, month, is_current, customer_id)
+    """)
+    
+    # Month-level rendered exports (pdf/xlsx/csv) served on re-download
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS invoice_artifacts (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            format TEXT NOT NULL,
+            content BLOB NOT NULL,
+            content_hash TEXT NOT NULL,
+            rendered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (year, month, format)
+        )
+    """)
+    
+    # Customers whose closed-month invoice is out of date because of late or edited entries
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS invoice_dirty (
+            customer_id INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            PRIMARY KEY (year, month, customer_id)
+        ) WITHOUT ROWID
+    """)
+    create_invoice_dirty_triggers(cursor)
+    
+    # Create payments table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER NOT NULL,
+            paid_on DATE NOT NULL,
+            amount REAL NOT NULL,
+            method TEXT,
+            reference TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (customer_id) REFERENCES customers(id),
-            UNIQUE(customer_id, entry_date)
+            FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_payments_customer_date
+        ON payments (customer_id, paid_on)
+    """)
+    
+    # Statement reconciliation checks references to avoid posting a credit twice
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_payments_reference
+        ON payments (reference)
+    """)
+    
+    # Running balance per customer (invoiced - paid), maintained by triggers on
+    # invoices and payments so the due list never has to scan history
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customer_balances (
+            customer_id INTEGER PRIMARY KEY,
+            invoiced REAL NOT NULL DEFAULT 0,
+            paid REAL NOT NULL DEFAULT 0,
+            balance REAL NOT NULL DEFAULT 0,
+            last_payment_on DATE,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
         )
     """)
     
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_customer_balances_balance
+        ON customer_balances (balance)
+    """)
+    create_balance_triggers(cursor)
+    
+    # Backfill balances for databases that already had invoices or payments
+    cursor.execute("""
+        SELECT (EXISTS (SELECT 1 FROM invoices) OR EXISTS (SELECT 1 FROM payments))
+               AND NOT EXISTS (SELECT 1 FROM customer_balances)
+    """)
+    if cursor.fetchone()[0]:
+        rebuild_customer_balances(cursor)
+
+    # Customer segments (route, society, customer type, free tags) and their members.
+    # The primary key serves "members of a segment"; the second index "segments of a customer"
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS segments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(kind, name)
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customer_segments (
+            segment_id INTEGER NOT NULL,
+            customer_id INTEGER NOT NULL,
+            PRIMARY KEY (segment_id, customer_id),
+            FOREIGN KEY (segment_id) REFERENCES segments(id) ON DELETE CASCADE,
+            FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+    
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_customer_segments_customer
+        ON customer_segments (customer_id, segment_id)
+    """)
+    
+    # Delivery position of a customer on a route (NULL = not optimized yet, listed last)
+    try:
+        cursor.execute("ALTER TABLE customer_segments ADD COLUMN stop_order INTEGER")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
+    # WhatsApp outbox: one row per bill message, sent in the background by utils.outbox
+    # dedupe_key (period + customer) keeps re-queuing a period from sending twice
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER NOT NULL,
+            mobile_number TEXT NOT NULL,
+            message TEXT NOT NULL,
+            period_label TEXT,
+            dedupe_key TEXT NOT NULL UNIQUE,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_outbox_status_next
+        ON outbox (status, next_attempt_at)
+    """)
+
+    # Which dispatcher is sending a message and since when, so a second dispatcher only
+    # takes over sends whose lease ran out or whose owner is gone
+    for column_sql in (
+        "ALTER TABLE outbox ADD COLUMN claimed_by TEXT",
+        "ALTER TABLE outbox ADD COLUMN claimed_at TIMESTAMP"
+    ):
+        try:
+            cursor.execute(column_sql)
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+    # Archived customers with their deliveries and payments, kept for the record after
+    # the live rows are removed (ids are never reused, so they stay unique)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archived_customers (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            price_per_ltr REAL NOT NULL,
+            mobile_number TEXT,
+            balance REAL NOT NULL DEFAULT 0,
+            created_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archived_entries (
+            customer_id INTEGER NOT NULL,
+            entry_date DATE NOT NULL,
+            shift TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            created_at TIMESTAMP,
+            PRIMARY KEY (customer_id, entry_date, shift)
+        ) WITHOUT ROWID
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archived_payments (
+            id INTEGER PRIMARY KEY,
+            customer_id INTEGER NOT NULL,
+            paid_on DATE NOT NULL,
+            amount REAL NOT NULL,
+            method TEXT,
+            reference TEXT,
+            created_at TIMESTAMP
+        )
+    """)
+
     conn.commit()
     conn.close()
     print(f"Database initialized: {DB_PATH}")
 
+def create_customer_search_triggers(cursor):
+    """Create the triggers that keep the customer_search index in step with customers"""
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_customers_search_insert AFTER INSERT ON customers
+        BEGIN
+            INSERT INTO customer_search (rowid, name, mobile_number)
+            VALUES (NEW.id, NEW.name, NEW.mobile_number);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_customers_search_delete AFTER DELETE ON customers
+        BEGIN
+            INSERT INTO customer_search (customer_search, rowid, name, mobile_number)
+            VALUES ('delete', OLD.id, OLD.name, OLD.mobile_number);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_customers_search_update AFTER UPDATE OF name, mobile_number ON customers
+        BEGIN
+            INSERT INTO customer_search (customer_search, rowid, name, mobile_number)
+            VALUES ('delete', OLD.id, OLD.name, OLD.mobile_number);
+            INSERT INTO customer_search (rowid, name, mobile_number)
+            VALUES (NEW.id, NEW.name, NEW.mobile_number);
+        END
+    """)
+
+def migrate_entries_shift(cursor):
+    """
+    Rebuild an entries table from before shifts: existing rows become morning entries
+    and the unique key gains the shift. Dropping the old table drops its triggers and
+    index, which init_database recreates; the prefix sums and rollups are per day and
+    per entry, so they stay valid as they are.
+    """
+    cursor.execute("PRAGMA table_info(entries)")
+    if any(column[1] == 'shift' for column in cursor.fetchall()):
+        return
+    cursor.execute("DROP TABLE IF EXISTS entries_with_shift")
+    cursor.execute(ENTRIES_SCHEMA.format(table='entries_with_shift'))
+    cursor.execute("""
+        INSERT INTO entries_with_shift (id, customer_id, entry_date, shift, quantity, created_at)
+        SELECT id, customer_id, entry_date, 'morning', quantity, created_at FROM entries
+    """)
+    cursor.execute("DROP TABLE entries")
+    cursor.execute("ALTER TABLE entries_with_shift RENAME TO entries")
+
+def create_entry_prefix_triggers(cursor):
+    """Create the triggers that keep entry_prefix in step with entries"""
+    # New entry: open a prefix row for its date (carrying the previous running total),
+    # then add the quantity to that row and every later one of the customer
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_entries_prefix_insert AFTER INSERT ON entries
+        BEGIN
+            INSERT INTO entry_prefix (customer_id, entry_date, cum_litres, cum_entries)
+            SELECT NEW.customer_id, NEW.entry_date, COALESCE(p.cum_litres, 0), COALESCE(p.cum_entries, 0)
+            FROM (SELECT 1) LEFT JOIN (
+                SELECT cum_litres, cum_entries FROM entry_prefix
+                WHERE customer_id = NEW.customer_id AND entry_date < NEW.entry_date
+                ORDER BY entry_date DESC LIMIT 1
+            ) p ON 1
+            WHERE NOT EXISTS (
+                SELECT 1 FROM entry_prefix WHERE customer_id = NEW.customer_id AND entry_date = NEW.entry_date
+            );
+            UPDATE entry_prefix
+            SET cum_litres = cum_litres + NEW.quantity, cum_entries = cum_entries + 1
+            WHERE customer_id = NEW.customer_id AND entry_date >= NEW.entry_date;
+        END
+    """)
+    
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_entries_prefix_delete AFTER DELETE ON entries
+        BEGIN
+            UPDATE entry_prefix
+            SET cum_litres = cum_litres - OLD.quantity, cum_entries = cum_entries - 1
+            WHERE customer_id = OLD.customer_id AND entry_date >= OLD.entry_date;
+            DELETE FROM entry_prefix
+            WHERE customer_id = OLD.customer_id AND entry_date = OLD.entry_date
+              AND NOT EXISTS (
+                  SELECT 1 FROM entries WHERE customer_id = OLD.customer_id AND entry_date = OLD.entry_date
+              );
+        END
+    """)
+    
+    # Quantity correction on the same day: apply the difference only
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_entries_prefix_update_qty AFTER UPDATE OF quantity ON entries
+        WHEN OLD.customer_id = NEW.customer_id AND OLD.entry_date = NEW.entry_date
+        BEGIN
+            UPDATE entry_prefix SET cum_litres = cum_litres + (NEW.quantity - OLD.quantity)
+            WHERE customer_id = NEW.customer_id AND entry_date >= NEW.entry_date;
+        END
+    """)
+    
+    # Entry moved to another customer or date: remove it from the old position, add at the new one
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_entries_prefix_update_move AFTER UPDATE OF customer_id, entry_date ON entries
+        WHEN OLD.customer_id != NEW.customer_id OR OLD.entry_date != NEW.entry_date
+        BEGIN
+            UPDATE entry_prefix
+            SET cum_litres = cum_litres - OLD.quantity, cum_entries = cum_entries - 1
+            WHERE customer_id = OLD.customer_id AND entry_date >= OLD.entry_date;
+            DELETE FROM entry_prefix
+            WHERE customer_id = OLD.customer_id AND entry_date = OLD.entry_date
+              AND NOT EXISTS (
+                  SELECT 1 FROM entries WHERE customer_id = OLD.customer_id AND entry_date = OLD.entry_date
+              );
+            INSERT INTO entry_prefix (customer_id, entry_date, cum_litres, cum_entries)
+            SELECT NEW.customer_id, NEW.entry_date, COALESCE(p.cum_litres, 0), COALESCE(p.cum_entries, 0)
+            FROM (SELECT 1) LEFT JOIN (
+                SELECT cum_litres, cum_entries FROM entry_prefix
+                WHERE customer_id = NEW.customer_id AND entry_date < NEW.entry_date
+                ORDER BY entry_date DESC LIMIT 1
+            ) p ON 1
+            WHERE NOT EXISTS (
+                SELECT 1 FROM entry_prefix WHERE customer_id = NEW.customer_id AND entry_date = NEW.entry_date
+            );
+            UPDATE entry_prefix
+            SET cum_litres = cum_litres + NEW.quantity, cum_entries = cum_entries + 1
+            WHERE customer_id = NEW.customer_id AND entry_date >= NEW.entry_date;
+        END
+    """)
+
+# Rollup tables kept in step with entries: (table, key columns, key expressions per entry row)
+ROLLUP_TABLES = [
+    ('daily_totals', ('day',), ('{row}.entry_date',)),
+    ('customer_monthly', ('customer_id', 'month'), ('{row}.customer_id', 'substr({row}.entry_date, 1, 7)')),
+    ('customer_yearly', ('customer_id', 'year'), ('{row}.customer_id', 'substr({row}.entry_date, 1, 4)')),
+]
+
+def create_rollup_triggers(cursor):
+    """Create the triggers that keep the rollup tables in step with entries"""
+    # Add / remove one entry's contribution. NOT EXISTS + UPDATE instead of an upsert,
+    # which the outer statement's conflict policy would override inside a trigger
+    add_parts = []
+    remove_parts = []
+    for table, columns, expressions in ROLLUP_TABLES:
+        match = " AND ".join(f"{c} = {e}" for c, e in zip(columns, expressions))
+        add_parts.append(f"""
+            INSERT INTO {table} ({', '.join(columns)}, litres, deliveries)
+            SELECT {', '.join(expressions)}, 0, 0
+            WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {match});
+            UPDATE {table}
+            SET litres = litres + {{row}}.quantity, deliveries = deliveries + 1
+            WHERE {match};""")
+        remove_parts.append(f"""
+            UPDATE {table}
+            SET litres = litres - {{row}}.quantity, deliveries = deliveries - 1
+            WHERE {match};
+            DELETE FROM {table} WHERE {match} AND deliveries <= 0;""")
+    add_sql = "".join(add_parts)
+    remove_sql = "".join(remove_parts)
+
+    # Earlier databases only rolled up months; drop those triggers once so the new ones replace them
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_entries_rollup_insert'")
+    existing = cursor.fetchone()
+    if existing and 'daily_totals' not in existing[0]:
+        for name in ('trg_entries_rollup_insert', 'trg_entries_rollup_delete', 'trg_entries_rollup_update'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_entries_rollup_insert AFTER INSERT ON entries
+        BEGIN{add_sql.format(row='NEW')}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_entries_rollup_delete AFTER DELETE ON entries
+        BEGIN{remove_sql.format(row='OLD')}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_entries_rollup_update AFTER UPDATE OF customer_id, entry_date, quantity ON entries
+        BEGIN{remove_sql.format(row='OLD')}{add_sql.format(row='NEW')}
+        END
+    """)
+
+def rebuild_rollups(cursor):
+    """Recompute the rollup tables from entries"""
+    for table, columns, expressions in ROLLUP_TABLES:
+        keys = [e.format(row='entries') for e in expressions]
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"""
+            INSERT INTO {table} ({', '.join(columns)}, litres, deliveries)
+            SELECT {', '.join(keys)}, SUM(quantity), COUNT(*)
+            FROM entries
+            GROUP BY {', '.join(keys)}
+        """)
+
+def create_invoice_dirty_triggers(cursor):
+    """Create the triggers that flag closed-month invoices touched by entry writes"""
+    # NOT EXISTS rather than INSERT OR IGNORE: inside a trigger the conflict policy of
+    # the outer statement (e.g. add_entry's upsert) overrides OR IGNORE
+    mark_sql = """
+            INSERT INTO invoice_dirty (customer_id, year, month)
+            SELECT {row}.customer_id, p.year, p.month FROM billing_periods p
+            WHERE p.year = CAST(substr({row}.entry_date, 1, 4) AS INTEGER)
+              AND p.month = CAST(substr({row}.entry_date, 6, 2) AS INTEGER)
+              AND NOT EXISTS (
+                  SELECT 1 FROM invoice_dirty d
+                  WHERE d.year = p.year AND d.month = p.month AND d.customer_id = {row}.customer_id
+              );
+    """
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_entries_dirty_insert AFTER INSERT ON entries
+        BEGIN
+            {mark_sql.format(row='NEW')}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_entries_dirty_delete AFTER DELETE ON entries
+        BEGIN
+            {mark_sql.format(row='OLD')}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_entries_dirty_update AFTER UPDATE ON entries
+        BEGIN
+            {mark_sql.format(row='OLD')}
+            {mark_sql.format(row='NEW')}
+        END
+    """)
+
+def create_balance_triggers(cursor):
+    """Create the triggers that keep customer_balances in step with invoices and payments"""
+    # Every invoice version carries its delta against the previous one, so adding
+    # delta_amount keeps the balance right for first issues and reissues alike
+    ensure_row = """
+            INSERT INTO customer_balances (customer_id)
+            SELECT {row}.customer_id
+            WHERE NOT EXISTS (SELECT 1 FROM customer_balances WHERE customer_id = {row}.customer_id);
+    """
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_invoices_balance_insert AFTER INSERT ON invoices
+        BEGIN
+            {ensure_row.format(row='NEW')}
+            UPDATE customer_balances
+            SET invoiced = invoiced + NEW.delta_amount,
+                balance = balance + NEW.delta_amount,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE customer_id = NEW.customer_id;
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_payments_balance_insert AFTER INSERT ON payments
+        BEGIN
+            {ensure_row.format(row='NEW')}
+            UPDATE customer_balances
+            SET paid = paid + NEW.amount,
+                balance = balance - NEW.amount,
+                last_payment_on = MAX(COALESCE(last_payment_on, NEW.paid_on), NEW.paid_on),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE customer_id = NEW.customer_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_payments_balance_delete AFTER DELETE ON payments
+        BEGIN
+            UPDATE customer_balances
+            SET paid = paid - OLD.amount,
+                balance = balance + OLD.amount,
+                last_payment_on = (SELECT MAX(paid_on) FROM payments WHERE customer_id = OLD.customer_id),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE customer_id = OLD.customer_id;
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_payments_balance_update AFTER UPDATE OF customer_id, amount, paid_on ON payments
+        BEGIN
+            UPDATE customer_balances
+            SET paid = paid - OLD.amount,
+                balance = balance + OLD.amount,
+                last_payment_on = (SELECT MAX(paid_on) FROM payments WHERE customer_id = OLD.customer_id),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE customer_id = OLD.customer_id;
+            {ensure_row.format(row='NEW')}
+            UPDATE customer_balances
+            SET paid = paid + NEW.amount,
+                balance = balance - NEW.amount,
+                last_payment_on = (SELECT MAX(paid_on) FROM payments WHERE customer_id = NEW.customer_id),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE customer_id = NEW.customer_id;
+        END
+    """)
+
+def rebuild_customer_balances(cursor):
+    """Recompute customer_balances from invoices and payments in one set-based pass"""
+    cursor.execute("DELETE FROM customer_balances")
+    cursor.execute("""
+        INSERT INTO customer_balances (customer_id, invoiced, paid, balance, last_payment_on)
+        SELECT customer_id, SUM(invoiced), SUM(paid), SUM(invoiced) - SUM(paid), MAX(paid_on)
+        FROM (
+            SELECT customer_id, delta_amount AS invoiced, 0 AS paid, NULL AS paid_on FROM invoices
+            UNION ALL
+            SELECT customer_id, 0, amount, paid_on FROM payments
+        )
+        GROUP BY customer_id
+    """)
+
+def rebuild_entry_prefix(cursor):
+    """Recompute entry_prefix from entries in one set-based pass"""
+    cursor.execute("DELETE FROM entry_prefix")
+    cursor.execute("""
+        INSERT INTO entry_prefix (customer_id, entry_date, cum_litres, cum_entries)
+        SELECT customer_id, entry_date,
+               SUM(SUM(quantity)) OVER (PARTITION BY customer_id ORDER BY entry_date),
+               SUM(COUNT(*)) OVER (PARTITION BY customer_id ORDER BY entry_date)
+        FROM entries
+        GROUP BY customer_id, entry_date
+    """)
+
+def purge_orphaned_rows(cursor):
+    """Delete per-customer rows whose customer no longer exists (entries first, through their triggers)"""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    existing = {row[0] for row in cursor.fetchall()}
+    for table in CUSTOMER_CHILD_TABLES:
+        if table in existing:
+            cursor.execute(f"DELETE FROM {table} WHERE customer_id NOT IN (SELECT id FROM customers)")
+
+def delete_customer_rows(cursor, customer_ids: Iterable[int]) -> Tuple[int, int]:
+    """
+    Delete customers and everything recorded against them; returns (customers, entries) deleted
+    Entries are deleted explicitly, since their foreign key has no cascade and their
+    triggers keep the rollups right; the other per-customer tables cascade.
+    Invoice dirty marks (no foreign key) are cleared last, after the entry triggers.
+    """
+    ids = json.dumps([int(cid) for cid in customer_ids])
+    cursor.execute("DELETE FROM entries WHERE customer_id IN (SELECT value FROM json_each(?))", (ids,))
+    entries_deleted = cursor.rowcount
+    cursor.execute("DELETE FROM customers WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+    customers_deleted = cursor.rowcount
+    cursor.execute("DELETE FROM invoice_dirty WHERE customer_id IN (SELECT value FROM json_each(?))", (ids,))
+    return customers_deleted, entries_deleted
+
+# Triggers maintaining the per-entry derived tables, and the tables themselves
+ENTRY_ROLLUP_TRIGGERS = [
+    'trg_entries_prefix_insert', 'trg_entries_prefix_delete', 'trg_entries_prefix_update_qty',
+    'trg_entries_prefix_update_move', 'trg_entries_rollup_insert', 'trg_entries_rollup_delete',
+    'trg_entries_rollup_update'
+]
+def upsert_entry_batch(cursor, rows: Iterable[Tuple[int, str, str, float]]) -> None:
+    """
+    Upsert a batch of entries (customer_id, entry_date, shift, quantity), one per key
+    Per-row trigger work dominates large imports, so the prefix-sum and rollup triggers
+    are dropped for the batch and their tables brought up to date set-based: rollups by
+    the batch's deltas, prefix sums from each customer's earliest batch date onwards.
+    Run it inside a write_transaction; other sessions never see the triggers missing.
+    """
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS entry_batch (
+            customer_id INTEGER NOT NULL,
+            entry_date DATE NOT NULL,
+            shift TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            old_quantity REAL,
+            PRIMARY KEY (customer_id, entry_date, shift)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("DELETE FROM entry_batch")
+    cursor.executemany(
+        "INSERT INTO entry_batch (customer_id, entry_date, shift, quantity) VALUES (?, ?, ?, ?)", rows
+    )
+    # Quantities being replaced, for the rollup deltas
+    cursor.execute("""
+        UPDATE entry_batch SET old_quantity = (
+            SELECT e.quantity FROM entries e
+            WHERE e.customer_id = entry_batch.customer_id AND e.entry_date = entry_batch.entry_date
+              AND e.shift = entry_batch.shift
+        )
+    """)
+
+    for name in ENTRY_ROLLUP_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    cursor.execute("""
+        INSERT INTO entries (customer_id, entry_date, shift, quantity)
+        SELECT customer_id, entry_date, shift, quantity FROM entry_batch WHERE true
+        ON CONFLICT (customer_id, entry_date, shift) DO UPDATE SET quantity = excluded.quantity
+    """)
+
+    # Upserts never remove an entry, so every touched rollup row keeps at least one delivery
+    for table, columns, expressions in ROLLUP_TABLES:
+        keys = [e.format(row='b') for e in expressions]
+        cursor.execute(f"""
+            INSERT INTO {table} ({', '.join(columns)}, litres, deliveries)
+            SELECT {', '.join(keys)}, SUM(b.quantity - COALESCE(b.old_quantity, 0)), SUM(b.old_quantity IS NULL)
+            FROM entry_batch b WHERE true
+            GROUP BY {', '.join(keys)}
+            ON CONFLICT ({', '.join(columns)}) DO UPDATE SET
+                litres = litres + excluded.litres, deliveries = deliveries + excluded.deliveries
+        """)
+
+    # Each customer's prefix rows from its earliest batch date on, continuing the running
+    # total of the row before it
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS entry_batch_scope (
+            customer_id INTEGER PRIMARY KEY,
+            from_date DATE NOT NULL,
+            base_litres REAL NOT NULL,
+            base_entries INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("DELETE FROM entry_batch_scope")
+    cursor.execute("""
+        INSERT INTO entry_batch_scope (customer_id, from_date, base_litres, base_entries)
+        SELECT s.customer_id, s.from_date, COALESCE(p.cum_litres, 0), COALESCE(p.cum_entries, 0)
+        FROM (SELECT customer_id, MIN(entry_date) AS from_date FROM entry_batch GROUP BY customer_id) s
+        LEFT JOIN entry_prefix p ON p.customer_id = s.customer_id AND p.entry_date = (
+            SELECT MAX(entry_date) FROM entry_prefix
+            WHERE customer_id = s.customer_id AND entry_date < s.from_date
+        )
+    """)
+    cursor.execute("""
+        DELETE FROM entry_prefix
+        WHERE customer_id IN (SELECT customer_id FROM entry_batch_scope)
+          AND entry_date >= (SELECT from_date FROM entry_batch_scope s WHERE s.customer_id = entry_prefix.customer_id)
+    """)
+    cursor.execute("""
+        INSERT INTO entry_prefix (customer_id, entry_date, cum_litres, cum_entries)
+        SELECT s.customer_id, e.entry_date,
+               s.base_litres + SUM(SUM(e.quantity)) OVER running,
+               s.base_entries + SUM(COUNT(*)) OVER running
+        FROM entry_batch_scope s
+        JOIN entries e ON e.customer_id = s.customer_id AND e.entry_date >= s.from_date
+        GROUP BY s.customer_id, e.entry_date
+        WINDOW running AS (PARTITION BY s.customer_id ORDER BY e.entry_date)
+    """)
+
+    create_entry_prefix_triggers(cursor)
+    create_rollup_triggers(cursor)
+
 # Customer operations
-def add_customer(name: str, price_per_ltr: float, mobile_number: str = None) -> bool:
-    """Add a new customer"""
+def write_error_reason(error: sqlite3.Error) -> str:
+    """Readable reason for a failed write"""
+    message = str(error)
+    if is_busy_error(error):
+        return "The database is busy; please try again"
+    if 'UNIQUE constraint failed: customers.name' in message:
+        return "A customer with this name already exists"
+    if 'FOREIGN KEY' in message:
+        return "Customer not found"
+    return f"Database error: {message}"
+
+def add_customer(name: str, price_per_ltr: float, mobile_number: str = None) -> Tuple[bool, str]:
+    """
+    Add a new customer
+    Returns: (success: bool, message: str)
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
+        write_transaction(lambda conn: conn.execute(
             "INSERT INTO customers (name, price_per_ltr, mobile_number) VALUES (?, ?, ?)",
             (name, price_per_ltr, mobile_number)
-        )
-        conn.commit()
-        conn.close()
-        return True
-    except sqlite3.IntegrityError:
-        return False
+        ))
+        return True, f"Customer '{name}' added"
+    except sqlite3.Error as e:
+        return False, write_error_reason(e)
 
 def get_all_customers() -> List[dict]:
     """Get all customers"""
@@ -80,6 +1008,81 @@ def get_all_customers() -> List[dict]:
     conn.close()
     return customers
 
+def count_customers() -> int:
+    """Number of customers"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM customers")
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+def search_customers(query: str = "", limit: int = 20, customer_ids: Optional[Iterable[int]] = None) -> List[dict]:
+    """
+    Customers whose name or mobile number contains every word of the query, best matches first
+    Names starting with the query come first. Words of three or more characters go through
+    the trigram index; shorter ones are matched with LIKE. An empty query returns the first
+    customers by name. customer_ids restricts the search to those customers.
+    """
+    terms = query.split()
+    index_terms = [t for t in terms if len(t) >= 3]
+    conditions = []
+    params = {'limit': limit, 'prefix': query.strip() + '%'}
+    for i, term in enumerate(t for t in terms if len(t) < 3):
+        conditions.append(f"(c.name LIKE :short{i} OR c.mobile_number LIKE :short{i})")
+        params[f'short{i}'] = f"%{term}%"
+    if customer_ids is not None:
+        conditions.append("c.id IN (SELECT value FROM json_each(:ids))")
+        params['ids'] = json.dumps([int(c) for c in customer_ids])
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if index_terms:
+            # Each word as a quoted phrase: substring match, any order
+            params['match'] = ' '.join('"' + t.replace('"', '""') + '"' for t in index_terms)
+            try:
+                cursor.execute(
+                    f"""
+                    SELECT c.* FROM customer_search s
+                    JOIN customers c ON c.id = s.rowid
+                    WHERE customer_search MATCH :match{''.join(' AND ' + c for c in conditions)}
+                    ORDER BY c.name LIKE :prefix DESC, s.rank, c.name
+                    LIMIT :limit
+                    """,
+                    params
+                )
+                return [dict(row) for row in cursor.fetchall()]
+            except sqlite3.OperationalError:
+                # No trigram index in this SQLite build: match the long words with LIKE too
+                for i, term in enumerate(index_terms):
+                    conditions.append(f"(c.name LIKE :long{i} OR c.mobile_number LIKE :long{i})")
+                    params[f'long{i}'] = f"%{term}%"
+        cursor.execute(
+            f"""
+            SELECT c.* FROM customers c
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            ORDER BY c.name LIKE :prefix DESC, c.name
+            LIMIT :limit
+            """,
+            params
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+def get_customers_by_ids(customer_ids: Iterable[int]) -> List[dict]:
+    """Get the given customers, ordered by name"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT * FROM customers WHERE id IN (SELECT value FROM json_each(?)) ORDER BY name",
+        (json.dumps([int(cid) for cid in customer_ids]),)
+    )
+    customers = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return customers
+
 def get_customer_by_id(customer_id: int) -> Optional[dict]:
     """Get customer by ID"""
     conn = get_db_connection()
@@ -89,51 +1092,77 @@ def get_customer_by_id(customer_id: int) -> Optional[dict]:
     conn.close()
     return dict(row) if row else None
 
-def update_customer(customer_id: int, name: str, price_per_ltr: float, mobile_number: str = None) -> bool:
-    """Update customer details"""
+def update_customer(customer_id: int, name: str, price_per_ltr: float,
+                    mobile_number: str = None) -> Tuple[bool, str]:
+    """
+    Update customer details
+    Returns: (success: bool, message: str)
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
+        updated = write_transaction(lambda conn: conn.execute(
             "UPDATE customers SET name = ?, price_per_ltr = ?, mobile_number = ? WHERE id = ?",
             (name, price_per_ltr, mobile_number, customer_id)
-        )
-        conn.commit()
-        conn.close()
-        return True
-    except sqlite3.IntegrityError:
-        return False
+        ).rowcount)
+    except sqlite3.Error as e:
+        return False, write_error_reason(e)
+    if not updated:
+        return False, "Customer not found"
+    return True, "Customer updated"
 
-def delete_customer(customer_id: int) -> bool:
-    """Delete a customer"""
+def delete_customer(customer_id: int) -> Tuple[bool, str]:
+    """
+    Delete a customer with their entries, payments and invoices
+    Returns: (success: bool, message: str)
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM customers WHERE id = ?", (customer_id,))
-        conn.commit()
-        conn.close()
-        return True
-    except:
-        return False
+        customers_deleted, entries_deleted = write_transaction(
+            lambda conn: delete_customer_rows(conn.cursor(), [customer_id])
+        )
+    except sqlite3.Error as e:
+        return False, write_error_reason(e)
+    if not customers_deleted:
+        return False, "Customer not found"
+    return True, f"Customer deleted with {entries_deleted} entr{'y' if entries_deleted == 1 else 'ies'}"
 
 # Entry operations
-def add_entry(customer_id: int, entry_date: str, quantity: float) -> bool:
-    """Add a new milk entry"""
+def add_entry(customer_id: int, entry_date: str, quantity: float, shift: str = 'morning') -> Tuple[bool, str]:
+    """
+    Add a new milk entry (replaces the quantity of the same customer, day and shift)
+    Returns: (success: bool, message: str)
+    """
+    if shift not in SHIFTS:
+        return False, f"Unknown shift: {shift}"
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT OR REPLACE INTO entries (customer_id, entry_date, quantity) VALUES (?, ?, ?)",
-            (customer_id, entry_date, quantity)
-        )
-        conn.commit()
-        conn.close()
-        return True
-    except:
-        return False
+        # Upsert rather than INSERT OR REPLACE: REPLACE deletes without firing
+        # delete triggers, which would double count in entry_prefix
+        write_transaction(lambda conn: conn.execute(
+            """
+            INSERT INTO entries (customer_id, entry_date, shift, quantity) VALUES (?, ?, ?, ?)
+            ON CONFLICT (customer_id, entry_date, shift) DO UPDATE SET quantity = excluded.quantity
+            """,
+            (customer_id, entry_date, shift, quantity)
+        ))
+        return True, "Entry saved"
+    except sqlite3.Error as e:
+        return False, write_error_reason(e)
+
+def add_entries(rows: Iterable[Tuple[int, str, str, float]]) -> int:
+    """
+    Bulk-add entries (customer_id, entry_date, shift, quantity) in one transaction
+    Same upsert as add_entry; returns the number of rows written
+    """
+    rows = list(rows)  # replayed if the write has to be retried
+    return write_transaction(lambda conn: conn.executemany(
+        """
+        INSERT INTO entries (customer_id, entry_date, shift, quantity) VALUES (?, ?, ?, ?)
+        ON CONFLICT (customer_id, entry_date, shift) DO UPDATE SET quantity = excluded.quantity
+        """,
+        rows
+    ).rowcount)
 
-def get_entries(start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[dict]:
-    """Get all entries with optional date filtering"""
+def get_entries(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                shift: Optional[str] = None) -> List[dict]:
+    """Get all entries with optional date and shift filtering"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -154,40 +1183,206 @@ def get_entries(start_date: Optional[str] = None, end_date: Optional[str] = None
         query += " WHERE e.entry_date <= ?"
         params = [end_date]
     
-    query += " ORDER BY e.entry_date DESC, c.name"
+    if shift:
+        query += (" AND" if params else " WHERE") + " e.shift = ?"
+        params.append(shift)
+    
+    # 'morning' sorts after 'evening', so DESC lists a day's morning round first
+    query += " ORDER BY e.entry_date DESC, c.name, e.shift DESC"
     
     cursor.execute(query, params)
     entries = [dict(row) for row in cursor.fetchall()]
     conn.close()
     return entries
 
+def get_recent_entries(limit: int = 10) -> List[dict]:
+    """The latest entries, in get_entries order"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    # Only the days holding the newest `limit` entries are read and sorted (index lookup)
+    cursor.execute(
+        """
+        SELECT e.*, c.name as customer_name, c.price_per_ltr
+        FROM entries e
+        JOIN customers c ON e.customer_id = c.id
+        WHERE e.entry_date >= (SELECT entry_date FROM entries ORDER BY entry_date DESC LIMIT 1 OFFSET ?)
+        ORDER BY e.entry_date DESC, c.name, e.shift DESC
+        LIMIT ?
+        """,
+        (limit - 1, limit)
+    )
+    entries = [dict(row) for row in cursor.fetchall()]
+    if not entries and limit > 0:
+        # Fewer than `limit` entries in all
+        cursor.execute(
+            """
+            SELECT e.*, c.name as customer_name, c.price_per_ltr
+            FROM entries e
+            JOIN customers c ON e.customer_id = c.id
+            ORDER BY e.entry_date DESC, c.name, e.shift DESC
+            """
+        )
+        entries = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return entries
+
+def get_entry_totals() -> dict:
+    """
+    Entries, litres and revenue over all time, from the monthly rollup
+    Revenue is at current rates like the analytics trend: flat-rate customers are summed
+    in SQL, slab customers are priced per month with price_litres.
+    """
+    # utils.pricing imports this module, so it is imported here rather than at the top
+    from utils.pricing import load_slab_table, price_litres
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT COALESCE(SUM(m.deliveries), 0), COALESCE(SUM(m.litres), 0),
+               COALESCE(SUM(CASE WHEN m.customer_id IN (SELECT customer_id FROM price_slabs)
+                                 THEN 0 ELSE m.litres * c.price_per_ltr END), 0)
+        FROM customer_monthly m
+        JOIN customers c ON c.id = m.customer_id
+        """
+    )
+    entries, litres, revenue = cursor.fetchone()
+    cursor.execute(
+        """
+        SELECT m.customer_id, m.litres, c.price_per_ltr
+        FROM customer_monthly m
+        JOIN customers c ON c.id = m.customer_id
+        WHERE m.customer_id IN (SELECT customer_id FROM price_slabs)
+        """
+    )
+    slab_rows = cursor.fetchall()
+    conn.close()
+
+    if slab_rows:
+        slab_ids = np.array([r[0] for r in slab_rows], dtype=np.int64)
+        amounts, _ = price_litres(
+            slab_ids,
+            np.array([r[1] for r in slab_rows], dtype=np.float64),
+            np.array([r[2] for r in slab_rows], dtype=np.float64),
+            load_slab_table(np.unique(slab_ids).tolist())
+        )
+        revenue += float(amounts.sum())
+    return {'entries': entries, 'litres': litres, 'revenue': revenue}
+
 def get_monthly_entries(year: int, month: int) -> List[dict]:
     """Get entries for a specific month"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
+    # A date range rather than strftime() on the column, so the date index is used
     query = """
         SELECT e.*, c.name as customer_name, c.price_per_ltr, c.mobile_number 
         FROM entries e
         JOIN customers c ON e.customer_id = c.id
-        WHERE strftime('%Y', e.entry_date) = ? AND strftime('%m', e.entry_date) = ?
+        WHERE e.entry_date BETWEEN ? AND ?
         ORDER BY e.entry_date, c.name
     """
     
-    cursor.execute(query, (str(year), f"{month:02d}"))
+    last_day = calendar.monthrange(year, month)[1]
+    cursor.execute(query, (f"{year:04d}-{month:02d}-01", f"{year:04d}-{month:02d}-{last_day:02d}"))
     entries = [dict(row) for row in cursor.fetchall()]
     conn.close()
     return entries
 
+def get_range_totals(start_date: str, end_date: str, customer_ids: Optional[Iterable[int]] = None) -> List[dict]:
+    """
+    Get per-customer litre totals between two dates (inclusive) from the prefix sums
+    Each total is the running total at end_date minus the one before start_date
+    Only customers with at least one entry in the range are returned
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    query = """
+        SELECT id, name, price_per_ltr, mobile_number,
+               end_litres - start_litres AS total_litres,
+               end_entries - start_entries AS deliveries
+        FROM (
+            SELECT c.id, c.name, c.price_per_ltr, c.mobile_number,
+                   COALESCE((SELECT cum_litres FROM entry_prefix p
+                             WHERE p.customer_id = c.id AND p.entry_date <= :end
+                             ORDER BY p.entry_date DESC LIMIT 1), 0) AS end_litres,
+                   COALESCE((SELECT cum_litres FROM entry_prefix p
+                             WHERE p.customer_id = c.id AND p.entry_date < :start
+                             ORDER BY p.entry_date DESC LIMIT 1), 0) AS start_litres,
+                   COALESCE((SELECT cum_entries FROM entry_prefix p
+                             WHERE p.customer_id = c.id AND p.entry_date <= :end
+                             ORDER BY p.entry_date DESC LIMIT 1), 0) AS end_entries,
+                   COALESCE((SELECT cum_entries FROM entry_prefix p
+                             WHERE p.customer_id = c.id AND p.entry_date < :start
+                             ORDER BY p.entry_date DESC LIMIT 1), 0) AS start_entries
+            FROM customers c
+            {where}
+        )
+        WHERE end_entries > start_entries
+        ORDER BY name
+    """
+    params = {'start': start_date, 'end': end_date}
+    if customer_ids is not None:
+        where = "WHERE c.id IN (SELECT value FROM json_each(:ids))"
+        params['ids'] = json.dumps([int(cid) for cid in customer_ids])
+    else:
+        where = ""
+    
+    cursor.execute(query.format(where=where), params)
+    totals = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return totals
+
+def set_billing_cycle(customer_id: int, billing_cycle: str, cycle_anchor: Optional[str] = None,
+                      cycle_cutoff_day: Optional[int] = None) -> bool:
+    """Set a customer's billing cycle (monthly, weekly, fortnightly or custom)"""
+    try:
+        write_transaction(lambda conn: conn.execute(
+            "UPDATE customers SET billing_cycle = ?, cycle_anchor = ?, cycle_cutoff_day = ? WHERE id = ?",
+            (billing_cycle, cycle_anchor, cycle_cutoff_day, customer_id)
+        ))
+        return True
+    except sqlite3.Error:
+        return False
+
+def set_subscription_qty(customer_id: int, subscription_qty: Optional[float]) -> bool:
+    """Set a customer's fixed daily quantity (None clears it)"""
+    try:
+        write_transaction(lambda conn: conn.execute(
+            "UPDATE customers SET subscription_qty = ? WHERE id = ?",
+            (subscription_qty, customer_id)
+        ))
+        return True
+    except sqlite3.Error:
+        return False
+
+def set_customer_location(customer_id: int, latitude: Optional[float], longitude: Optional[float]) -> bool:
+    """Set a customer's delivery location in decimal degrees (None clears it)"""
+    if (latitude is None) != (longitude is None):
+        return False
+    if latitude is not None and not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return False
+    try:
+        write_transaction(lambda conn: conn.execute(
+            "UPDATE customers SET latitude = ?, longitude = ? WHERE id = ?",
+            (latitude, longitude, customer_id)
+        ))
+        return True
+    except sqlite3.Error:
+        return False
+
 def get_customer_entries_for_forecast(customer_id: int, days: int = 30) -> List[Tuple[str, float]]:
-    """Get recent entries for a customer for forecasting"""
+    """Get a customer's daily quantities (all shifts added) for the last `days` delivery days"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
+    # Groups stream off the (customer_id, entry_date, shift) key in one backward scan
     query = """
-        SELECT entry_date, quantity 
+        SELECT entry_date, SUM(quantity)
         FROM entries 
         WHERE customer_id = ? 
+        GROUP BY entry_date
         ORDER BY entry_date DESC 
         LIMIT ?
     """
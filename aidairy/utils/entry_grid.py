@@ -0,0 +1,114 @@
+"""
+Entry grid module for SmartDairy
+Bulk entry of a day's delivery round: the roster (a route in stop order, or every
+customer) is prefilled with the stored quantities, else the subscription or forecast,
+edited as a grid and saved as a diff. Only new or changed cells are written, cleared
+cells delete their entry, and the whole save is one transaction
+"""
+
+import json
+import sqlite3
+import numpy as np
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+from utils.db import get_db_connection, write_transaction, SHIFTS
+from utils.route_sheets import expected_quantities
+
+def load_entry_grid(entry_date: date, shift: str = 'morning', route_id: Optional[int] = None) -> Dict:
+    """
+    Roster of a day and shift with stored and suggested quantities
+    Returns customer_ids, stored (NaN = no entry), suggested and basis arrays plus names.
+    The subscription is a daily quantity, so it is suggested for the morning round only;
+    other rounds are suggested from that shift's past deliveries.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    if route_id is None:
+        cursor.execute("SELECT id, name, subscription_qty FROM customers ORDER BY name")
+    else:
+        cursor.execute(
+            """
+            SELECT c.id, c.name, c.subscription_qty
+            FROM customer_segments cs
+            JOIN customers c ON c.id = cs.customer_id
+            WHERE cs.segment_id = ?
+            ORDER BY cs.stop_order IS NULL, cs.stop_order, c.name
+            """,
+            (route_id,)
+        )
+    roster = cursor.fetchall()
+    cursor.execute(
+        "SELECT customer_id, quantity FROM entries WHERE entry_date = ? AND shift = ?",
+        (entry_date.isoformat(), shift)
+    )
+    stored_rows = dict(cursor.fetchall())
+    conn.close()
+
+    customer_ids = np.array([r[0] for r in roster], dtype=np.int64)
+    stored = np.array([stored_rows.get(r[0], np.nan) for r in roster], dtype=np.float64)
+    subscription = np.array(
+        [np.nan if r[2] is None or shift != SHIFTS[0] else r[2] for r in roster], dtype=np.float64
+    )
+    suggested, basis = expected_quantities(customer_ids, subscription, entry_date, shift)
+    return {
+        'entry_date': entry_date,
+        'shift': shift,
+        'customer_ids': customer_ids,
+        'names': [r[1] for r in roster],
+        'stored': stored,
+        'suggested': np.round(suggested, 2),
+        'basis': basis
+    }
+
+def diff_entry_grid(customer_ids: Sequence[int], stored: Sequence[float], edited: Sequence[float]) -> Dict:
+    """
+    Changes between stored quantities and the edited grid
+    Returns upserts [(customer_id, quantity)] for new or changed cells and deletes
+    [customer_id] for cleared ones; empty, zero and NaN all mean no delivery.
+    """
+    customer_ids = np.asarray(customer_ids, dtype=np.int64)
+    stored = np.asarray(stored, dtype=np.float64)
+    edited = np.asarray(edited, dtype=np.float64)
+    edited = np.where(edited > 0, edited, np.nan)
+
+    has_stored = ~np.isnan(stored)
+    has_edited = ~np.isnan(edited)
+    changed = has_edited & (~has_stored | (np.abs(np.nan_to_num(edited) - np.nan_to_num(stored)) > 1e-9))
+    cleared = has_stored & ~has_edited
+    return {
+        'upserts': list(zip(customer_ids[changed].tolist(), edited[changed].tolist())),
+        'deletes': customer_ids[cleared].tolist()
+    }
+
+def save_entry_grid(entry_date: date, shift: str, upserts: List[Tuple[int, float]],
+                    deletes: List[int]) -> Tuple[bool, str]:
+    """Write a grid diff (from diff_entry_grid) for one day and shift in a single transaction"""
+    if shift not in SHIFTS:
+        return False, f"Unknown shift: {shift}"
+    if not upserts and not deletes:
+        return True, "No changes to save"
+
+    day = entry_date.isoformat()
+
+    def write(conn):
+        conn.executemany(
+            """
+            INSERT INTO entries (customer_id, entry_date, shift, quantity) VALUES (?, ?, ?, ?)
+            ON CONFLICT (customer_id, entry_date, shift) DO UPDATE SET quantity = excluded.quantity
+            """,
+            [(customer_id, day, shift, quantity) for customer_id, quantity in upserts]
+        )
+        conn.execute(
+            """
+            DELETE FROM entries
+            WHERE entry_date = ? AND shift = ? AND customer_id IN (SELECT value FROM json_each(?))
+            """,
+            (day, shift, json.dumps(deletes))
+        )
+
+    try:
+        write_transaction(write)
+    except sqlite3.Error as e:
+        return False, f"Save failed: {e}"
+    return True, f"Saved {len(upserts)} entr{'y' if len(upserts) == 1 else 'ies'}, removed {len(deletes)}"
@@ -0,0 +1,185 @@
+"""
+Entry writer module for SmartDairy
+One writer thread per process for milk entries. Sessions put writes on a queue and get
+a Future back; the writer takes everything queued while its last commit was running and
+commits it as one transaction (group commit), so staff entering at the same time share
+one lock and one disk sync per batch instead of queueing for one each. When a batch fails,
+its writes are replayed one savepoint at a time so each caller gets its own outcome
+"""
+
+import atexit
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+from utils.db import get_db_connection, is_busy_error, SHIFTS, WRITE_RETRIES, WRITE_RETRY_DELAY
+
+# Seconds to wait for more writes after the first of a batch. 0 takes what is already
+# queued: batches grow by themselves with load, as writes pile up during each commit
+WRITE_BATCH_WINDOW = 0.0
+WRITE_BATCH_MAX = 500  # writes per transaction
+
+ENTRY_UPSERT_SQL = """
+    INSERT INTO entries (customer_id, entry_date, shift, quantity) VALUES (?, ?, ?, ?)
+    ON CONFLICT (customer_id, entry_date, shift) DO UPDATE SET quantity = excluded.quantity
+"""
+
+_STOP = object()
+
+def _error_reason(params: Tuple, error: sqlite3.Error) -> str:
+    """Readable reason for a failed entry write"""
+    if 'FOREIGN KEY' in str(error):
+        return f"Customer {params[0]} does not exist"
+    if is_busy_error(error):
+        return "The database is busy; please try again"
+    return f"Save failed: {error}"
+
+class EntryWriter:
+    """Background thread committing queued entry writes in batches"""
+
+    def __init__(self, window: float = WRITE_BATCH_WINDOW, max_batch: int = WRITE_BATCH_MAX):
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        self._queue = queue.Queue()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="entry-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def is_running(self) -> bool:
+        return self._thread.is_alive() and not self._stopping
+
+    def submit(self, params: Tuple) -> Future:
+        """Queue one upsert (customer_id, entry_date, shift, quantity)"""
+        future = Future()
+        self._queue.put((params, future))
+        return future
+
+    def stop(self, timeout: Optional[float] = None):
+        """Write everything queued so far, then end the thread"""
+        self._stopping = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _next_batch(self) -> Tuple[List, bool]:
+        """Block for one write, then collect more until the window closes; returns (batch, stop)"""
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _write(self, conn: sqlite3.Connection, batch: List):
+        """Commit a batch in one transaction (retrying while locked); on failure replay it write by write"""
+        params = [item[0] for item in batch]
+        for attempt in range(WRITE_RETRIES):
+            try:
+                with conn:
+                    conn.executemany(ENTRY_UPSERT_SQL, params)
+                results = [(True, "Entry saved")] * len(batch)
+                break
+            except sqlite3.Error as e:
+                if is_busy_error(e) and attempt < WRITE_RETRIES - 1:
+                    time.sleep(WRITE_RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
+                    continue
+                results = self._replay(conn, params)
+                break
+        self.batches += 1
+        self.writes += len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _replay(self, conn: sqlite3.Connection, params: List[Tuple]) -> List[Tuple[bool, str]]:
+        """Write a failed batch one savepoint per write, committing the writes that succeed"""
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for write in params:
+                conn.execute("SAVEPOINT entry_write")
+                try:
+                    conn.execute(ENTRY_UPSERT_SQL, write)
+                    results.append((True, "Entry saved"))
+                except sqlite3.Error as e:
+                    conn.execute("ROLLBACK TO entry_write")
+                    results.append((False, _error_reason(write, e)))
+                conn.execute("RELEASE entry_write")
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            results = [(False, _error_reason(write, e)) for write in params]
+        return results
+
+    def _run(self):
+        conn = None
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if not batch:
+                continue
+            try:
+                conn = conn or get_db_connection()
+                self._write(conn, batch)
+            except Exception as e:
+                # Never leave a caller waiting, whatever went wrong
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result((False, f"Save failed: {e}"))
+        if conn is not None:
+            conn.close()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def _submit(params: Tuple) -> Future:
+    """Queue a write on the process's writer, starting it on first use"""
+    global _writer
+    # Under the lock, so no write can land behind a stop request
+    with _writer_lock:
+        if _writer is None or not _writer.is_running():
+            _writer = EntryWriter()
+            _writer.start()
+        return _writer.submit(params)
+
+def submit_entry(customer_id: int, entry_date: str, quantity: float, shift: str = 'morning') -> Future:
+    """
+    Queue a milk entry (replaces the quantity of the same customer, day and shift)
+    Returns a Future resolving to (success: bool, message: str); invalid input resolves at once.
+    """
+    if shift not in SHIFTS:
+        future = Future()
+        future.set_result((False, f"Unknown shift: {shift}"))
+        return future
+    if not quantity > 0:
+        future = Future()
+        future.set_result((False, "Quantity must be above zero"))
+        return future
+    return _submit((int(customer_id), entry_date, shift, float(quantity)))
+
+def save_entry(customer_id: int, entry_date: str, quantity: float, shift: str = 'morning',
+               timeout: float = 30.0) -> Tuple[bool, str]:
+    """submit_entry and wait for the outcome"""
+    return submit_entry(customer_id, entry_date, quantity, shift).result(timeout)
+
+def stop_entry_writer(timeout: Optional[float] = 10.0):
+    """Flush queued writes and stop the writer thread (restarted by the next submit)"""
+    with _writer_lock:
+        if _writer is not None and _writer.is_running():
+            _writer.stop(timeout)
+
+atexit.register(stop_entry_writer)
@@ -3,11 +3,15 @@ Forecasting utility module for SmartDairy
 Implements simple moving average forecasting for milk quantity prediction
 """
 
+import json
 import pandas as pd
 import numpy as np
-from typing import List, Tuple, Optional
-from datetime import datetime, timedelta
-from utils.db import get_customer_entries_for_forecast
+from typing import Dict, Iterable, List, Tuple, Optional
+from datetime import date, timedelta
+from utils.db import get_customer_entries_for_forecast, get_db_connection
+from utils.segments import resolve_segment_customers
+
+FORECAST_LOOKBACK_DAYS = 60  # bulk forecasts only read this many days of history
 
 def calculate_moving_average(values: List[float], window: int = 7) -> float:
     """
@@ -99,3 +103,57 @@ def get_forecast_summary(customer_id: int, window: int = 7) -> dict:
         'window_size': window
     }
 
+def forecast_all(window: int = 7, as_of: Optional[date] = None, customer_ids: Optional[Iterable[int]] = None,
+                 segments: Optional[Iterable[int]] = None, lookback_days: int = FORECAST_LOOKBACK_DAYS,
+                 shift: Optional[str] = None) -> Dict:
+    """
+    Next-day moving-average forecast for every customer (or the given ones / a segment filter)
+    Same rule as predict_next_day_quantity, the mean of each customer's last `window`
+    delivery days (shifts added together), computed for all customers from one query
+    over the last `lookback_days` days up to as_of. Customers without entries in that
+    span are left out. With a shift, only that shift's entries are averaged.
+    Returns arrays: ids (sorted), predicted and data_points (days averaged)
+    """
+    as_of = as_of or date.today()
+    if segments:
+        customer_ids = resolve_segment_customers(segments, customer_ids)
+
+    params = {'first': (as_of - timedelta(days=lookback_days - 1)).isoformat(), 'last': as_of.isoformat()}
+    customer_filter = ""
+    if customer_ids is not None:
+        customer_filter = " AND customer_id IN (SELECT value FROM json_each(:ids))"
+        params['ids'] = json.dumps([int(cid) for cid in customer_ids])
+    if shift is not None:
+        customer_filter += " AND shift = :shift"
+        params['shift'] = shift
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    # Daily totals across shifts, grouped in the date index's order (one covered range scan)
+    cursor.execute(
+        f"""
+        SELECT customer_id, CAST(julianday(entry_date) AS INTEGER), SUM(quantity) FROM entries
+        WHERE entry_date BETWEEN :first AND :last{customer_filter}
+        GROUP BY entry_date, customer_id
+        """,
+        params
+    )
+    rows = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 3)
+    conn.close()
+
+    # Group customers, newest day first within each
+    rows = rows[np.lexsort((-rows[:, 1], rows[:, 0]))]
+    # Rank of each day within its customer (0 = latest); average the first `window`
+    row_ids = rows[:, 0].astype(np.int64)
+    ids, group_starts, group = np.unique(row_ids, return_index=True, return_inverse=True)
+    rank = np.arange(len(row_ids)) - group_starts[group]
+    recent = rank < window
+    counts = np.bincount(group, weights=recent, minlength=len(ids))
+    sums = np.bincount(group, weights=rows[:, 2] * recent, minlength=len(ids))
+
+    return {
+        'ids': ids,
+        'predicted': np.round(sums / np.maximum(counts, 1), 2),
+        'data_points': counts.astype(np.int64)
+    }
@@ -0,0 +1,156 @@
+"""
+HTML invoice module for SmartDairy
+Renders the summary and per-customer invoices from templates/invoice_template.html
+The template is parsed once into literal chunks and placeholder slots; rendering
+only joins strings, so thousands of static invoice pages can be written in one go
+"""
+
+import os
+import re
+import json
+import html
+import hashlib
+from datetime import datetime
+from typing import Dict, Optional
+from utils.billing import get_period_label, get_rate_label
+from utils.invoices import compute_invoice_hash
+
+TEMPLATE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates', 'invoice_template.html'
+)
+MANIFEST_NAME = 'manifest.json'
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{(\w+)\}\}")
+
+class CompiledTemplate:
+    """
+    A template split into literal chunks and placeholder names
+    chunks[i] is followed by the value of slots[i]; the last chunk closes the document
+    """
+
+    def __init__(self, source: str):
+        self.source_hash = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        self.chunks = []
+        self.slots = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(source):
+            self.chunks.append(source[position:match.start()])
+            self.slots.append(match.group(1))
+            position = match.end()
+        self.chunks.append(source[position:])
+
+    def render(self, values: Dict[str, str]) -> str:
+        """Fill every placeholder; missing values render as empty strings"""
+        parts = []
+        for chunk, slot in zip(self.chunks, self.slots):
+            parts.append(chunk)
+            parts.append(values.get(slot, ''))
+        parts.append(self.chunks[-1])
+        return ''.join(parts)
+
+_compiled = {}
+
+def load_template(path: str = TEMPLATE_PATH) -> CompiledTemplate:
+    """Compile a template once per file version (recompiled when the file changes)"""
+    mtime = os.path.getmtime(path)
+    cached = _compiled.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding='utf-8') as f:
+            cached = (mtime, CompiledTemplate(f.read()))
+        _compiled[path] = cached
+    return cached[1]
+
+def _billing_rows(customer: Dict) -> str:
+    """Table row fragment(s) of one customer; slab customers get a line per slab below their row"""
+    rows = [
+        f"<tr><td>{html.escape(customer['name'])}</td>"
+        f"<td>{customer['total_litres']:.2f}</td>"
+        f"<td>{html.escape(get_rate_label(customer))}</td>"
+        f"<td class=\"amount\">₹{customer['total_amount']:.2f}</td></tr>"
+    ]
+    for slab in customer.get('slab_breakdown') or []:
+        upto = f"{slab['upto_litres']:g}" if slab['upto_litres'] is not None else "+"
+        rows.append(
+            f"<tr><td>&nbsp;&nbsp;Slab {slab['from_litres']:g} - {upto} L</td>"
+            f"<td>{slab['litres']:.2f}</td>"
+            f"<td>{slab['rate']:.2f}</td>"
+            f"<td class=\"amount\">₹{slab['amount']:.2f}</td></tr>"
+        )
+    return '\n'.join(rows)
+
+def render_summary_html(billing_data: Dict, template: Optional[CompiledTemplate] = None) -> str:
+    """Render the billing summary of all customers as one HTML page"""
+    template = template or load_template()
+    return template.render({
+        'MONTH_YEAR': html.escape(get_period_label(billing_data)),
+        'GENERATED_DATE': datetime.now().strftime('%d %B %Y, %I:%M %p'),
+        'TOTAL_CUSTOMERS': str(billing_data['total_customers']),
+        'GRAND_TOTAL': f"{billing_data['grand_total']:.2f}",
+        'BILLING_ROWS': '\n'.join(_billing_rows(c) for c in billing_data['customers'])
+    })
+
+def render_customer_html(customer: Dict, billing_data: Dict, template: Optional[CompiledTemplate] = None) -> str:
+    """Render one customer's invoice as an HTML page"""
+    template = template or load_template()
+    return template.render({
+        'MONTH_YEAR': html.escape(get_period_label(billing_data)),
+        'GENERATED_DATE': datetime.now().strftime('%d %B %Y, %I:%M %p'),
+        'TOTAL_CUSTOMERS': '1',
+        'GRAND_TOTAL': f"{customer['total_amount']:.2f}",
+        'BILLING_ROWS': _billing_rows(customer)
+    })
+
+def _customer_key(customer: Dict) -> str:
+    """Change key of a customer's page: billed figures plus the name printed on it"""
+    return f"{compute_invoice_hash(customer)}:{customer['name']}"
+
+def write_invoice_site(billing_data: Dict, output_dir: str, incremental: bool = True) -> Dict:
+    """
+    Write index.html (summary) and one customer_<id>.html per customer into output_dir
+    With incremental=True, customer pages whose totals, rates and name are unchanged since
+    the last build (per the manifest in output_dir) are left as they are. A different
+    period or template forces a full rebuild. Pages of customers no longer billed are removed.
+    Returns counts of written, unchanged and removed pages
+    """
+    template = load_template()
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    build_key = f"{billing_data['start_date']}:{billing_data['end_date']}:{template.source_hash}"
+
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    # Pages of the last build are only reused for the same period and template
+    previous = manifest.get('customers', {}) if incremental and manifest.get('build_key') == build_key else {}
+
+    summary = {'written': 0, 'unchanged': 0, 'removed': 0}
+    current = {}
+    for customer in billing_data['customers']:
+        customer_id = str(customer['id'])
+        key = _customer_key(customer)
+        current[customer_id] = key
+        page_path = os.path.join(output_dir, f"customer_{customer_id}.html")
+        if previous.get(customer_id) == key and os.path.exists(page_path):
+            summary['unchanged'] += 1
+            continue
+        with open(page_path, 'w', encoding='utf-8') as f:
+            f.write(render_customer_html(customer, billing_data, template))
+        summary['written'] += 1
+
+    for customer_id in set(manifest.get('customers', {})) - set(current):
+        page_path = os.path.join(output_dir, f"customer_{customer_id}.html")
+        if os.path.exists(page_path):
+            os.remove(page_path)
+            summary['removed'] += 1
+
+    # The summary lists every customer, so it is rewritten whenever anything changed
+    index_path = os.path.join(output_dir, 'index.html')
+    if summary['written'] or summary['removed'] or not os.path.exists(index_path):
+        with open(index_path, 'w', encoding='utf-8') as f:
+            f.write(render_summary_html(billing_data, template))
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({'build_key': build_key, 'customers': current}, f)
+
+    return summary
@@ -0,0 +1,321 @@
+"""
+Import module for SmartDairy
+Bulk import of customers and historical milk entries from CSV or Excel files, for
+moving a dairy's paper or spreadsheet history into SmartDairy. Files are streamed in
+chunks; each chunk is validated column-wise (dates, quantities, shifts, duplicates),
+customer names are resolved through an in-memory name -> id map, and rows are upserted
+with executemany, one transaction per chunk, so other writers get the lock between
+chunks. A dry run validates the whole file and reports what would be written without
+touching the database
+"""
+
+import os
+import re
+import json
+import time
+import numpy as np
+import pandas as pd
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional
+from utils.db import get_db_connection, write_transaction, upsert_entry_batch, SHIFTS
+from utils.bulk_customers import CUSTOMER_UPSERT_SQL
+
+IMPORT_CHUNK_SIZE = 100_000  # rows validated and written per transaction
+IMPORT_ERROR_SAMPLES = 50  # rejected rows listed in the report
+MAX_ENTRY_QUANTITY = 1000.0  # litres; larger quantities are treated as typing errors
+
+# Accepted header spellings per field (compared lower-case without spaces or punctuation)
+COLUMN_ALIASES = {
+    'customer': ['customer', 'customername', 'name'],
+    'date': ['date', 'entrydate', 'day'],
+    'quantity': ['quantity', 'qty', 'litres', 'liters', 'quantitylitres', 'quantityl'],
+    'shift': ['shift', 'session'],
+    'price_per_ltr': ['priceperltr', 'pricelitre', 'priceperlitre', 'price', 'rate', 'rateperlitre', 'ratelitre'],
+    'mobile_number': ['mobilenumber', 'mobile', 'phone', 'whatsapp'],
+    'subscription_qty': ['subscriptionqty', 'subscription', 'dailyqty'],
+}
+ENTRY_FIELDS = ['customer', 'date', 'quantity']
+CUSTOMER_FIELDS = ['customer', 'price_per_ltr']
+
+# Spellings accepted in the shift column
+SHIFT_ALIASES = {'': 'morning', 'am': 'morning', 'm': 'morning', 'pm': 'evening', 'e': 'evening'}
+DATE_FORMATS = ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%d.%m.%Y', '%Y/%m/%d']
+
+def _field_name(header) -> Optional[str]:
+    """Field a column header stands for, or None"""
+    key = re.sub(r'[^a-z]', '', str(header).lower())
+    for field, aliases in COLUMN_ALIASES.items():
+        if key in aliases:
+            return field
+    return None
+
+def _rename_columns(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Keep the recognised columns (the first one per field), renamed to field names"""
+    mapping = {}
+    for column in chunk.columns:
+        field = _field_name(column)
+        if field and field not in mapping.values():
+            mapping[column] = field
+    return chunk[list(mapping)].rename(columns=mapping)
+
+def _cell_text(value) -> str:
+    """Excel cell as text: dates in ISO form, whole numbers without '.0'"""
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def read_chunks(source, file_format: Optional[str] = None,
+                chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Stream a CSV or XLSX file (path or file-like object) as DataFrames of text
+    Headers are mapped to field names with COLUMN_ALIASES and other columns dropped.
+    Excel workbooks are read row by row in read-only mode (first sheet), so memory
+    stays bounded by the chunk size for both formats.
+    """
+    file_format = (file_format or os.path.splitext(getattr(source, 'name', str(source)))[1]).lstrip('.').lower()
+    if file_format == 'csv':
+        for chunk in pd.read_csv(source, chunksize=chunk_size, dtype=str, keep_default_na=False,
+                                 skipinitialspace=True, encoding='utf-8-sig'):
+            yield _rename_columns(chunk)
+    elif file_format in ('xlsx', 'xlsm'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            header = [_cell_text(h) for h in header]
+            batch = []
+            for row in rows:
+                batch.append([_cell_text(v) for v in row[:len(header)]])
+                if len(batch) >= chunk_size:
+                    yield _rename_columns(pd.DataFrame(batch, columns=header))
+                    batch = []
+            if batch:
+                yield _rename_columns(pd.DataFrame(batch, columns=header))
+        finally:
+            workbook.close()
+    else:
+        raise ValueError(f"Unsupported file type '{file_format}' (use CSV or XLSX)")
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    """Parse a text column of dates (ISO, or day first with - / . separators); NaT where invalid"""
+    values = values.str.strip()
+    parsed = pd.to_datetime(values, format=DATE_FORMATS[0], errors='coerce')
+    for date_format in DATE_FORMATS[1:]:
+        missing = parsed.isna() & values.ne('')
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(values[missing], format=date_format, errors='coerce')
+    return parsed
+
+def _iso_days(parsed: pd.Series) -> np.ndarray:
+    """ISO date strings of a datetime column, formatting each distinct day once"""
+    days, inverse = np.unique(parsed.to_numpy().astype('datetime64[D]'), return_inverse=True)
+    return days.astype(str)[inverse]
+
+class _NameMap:
+    """Customer name -> id lookups, exact first, then ignoring case"""
+
+    def __init__(self):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute("SELECT id, name FROM customers")
+        rows = cursor.fetchall()
+        conn.close()
+        self.exact = {name: customer_id for customer_id, name in rows}
+        self.folded = {name.casefold(): customer_id for customer_id, name in rows}
+        self.next_placeholder = max(self.exact.values(), default=0) + 1
+
+    def lookup(self, names: pd.Series) -> pd.Series:
+        """Ids for a column of names (NaN where unknown)"""
+        ids = names.map(self.exact)
+        missing = ids.isna()
+        if missing.any():
+            ids[missing] = names[missing].str.casefold().map(self.folded)
+        return ids
+
+    def add(self, name: str, customer_id: int) -> None:
+        """Remember a created (or, in a dry run, to-be-created) customer"""
+        self.exact[name] = customer_id
+        self.folded[name.casefold()] = customer_id
+
+    def placeholder(self) -> int:
+        """Id standing in for a customer a dry run would create"""
+        self.next_placeholder += 1
+        return self.next_placeholder - 1
+
+def _new_report(dry_run: bool) -> Dict:
+    """Empty import report"""
+    return {'dry_run': dry_run, 'rows': 0, 'imported': 0, 'rejected': 0, 'duplicates': 0,
+            'new_customers': 0, 'errors': {}, 'samples': [], 'first_date': None, 'last_date': None,
+            'seconds': 0.0}
+
+def _record_rejects(report: Dict, chunk: pd.DataFrame, reasons: np.ndarray, first_row: int) -> np.ndarray:
+    """Count rejected rows by reason and keep a few samples; returns the mask of accepted rows"""
+    rejected = reasons != ''
+    report['rejected'] += int(rejected.sum())
+    for reason, count in zip(*np.unique(reasons[rejected], return_counts=True)):
+        report['errors'][str(reason)] = report['errors'].get(str(reason), 0) + int(count)
+    for position in np.flatnonzero(rejected)[:max(IMPORT_ERROR_SAMPLES - len(report['samples']), 0)].tolist():
+        sample = {'row': first_row + position, 'reason': str(reasons[position])}
+        sample.update(chunk.iloc[position].to_dict())
+        report['samples'].append(sample)
+    return ~rejected
+
+def _create_customers(conn, names: List[str], rate: float) -> List:
+    """Insert the customers not there yet at `rate`; returns (id, name) of every one of `names`"""
+    conn.executemany(
+        "INSERT INTO customers (name, price_per_ltr) VALUES (?, ?) ON CONFLICT (name) DO NOTHING",
+        [(name, rate) for name in names]
+    )
+    return conn.execute(
+        "SELECT id, name FROM customers WHERE name IN (SELECT value FROM json_each(?))",
+        (json.dumps(names),)
+    ).fetchall()
+
+def _require_fields(chunk: pd.DataFrame, fields: List[str]) -> None:
+    """Raise ValueError naming the required columns the file lacks"""
+    missing = [field for field in fields if field not in chunk.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+def import_entries(source, file_format: Optional[str] = None, dry_run: bool = False,
+                   create_customers: bool = False, default_rate: Optional[float] = None,
+                   chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict:
+    """
+    Import milk entries (customer, date, quantity, optional shift) from CSV or XLSX
+    Rows are validated per chunk: unknown customers, unreadable or future dates,
+    quantities outside (0, MAX_ENTRY_QUANTITY] and unknown shifts are rejected and
+    counted by reason. Valid rows are upserted (a later row for the same customer, day
+    and shift wins; those are counted as duplicates). With create_customers, unknown
+    names become new customers at default_rate. Each chunk commits on its own, with the
+    prefix sums and rollups updated set-based in the same transaction (see
+    upsert_entry_batch), so they always match the entries. A failed import keeps the
+    chunks before the failure. Returns the report; dry_run writes nothing.
+    """
+    if create_customers and (default_rate is None or default_rate <= 0):
+        raise ValueError("A default rate is needed to create customers")
+    started = time.perf_counter()
+    report = _new_report(dry_run)
+    names = _NameMap()
+    today = pd.Timestamp(date.today())
+    keys = []  # compact (customer, day, shift) keys of valid rows, for duplicate counting
+
+    for index, current in enumerate(read_chunks(source, file_format, chunk_size)):
+        if index == 0:
+            _require_fields(current, ENTRY_FIELDS)
+        first_row = report['rows'] + 2  # file line of the chunk's first row (after the header)
+        report['rows'] += len(current)
+        customer = current['customer'].str.strip()
+        parsed = parse_dates(current['date'])
+        quantity = pd.to_numeric(current['quantity'].str.strip(), errors='coerce')
+        shift = current['shift'].str.strip().str.lower() if 'shift' in current.columns else pd.Series('', index=current.index)
+        shift = shift.replace(SHIFT_ALIASES)
+        customer_ids = names.lookup(customer)
+
+        unknown = customer_ids.isna() & customer.ne('')
+        if create_customers and unknown.any():
+            new_names = customer[unknown].drop_duplicates().tolist()
+            if dry_run:
+                for name in new_names:
+                    names.add(name, names.placeholder())
+            else:
+                for row in write_transaction(lambda conn: _create_customers(conn, new_names, default_rate)):
+                    names.add(row[1], row[0])
+            report['new_customers'] += len(new_names)
+            customer_ids = names.lookup(customer)
+
+        reasons = np.select(
+            [customer.eq('').to_numpy(), customer_ids.isna().to_numpy(), parsed.isna().to_numpy(),
+             (parsed > today).to_numpy(), ~((quantity > 0) & (quantity <= MAX_ENTRY_QUANTITY)).to_numpy(),
+             ~shift.isin(SHIFTS).to_numpy()],
+            ['missing customer', 'unknown customer', 'invalid date', 'date in the future',
+             'invalid quantity', 'invalid shift'],
+            default=''
+        )
+        valid = _record_rejects(report, current, reasons, first_row)
+
+        if valid.any():
+            ids = customer_ids[valid].to_numpy(dtype=np.int64)
+            valid_dates = parsed[valid]
+            days = _iso_days(valid_dates)
+            shifts = shift[valid].to_numpy()
+            litres = quantity[valid].to_numpy(dtype=np.float64)
+            day_numbers = valid_dates.to_numpy().astype('datetime64[D]').astype(np.int64)
+            keys.append((ids << 22 | (day_numbers & 0x1FFFFF)) << 1 | (shifts == SHIFTS[1]))
+            first, last = valid_dates.min().date().isoformat(), valid_dates.max().date().isoformat()
+            report['first_date'] = min(filter(None, [report['first_date'], first]))
+            report['last_date'] = max(filter(None, [report['last_date'], last]))
+            report['imported'] += len(ids)
+            if not dry_run:
+                # One row per key, the file's last one winning as in a row-by-row upsert
+                batch = pd.DataFrame({'customer_id': ids, 'entry_date': days, 'shift': shifts, 'quantity': litres})
+                batch = batch.drop_duplicates(['customer_id', 'entry_date', 'shift'], keep='last')
+                rows = list(zip(batch['customer_id'].tolist(), batch['entry_date'].tolist(),
+                                batch['shift'].tolist(), batch['quantity'].tolist()))
+                write_transaction(lambda conn: upsert_entry_batch(conn.cursor(), rows))
+
+    if keys:
+        all_keys = np.concatenate(keys)
+        report['duplicates'] = int(len(all_keys) - len(np.unique(all_keys)))
+    report['seconds'] = time.perf_counter() - started
+    return report
+
+def import_customers(source, file_format: Optional[str] = None, dry_run: bool = False,
+                     chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict:
+    """
+    Import customers (name, price per litre, optional mobile number and subscription)
+    Existing names are updated (mobile and subscription only when given); a later row
+    for the same name wins. The report counts new_customers among the imported rows.
+    """
+    started = time.perf_counter()
+    report = _new_report(dry_run)
+    names = _NameMap()
+    seen = set()
+    for index, chunk in enumerate(read_chunks(source, file_format, chunk_size)):
+        if index == 0:
+            _require_fields(chunk, CUSTOMER_FIELDS)
+        first_row = report['rows'] + 2
+        report['rows'] += len(chunk)
+        name = chunk['customer'].str.strip()
+        price = pd.to_numeric(chunk['price_per_ltr'].str.strip(), errors='coerce')
+        mobile = (chunk['mobile_number'] if 'mobile_number' in chunk.columns else pd.Series('', index=chunk.index))
+        mobile = mobile.str.replace(r'[\s\-()]', '', regex=True)
+        subscription_text = (chunk['subscription_qty'] if 'subscription_qty' in chunk.columns
+                             else pd.Series('', index=chunk.index)).str.strip()
+        subscription = pd.to_numeric(subscription_text, errors='coerce')
+
+        reasons = np.select(
+            [name.eq('').to_numpy(), ~(price > 0).to_numpy(),
+             (mobile.ne('') & ~mobile.str.fullmatch(r'\+?\d{10,15}')).to_numpy(),
+             (subscription_text.ne('') & ~(subscription >= 0)).to_numpy()],
+            ['missing name', 'invalid price', 'invalid mobile number', 'invalid subscription'],
+            default=''
+        )
+        valid = _record_rejects(report, chunk, reasons, first_row)
+        if not valid.any():
+            continue
+
+        rows = pd.DataFrame({'name': name[valid], 'price': price[valid], 'mobile': mobile[valid],
+                             'subscription': subscription[valid]})
+        report['imported'] += len(rows)
+        duplicated = rows['name'].duplicated(keep='last') | rows['name'].isin(seen)
+        report['duplicates'] += int(duplicated.sum())
+        rows = rows.drop_duplicates('name', keep='last')
+        report['new_customers'] += int((names.lookup(rows['name']).isna() & ~rows['name'].isin(seen)).sum())
+        seen.update(rows['name'].tolist())
+        if dry_run:
+            continue
+        upserts = list(zip(rows['name'].tolist(), rows['price'].tolist(),
+                           [m or None for m in rows['mobile'].tolist()],
+                           [None if np.isnan(s) else s for s in rows['subscription'].tolist()]))
+        write_transaction(lambda conn: conn.executemany(CUSTOMER_UPSERT_SQL, upserts))
+    report['seconds'] = time.perf_counter() - started
+    return report
@@ -0,0 +1,322 @@
+"""
+Invoice snapshot module for SmartDairy
+Closes billing months into immutable per-customer invoice snapshots, serves
+re-downloads from stored artifacts and reissues only the invoices affected by
+late or edited entries
+"""
+
+import io
+import json
+import sqlite3
+import hashlib
+import calendar
+from datetime import date
+from typing import List, Dict, Optional, Tuple
+from utils.db import get_db_connection, write_transaction, write_error_reason
+from utils.billing import (
+    calculate_billing, calculate_monthly_billing,
+    generate_pdf_invoice, generate_excel_invoice, generate_csv_invoice
+)
+
+ARTIFACT_FORMATS = ['pdf', 'xlsx', 'csv']
+
+def compute_invoice_hash(customer: Dict) -> str:
+    """Content hash of a customer's billed figures (what the customer is charged for)"""
+    payload = {
+        'id': customer['id'],
+        'total_litres': round(customer['total_litres'], 3),
+        'total_amount': round(customer['total_amount'], 2),
+        'price_per_ltr': customer['price_per_ltr'],
+        'slab_breakdown': [
+            [s['from_litres'], s['upto_litres'], round(s['litres'], 3), s['rate']]
+            for s in customer.get('slab_breakdown', [])
+        ]
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+def is_month_closed(year: int, month: int) -> bool:
+    """Check whether a billing month has been closed"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM billing_periods WHERE year = ? AND month = ?", (year, month))
+    closed = cursor.fetchone() is not None
+    conn.close()
+    return closed
+
+def close_month(year: int, month: int) -> Tuple[bool, str]:
+    """
+    Close a billing month: snapshot every customer's invoice and render the month exports
+    Later entry writes for the month only flag the affected customers for reissue
+    """
+    if is_month_closed(year, month):
+        return False, "This month is already closed"
+
+    # Compute and render without the write lock, so entries can still be saved meanwhile
+    billing_data = calculate_monthly_billing(year, month)
+    if not billing_data['customers']:
+        return False, "No entries found for this month"
+    artifacts = _render_artifacts(billing_data)
+
+    def close(conn):
+        # Under the write lock nothing can change any more: check whether another session
+        # closed the month or saved entries for it while the exports were rendering
+        if conn.execute("SELECT 1 FROM billing_periods WHERE year = ? AND month = ?", (year, month)).fetchone():
+            return False, "This month is already closed"
+        current = calculate_monthly_billing(year, month)
+        if not current['customers']:
+            return False, "No entries found for this month"
+        changed = _invoice_hashes(current) != _invoice_hashes(billing_data)
+
+        conn.execute("INSERT INTO billing_periods (year, month) VALUES (?, ?)", (year, month))
+        conn.execute("DELETE FROM invoice_dirty WHERE year = ? AND month = ?", (year, month))
+        conn.executemany(
+            """
+            INSERT INTO invoices (customer_id, year, month, version, total_litres, total_amount,
+                                  delta_amount, content_hash, details)
+            VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?)
+            """,
+            [
+                (c['id'], year, month, c['total_litres'], c['total_amount'], c['total_amount'],
+                 compute_invoice_hash(c), json.dumps(c))
+                for c in current['customers']
+            ]
+        )
+        # Exports rendered from figures that changed since are dropped; get_invoice_artifact
+        # renders them from the snapshots on first download
+        if not changed:
+            _store_artifacts(conn, year, month, artifacts)
+        return True, f"Closed with {current['total_customers']} invoices"
+
+    try:
+        return write_transaction(close)
+    except sqlite3.Error as e:
+        return False, write_error_reason(e)
+
+def get_closed_billing(year: int, month: int, customer_ids: Optional[List[int]] = None) -> Optional[Dict]:
+    """
+    Rebuild the billing dictionary of a closed month from its current snapshots (no recompute)
+    customer_ids limits it to those customers (e.g. a resolved segment filter)
+    """
+    if not is_month_closed(year, month):
+        return None
+
+    params = [year, month]
+    customer_filter = ""
+    if customer_ids is not None:
+        customer_filter = " AND customer_id IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps([int(cid) for cid in customer_ids]))
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT details FROM invoices
+        WHERE year = ? AND month = ? AND is_current = 1 AND total_litres > 0{customer_filter}
+        """,
+        params
+    )
+    customers = [json.loads(row['details']) for row in cursor.fetchall()]
+    conn.close()
+
+    customers.sort(key=lambda c: c['name'])
+    return _billing_dict(year, month, customers)
+
+def get_invoice_artifact(year: int, month: int, fmt: str) -> Optional[bytes]:
+    """
+    Get a closed month's stored export (pdf, xlsx or csv)
+    Missing artifacts (e.g. after a reissue) are re-rendered from the snapshots and stored
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT content FROM invoice_artifacts WHERE year = ? AND month = ? AND format = ?",
+        (year, month, fmt)
+    )
+    row = cursor.fetchone()
+    conn.close()
+    if row:
+        return row['content']
+
+    billing_data = get_closed_billing(year, month)
+    if billing_data is None:
+        return None
+
+    artifacts = _render_artifacts(billing_data)
+    write_transaction(lambda conn: _store_artifacts(conn, year, month, artifacts))
+    return artifacts.get(fmt)
+
+def get_customer_invoice_pdf(year: int, month: int, customer_id: int) -> Optional[bytes]:
+    """Get one customer's invoice PDF for a closed month, rendering and caching it on first request"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id, details, pdf FROM invoices WHERE year = ? AND month = ? AND customer_id = ? AND is_current = 1",
+        (year, month, customer_id)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        conn.close()
+        return None
+    if row['pdf'] is not None:
+        conn.close()
+        return row['pdf']
+
+    customer = json.loads(row['details'])
+    conn.close()
+    pdf_bytes = _render(generate_pdf_invoice, _billing_dict(year, month, [customer]))
+    write_transaction(lambda conn: conn.execute("UPDATE invoices SET pdf = ? WHERE id = ?", (pdf_bytes, row['id'])))
+    return pdf_bytes
+
+def get_pending_reissues(year: int, month: int) -> List[int]:
+    """Customer ids whose closed-month invoice has been touched by later entry writes"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT customer_id FROM invoice_dirty WHERE year = ? AND month = ? ORDER BY customer_id",
+        (year, month)
+    )
+    customer_ids = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return customer_ids
+
+def reissue_closed_month(year: int, month: int) -> Dict:
+    """
+    Recompute only the flagged customers of a closed month and reissue changed invoices
+    Each reissue is a new version carrying the delta against the previous one; unchanged
+    content hashes are left alone. Amounts are priced at the customer's current rates.
+    Returns a summary with the reissued invoices and the number left unchanged
+    """
+    summary = {'reissued': [], 'unchanged': 0}
+    start = date(year, month, 1)
+    end = date(year, month, calendar.monthrange(year, month)[1])
+
+    def reissue(conn):
+        # Flags and figures are read under the write lock, so an entry saved meanwhile
+        # can't have its flag cleared without being reissued
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT customer_id FROM invoice_dirty WHERE year = ? AND month = ? ORDER BY customer_id",
+            (year, month)
+        )
+        customer_ids = [row[0] for row in cursor.fetchall()]
+        if not customer_ids:
+            return summary
+        recomputed = {c['id']: c for c in calculate_billing(start, end, customer_ids)['customers']}
+
+        ids = json.dumps(customer_ids)
+        cursor.execute(
+            """
+            SELECT id, customer_id, version, total_amount, content_hash, details FROM invoices
+            WHERE year = ? AND month = ? AND is_current = 1 AND customer_id IN (SELECT value FROM json_each(?))
+            """,
+            (year, month, ids)
+        )
+        current = {row['customer_id']: dict(row) for row in cursor.fetchall()}
+
+        for customer_id in customer_ids:
+            previous = current.get(customer_id)
+            customer = recomputed.get(customer_id)
+            if customer is None:
+                # All entries of the month were removed: reissue as a zero invoice
+                if previous is None:
+                    continue
+                customer = dict(json.loads(previous['details']))
+                customer.update({'total_litres': 0.0, 'total_amount': 0.0, 'deliveries': 0, 'slab_breakdown': []})
+
+            content_hash = compute_invoice_hash(customer)
+            if previous is not None and previous['content_hash'] == content_hash:
+                summary['unchanged'] += 1
+                continue
+
+            previous_amount = previous['total_amount'] if previous else 0.0
+            version = previous['version'] + 1 if previous else 1
+            if previous is not None:
+                cursor.execute("UPDATE invoices SET is_current = 0 WHERE id = ?", (previous['id'],))
+            cursor.execute(
+                """
+                INSERT INTO invoices (customer_id, year, month, version, total_litres, total_amount,
+                                      delta_amount, content_hash, details)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (customer_id, year, month, version, customer['total_litres'], customer['total_amount'],
+                 customer['total_amount'] - previous_amount, content_hash, json.dumps(customer))
+            )
+            summary['reissued'].append({
+                'customer_id': customer_id,
+                'name': customer['name'],
+                'version': version,
+                'previous_amount': previous_amount,
+                'total_amount': customer['total_amount'],
+                'delta_amount': customer['total_amount'] - previous_amount
+            })
+
+        cursor.execute(
+            "DELETE FROM invoice_dirty WHERE year = ? AND month = ? AND customer_id IN (SELECT value FROM json_each(?))",
+            (year, month, ids)
+        )
+        # Month exports are stale now; they are re-rendered from the snapshots on next download
+        if summary['reissued']:
+            cursor.execute("DELETE FROM invoice_artifacts WHERE year = ? AND month = ?", (year, month))
+        return summary
+
+    return write_transaction(reissue)
+
+def get_invoice_history(year: int, month: int) -> List[Dict]:
+    """All invoice versions of a closed month, newest first per customer"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT i.customer_id, c.name, i.version, i.total_litres, i.total_amount,
+               i.delta_amount, i.is_current, i.issued_at
+        FROM invoices i
+        JOIN customers c ON c.id = i.customer_id
+        WHERE i.year = ? AND i.month = ?
+        ORDER BY c.name, i.version DESC
+        """,
+        (year, month)
+    )
+    history = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return history
+
+def _billing_dict(year: int, month: int, customers: List[Dict]) -> Dict:
+    """Billing dictionary in the shape calculate_monthly_billing returns"""
+    return {
+        'year': year,
+        'month': month,
+        'start_date': date(year, month, 1).isoformat(),
+        'end_date': date(year, month, calendar.monthrange(year, month)[1]).isoformat(),
+        'customers': customers,
+        'grand_total': sum(c['total_amount'] for c in customers),
+        'total_customers': len(customers)
+    }
+
+def _render(generator, billing_data: Dict) -> bytes:
+    """Run an export generator into memory and return the bytes"""
+    if generator is generate_csv_invoice:
+        buffer = io.StringIO()
+        generator(billing_data, buffer)
+        return buffer.getvalue().encode('utf-8')
+    buffer = io.BytesIO()
+    generator(billing_data, buffer)
+    return buffer.getvalue()
+
+def _render_artifacts(billing_data: Dict) -> Dict[str, bytes]:
+    """Render the month exports, by format"""
+    generators = {'pdf': generate_pdf_invoice, 'xlsx': generate_excel_invoice, 'csv': generate_csv_invoice}
+    return {fmt: _render(generators[fmt], billing_data) for fmt in ARTIFACT_FORMATS}
+
+def _invoice_hashes(billing_data: Dict) -> Dict[int, str]:
+    """Content hash of every customer's invoice in a billing result"""
+    return {c['id']: compute_invoice_hash(c) for c in billing_data['customers']}
+
+def _store_artifacts(conn, year: int, month: int, artifacts: Dict[str, bytes]):
+    """Store rendered month exports inside the caller's transaction"""
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO invoice_artifacts (year, month, format, content, content_hash)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        [(year, month, fmt, content, hashlib.sha256(content).hexdigest()) for fmt, content in artifacts.items()]
+    )
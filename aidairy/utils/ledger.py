@@ -0,0 +1,130 @@
+"""
+Ledger utility module for SmartDairy
+Records customer payments and combines them with issued invoices into a customer ledger
+"""
+
+import sqlite3
+from datetime import date
+from typing import List, Dict, Optional, Tuple
+from utils.db import get_db_connection, write_transaction
+
+PAYMENT_METHODS = ['Cash', 'UPI', 'Bank Transfer', 'Cheque', 'Other']
+
+def record_payment(customer_id: int, amount: float, paid_on: Optional[str] = None,
+                   method: Optional[str] = None, reference: Optional[str] = None) -> Tuple[bool, str]:
+    """
+    Record a payment received from a customer
+    The customer's running balance is updated by trigger in the same transaction
+    Returns: (success: bool, message: str)
+    """
+    if amount is None or amount <= 0:
+        return False, "Payment amount must be greater than zero"
+
+    paid_on = paid_on or date.today().isoformat()
+    try:
+        write_transaction(lambda conn: conn.execute(
+            "INSERT INTO payments (customer_id, paid_on, amount, method, reference) VALUES (?, ?, ?, ?, ?)",
+            (customer_id, paid_on, amount, method, reference)
+        ))
+        return True, f"Payment of ₹{amount:.2f} recorded"
+    except sqlite3.IntegrityError:
+        return False, "Customer not found"
+    except sqlite3.Error as e:
+        return False, f"Error recording payment: {str(e)}"
+
+def delete_payment(payment_id: int) -> bool:
+    """Delete a payment (the balance is restored by trigger)"""
+    try:
+        return write_transaction(
+            lambda conn: conn.execute("DELETE FROM payments WHERE id = ?", (payment_id,)).rowcount > 0
+        )
+    except sqlite3.Error:
+        return False
+
+def get_customer_balance(customer_id: int) -> Dict:
+    """Get a customer's invoiced, paid and outstanding totals"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT invoiced, paid, balance, last_payment_on FROM customer_balances WHERE customer_id = ?",
+        (customer_id,)
+    )
+    row = cursor.fetchone()
+    conn.close()
+    if row is None:
+        return {'invoiced': 0.0, 'paid': 0.0, 'balance': 0.0, 'last_payment_on': None}
+    return dict(row)
+
+def get_due_list(min_balance: float = 0.01) -> List[Dict]:
+    """
+    Get every customer with an outstanding balance, largest first
+    One indexed range scan over customer_balances.balance
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT c.id, c.name, c.mobile_number, b.invoiced, b.paid, b.balance, b.last_payment_on
+        FROM customer_balances b
+        JOIN customers c ON c.id = b.customer_id
+        WHERE b.balance >= ?
+        ORDER BY b.balance DESC
+        """,
+        (min_balance,)
+    )
+    due = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return due
+
+def get_customer_ledger(customer_id: int) -> List[Dict]:
+    """
+    Get a customer's ledger: invoice issues/reissues (debits) and payments (credits)
+    in date order, with the running balance after each line
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT entry_date, description, debit, credit,
+               SUM(debit - credit) OVER (ORDER BY entry_date, sort_key, ref_id) AS balance
+        FROM (
+            SELECT date(issued_at) AS entry_date,
+                   printf('Invoice %04d-%02d%s', year, month,
+                          CASE WHEN version > 1 THEN printf(' (reissue v%d)', version) ELSE '' END) AS description,
+                   delta_amount AS debit, 0 AS credit, 0 AS sort_key, id AS ref_id
+            FROM invoices
+            WHERE customer_id = :customer_id
+            UNION ALL
+            SELECT paid_on,
+                   'Payment' || COALESCE(' - ' || method, '') || COALESCE(' (' || reference || ')', ''),
+                   0, amount, 1, id
+            FROM payments
+            WHERE customer_id = :customer_id
+        )
+        ORDER BY entry_date, sort_key, ref_id
+        """,
+        {'customer_id': customer_id}
+    )
+    ledger = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return ledger
+
+def get_payments(customer_id: Optional[int] = None, limit: int = 100) -> List[Dict]:
+    """Get recent payments, optionally for one customer"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    query = """
+        SELECT p.id, p.customer_id, c.name AS customer_name, p.paid_on, p.amount, p.method, p.reference
+        FROM payments p
+        JOIN customers c ON c.id = p.customer_id
+    """
+    params = []
+    if customer_id is not None:
+        query += " WHERE p.customer_id = ?"
+        params.append(customer_id)
+    query += " ORDER BY p.paid_on DESC, p.id DESC LIMIT ?"
+    params.append(limit)
+    cursor.execute(query, params)
+    payments = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return payments
@@ -0,0 +1,451 @@
+"""
+Outbox utility module for SmartDairy
+Queues WhatsApp bill messages in the database and sends them in the background
+through a pluggable transport, under a rate limit, with retries and status tracking
+"""
+
+import asyncio
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import List, Dict, Optional, Tuple
+from utils.db import get_db_connection, write_transaction
+from utils.billing import format_bill_message, get_period_label
+
+OUTBOX_STATUSES = ['queued', 'sending', 'sent', 'failed']
+
+DEFAULT_RATE_PER_MINUTE = 20
+DEFAULT_MAX_CONCURRENCY = 1
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BASE_SECONDS = 30
+# A claimed message is renewed right before it is sent; a claim older than this belongs
+# to a dispatcher that stopped without finishing, and is queued again
+SEND_LEASE_SECONDS = 600
+
+_active_owners = set()  # claim owners of the dispatchers running in this process
+
+class TransportError(Exception):
+    """Raised by a transport when a message could not be delivered"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+class WhatsAppTransport(ABC):
+    """
+    Base class for message transports
+    Subclasses implement `send` as a coroutine and raise TransportError on failure
+    `max_concurrency` caps parallel sends for transports that drive a single browser
+    """
+
+    name = 'base'
+    max_concurrency = None
+
+    @abstractmethod
+    async def send(self, mobile_number: str, message: str):
+        """Deliver one message to a mobile number"""
+
+class PyWhatKitTransport(WhatsAppTransport):
+    """Sends through WhatsApp Web with pywhatkit (one browser tab at a time)"""
+
+    name = 'pywhatkit'
+    max_concurrency = 1
+
+    def __init__(self, wait_time: int = 15, close_time: int = 3):
+        self.wait_time = wait_time
+        self.close_time = close_time
+
+    async def send(self, mobile_number: str, message: str):
+        try:
+            import pywhatkit as pwk
+        except ImportError:
+            raise TransportError("pywhatkit library not installed. Please install it using: pip install pywhatkit",
+                                 retryable=False)
+        try:
+            # pywhatkit blocks while it drives the browser; keep it off the event loop
+            await asyncio.to_thread(
+                pwk.sendwhatmsg_instantly, mobile_number, message,
+                wait_time=self.wait_time, tab_close=True, close_time=self.close_time
+            )
+        except Exception as e:
+            raise TransportError(str(e))
+
+class FakeTransport(WhatsAppTransport):
+    """
+    Local transport that sends nothing and records every message
+    Useful for testing and dry runs; can simulate latency and random failures
+    """
+
+    name = 'fake'
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.sent = []
+        self._random = random.Random(seed)
+
+    async def send(self, mobile_number: str, message: str):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self._random.random() < self.failure_rate:
+            raise TransportError("Simulated delivery failure")
+        self.sent.append((mobile_number, message))
+
+class RateLimiter:
+    """Token bucket: at most `rate_per_minute` acquisitions per minute, with bursts up to `burst`"""
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.interval == 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) * self.interval)
+
+def format_whatsapp_number(mobile_number: Optional[str]) -> Optional[str]:
+    """Normalize a mobile number to +<country><number>; 10-digit numbers are taken as Indian"""
+    if not mobile_number:
+        return None
+    mobile_clean = ''.join(c for c in mobile_number.strip() if c.isdigit() or c == '+')
+    if not mobile_clean:
+        return None
+    if not mobile_clean.startswith('+'):
+        if len(mobile_clean) == 10:
+            mobile_clean = '+91' + mobile_clean
+        elif len(mobile_clean) > 10:
+            mobile_clean = '+' + mobile_clean
+        else:
+            return None
+    return mobile_clean
+
+def enqueue_bills(billing_data: Dict) -> Tuple[int, int]:
+    """
+    Render the bill message of every customer in a billing result and queue it
+    Customers without a mobile number are skipped. A customer already queued for the
+    same period gets the new message if it has not been sent yet; sent bills, and bills a
+    dispatcher is sending right now, are kept.
+    Returns: (queued: int, skipped: int)
+    """
+    period_label = get_period_label(billing_data)
+    rows = []
+    skipped = 0
+    for customer in billing_data['customers']:
+        mobile = format_whatsapp_number(customer.get('mobile_number'))
+        if mobile is None:
+            skipped += 1
+            continue
+        rows.append((
+            customer['id'], mobile, format_bill_message(customer, billing_data), period_label,
+            f"bill:{billing_data['start_date']}:{billing_data['end_date']}:{customer['id']}"
+        ))
+
+    if not rows:
+        return 0, skipped
+
+    def enqueue(conn):
+        before = conn.total_changes
+        conn.executemany(
+            """
+            INSERT INTO outbox (customer_id, mobile_number, message, period_label, dedupe_key)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (dedupe_key) DO UPDATE SET
+                mobile_number = excluded.mobile_number,
+                message = excluded.message,
+                status = 'queued',
+                attempts = 0,
+                last_error = NULL,
+                next_attempt_at = CURRENT_TIMESTAMP
+            WHERE outbox.status NOT IN ('sent', 'sending')
+            """,
+            rows
+        )
+        return conn.total_changes - before
+
+    queued = write_transaction(enqueue)
+    return queued, skipped + len(rows) - queued
+
+def get_outbox_summary() -> Dict[str, int]:
+    """Message counts per status"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status")
+    counts = {status: 0 for status in OUTBOX_STATUSES}
+    counts.update({row[0]: row[1] for row in cursor.fetchall()})
+    conn.close()
+    return counts
+
+def get_outbox_messages(status: Optional[str] = None, limit: int = 200) -> List[Dict]:
+    """Get recent outbox messages, optionally with one status"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    query = """
+        SELECT o.id, o.customer_id, c.name AS customer_name, o.mobile_number, o.period_label,
+               o.status, o.attempts, o.last_error, o.created_at, o.sent_at
+        FROM outbox o
+        JOIN customers c ON c.id = o.customer_id
+    """
+    params = []
+    if status:
+        query += " WHERE o.status = ?"
+        params.append(status)
+    query += " ORDER BY o.id DESC LIMIT ?"
+    params.append(limit)
+    cursor.execute(query, params)
+    messages = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return messages
+
+def retry_failed() -> int:
+    """Put every failed message back in the queue"""
+    return write_transaction(lambda conn: conn.execute(
+        """
+        UPDATE outbox SET status = 'queued', attempts = 0, next_attempt_at = CURRENT_TIMESTAMP
+        WHERE status = 'failed'
+        """
+    ).rowcount)
+
+def clear_sent() -> int:
+    """Delete sent messages from the outbox"""
+    return write_transaction(lambda conn: conn.execute("DELETE FROM outbox WHERE status = 'sent'").rowcount)
+
+def _new_owner() -> str:
+    """Claim owner for one dispatcher run: host, process id and a random part"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+def _owner_is_dead(owner: Optional[str]) -> bool:
+    """
+    Whether a claim's dispatcher is known to have stopped: an earlier run in this process,
+    or a process on this host that no longer exists. Owners on other hosts are left to
+    the lease timeout.
+    """
+    try:
+        host, pid, _ = (owner or '').split(':')
+        pid = int(pid)
+    except ValueError:
+        return True  # no owner (claimed before owners were recorded)
+    if host != socket.gethostname():
+        return False
+    if pid == os.getpid():
+        return owner not in _active_owners
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass  # exists, owned by another user
+    return False
+
+def _reclaim_abandoned() -> int:
+    """Queue again the messages left in 'sending' by a dispatcher that has stopped or whose lease ran out"""
+    def reclaim(conn):
+        owners = [row[0] for row in conn.execute(
+            "SELECT DISTINCT claimed_by FROM outbox WHERE status = 'sending'"
+        ).fetchall()]
+        dead = [owner for owner in owners if _owner_is_dead(owner)]
+        return conn.execute(
+            """
+            UPDATE outbox SET status = 'queued', claimed_by = NULL, claimed_at = NULL
+            WHERE status = 'sending'
+              AND (claimed_at IS NULL OR claimed_at <= datetime('now', ?)
+                   OR claimed_by IN (SELECT value FROM json_each(?)))
+            """,
+            (f"-{SEND_LEASE_SECONDS} seconds", json.dumps(dead))
+        ).rowcount
+    return write_transaction(reclaim)
+
+def _claim_batch(limit: int, owner: str) -> List[Dict]:
+    """Mark up to `limit` due messages as sending by `owner` and return them"""
+    return write_transaction(lambda conn: [dict(row) for row in conn.execute(
+        """
+        UPDATE outbox SET status = 'sending', claimed_by = ?, claimed_at = CURRENT_TIMESTAMP
+        WHERE id IN (
+            SELECT id FROM outbox
+            WHERE status = 'queued' AND next_attempt_at <= CURRENT_TIMESTAMP
+            ORDER BY next_attempt_at, id
+            LIMIT ?
+        )
+        RETURNING id, mobile_number, message, attempts
+        """,
+        (owner, limit)
+    ).fetchall()])
+
+def _renew_claim(message_id: int, owner: str) -> bool:
+    """Restart the lease of a claimed message; False if `owner` no longer holds it"""
+    return write_transaction(lambda conn: conn.execute(
+        """
+        UPDATE outbox SET claimed_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = 'sending' AND claimed_by = ?
+        """,
+        (message_id, owner)
+    ).rowcount == 1)
+
+def _record_result(message_id: int, attempts: int, error: Optional[TransportError], max_attempts: int):
+    """Store the outcome of one send; failed sends are rescheduled with exponential backoff"""
+    if error is None:
+        sql = """
+            UPDATE outbox SET status = 'sent', attempts = ?, last_error = NULL, sent_at = CURRENT_TIMESTAMP,
+                              claimed_by = NULL, claimed_at = NULL
+            WHERE id = ?
+        """
+        params = (attempts, message_id)
+    elif not error.retryable or attempts >= max_attempts:
+        sql = """
+            UPDATE outbox SET status = 'failed', attempts = ?, last_error = ?, claimed_by = NULL, claimed_at = NULL
+            WHERE id = ?
+        """
+        params = (attempts, str(error), message_id)
+    else:
+        delay = RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+        sql = """
+            UPDATE outbox SET status = 'queued', attempts = ?, last_error = ?,
+                              next_attempt_at = datetime('now', ?), claimed_by = NULL, claimed_at = NULL
+            WHERE id = ?
+        """
+        params = (attempts, str(error), f"+{delay} seconds", message_id)
+    write_transaction(lambda conn: conn.execute(sql, params))
+
+def _seconds_until_next_due() -> Optional[float]:
+    """Seconds until the next queued message is due, or None if the queue is empty"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT MAX(0, (julianday(MIN(next_attempt_at)) - julianday('now')) * 86400)
+        FROM outbox WHERE status = 'queued'
+        """
+    )
+    row = cursor.fetchone()
+    conn.close()
+    return row[0]
+
+async def dispatch_outbox(transport: WhatsAppTransport, rate_per_minute: float = DEFAULT_RATE_PER_MINUTE,
+                          max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                          max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                          stop_event: Optional[threading.Event] = None) -> Dict[str, int]:
+    """
+    Send queued messages until the queue is empty (retries included) or `stop_event` is set
+    Sends run concurrently up to `max_concurrency` (capped by the transport) and start no
+    faster than `rate_per_minute`. Returns counts of sent and failed messages.
+    """
+    # Several dispatchers (one per app process) can share the outbox: each claims its own
+    # messages, and only takes back sends whose dispatcher stopped or whose lease ran out
+    owner = _new_owner()
+    _active_owners.add(owner)
+    try:
+        return await _dispatch(transport, owner, rate_per_minute, max_concurrency, max_attempts, stop_event)
+    finally:
+        _active_owners.discard(owner)
+
+async def _dispatch(transport: WhatsAppTransport, owner: str, rate_per_minute: float, max_concurrency: int,
+                    max_attempts: int, stop_event: Optional[threading.Event]) -> Dict[str, int]:
+    """dispatch_outbox for one claim owner"""
+
+    if transport.max_concurrency:
+        max_concurrency = min(max_concurrency, transport.max_concurrency)
+    max_concurrency = max(max_concurrency, 1)
+    limiter = RateLimiter(rate_per_minute, burst=max_concurrency)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    summary = {'sent': 0, 'failed': 0}
+
+    async def send_one(message: Dict):
+        async with semaphore:
+            await limiter.acquire()
+            # The claim may have waited a while for its turn; never send one we no longer hold
+            if not _renew_claim(message['id'], owner):
+                return
+            attempts = message['attempts'] + 1
+            error = None
+            try:
+                await transport.send(message['mobile_number'], message['message'])
+            except TransportError as e:
+                error = e
+            except Exception as e:
+                error = TransportError(str(e))
+            _record_result(message['id'], attempts, error, max_attempts)
+            if error is None:
+                summary['sent'] += 1
+            elif not error.retryable or attempts >= max_attempts:
+                summary['failed'] += 1
+
+    while not (stop_event and stop_event.is_set()):
+        _reclaim_abandoned()
+        batch = _claim_batch(max_concurrency * 4, owner)
+        if batch:
+            await asyncio.gather(*(send_one(message) for message in batch))
+            continue
+        # Nothing due right now: wait for the next retry, or finish if the queue is empty
+        wait = _seconds_until_next_due()
+        if wait is None:
+            break
+        await asyncio.sleep(min(max(wait, 0.5), 5.0))
+
+    return summary
+
+class OutboxWorker:
+    """Runs dispatch_outbox on its own event loop in a background thread"""
+
+    def __init__(self, transport: WhatsAppTransport, **options):
+        self.transport = transport
+        self.options = options
+        self.summary = None
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+
+    def _run(self):
+        try:
+            self.summary = asyncio.run(dispatch_outbox(self.transport, stop_event=self._stop, **self.options))
+        except sqlite3.Error as e:
+            self.error = str(e)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_running(self) -> bool:
+        return self._thread.is_alive()
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def start_dispatcher(transport: WhatsAppTransport, **options) -> Tuple[bool, str]:
+    """
+    Start the background dispatcher unless one is already running
+    Returns: (success: bool, message: str)
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is not None and _worker.is_running():
+            return False, "The dispatcher is already sending"
+        _worker = OutboxWorker(transport, **options)
+        _worker.start()
+    return True, f"Sending started ({transport.name})"
+
+def stop_dispatcher():
+    """Ask the background dispatcher to stop after its current batch"""
+    if _worker is not None:
+        _worker.stop()
+
+def is_dispatcher_running() -> bool:
+    """Check whether the background dispatcher is sending"""
+    return _worker is not None and _worker.is_running()
@@ -0,0 +1,230 @@
+"""
+Pricing utility module for SmartDairy
+Implements volume-slab (tiered) pricing for bulk customers such as hotels and sweet shops
+"""
+
+import json
+import sqlite3
+import numpy as np
+from typing import List, Dict, Optional, Sequence, Tuple
+from utils.db import get_db_connection, write_transaction
+
+class SlabTable:
+    """
+    Flattened slab definitions for many customers
+
+    One row per slab, sorted by customer and slab order. `lower`/`upper` are the
+    litre bounds of the slab (`upper` is inf for the open-ended last slab).
+    """
+
+    def __init__(self, customer_ids, lower, upper, rates):
+        self.customer_ids = np.asarray(customer_ids, dtype=np.int64)
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.rates = np.asarray(rates, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.customer_ids)
+
+    @classmethod
+    def empty(cls) -> "SlabTable":
+        return cls([], [], [], [])
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Tuple[int, Optional[float], float]]) -> "SlabTable":
+        """
+        Build from (customer_id, upto_litres, rate) rows ordered by customer and slab order
+        A NULL/None upto_litres marks the open-ended last slab
+        """
+        if not rows:
+            return cls.empty()
+
+        customer_ids = np.array([r[0] for r in rows], dtype=np.int64)
+        upper = np.array([np.inf if r[1] is None else r[1] for r in rows], dtype=np.float64)
+        rates = np.array([r[2] for r in rows], dtype=np.float64)
+
+        # The last slab of a chart is always open-ended: litres above its limit (charts
+        # saved before limits on it were refused) are billed at its rate, never for free
+        last_of_customer = np.ones(len(rows), dtype=bool)
+        last_of_customer[:-1] = customer_ids[1:] != customer_ids[:-1]
+        upper[last_of_customer] = np.inf
+
+        # Lower bound is the previous slab's upper bound within the same customer
+        lower = np.zeros_like(upper)
+        lower[1:] = upper[:-1]
+        first_of_customer = np.ones(len(rows), dtype=bool)
+        first_of_customer[1:] = customer_ids[1:] != customer_ids[:-1]
+        lower[first_of_customer] = 0.0
+
+        return cls(customer_ids, lower, upper, rates)
+
+def validate_slabs(slabs: List[Tuple[Optional[float], float]]) -> Optional[str]:
+    """
+    Validate a slab chart given as [(upto_litres, rate), ...]
+    Limits must increase and the last slab must be open-ended (None), so every litre is priced
+    Returns an error message, or None if the chart is valid
+    """
+    if not slabs:
+        return "At least one slab is required"
+
+    previous_upto = 0.0
+    for i, (upto, rate) in enumerate(slabs):
+        if rate is None or rate < 0:
+            return f"Slab {i + 1}: rate must be zero or positive"
+        is_last = i == len(slabs) - 1
+        if upto is None:
+            if not is_last:
+                return f"Slab {i + 1}: only the last slab can be open-ended"
+            continue
+        if is_last:
+            return f"Slab {i + 1}: the last slab must be open-ended (leave 'Upto Litres' empty)"
+        if upto <= previous_upto:
+            return f"Slab {i + 1}: limits must be increasing"
+        previous_upto = upto
+
+    return None
+
+def set_customer_slabs(customer_id: int, slabs: List[Tuple[Optional[float], float]]) -> Tuple[bool, str]:
+    """
+    Replace the slab chart of a customer
+    `slabs` is [(upto_litres, rate), ...]; use None as upto_litres for the last slab
+    Pass an empty list to go back to the flat price_per_ltr
+    """
+    if slabs:
+        error = validate_slabs(slabs)
+        if error:
+            return False, error
+
+    def replace(conn):
+        conn.execute("DELETE FROM price_slabs WHERE customer_id = ?", (customer_id,))
+        conn.executemany(
+            "INSERT INTO price_slabs (customer_id, slab_order, upto_litres, rate) VALUES (?, ?, ?, ?)",
+            [(customer_id, i, upto, rate) for i, (upto, rate) in enumerate(slabs)]
+        )
+
+    try:
+        write_transaction(replace)
+    except sqlite3.IntegrityError:
+        return False, "Customer not found"
+    except sqlite3.Error as e:
+        return False, f"Saving slab pricing failed: {e}"
+    return True, "Slab pricing saved" if slabs else "Slab pricing removed"
+
+def get_customer_slabs(customer_id: int) -> List[Dict]:
+    """Get the slab chart of a customer as a list of dicts"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT upto_litres, rate FROM price_slabs WHERE customer_id = ? ORDER BY slab_order",
+        (customer_id,)
+    )
+    slabs = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return slabs
+
+def load_slab_table(customer_ids: Optional[Sequence[int]] = None) -> SlabTable:
+    """Load slab charts for all customers (or only the given ones, filtered in SQL) in one query"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if customer_ids is None:
+        cursor.execute(
+            "SELECT customer_id, upto_litres, rate FROM price_slabs ORDER BY customer_id, slab_order"
+        )
+    else:
+        cursor.execute(
+            """
+            SELECT customer_id, upto_litres, rate FROM price_slabs
+            WHERE customer_id IN (SELECT value FROM json_each(?))
+            ORDER BY customer_id, slab_order
+            """,
+            (json.dumps([int(c) for c in customer_ids]),)
+        )
+    rows = cursor.fetchall()
+    conn.close()
+
+    return SlabTable.from_rows([tuple(r) for r in rows])
+
+def price_litres(customer_ids, litres, flat_rates, slabs: Optional[SlabTable] = None):
+    """
+    Price litre totals for many rows in one vectorized pass
+
+    `customer_ids`, `litres` and `flat_rates` are parallel arrays (a customer may
+    appear more than once, e.g. once per month). Rows whose customer has a slab
+    chart are priced per slab; everything else is litres * flat rate.
+
+    Returns (amounts, breakdown) where breakdown is a dict of parallel arrays
+    (row, lower, upper, litres, rate, amount), one entry per slab touched.
+    """
+    customer_ids = np.asarray(customer_ids, dtype=np.int64)
+    litres = np.asarray(litres, dtype=np.float64)
+    flat_rates = np.asarray(flat_rates, dtype=np.float64)
+
+    amounts = litres * flat_rates
+    empty = np.array([], dtype=np.float64)
+    breakdown = {
+        'row': np.array([], dtype=np.int64), 'lower': empty, 'upper': empty,
+        'litres': empty, 'rate': empty, 'amount': empty
+    }
+
+    if slabs is None or len(slabs) == 0 or len(customer_ids) == 0:
+        return amounts, breakdown
+
+    # Join slab rows to input rows: sort inputs by customer and find each slab's matching range
+    order = np.argsort(customer_ids, kind='stable')
+    sorted_ids = customer_ids[order]
+    starts = np.searchsorted(sorted_ids, slabs.customer_ids, side='left')
+    ends = np.searchsorted(sorted_ids, slabs.customer_ids, side='right')
+    counts = ends - starts
+    if counts.sum() == 0:
+        return amounts, breakdown
+
+    slab_idx = np.repeat(np.arange(len(slabs)), counts)
+    # Position within each slab's range: global arange minus the range offset
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    rows = order[np.repeat(starts, counts) + (np.arange(counts.sum()) - offsets)]
+
+    lower = slabs.lower[slab_idx]
+    upper = slabs.upper[slab_idx]
+    rates = slabs.rates[slab_idx]
+    slab_litres = np.clip(litres[rows] - lower, 0.0, upper - lower)
+    slab_amounts = slab_litres * rates
+
+    slab_priced = np.zeros(len(customer_ids), dtype=bool)
+    slab_priced[rows] = True
+    totals = np.bincount(rows, weights=slab_amounts, minlength=len(customer_ids))
+    amounts[slab_priced] = totals[slab_priced]
+
+    # Only report slabs that actually carry litres
+    used = slab_litres > 0
+    breakdown = {
+        'row': rows[used], 'lower': lower[used], 'upper': upper[used],
+        'litres': slab_litres[used], 'rate': rates[used], 'amount': slab_amounts[used]
+    }
+    return amounts, breakdown
+
+def breakdown_by_row(breakdown: Dict, n_rows: int) -> List[List[Dict]]:
+    """Split a breakdown from price_litres into a list of slab dicts per input row"""
+    per_row = [[] for _ in range(n_rows)]
+    for row, lower, upper, qty, rate, amount in zip(
+        breakdown['row'].tolist(), breakdown['lower'].tolist(), breakdown['upper'].tolist(),
+        breakdown['litres'].tolist(), breakdown['rate'].tolist(), breakdown['amount'].tolist()
+    ):
+        per_row[row].append({
+            'from_litres': lower,
+            'upto_litres': None if upper == float('inf') else upper,
+            'litres': qty,
+            'rate': rate,
+            'amount': amount
+        })
+    return per_row
+
+def format_slab_breakdown(slab_breakdown: List[Dict]) -> str:
+    """Format a customer's slab breakdown as a single line, e.g. for CSV cells"""
+    parts = []
+    for slab in slab_breakdown:
+        if slab['upto_litres'] is None:
+            label = f"{slab['from_litres']:g}+ L"
+        else:
+            label = f"{slab['from_litres']:g}-{slab['upto_litres']:g} L"
+        parts.append(f"{label}: {slab['litres']:.2f} L @ ₹{slab['rate']:.2f} = ₹{slab['amount']:.2f}")
+    return "; ".join(parts)
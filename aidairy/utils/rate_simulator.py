@@ -0,0 +1,157 @@
+"""
+Rate simulator module for SmartDairy
+"What-if" pricing: re-prices the last N months of deliveries under a proposed rate
+change and reports the revenue impact per customer and per month. The monthly litres
+are loaded once into a SimulationBase; each proposal only re-runs price_litres
+over those arrays, so trying different rates never goes back to the database
+"""
+
+import json
+import numpy as np
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+from utils.db import get_db_connection
+from utils.pricing import SlabTable, load_slab_table, price_litres, validate_slabs
+from utils.statements import month_span
+
+CHANGE_TYPES = ['percent', 'flat', 'rate', 'slabs']
+
+class SimulationBase:
+    """
+    Monthly litres of every customer over a span of months, ready for re-pricing
+    One row per (customer, month) with deliveries: row_customer indexes ids/names/rates,
+    row_month indexes months. base_amounts are the rows priced at current rates.
+    """
+
+    def __init__(self, months: List[str], ids, names: List[str], rates, slabs: SlabTable,
+                 row_customer, row_month, row_litres):
+        self.months = months
+        self.ids = ids
+        self.names = names
+        self.rates = rates
+        self.slabs = slabs
+        self.row_customer = row_customer
+        self.row_month = row_month
+        self.row_litres = row_litres
+        self.base_amounts, _ = price_litres(ids[row_customer], row_litres, rates[row_customer], slabs)
+
+    @property
+    def slab_customers(self) -> np.ndarray:
+        """Ids of customers currently on a slab chart"""
+        return np.unique(self.slabs.customer_ids)
+
+def load_simulation_base(months_back: int = 12, as_of: Optional[date] = None) -> SimulationBase:
+    """Load the last `months_back` months (up to and including as_of's month) from the monthly rollup"""
+    as_of = as_of or date.today()
+    last = as_of.year * 12 + as_of.month - 1
+    first = last - months_back + 1
+    months = month_span(first // 12, first % 12 + 1, as_of.year, as_of.month)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(
+        """
+        SELECT cm.customer_id,
+               CAST(substr(cm.month, 1, 4) AS INTEGER) * 12 + CAST(substr(cm.month, 6, 2) AS INTEGER) - 1 - :first,
+               cm.litres
+        FROM customer_monthly cm
+        JOIN customers c ON c.id = cm.customer_id
+        WHERE cm.month BETWEEN :first_month AND :last_month
+        """,
+        {'first': first, 'first_month': months[0], 'last_month': months[-1]}
+    )
+    rows = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 3)
+    ids, row_customer = np.unique(rows[:, 0].astype(np.int64), return_inverse=True)
+    cursor.execute(
+        "SELECT id, name, price_per_ltr FROM customers WHERE id IN (SELECT value FROM json_each(?)) ORDER BY id",
+        (json.dumps(ids.tolist()),)
+    )
+    customers = cursor.fetchall()
+    conn.close()
+
+    return SimulationBase(
+        months, ids, [c[1] for c in customers],
+        np.array([c[2] for c in customers], dtype=np.float64),
+        load_slab_table(ids.tolist()),
+        row_customer.astype(np.int64), rows[:, 1].astype(np.int64), rows[:, 2]
+    )
+
+def _proposed_pricing(base: SimulationBase, change_type: str, value: float = 0.0,
+                      slabs: Optional[List[Tuple[Optional[float], float]]] = None,
+                      customer_ids: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, SlabTable]:
+    """Flat rates and slab table after applying a change to the chosen customers (all when None)"""
+    in_scope = np.ones(len(base.ids), dtype=bool) if customer_ids is None else np.isin(base.ids, list(customer_ids))
+    slab_in_scope = np.isin(base.slabs.customer_ids, base.ids[in_scope])
+    rates = base.rates.copy()
+    slab_rates = base.slabs.rates.copy()
+
+    if change_type == 'percent':
+        rates[in_scope] *= 1 + value / 100
+        slab_rates[slab_in_scope] *= 1 + value / 100
+    elif change_type == 'flat':
+        rates[in_scope] += value
+        slab_rates[slab_in_scope] += value
+    elif change_type == 'rate':
+        # A new flat rate replaces any slab chart of the customers it applies to
+        rates[in_scope] = value
+        keep = ~slab_in_scope
+        return rates, SlabTable(base.slabs.customer_ids[keep], base.slabs.lower[keep],
+                                base.slabs.upper[keep], base.slabs.rates[keep])
+    elif change_type == 'slabs':
+        # The chart replaces the current pricing of every customer in scope
+        chart = SlabTable.from_rows([(0, upto, rate) for upto, rate in slabs])
+        keep = ~slab_in_scope
+        scoped_ids = base.ids[in_scope]
+        return rates, SlabTable(
+            np.concatenate([base.slabs.customer_ids[keep], np.repeat(scoped_ids, len(chart))]),
+            np.concatenate([base.slabs.lower[keep], np.tile(chart.lower, len(scoped_ids))]),
+            np.concatenate([base.slabs.upper[keep], np.tile(chart.upper, len(scoped_ids))]),
+            np.concatenate([base.slabs.rates[keep], np.tile(chart.rates, len(scoped_ids))])
+        )
+
+    return rates, SlabTable(base.slabs.customer_ids, base.slabs.lower, base.slabs.upper, slab_rates)
+
+def simulate_rate_change(base: SimulationBase, change_type: str, value: float = 0.0,
+                         slabs: Optional[List[Tuple[Optional[float], float]]] = None,
+                         customer_ids: Optional[Sequence[int]] = None) -> Dict:
+    """
+    Re-price the base under a proposed change
+    change_type is one of CHANGE_TYPES:
+      'percent' - rates (flat and slab) change by `value` percent
+      'flat'    - rates (flat and slab) change by `value` ₹ per litre
+      'rate'    - a new flat rate of `value` ₹ per litre, replacing slab charts
+      'slabs'   - the slab chart `slabs` [(upto_litres, rate), ...]
+    customer_ids limits the change to a segment; everyone else keeps their pricing.
+    Returns per-customer arrays (base, proposed, delta) and per-month totals (aligned with base.months).
+    """
+    if change_type not in CHANGE_TYPES:
+        raise ValueError(f"Unknown change type: {change_type}")
+    if change_type == 'slabs':
+        error = validate_slabs(slabs or [])
+        if error:
+            raise ValueError(error)
+
+    rates, slab_table = _proposed_pricing(base, change_type, value, slabs, customer_ids)
+    proposed_amounts, _ = price_litres(
+        base.ids[base.row_customer], base.row_litres, rates[base.row_customer], slab_table
+    )
+
+    n_customers, n_months = len(base.ids), len(base.months)
+    customer_base = np.bincount(base.row_customer, weights=base.base_amounts, minlength=n_customers)
+    customer_proposed = np.bincount(base.row_customer, weights=proposed_amounts, minlength=n_customers)
+    month_base = np.bincount(base.row_month, weights=base.base_amounts, minlength=n_months)
+    month_proposed = np.bincount(base.row_month, weights=proposed_amounts, minlength=n_months)
+
+    return {
+        'customer_base': customer_base,
+        'customer_proposed': customer_proposed,
+        'customer_delta': customer_proposed - customer_base,
+        'month_base': month_base,
+        'month_proposed': month_proposed,
+        'month_delta': month_proposed - month_base,
+        'total_base': float(customer_base.sum()),
+        'total_proposed': float(customer_proposed.sum()),
+        'total_delta': float(customer_proposed.sum() - customer_base.sum()),
+        'customers_affected': int(np.count_nonzero(np.abs(customer_proposed - customer_base) > 0.005))
+    }
@@ -0,0 +1,340 @@
+"""
+Reconciliation utility module for SmartDairy
+Imports bank/UPI statement CSVs and matches credits to customers and open invoices
+Matching order: mobile-number hash join, exact outstanding-amount hash join, then a
+character trigram index over customer names for fuzzy matches
+"""
+
+import re
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Optional, Tuple
+from utils.db import get_db_connection, write_transaction
+
+# Accepted statement column names (lower-cased) for each field
+DATE_COLUMNS = ['date', 'txn date', 'transaction date', 'value date', 'posting date']
+DESCRIPTION_COLUMNS = ['description', 'narration', 'remarks', 'particulars', 'details']
+AMOUNT_COLUMNS = ['amount', 'credit', 'credit amount', 'deposit', 'deposit amount', 'cr amount']
+REFERENCE_COLUMNS = ['reference', 'ref no', 'ref no.', 'utr', 'chq/ref no', 'chq./ref.no.', 'transaction id']
+
+MOBILE_PATTERN = re.compile(r'(?<!\d)(?:\+?91[\s-]?)?([6-9]\d{9})(?!\d)')
+NON_LETTERS = re.compile(r'[^a-z]+')
+
+NAME_MATCH_THRESHOLD = 0.6
+# Best name score must beat the runner-up by this much, otherwise the name is ambiguous
+NAME_MATCH_MARGIN = 0.1
+# Trigrams shared by more than this share of customers are not used to find candidates
+STOP_GRAM_SHARE = 0.01
+
+def parse_statement(file) -> pd.DataFrame:
+    """
+    Parse a bank/UPI statement CSV into date, description, amount, reference columns
+    Only credits (money received) are kept. A credit whose date can't be read keeps
+    date None; it is shown for review but never recorded.
+    """
+    raw = pd.read_csv(file, dtype=str, keep_default_na=False)
+    columns = {c.strip().lower(): c for c in raw.columns}
+
+    def pick(candidates: List[str], required: bool = True) -> Optional[str]:
+        for name in candidates:
+            if name in columns:
+                return columns[name]
+        if required:
+            raise ValueError(f"Statement needs one of these columns: {', '.join(candidates)}")
+        return None
+
+    date_col = pick(DATE_COLUMNS)
+    description_col = pick(DESCRIPTION_COLUMNS)
+    amount_col = pick(AMOUNT_COLUMNS)
+    reference_col = pick(REFERENCE_COLUMNS, required=False)
+
+    amounts = pd.to_numeric(
+        raw[amount_col].str.replace(r'[^\d.\-]', '', regex=True), errors='coerce'
+    )
+    statement = pd.DataFrame({
+        'line_no': np.arange(1, len(raw) + 1),
+        'date': pd.to_datetime(raw[date_col], errors='coerce', dayfirst=True).dt.strftime('%Y-%m-%d')
+                  .astype(object).where(lambda dates: dates.notna(), None),
+        'description': raw[description_col].astype(str),
+        'amount': amounts.round(2),
+        'reference': raw[reference_col].str.strip() if reference_col else ''
+    })
+    return statement[statement['amount'] > 0].reset_index(drop=True)
+
+def normalize_mobile(mobile: Optional[str]) -> Optional[str]:
+    """Last 10 digits of a mobile number, or None"""
+    if not mobile:
+        return None
+    digits = ''.join(c for c in str(mobile) if c.isdigit())
+    return digits[-10:] if len(digits) >= 10 else None
+
+def name_trigrams(text: str) -> set:
+    """Character trigrams of each word, padded so word starts and ends count"""
+    grams = set()
+    for word in NON_LETTERS.sub(' ', text.lower()).split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+class CustomerMatchIndex:
+    """
+    In-memory match structures over the customer list
+    - mobile hash map (last 10 digits -> customer row)
+    - outstanding amount hash map (paise -> customer rows)
+    - trigram inverted index over names with idf weights; each name's trigram ids are
+      also kept in CSR form (flat ids + offsets) so candidates can be scored in bulk
+    """
+
+    def __init__(self, customers: List[Dict], balances: Optional[Dict[int, float]] = None):
+        self.customer_ids = np.array([c['id'] for c in customers], dtype=np.int64)
+        self.names = [c['name'] for c in customers]
+        balances = balances or {}
+
+        self.by_mobile = {}
+        for row, customer in enumerate(customers):
+            mobile = normalize_mobile(customer.get('mobile_number'))
+            if mobile:
+                self.by_mobile.setdefault(mobile, row)
+
+        self.by_amount = {}
+        for row, customer_id in enumerate(self.customer_ids.tolist()):
+            balance = balances.get(customer_id, 0.0)
+            if balance > 0:
+                self.by_amount.setdefault(int(round(balance * 100)), []).append(row)
+
+        # Trigram vocabulary and each name's trigram ids (CSR)
+        self.vocabulary = {}
+        gram_ids = []
+        offsets = [0]
+        for name in self.names:
+            for gram in name_trigrams(name):
+                gram_ids.append(self.vocabulary.setdefault(gram, len(self.vocabulary)))
+            offsets.append(len(gram_ids))
+        self.row_gram_ids = np.array(gram_ids, dtype=np.int64)
+        self.row_offsets = np.array(offsets, dtype=np.int64)
+        row_of_gram = np.repeat(np.arange(len(self.names)), np.diff(self.row_offsets))
+
+        n = max(len(customers), 1)
+        document_frequency = np.bincount(self.row_gram_ids, minlength=len(self.vocabulary))
+        self.idf = np.log(1 + n / np.maximum(document_frequency, 1))
+        self.name_weight = np.bincount(
+            row_of_gram, weights=self.idf[self.row_gram_ids], minlength=len(self.names)
+        )
+
+        # Postings for candidate generation; very common trigrams are skipped here
+        # (they still count when scoring the candidates)
+        stop_limit = max(int(n * STOP_GRAM_SHARE), 50)
+        order = np.argsort(self.row_gram_ids, kind='stable')
+        sorted_grams = self.row_gram_ids[order]
+        bounds = np.searchsorted(sorted_grams, np.arange(len(self.vocabulary) + 1))
+        self.postings = {}
+        for gram_id in np.flatnonzero(document_frequency <= stop_limit).tolist():
+            self.postings[gram_id] = row_of_gram[order[bounds[gram_id]:bounds[gram_id + 1]]]
+
+    def match_name(self, text: str) -> Tuple[Optional[int], float, float]:
+        """
+        Best customer row for a free-text description, its score in [0, 1] and the
+        runner-up's score (to spot ambiguous names)
+        Score is the idf-weighted share of the name's trigrams found in the text
+        """
+        text_ids = np.array(
+            [self.vocabulary[g] for g in name_trigrams(text) if g in self.vocabulary], dtype=np.int64
+        )
+        rare_ids = [g for g in text_ids.tolist() if g in self.postings]
+        if not rare_ids:
+            return None, 0.0, 0.0
+
+        candidates = np.unique(np.concatenate([self.postings[g] for g in rare_ids]))
+
+        # Gather every candidate's trigram ids and sum the idf of those present in the text
+        starts = self.row_offsets[candidates]
+        lengths = self.row_offsets[candidates + 1] - starts
+        owner = np.repeat(np.arange(len(candidates)), lengths)
+        # Position within each candidate's slice: global arange minus the slice offset
+        offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        flat = self.row_gram_ids[np.repeat(starts, lengths) + (np.arange(lengths.sum()) - offsets)]
+        present = np.isin(flat, text_ids)
+        shared = np.bincount(owner, weights=self.idf[flat] * present, minlength=len(candidates))
+        scores = shared / np.maximum(self.name_weight[candidates], 1e-9)
+
+        if len(scores) == 1:
+            return int(candidates[0]), float(scores[0]), 0.0
+        top_two = np.argpartition(-scores, 1)[:2]
+        best, runner_up = sorted(top_two.tolist(), key=lambda k: -scores[k])
+        return int(candidates[best]), float(scores[best]), float(scores[runner_up])
+
+def load_match_index() -> CustomerMatchIndex:
+    """Build the match index from all customers and their outstanding balances"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, name, mobile_number FROM customers ORDER BY id")
+    customers = [dict(row) for row in cursor.fetchall()]
+    cursor.execute("SELECT customer_id, balance FROM customer_balances WHERE balance > 0")
+    balances = {row[0]: row[1] for row in cursor.fetchall()}
+    conn.close()
+    return CustomerMatchIndex(customers, balances)
+
+def match_transactions(statement: pd.DataFrame, index: CustomerMatchIndex) -> pd.DataFrame:
+    """
+    Match statement credits to customers
+    Adds customer_id, customer_name, match_method and score columns (unmatched rows keep NaN ids)
+    """
+    n = len(statement)
+    rows = np.full(n, -1, dtype=np.int64)
+    methods = np.full(n, '', dtype=object)
+    scores = np.zeros(n, dtype=np.float64)
+
+    descriptions = statement['description'].tolist()
+    amounts_paise = np.round(statement['amount'].to_numpy(dtype=np.float64) * 100).astype(np.int64)
+
+    # 1. Mobile number hash join
+    for i, text in enumerate(descriptions):
+        for mobile in MOBILE_PATTERN.findall(text):
+            row = index.by_mobile.get(mobile)
+            if row is not None:
+                rows[i], methods[i], scores[i] = row, 'mobile', 1.0
+                break
+
+    # 2. Exact outstanding-amount hash join (unique amount, or confirmed by name)
+    # 3. Trigram name match for whatever is left
+    for i in np.flatnonzero(rows < 0).tolist():
+        name_row, name_score, runner_up = index.match_name(descriptions[i])
+        name_is_clear = name_score >= NAME_MATCH_THRESHOLD and name_score - runner_up >= NAME_MATCH_MARGIN
+        amount_rows = index.by_amount.get(int(amounts_paise[i]), [])
+        if name_row is not None and name_row in amount_rows and name_score >= NAME_MATCH_THRESHOLD / 2:
+            rows[i], methods[i], scores[i] = name_row, 'amount+name', max(name_score, 0.9)
+        elif len(amount_rows) == 1 and name_score < NAME_MATCH_THRESHOLD:
+            rows[i], methods[i], scores[i] = amount_rows[0], 'amount', 0.7
+        elif name_is_clear:
+            rows[i], methods[i], scores[i] = name_row, 'name', name_score
+
+    result = statement.copy()
+    result['customer_id'] = pd.array(
+        [int(index.customer_ids[r]) if r >= 0 else None for r in rows.tolist()], dtype='Int64'
+    )
+    result['customer_name'] = [index.names[r] if r >= 0 else '' for r in rows.tolist()]
+    result['match_method'] = methods
+    result['score'] = scores.round(2)
+    return result
+
+def propose_allocations(matches: pd.DataFrame) -> pd.DataFrame:
+    """
+    Propose how each matched credit settles the customer's open invoices (oldest first)
+    Open amounts are computed for all matched customers from one invoice query, applying
+    each customer's recorded payments to their oldest invoices first.
+    Adds allocations (list of {year, month, amount}), unallocated and duplicate columns.
+    A reference already recorded, or repeated earlier in the same statement, is a duplicate;
+    duplicates and undated lines are not allocated.
+    """
+    result = matches.copy()
+    customer_ids = sorted({int(c) for c in result['customer_id'].dropna().tolist()})
+
+    open_invoices = {}
+    existing_references = set()
+    if customer_ids:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        ids_json = json.dumps(customer_ids)
+        cursor.execute(
+            """
+            SELECT i.customer_id, i.year, i.month, i.total_amount
+            FROM invoices i
+            WHERE i.is_current = 1 AND i.customer_id IN (SELECT value FROM json_each(?))
+            ORDER BY i.customer_id, i.year, i.month
+            """,
+            (ids_json,)
+        )
+        invoices = cursor.fetchall()
+        cursor.execute(
+            "SELECT customer_id, paid FROM customer_balances WHERE customer_id IN (SELECT value FROM json_each(?))",
+            (ids_json,)
+        )
+        paid = {row[0]: row[1] for row in cursor.fetchall()}
+        references = [r for r in result['reference'].tolist() if r]
+        if references:
+            cursor.execute(
+                "SELECT reference FROM payments WHERE reference IN (SELECT value FROM json_each(?))",
+                (json.dumps(references),)
+            )
+            existing_references = {row[0] for row in cursor.fetchall()}
+        conn.close()
+
+        # Apply what each customer has already paid to their oldest invoices
+        credit = dict(paid)
+        for customer_id, year, month, amount in invoices:
+            settled = min(credit.get(customer_id, 0.0), amount)
+            credit[customer_id] = credit.get(customer_id, 0.0) - settled
+            if amount - settled > 0.005:
+                open_invoices.setdefault(customer_id, []).append([year, month, amount - settled])
+
+    references = result['reference'].fillna('')
+    duplicate = (references != '') & (references.isin(existing_references) | references.duplicated(keep='first'))
+    recordable = (~duplicate & result['date'].notna()).tolist()
+
+    allocations = []
+    unallocated = []
+    for customer_id, amount, allocate in zip(result['customer_id'].tolist(), result['amount'].tolist(), recordable):
+        lines = []
+        remaining = float(amount)
+        if pd.notna(customer_id) and allocate:
+            for invoice in open_invoices.get(int(customer_id), []):
+                if remaining <= 0.005:
+                    break
+                applied = min(remaining, invoice[2])
+                if applied > 0.005:
+                    lines.append({'year': invoice[0], 'month': invoice[1], 'amount': round(applied, 2)})
+                    invoice[2] -= applied
+                    remaining -= applied
+        allocations.append(lines)
+        unallocated.append(round(remaining, 2))
+
+    result['allocations'] = allocations
+    result['unallocated'] = unallocated
+    result['duplicate'] = duplicate.tolist()
+    return result
+
+def reconcile_statement(file) -> pd.DataFrame:
+    """Parse a statement, match it against customers and propose invoice allocations"""
+    statement = parse_statement(file)
+    return propose_allocations(match_transactions(statement, load_match_index()))
+
+def format_allocations(allocations: List[Dict]) -> str:
+    """Allocation list as text, e.g. '2026-08: ₹500.00; 2026-09: ₹250.00'"""
+    return "; ".join(f"{a['year']:04d}-{a['month']:02d}: ₹{a['amount']:.2f}" for a in allocations)
+
+def apply_reconciliation(proposals: pd.DataFrame, method: str = 'Bank Transfer') -> Tuple[bool, str]:
+    """
+    Record matched, dated, non-duplicate statement lines as payments in one transaction
+    References are checked again inside the transaction, so applying the same statement
+    twice (e.g. from two sessions) records each credit once.
+    Returns: (success: bool, message: str)
+    """
+    accepted = proposals[proposals['customer_id'].notna() & proposals['date'].notna() & ~proposals['duplicate']]
+    rows = [
+        (int(r.customer_id), r.date, float(r.amount), method, r.reference or None)
+        for r in accepted.itertuples(index=False)
+    ]
+
+    def record(conn):
+        references = [row[4] for row in rows if row[4]]
+        recorded_before = {r[0] for r in conn.execute(
+            "SELECT reference FROM payments WHERE reference IN (SELECT value FROM json_each(?))",
+            (json.dumps(references),)
+        )}
+        new_rows = [row for row in rows if not row[4] or row[4] not in recorded_before]
+        conn.executemany(
+            "INSERT INTO payments (customer_id, paid_on, amount, method, reference) VALUES (?, ?, ?, ?, ?)",
+            new_rows
+        )
+        return len(new_rows)
+
+    try:
+        recorded = write_transaction(record) if rows else 0
+    except sqlite3.IntegrityError:
+        return False, "A matched customer no longer exists; nothing was recorded"
+    except sqlite3.Error as e:
+        return False, f"Recording payments failed: {e}"
+    return True, (f"Recorded {recorded} payment(s); skipped {len(proposals) - recorded} "
+                  f"unmatched, undated or duplicate line(s)")
@@ -0,0 +1,213 @@
+"""
+Register utility module for SmartDairy
+Exports the monthly collection register: one row per customer, one column per day,
+with totals. Rows are built from a single ordered cursor pass and written straight
+to a streaming workbook or CSV, so memory stays flat however many customers there are
+"""
+
+import csv
+import json
+import calendar
+import numpy as np
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional
+from utils.db import get_db_connection, read_snapshot
+from utils.pricing import load_slab_table, price_litres
+
+REGISTER_CHUNK_SIZE = 2000  # customers priced together in one vectorized pass
+
+def _month_bounds(year: int, month: int):
+    """First and last date of a month"""
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+def _customer_filter(customer_ids: Optional[Iterable[int]], column: str, params: Dict) -> str:
+    """SQL condition limiting a register query to the given customers ('' for everyone)"""
+    if customer_ids is None:
+        return ""
+    params['ids'] = json.dumps([int(cid) for cid in customer_ids])
+    return f"{column} IN (SELECT value FROM json_each(:ids))"
+
+def iter_register_rows(start: date, end: date, chunk_size: int = REGISTER_CHUNK_SIZE,
+                       customer_ids: Optional[Iterable[int]] = None) -> Iterator[List[Dict]]:
+    """
+    Yield register rows in chunks, ordered by customer name
+    Every customer (or every one of customer_ids) is listed, including those without deliveries. Each row has
+    id, name, price_per_ltr, daily (quantity per day, shifts added, None when nothing was delivered),
+    deliveries (entries, so both shifts of a day count, as on bills), total_litres and total_amount
+    (flat or slab priced).
+    """
+    n_days = (end - start).days + 1
+    slabs = load_slab_table(None if customer_ids is None else list(customer_ids))
+
+    params = {'start': start.isoformat(), 'end': end.isoformat()}
+    customer_filter = _customer_filter(customer_ids, 'c.id', params)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    # customers.name is unique and indexed, and each customer's entries come off the
+    # (customer_id, entry_date) index, so the rows arrive in register order without a sort
+    cursor.execute(
+        f"""
+        SELECT c.id, c.name, c.price_per_ltr,
+               CAST(julianday(e.entry_date) - julianday(:start) AS INTEGER) AS day_index, e.quantity
+        FROM customers c
+        LEFT JOIN entries e
+               ON e.customer_id = c.id AND e.entry_date BETWEEN :start AND :end
+        {'WHERE ' + customer_filter if customer_filter else ''}
+        ORDER BY c.name, e.entry_date
+        """,
+        params
+    )
+
+    chunk = []
+    current = None
+    while True:
+        records = cursor.fetchmany(5000)
+        if not records:
+            break
+        for customer_id, name, price, day_index, quantity in records:
+            if current is None or current['id'] != customer_id:
+                if current is not None:
+                    chunk.append(current)
+                    if len(chunk) >= chunk_size:
+                        yield _price_chunk(chunk, slabs)
+                        chunk = []
+                current = {'id': customer_id, 'name': name, 'price_per_ltr': price, 'daily': [None] * n_days,
+                           'deliveries': 0}
+            if day_index is not None:
+                current['deliveries'] += 1
+                daily = current['daily']
+                daily[day_index] = quantity if daily[day_index] is None else daily[day_index] + quantity
+    conn.close()
+
+    if current is not None:
+        chunk.append(current)
+    if chunk:
+        yield _price_chunk(chunk, slabs)
+
+def _price_chunk(chunk: List[Dict], slabs) -> List[Dict]:
+    """Fill total litres and amounts of a chunk of register rows"""
+    for row in chunk:
+        row['total_litres'] = round(sum(q for q in row['daily'] if q is not None), 3)
+
+    amounts, _ = price_litres(
+        np.array([r['id'] for r in chunk], dtype=np.int64),
+        np.array([r['total_litres'] for r in chunk], dtype=np.float64),
+        np.array([r['price_per_ltr'] for r in chunk], dtype=np.float64),
+        slabs
+    )
+    for row, amount in zip(chunk, amounts.tolist()):
+        row['total_amount'] = amount
+    return chunk
+
+def get_day_totals(start: date, end: date, customer_ids: Optional[Iterable[int]] = None) -> np.ndarray:
+    """Litres delivered per day of the range (one pass over the date index)"""
+    n_days = (end - start).days + 1
+    params = {'start': start.isoformat(), 'end': end.isoformat()}
+    customer_filter = _customer_filter(customer_ids, 'customer_id', params)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT CAST(julianday(entry_date) - julianday(:start) AS INTEGER), SUM(quantity)
+        FROM entries
+        WHERE entry_date BETWEEN :start AND :end{' AND ' + customer_filter if customer_filter else ''}
+        GROUP BY entry_date
+        """,
+        params
+    )
+    totals = np.zeros(n_days)
+    for day_index, litres in cursor.fetchall():
+        totals[day_index] = litres
+    conn.close()
+    return totals
+
+def _register_header(start: date, end: date) -> List[str]:
+    """Column titles: customer, one column per day, totals"""
+    days = [(start + timedelta(days=i)).strftime('%d') for i in range((end - start).days + 1)]
+    return ['Customer Name', 'Rate/Litre (₹)'] + days + ['Deliveries', 'Total Litres', 'Total Amount (₹)']
+
+def generate_register_csv(year: int, month: int, output_path: str = "register.csv",
+                          customer_ids: Optional[Iterable[int]] = None):
+    """Generate the monthly register as CSV, for everyone or the given customers"""
+    start, end = _month_bounds(year, month)
+    grand = {'deliveries': 0, 'litres': 0.0, 'amount': 0.0}
+
+    # One snapshot for the rows and the day totals, so the TOTAL row always adds up
+    with open(output_path, 'w', newline='', encoding='utf-8') as f, read_snapshot():
+        writer = csv.writer(f)
+        writer.writerow(_register_header(start, end))
+        for chunk in iter_register_rows(start, end, customer_ids=customer_ids):
+            for row in chunk:
+                writer.writerow(
+                    [row['name'], f"{row['price_per_ltr']:.2f}"]
+                    + ['' if q is None else f"{q:g}" for q in row['daily']]
+                    + [row['deliveries'], f"{row['total_litres']:.2f}", f"{row['total_amount']:.2f}"]
+                )
+                _add_to_totals(row, grand)
+        writer.writerow(
+            ['TOTAL', ''] + [f"{q:g}" for q in np.round(get_day_totals(start, end, customer_ids), 3)]
+            + [grand['deliveries'], f"{grand['litres']:.2f}", f"{grand['amount']:.2f}"]
+        )
+    return output_path
+
+def generate_register_excel(year: int, month: int, output_path: str = "register.xlsx",
+                            customer_ids: Optional[Iterable[int]] = None):
+    """Generate the monthly register as an Excel workbook (write-only, rows streamed to disk)"""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.utils import get_column_letter
+
+    start, end = _month_bounds(year, month)
+    n_days = (end - start).days + 1
+    grand = {'deliveries': 0, 'litres': 0.0, 'amount': 0.0}
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(title=start.strftime('%B %Y'))
+    worksheet.freeze_panes = 'C2'
+    worksheet.column_dimensions['A'].width = 28
+    worksheet.column_dimensions['B'].width = 14
+    for col in range(3, 3 + n_days):
+        worksheet.column_dimensions[get_column_letter(col)].width = 6
+    for col in range(3 + n_days, 6 + n_days):
+        worksheet.column_dimensions[get_column_letter(col)].width = 16
+
+    header_fill = PatternFill(start_color="2E86AB", end_color="2E86AB", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    header = []
+    for title in _register_header(start, end):
+        cell = WriteOnlyCell(worksheet, value=title)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal='center')
+        header.append(cell)
+    worksheet.append(header)
+
+    with read_snapshot():
+        for chunk in iter_register_rows(start, end, customer_ids=customer_ids):
+            for row in chunk:
+                worksheet.append(
+                    [row['name'], row['price_per_ltr']] + row['daily']
+                    + [row['deliveries'], round(row['total_litres'], 2), round(row['total_amount'], 2)]
+                )
+                _add_to_totals(row, grand)
+        day_totals = get_day_totals(start, end, customer_ids)
+
+    total_font = Font(bold=True)
+    total_row = (['TOTAL', None] + np.round(day_totals, 3).tolist()
+                 + [grand['deliveries'], round(grand['litres'], 2), round(grand['amount'], 2)])
+    cells = []
+    for value in total_row:
+        cell = WriteOnlyCell(worksheet, value=value)
+        cell.font = total_font
+        cells.append(cell)
+    worksheet.append(cells)
+
+    workbook.save(output_path)
+    return output_path
+
+def _add_to_totals(row: Dict, grand: Dict):
+    """Accumulate a register row into the grand totals"""
+    grand['deliveries'] += row['deliveries']
+    grand['litres'] += row['total_litres']
+    grand['amount'] += row['total_amount']
@@ -0,0 +1,197 @@
+"""
+Route sheet utility module for SmartDairy
+Printable delivery sheets, one per route, listing each customer with the quantity to
+deliver (their subscription, else the moving-average forecast) and a blank column for
+the actual quantity. Rosters come from the 'route' segments in one query, forecasts for
+every customer from one vectorized pass; each route is written as a multi-page PDF and
+a CSV, rendered in parallel by a process pool
+"""
+
+import os
+import csv
+import json
+import numpy as np
+from xml.sax.saxutils import escape
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.enums import TA_CENTER
+from utils.db import get_db_connection
+from utils.forecasting import forecast_all
+
+ROUTE_SHEET_BATCH_SIZE = 10  # routes rendered per worker task
+ROUTE_SHEET_WINDOW = 7  # days averaged for customers without a subscription
+ROUTE_SHEET_COLUMNS = ['#', 'Customer', 'Mobile', 'Expected (L)', 'Basis', 'Actual (L)']
+BASIS_LABELS = {'subscription': 'Subscription', 'forecast': 'Forecast', 'none': 'No history'}
+
+def expected_quantities(customer_ids: np.ndarray, subscription: np.ndarray, delivery_date: date,
+                        shift: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantity each customer is expected to take on delivery_date, and its basis
+    Subscribers get their subscription (NaN = none); everyone else the forecast from
+    entries up to the day before, all computed in a single pass. Customers with
+    neither get 0 and basis 'none'. With a shift, the forecast covers only that shift.
+    """
+    predicted = np.zeros(len(customer_ids))
+    has_forecast = np.zeros(len(customer_ids), dtype=bool)
+    forecast_ids = np.unique(customer_ids[np.isnan(subscription)])
+    if len(forecast_ids):
+        forecast = forecast_all(ROUTE_SHEET_WINDOW, delivery_date - timedelta(days=1), forecast_ids.tolist(), shift=shift)
+        if len(forecast['ids']):
+            position = np.minimum(np.searchsorted(forecast['ids'], customer_ids), len(forecast['ids']) - 1)
+            has_forecast = forecast['ids'][position] == customer_ids
+            predicted = np.where(has_forecast, forecast['predicted'][position], 0.0)
+
+    subscribed = ~np.isnan(subscription)
+    expected = np.where(subscribed, subscription, predicted)
+    basis = np.where(subscribed, 'subscription', np.where(has_forecast, 'forecast', 'none'))
+    return expected, basis
+
+def load_route_sheets(delivery_date: date, route_ids: Optional[Sequence[int]] = None) -> List[Dict]:
+    """
+    Rosters of every route (or the given route segments) with the expected quantities
+    Customers are listed in the route's stop order (see utils.routing), unordered ones
+    last by name; a customer on two routes appears on both.
+    Forecasts use the entries up to the day before delivery_date.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    route_filter = ""
+    params = []
+    if route_ids is not None:
+        route_filter = " AND s.id IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps([int(rid) for rid in route_ids]))
+    cursor.execute(
+        f"""
+        SELECT s.id, s.name, c.id, c.name, COALESCE(c.mobile_number, ''), c.subscription_qty
+        FROM segments s
+        JOIN customer_segments cs ON cs.segment_id = s.id
+        JOIN customers c ON c.id = cs.customer_id
+        WHERE s.kind = 'route'{route_filter}
+        ORDER BY s.name, s.id, cs.stop_order IS NULL, cs.stop_order, c.name, c.id
+        """,
+        params
+    )
+    rows = cursor.fetchall()
+    conn.close()
+    if not rows:
+        return []
+
+    customer_ids = np.array([r[2] for r in rows], dtype=np.int64)
+    subscription = np.array([np.nan if r[5] is None else r[5] for r in rows], dtype=np.float64)
+    expected, basis = expected_quantities(customer_ids, subscription, delivery_date)
+
+    # Rows are ordered by route, so each route is a contiguous run
+    route_column = np.array([r[0] for r in rows], dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, route_column[1:] != route_column[:-1]])
+    stops = np.r_[starts[1:], len(rows)]
+    sheets = []
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        sheets.append({
+            'route_id': rows[start][0],
+            'route_name': rows[start][1],
+            'delivery_date': delivery_date.isoformat(),
+            'customer_ids': customer_ids[start:stop].tolist(),
+            'names': [r[3] for r in rows[start:stop]],
+            'mobiles': [r[4] for r in rows[start:stop]],
+            'expected': np.round(expected[start:stop], 2).tolist(),
+            'basis': basis[start:stop].tolist()
+        })
+    return sheets
+
+def write_route_sheet_csv(sheet: Dict, output_path: str) -> None:
+    """Write a route sheet as CSV (header line, one row per customer, total row)"""
+    with open(output_path, 'w', newline='', encoding='utf-8') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(['Route', sheet['route_name'], 'Date', sheet['delivery_date']])
+        writer.writerow(ROUTE_SHEET_COLUMNS)
+        for stop, (name, mobile, qty, basis) in enumerate(
+            zip(sheet['names'], sheet['mobiles'], sheet['expected'], sheet['basis']), start=1
+        ):
+            writer.writerow([stop, name, mobile, f"{qty:.2f}", BASIS_LABELS[basis], ''])
+        writer.writerow(['', 'TOTAL', '', f"{sum(sheet['expected']):.2f}", '', ''])
+
+def render_route_sheet(sheet: Dict, output) -> None:
+    """Render a route sheet PDF into a path or file-like object; the table header repeats on every page"""
+    doc = SimpleDocTemplate(output, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch,
+                            title=f"Route {sheet['route_name']} - {sheet['delivery_date']}")
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'RouteTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        textColor=colors.HexColor('#2E86AB'),
+        spaceAfter=8,
+        alignment=TA_CENTER
+    )
+    delivery_day = datetime.strptime(sheet['delivery_date'], '%Y-%m-%d')
+    story = [
+        Paragraph(f"SmartDairy - Route {escape(sheet['route_name'])}", title_style),
+        Paragraph(f"<b>Delivery Date:</b> {delivery_day.strftime('%A, %d %B %Y')}", styles['Normal']),
+        Paragraph(f"<b>Customers:</b> {len(sheet['names'])}", styles['Normal']),
+        Spacer(1, 0.15*inch)
+    ]
+
+    lines = [ROUTE_SHEET_COLUMNS]
+    for stop, (name, mobile, qty, basis) in enumerate(
+        zip(sheet['names'], sheet['mobiles'], sheet['expected'], sheet['basis']), start=1
+    ):
+        lines.append([str(stop), name, mobile, f"{qty:.2f}", BASIS_LABELS[basis], ''])
+    lines.append(['', 'TOTAL', '', f"{sum(sheet['expected']):.2f}", '', ''])
+    table = Table(lines, colWidths=[0.45*inch, 2.4*inch, 1.25*inch, 1.0*inch, 1.0*inch, 1.0*inch], repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E86AB')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('ALIGN', (3, 0), (-1, -1), 'CENTER'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#F77F00')),
+        ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ]))
+    story.append(table)
+    doc.build(story)
+
+def route_sheet_filename(sheet: Dict, extension: str) -> str:
+    """File name of a route sheet, e.g. route_2026-10-19_3.pdf"""
+    return f"route_{sheet['delivery_date']}_{sheet['route_id']}.{extension}"
+
+def _render_batch(sheets: List[Dict], output_dir: str) -> List[str]:
+    """Worker task: write the PDF and CSV of each route in a batch"""
+    paths = []
+    for sheet in sheets:
+        pdf_path = os.path.join(output_dir, route_sheet_filename(sheet, 'pdf'))
+        csv_path = os.path.join(output_dir, route_sheet_filename(sheet, 'csv'))
+        render_route_sheet(sheet, pdf_path)
+        write_route_sheet_csv(sheet, csv_path)
+        paths += [pdf_path, csv_path]
+    return paths
+
+def generate_route_sheets(delivery_date: date, output_dir: str, route_ids: Optional[Sequence[int]] = None,
+                          workers: Optional[int] = None) -> List[str]:
+    """
+    Write a PDF and a CSV sheet per route into output_dir
+    Batches of routes are rendered in parallel across `workers` processes (default: CPU
+    count); workers=1 renders in this process. Returns the written paths in route name order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    sheets = load_route_sheets(delivery_date, route_ids)
+    if not sheets:
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    batches = [sheets[start:start + ROUTE_SHEET_BATCH_SIZE] for start in range(0, len(sheets), ROUTE_SHEET_BATCH_SIZE)]
+    if workers == 1 or len(batches) == 1:
+        return [path for batch in batches for path in _render_batch(batch, output_dir)]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+        results = pool.map(_render_batch, batches, [output_dir] * len(batches))
+        return [path for paths in results for path in paths]
@@ -0,0 +1,354 @@
+"""
+Route optimizer module for SmartDairy
+Orders the stops of a delivery route to shorten the drive. Customer locations are
+projected to kilometres and a uniform grid finds each stop's nearest neighbours; a
+nearest-neighbour tour from the depot (or an outlying stop) is then improved with
+2-opt and Or-opt moves tried only against those neighbours. The order is saved per
+route and the route sheets list customers in it
+"""
+
+import json
+import math
+import numpy as np
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+from utils.db import get_db_connection, write_transaction
+
+EARTH_RADIUS_KM = 6371.0
+NEIGHBOUR_CANDIDATES = 8  # nearest stops tried by each move
+OR_OPT_MAX_SEGMENT = 3  # longest run of consecutive stops relocated by Or-opt
+GRID_POINTS_PER_CELL = 2.0  # target average occupancy of the grid cells
+MIN_GAIN_KM = 1e-9  # smaller improvements are treated as rounding noise
+
+def project_km(latitudes: Sequence[float], longitudes: Sequence[float]) -> np.ndarray:
+    """Project decimal degrees to planar (x, y) kilometres, accurate over a delivery area"""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    return np.column_stack([lon * math.cos(float(lat.mean())), lat]) * EARTH_RADIUS_KM
+
+def path_length(points: np.ndarray, order: Sequence[int]) -> float:
+    """Length of the open path visiting points in the given order"""
+    if len(order) < 2:
+        return 0.0
+    steps = np.diff(points[np.asarray(order)], axis=0)
+    return float(np.hypot(steps[:, 0], steps[:, 1]).sum())
+
+class GridIndex:
+    """
+    Uniform grid over planar points, sized for a few points per cell
+    Points are sorted by cell key (column-major), so the cells of one grid column
+    between two rows are a single slice of the sorted order.
+    """
+
+    def __init__(self, points: np.ndarray, points_per_cell: float = GRID_POINTS_PER_CELL):
+        self.points = points
+        lower = points.min(axis=0)
+        span = points.max(axis=0) - lower
+        n = len(points)
+        # The second term keeps cells sensible when the points lie (nearly) on a line
+        self.cell_size = max(math.sqrt(span[0] * span[1] * points_per_cell / n),
+                             float(span.max()) * points_per_cell / n, 1e-9)
+        self.shape = (int(span[0] // self.cell_size) + 1, int(span[1] // self.cell_size) + 1)
+        self.cells = np.minimum(((points - lower) // self.cell_size).astype(np.int64),
+                                np.array(self.shape) - 1)
+        keys = self.cells[:, 0] * self.shape[1] + self.cells[:, 1]
+        self.order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.order]
+
+    def block(self, cx: int, cy: int, radius: int) -> np.ndarray:
+        """Indices of the points in the (2 * radius + 1)^2 cells around cell (cx, cy)"""
+        rows = self.shape[1]
+        y0, y1 = max(cy - radius, 0), min(cy + radius, rows - 1)
+        slices = []
+        for x in range(max(cx - radius, 0), min(cx + radius, self.shape[0] - 1) + 1):
+            lo = np.searchsorted(self.sorted_keys, x * rows + y0, 'left')
+            hi = np.searchsorted(self.sorted_keys, x * rows + y1, 'right')
+            slices.append(self.order[lo:hi])
+        return np.concatenate(slices)
+
+    def nearest_neighbours(self, k: int) -> np.ndarray:
+        """
+        The k nearest other points of every point, nearest first (n x k, -1 padded)
+        Each occupied cell grows its search block until every member's k-th neighbour
+        is closer than the block edge, so the lists are exact.
+        """
+        n = len(self.points)
+        k = min(k, n - 1)
+        neighbours = np.full((n, max(k, 0)), -1, dtype=np.int64)
+        if k <= 0:
+            return neighbours
+
+        cell_starts = np.flatnonzero(np.r_[True, self.sorted_keys[1:] != self.sorted_keys[:-1]])
+        cell_stops = np.r_[cell_starts[1:], n]
+        whole_grid = max(self.shape)
+        for start, stop in zip(cell_starts.tolist(), cell_stops.tolist()):
+            members = self.order[start:stop]
+            cx, cy = self.cells[members[0]].tolist()
+            radius = 1
+            while True:
+                candidates = self.block(cx, cy, radius)
+                if len(candidates) > k:
+                    offsets = self.points[members, None, :] - self.points[None, candidates, :]
+                    distances = np.hypot(offsets[..., 0], offsets[..., 1])
+                    distances[members[:, None] == candidates[None, :]] = np.inf
+                    nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                    kth = np.take_along_axis(distances, nearest, axis=1).max(axis=1)
+                    if kth.max() <= radius * self.cell_size or radius >= whole_grid:
+                        break
+                radius += 1
+            # Sort each member's k candidates by distance
+            nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+            ranked = np.take_along_axis(nearest, np.argsort(nearest_distances, axis=1), axis=1)
+            neighbours[members] = candidates[ranked]
+        return neighbours
+
+def nearest_neighbour_tour(points: np.ndarray, neighbours: np.ndarray, start: int = 0) -> np.ndarray:
+    """
+    Greedy path from `start`, always driving to the closest unvisited stop
+    The neighbour lists answer most steps; only when all of a stop's candidates are
+    visited does it fall back to scanning every stop.
+    """
+    n = len(points)
+    visited = np.zeros(n, dtype=bool)
+    tour = np.empty(n, dtype=np.int64)
+    current = start
+    for step in range(n):
+        tour[step] = current
+        visited[current] = True
+        if step == n - 1:
+            break
+        candidates = neighbours[current]
+        open_candidates = candidates[(candidates >= 0) & ~visited[np.maximum(candidates, 0)]]
+        if len(open_candidates):
+            current = int(open_candidates[0])
+        else:
+            distances = np.hypot(points[:, 0] - points[current, 0], points[:, 1] - points[current, 1])
+            distances[visited] = np.inf
+            current = int(np.argmin(distances))
+    return tour
+
+class _LocalSearch:
+    """
+    2-opt and Or-opt improvement of an open path whose first stop is fixed
+    Moves only connect a stop to one of its neighbour candidates; stops whose
+    surroundings changed are queued again until no move shortens the path.
+    """
+
+    def __init__(self, points: np.ndarray, tour: np.ndarray, neighbours: np.ndarray):
+        self.xs = points[:, 0].tolist()
+        self.ys = points[:, 1].tolist()
+        self.n = len(tour)
+        self.tour = tour.copy()
+        self.pos = np.empty(self.n, dtype=np.int64)
+        self.pos[self.tour] = np.arange(self.n)
+        self.neighbours = [[c for c in row if c >= 0] for row in neighbours.tolist()]
+
+    def dist(self, a: int, b: int) -> float:
+        """Distance between two stops; -1 stands for 'past the end of the path' and costs nothing"""
+        if a < 0 or b < 0:
+            return 0.0
+        return math.hypot(self.xs[a] - self.xs[b], self.ys[a] - self.ys[b])
+
+    def at(self, i: int) -> int:
+        """Stop at position i, or -1 outside the path"""
+        return int(self.tour[i]) if 0 <= i < self.n else -1
+
+    def reverse(self, i: int, j: int) -> None:
+        """Reverse the stops at positions i..j"""
+        self.tour[i:j + 1] = self.tour[i:j + 1][::-1].copy()
+        self.pos[self.tour[i:j + 1]] = np.arange(i, j + 1)
+
+    def try_2opt(self, a: int) -> Optional[List[int]]:
+        """Best-first 2-opt move adding an edge from `a` to a neighbour; returns the touched stops"""
+        i = int(self.pos[a])
+        # Replace (a, a_next) and (c, c_next) by (a, c) and (a_next, c_next)
+        a_next = self.at(i + 1)
+        if a_next >= 0:
+            for c in self.neighbours[a]:
+                g1 = self.dist(a, a_next) - self.dist(a, c)
+                if g1 <= MIN_GAIN_KM:
+                    break
+                j = int(self.pos[c])
+                if abs(i - j) <= 1:
+                    continue
+                c_next = self.at(j + 1)
+                if g1 + self.dist(c, c_next) - self.dist(a_next, c_next) > MIN_GAIN_KM:
+                    self.reverse(min(i, j) + 1, max(i, j))
+                    return [a, a_next, c, c_next]
+        # Replace (a_prev, a) and (c_prev, c) by (a, c) and (a_prev, c_prev)
+        a_prev = self.at(i - 1)
+        if a_prev >= 0:
+            for c in self.neighbours[a]:
+                g1 = self.dist(a_prev, a) - self.dist(a, c)
+                if g1 <= MIN_GAIN_KM:
+                    break
+                j = int(self.pos[c])
+                if abs(i - j) <= 1 or j == 0:
+                    continue
+                c_prev = self.at(j - 1)
+                if g1 + self.dist(c_prev, c) - self.dist(c_prev, a_prev) > MIN_GAIN_KM:
+                    if j < i:
+                        self.reverse(j, i - 1)
+                    else:
+                        self.reverse(i, j - 1)
+                    return [a, a_prev, c, c_prev]
+        return None
+
+    def try_or_opt(self, a: int) -> Optional[List[int]]:
+        """Move a run of 1..OR_OPT_MAX_SEGMENT stops starting at `a` next to a neighbour, either way round"""
+        i = int(self.pos[a])
+        if i == 0:
+            return None
+        for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+            last = i + length - 1
+            if last >= self.n:
+                break
+            first_stop, last_stop = a, self.at(last)
+            before, after = self.at(i - 1), self.at(last + 1)
+            removal_gain = self.dist(before, first_stop) + self.dist(last_stop, after) - self.dist(before, after)
+            if removal_gain <= MIN_GAIN_KM:
+                continue
+            for end in (first_stop, last_stop):
+                for c in self.neighbours[end]:
+                    if self.dist(end, c) >= removal_gain:
+                        break
+                    j = int(self.pos[c])
+                    if i <= j <= last:
+                        continue
+                    for u, v in ((c, self.at(j + 1)), (self.at(j - 1), c)):
+                        if u < 0 or i <= int(self.pos[u]) <= last or (v >= 0 and i <= int(self.pos[v]) <= last):
+                            continue
+                        forward = self.dist(u, first_stop) + self.dist(last_stop, v)
+                        backward = self.dist(u, last_stop) + self.dist(first_stop, v)
+                        insertion = min(forward, backward) - self.dist(u, v)
+                        if removal_gain - insertion > MIN_GAIN_KM:
+                            self.move_segment(i, last, u, backward < forward)
+                            return [before, after, first_stop, last_stop, u, v]
+        return None
+
+    def move_segment(self, i: int, last: int, u: int, reverse: bool) -> None:
+        """Move the stops at positions i..last to just after stop u, optionally reversed"""
+        segment = self.tour[i:last + 1].copy()
+        if reverse:
+            segment = segment[::-1]
+        rest = np.concatenate([self.tour[:i], self.tour[last + 1:]])
+        k = int(self.pos[u])
+        k = k if k < i else k - len(segment)
+        self.tour = np.concatenate([rest[:k + 1], segment, rest[k + 1:]])
+        self.pos[self.tour] = np.arange(self.n)
+
+    def run(self) -> np.ndarray:
+        """Apply improving moves until none is left; returns the improved tour"""
+        queue = deque(self.tour.tolist())
+        queued = [True] * self.n
+        while queue:
+            a = queue.popleft()
+            queued[a] = False
+            touched = self.try_2opt(a) or self.try_or_opt(a)
+            if touched:
+                for stop in touched:
+                    if stop >= 0 and not queued[stop]:
+                        queued[stop] = True
+                        queue.append(stop)
+        return self.tour
+
+def optimize_stop_order(points: np.ndarray, start: Optional[int] = None) -> np.ndarray:
+    """
+    Visiting order for planar points (km), beginning at index `start`
+    Without a start the path begins at the stop farthest from the centre, which
+    suits an open route. Returns a permutation of range(len(points)).
+    """
+    n = len(points)
+    if n <= 2:
+        order = np.arange(n)
+        if start is not None and n == 2 and start == 1:
+            order = order[::-1].copy()
+        return order
+    if start is None:
+        offsets = points - points.mean(axis=0)
+        start = int(np.argmax(np.hypot(offsets[:, 0], offsets[:, 1])))
+
+    neighbours = GridIndex(points).nearest_neighbours(NEIGHBOUR_CANDIDATES)
+    tour = nearest_neighbour_tour(points, neighbours, start)
+    return _LocalSearch(points, tour, neighbours).run()
+
+def plan_route(latitudes: Sequence[float], longitudes: Sequence[float],
+               depot: Optional[Tuple[float, float]] = None) -> Tuple[np.ndarray, float]:
+    """Stop order for customer locations, starting from the depot (lat, lon) when given; returns (order, km)"""
+    if depot is not None:
+        latitudes = [depot[0]] + list(latitudes)
+        longitudes = [depot[1]] + list(longitudes)
+    points = project_km(latitudes, longitudes)
+    order = optimize_stop_order(points, 0 if depot is not None else None)
+    length = path_length(points, order)
+    if depot is not None:
+        order = order[1:] - 1
+    return order, length
+
+def optimize_route(route_id: int, depot: Optional[Tuple[float, float]] = None) -> Dict:
+    """
+    Re-order the stops of a route segment and save the order
+    Customers with a location are ordered by plan_route; those without follow in
+    their previous order. Returns stop counts and the driving distance (km, straight
+    line) of the located stops before and after.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(
+        """
+        SELECT c.id, c.latitude, c.longitude
+        FROM customer_segments cs
+        JOIN customers c ON c.id = cs.customer_id
+        WHERE cs.segment_id = ?
+        ORDER BY cs.stop_order IS NULL, cs.stop_order, c.name, c.id
+        """,
+        (route_id,)
+    )
+    rows = cursor.fetchall()
+    conn.close()
+
+    located = [r for r in rows if r[1] is not None and r[2] is not None]
+    unlocated = [r[0] for r in rows if r[1] is None or r[2] is None]
+    result = {'route_id': route_id, 'stops': len(rows), 'located': len(located),
+              'previous_km': 0.0, 'optimized_km': 0.0}
+    if not rows:
+        return result
+
+    order = np.arange(len(located))
+    if located:
+        latitudes = [r[1] for r in located]
+        longitudes = [r[2] for r in located]
+        order, result['optimized_km'] = plan_route(latitudes, longitudes, depot)
+        previous = project_km(([depot[0]] if depot else []) + latitudes, ([depot[1]] if depot else []) + longitudes)
+        result['previous_km'] = path_length(previous, np.arange(len(previous)))
+
+    stop_ids = [located[k][0] for k in order.tolist()] + unlocated
+    write_transaction(lambda conn: conn.executemany(
+        "UPDATE customer_segments SET stop_order = ? WHERE segment_id = ? AND customer_id = ?",
+        [(stop, route_id, customer_id) for stop, customer_id in enumerate(stop_ids, start=1)]
+    ))
+    return result
+
+def optimize_routes(route_ids: Optional[Sequence[int]] = None,
+                    depot: Optional[Tuple[float, float]] = None) -> List[Dict]:
+    """Optimize every route segment (or the given ones); one result per route"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT id, name FROM segments
+        WHERE kind = 'route' AND (:ids IS NULL OR id IN (SELECT value FROM json_each(:ids)))
+        ORDER BY name
+        """,
+        {'ids': None if route_ids is None else json.dumps([int(rid) for rid in route_ids])}
+    )
+    routes = cursor.fetchall()
+    conn.close()
+
+    results = []
+    for route in routes:
+        result = optimize_route(route['id'], depot)
+        result['route_name'] = route['name']
+        results.append(result)
+    return results
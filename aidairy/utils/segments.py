@@ -0,0 +1,150 @@
+"""
+Segments utility module for SmartDairy
+Groups customers by route, society, customer type or free tags. Bulk operations take
+a list of segment ids, which resolve_segment_customers turns into a customer id set
+once; that set is then pushed into each query, so a route's work scales with the route
+"""
+
+import sqlite3
+import json
+from typing import List, Dict, Optional, Iterable, Tuple
+from utils.db import get_db_connection, write_transaction
+
+SEGMENT_KINDS = ['route', 'society', 'type', 'tag']
+SEGMENT_KIND_LABELS = {'route': 'Route', 'society': 'Society', 'type': 'Customer Type', 'tag': 'Tag'}
+
+def create_segment(kind: str, name: str) -> Tuple[bool, str]:
+    """Create a segment; names are unique within a kind"""
+    if kind not in SEGMENT_KINDS:
+        return False, f"Unknown segment kind: {kind}"
+    if not name or not name.strip():
+        return False, "Segment name is required"
+    try:
+        write_transaction(lambda conn: conn.execute("INSERT INTO segments (kind, name) VALUES (?, ?)",
+                                                    (kind, name.strip())))
+        return True, f"{SEGMENT_KIND_LABELS[kind]} '{name.strip()}' created"
+    except sqlite3.IntegrityError:
+        return False, f"{SEGMENT_KIND_LABELS[kind]} '{name.strip()}' already exists"
+    except sqlite3.Error as e:
+        return False, f"Could not create the segment: {e}"
+
+def delete_segment(segment_id: int) -> bool:
+    """Delete a segment and its memberships"""
+    def delete(conn):
+        conn.execute("DELETE FROM customer_segments WHERE segment_id = ?", (segment_id,))
+        return conn.execute("DELETE FROM segments WHERE id = ?", (segment_id,)).rowcount > 0
+
+    try:
+        return write_transaction(delete)
+    except sqlite3.Error:
+        return False
+
+def get_segments(kind: Optional[str] = None) -> List[Dict]:
+    """All segments (or those of one kind) with their member counts"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT s.id, s.kind, s.name,
+               (SELECT COUNT(*) FROM customer_segments cs WHERE cs.segment_id = s.id) AS customers
+        FROM segments s
+        WHERE :kind IS NULL OR s.kind = :kind
+        ORDER BY s.kind, s.name
+        """,
+        {'kind': kind}
+    )
+    segments = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return segments
+
+def format_segment(segment: Dict) -> str:
+    """Display label, e.g. 'Route: North'"""
+    return f"{SEGMENT_KIND_LABELS.get(segment['kind'], segment['kind'])}: {segment['name']}"
+
+def get_customer_segments(customer_id: int) -> List[Dict]:
+    """Segments a customer belongs to"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT s.id, s.kind, s.name FROM customer_segments cs
+        JOIN segments s ON s.id = cs.segment_id
+        WHERE cs.customer_id = ?
+        ORDER BY s.kind, s.name
+        """,
+        (customer_id,)
+    )
+    segments = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return segments
+
+def set_customer_segments(customer_id: int, segment_ids: Iterable[int]) -> bool:
+    """Replace the segments of a customer"""
+    rows = [(int(sid), customer_id) for sid in set(segment_ids)]
+
+    def replace(conn):
+        conn.execute("DELETE FROM customer_segments WHERE customer_id = ?", (customer_id,))
+        conn.executemany("INSERT INTO customer_segments (segment_id, customer_id) VALUES (?, ?)", rows)
+
+    try:
+        write_transaction(replace)
+        return True
+    except sqlite3.Error:
+        return False
+
+def add_customers_to_segment(segment_id: int, customer_ids: Iterable[int]) -> int:
+    """Add customers to a segment; returns how many were not members yet"""
+    ids = json.dumps([int(cid) for cid in customer_ids])
+    return write_transaction(lambda conn: conn.execute(
+        """
+        INSERT INTO customer_segments (segment_id, customer_id)
+        SELECT ?, c.id FROM customers c WHERE c.id IN (SELECT value FROM json_each(?))
+        ON CONFLICT DO NOTHING
+        """,
+        (segment_id, ids)
+    ).rowcount)
+
+def remove_customers_from_segment(segment_id: int, customer_ids: Iterable[int]) -> int:
+    """Remove customers from a segment; returns how many were removed"""
+    ids = json.dumps([int(cid) for cid in customer_ids])
+    return write_transaction(lambda conn: conn.execute(
+        "DELETE FROM customer_segments WHERE segment_id = ? AND customer_id IN (SELECT value FROM json_each(?))",
+        (segment_id, ids)
+    ).rowcount)
+
+def resolve_segment_customers(segment_ids: Iterable[int], within: Optional[Iterable[int]] = None) -> List[int]:
+    """
+    Customer ids matching a segment filter, sorted
+    Segments of the same kind are alternatives (route A or route B); different kinds
+    narrow each other (route A and type hotel). `within` further limits the result.
+    Only the selected segments' members are read, through the primary key.
+    """
+    segment_ids = [int(sid) for sid in segment_ids]
+    if not segment_ids:
+        return []
+
+    params = {'segments': json.dumps(segment_ids)}
+    within_filter = ""
+    if within is not None:
+        within_filter = " AND cs.customer_id IN (SELECT value FROM json_each(:within))"
+        params['within'] = json.dumps([int(cid) for cid in within])
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT cs.customer_id
+        FROM customer_segments cs
+        JOIN segments s ON s.id = cs.segment_id
+        WHERE cs.segment_id IN (SELECT value FROM json_each(:segments)){within_filter}
+        GROUP BY cs.customer_id
+        HAVING COUNT(DISTINCT s.kind) = (
+            SELECT COUNT(DISTINCT kind) FROM segments WHERE id IN (SELECT value FROM json_each(:segments))
+        )
+        ORDER BY cs.customer_id
+        """,
+        params
+    )
+    customer_ids = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return customer_ids
@@ -0,0 +1,456 @@
+"""
+Statement utility module for SmartDairy
+Per-customer monthly statement PDFs with a calendar grid of daily quantities, so
+customers can check every delivery. The month is read in one query for all
+customers into compact arrays; PDFs are rendered in parallel by a process pool,
+each worker receiving only its slice of the arrays
+"""
+
+import io
+import os
+import json
+import calendar
+import numpy as np
+from xml.sax.saxutils import escape
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.enums import TA_CENTER
+from utils.db import get_db_connection, read_snapshot
+from utils.pricing import load_slab_table, price_litres
+
+STATEMENT_BATCH_SIZE = 250  # customers rendered per worker task
+
+def load_month_arrays(year: int, month: int, customer_ids: Optional[Sequence[int]] = None) -> Dict:
+    """
+    Load a month of entries for all customers (or the given ones) as compact arrays
+    - ids, rates, amounts, deliveries: one value per customer (deliveries counts entries,
+      so both shifts of a day count, as on bills)
+    - names: list of customer names
+    - quantities: float32 matrix [customer, day], NaN where nothing was delivered
+    - slabs: parallel arrays (row, lower, upper, litres, rate, amount) of slab-priced rows
+    Only customers with at least one delivery in the month are included.
+    """
+    n_days = calendar.monthrange(year, month)[1]
+    start = f"{year}-{month:02d}-01"
+    end = f"{year}-{month:02d}-{n_days:02d}"
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.row_factory = None  # plain tuples straight into numpy
+    query = """
+        SELECT e.customer_id, CAST(substr(e.entry_date, 9, 2) AS INTEGER) - 1, e.quantity
+        FROM entries e
+        WHERE e.entry_date BETWEEN ? AND ?
+    """
+    params = [start, end]
+    if customer_ids is not None:
+        query += " AND e.customer_id IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps([int(c) for c in customer_ids]))
+    cursor.execute(query, params)
+    records = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 3)
+
+    ids = np.unique(records[:, 0].astype(np.int64))
+    cursor.execute(
+        "SELECT id, name, price_per_ltr FROM customers WHERE id IN (SELECT value FROM json_each(?)) ORDER BY name",
+        (json.dumps(ids.tolist()),)
+    )
+    customers = cursor.fetchall()
+    conn.close()
+
+    ids = np.array([c[0] for c in customers], dtype=np.int64)
+    rates = np.array([c[2] for c in customers], dtype=np.float64)
+    names = [c[1] for c in customers]
+
+    # Scatter the (customer, day, quantity) records into the matrix (summing repeated days)
+    quantities = np.zeros((len(ids), n_days), dtype=np.float64)
+    delivered = np.zeros((len(ids), n_days), dtype=bool)
+    deliveries = np.zeros(len(ids), dtype=np.int64)
+    if len(records) and len(ids):
+        # Entries left behind by deleted customers have no row and are skipped
+        rows, found = _lookup_rows(ids, records[:, 0].astype(np.int64))
+        days = records[found, 1].astype(np.int64)
+        np.add.at(quantities, (rows, days), records[found, 2])
+        np.add.at(deliveries, rows, 1)
+        delivered[rows, days] = True
+    totals = np.round(quantities.sum(axis=1), 3)
+    quantities = np.where(delivered, quantities, np.nan).astype(np.float32)
+
+    amounts, breakdown = price_litres(ids, totals, rates, load_slab_table(ids.tolist()))
+    return {
+        'year': year, 'month': month, 'ids': ids, 'names': names, 'rates': rates,
+        'quantities': quantities, 'totals': totals, 'amounts': amounts, 'deliveries': deliveries,
+        'slabs': breakdown
+    }
+
+def _slice_month_arrays(data: Dict, start: int, stop: int) -> Dict:
+    """Arrays of customers [start, stop) with slab rows re-indexed to the slice"""
+    slabs = data['slabs']
+    keep = (slabs['row'] >= start) & (slabs['row'] < stop)
+    return {
+        'year': data['year'], 'month': data['month'],
+        'ids': data['ids'][start:stop], 'names': data['names'][start:stop], 'rates': data['rates'][start:stop],
+        'quantities': data['quantities'][start:stop], 'totals': data['totals'][start:stop],
+        'amounts': data['amounts'][start:stop], 'deliveries': data['deliveries'][start:stop],
+        'slabs': {key: (values[keep] - start if key == 'row' else values[keep]) for key, values in slabs.items()}
+    }
+
+def render_statement(data: Dict, row: int, output) -> None:
+    """Render the statement of customer `row` of the month arrays into a path or file-like object"""
+    year, month = data['year'], data['month']
+    doc = SimpleDocTemplate(output, pagesize=A4, topMargin=0.6*inch, bottomMargin=0.6*inch)
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'StatementTitle',
+        parent=styles['Heading1'],
+        fontSize=20,
+        textColor=colors.HexColor('#2E86AB'),
+        spaceAfter=12,
+        alignment=TA_CENTER
+    )
+    story = [
+        Paragraph("SmartDairy - Monthly Statement", title_style),
+        Paragraph(f"<b>Customer:</b> {escape(data['names'][row])}", styles['Normal']),
+        Paragraph(f"<b>Period:</b> {datetime(year, month, 1).strftime('%B %Y')}", styles['Normal']),
+        Paragraph(f"<b>Generated On:</b> {datetime.now().strftime('%d %B %Y')}", styles['Normal']),
+        Spacer(1, 0.25*inch)
+    ]
+
+    # Calendar grid: one row per week (Mon-Sun), each cell shows the day and litres delivered
+    quantities = data['quantities'][row]
+    grid = [['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']]
+    empty_cells = []
+    for week_index, week in enumerate(calendar.monthcalendar(year, month)):
+        cells = []
+        for weekday, day in enumerate(week):
+            if day == 0:
+                cells.append('')
+                continue
+            qty = quantities[day - 1]
+            if np.isnan(qty):
+                cells.append(f"{day}\n-")
+                empty_cells.append((weekday, week_index + 1))
+            else:
+                cells.append(f"{day}\n{qty:g} L")
+        grid.append(cells)
+    calendar_table = Table(grid, colWidths=[0.95*inch] * 7, rowHeights=[0.3*inch] + [0.6*inch] * (len(grid) - 1))
+    calendar_style = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E86AB')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ]
+    calendar_style += [('TEXTCOLOR', cell, cell, colors.grey) for cell in empty_cells]
+    calendar_table.setStyle(TableStyle(calendar_style))
+    story.append(calendar_table)
+    story.append(Spacer(1, 0.3*inch))
+
+    # Totals, with the slab lines for volume-priced customers
+    deliveries = int(data['deliveries'][row])
+    lines = [['Description', 'Litres', 'Rate (₹)', 'Amount (₹)']]
+    slab_rows = np.flatnonzero(data['slabs']['row'] == row)
+    if len(slab_rows):
+        for k in slab_rows.tolist():
+            upper = data['slabs']['upper'][k]
+            upto = "+" if np.isinf(upper) else f"{upper:g}"
+            lines.append([f"Slab {data['slabs']['lower'][k]:g} - {upto} L", f"{data['slabs']['litres'][k]:.2f}",
+                          f"{data['slabs']['rate'][k]:.2f}", f"{data['slabs']['amount'][k]:.2f}"])
+    else:
+        lines.append([f"Milk ({deliveries} deliveries)", f"{data['totals'][row]:.2f}",
+                      f"{data['rates'][row]:.2f}", f"{data['amounts'][row]:.2f}"])
+    lines.append(['TOTAL', f"{data['totals'][row]:.2f}", '', f"{data['amounts'][row]:.2f}"])
+    totals_table = Table(lines, colWidths=[2.8*inch, 1.2*inch, 1.3*inch, 1.35*inch])
+    totals_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E86AB')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#F77F00')),
+        ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ]))
+    story.append(totals_table)
+    story.append(Spacer(1, 0.3*inch))
+    story.append(Paragraph(
+        "<i>Please report any difference in daily quantities to your dairy. Thank you for using SmartDairy!</i>",
+        styles['Normal']
+    ))
+    doc.build(story)
+
+def _render_batch(data: Dict, output_dir: str) -> List[str]:
+    """Worker task: render every statement of a slice of the month arrays"""
+    paths = []
+    for row in range(len(data['ids'])):
+        path = os.path.join(output_dir, f"statement_{data['year']}_{data['month']:02d}_{data['ids'][row]}.pdf")
+        render_statement(data, row, path)
+        paths.append(path)
+    return paths
+
+def generate_customer_statements(year: int, month: int, output_dir: str,
+                                 customer_ids: Optional[Sequence[int]] = None,
+                                 workers: Optional[int] = None) -> List[str]:
+    """
+    Write one statement PDF per customer with deliveries in the month into output_dir
+    Batches are rendered in parallel across `workers` processes (default: CPU count);
+    workers=1 renders in this process. Returns the written paths in customer name order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    # Entries, customers and slab charts from one snapshot, unaffected by entries saved meanwhile
+    with read_snapshot():
+        data = load_month_arrays(year, month, customer_ids)
+    n_customers = len(data['ids'])
+    if n_customers == 0:
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    batches = [
+        _slice_month_arrays(data, start, min(start + STATEMENT_BATCH_SIZE, n_customers))
+        for start in range(0, n_customers, STATEMENT_BATCH_SIZE)
+    ]
+    if workers == 1 or len(batches) == 1:
+        return [path for batch in batches for path in _render_batch(batch, output_dir)]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+        results = pool.map(_render_batch, batches, [output_dir] * len(batches))
+        return [path for paths in results for path in paths]
+
+def generate_customer_statement_pdf(year: int, month: int, customer_id: int) -> Optional[bytes]:
+    """Render one customer's statement into memory (None if there were no deliveries)"""
+    with read_snapshot():
+        data = load_month_arrays(year, month, [customer_id])
+    if len(data['ids']) == 0:
+        return None
+    buffer = io.BytesIO()
+    render_statement(data, 0, buffer)
+    return buffer.getvalue()
+
+def month_span(start_year: int, start_month: int, end_year: int, end_month: int) -> List[str]:
+    """'YYYY-MM' keys of every month from start to end (inclusive)"""
+    months = []
+    year, month = start_year, start_month
+    while (year, month) <= (end_year, end_month):
+        months.append(f"{year}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+def get_period_statement(start_year: int, start_month: int, end_year: int, end_month: int,
+                         customer_ids: Optional[Sequence[int]] = None) -> Dict:
+    """
+    Multi-month statement (e.g. quarter or financial year) for all customers or the given ones
+    Reads the customer_monthly rollup only. Months are priced at current rates like
+    calculate_billing, except closed months, which show the current invoice snapshot.
+    Returns customer arrays (ids, names, mobiles) and [customer, month] matrices
+    (litres, deliveries, amounts, deltas vs the previous month, invoiced flag), plus totals.
+    """
+    months = month_span(start_year, start_month, end_year, end_month)
+    # Month column computed in SQL so each result set converts to numpy in one step
+    month_column = "CAST(substr({0}, 1, 4) AS INTEGER) * 12 + CAST(substr({0}, 6, 2) AS INTEGER) - :base"
+    params = {'first': months[0] if months else '', 'last': months[-1] if months else '',
+              'base': start_year * 12 + start_month}
+    customer_filter = ""
+    if customer_ids is not None:
+        customer_filter = " AND customer_id IN (SELECT value FROM json_each(:ids))"
+        params['ids'] = json.dumps([int(c) for c in customer_ids])
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(
+        f"""
+        SELECT customer_id, {month_column.format('month')}, litres, deliveries FROM customer_monthly
+        WHERE month BETWEEN :first AND :last{customer_filter}
+        """,
+        params
+    )
+    rollup = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 4)
+    cursor.execute(
+        f"""
+        SELECT customer_id, year * 12 + month - :base, total_litres, total_amount FROM invoices
+        WHERE is_current = 1 AND printf('%04d-%02d', year, month) BETWEEN :first AND :last{customer_filter}
+        """,
+        params
+    )
+    snapshots = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 4)
+
+    cursor.execute(
+        """
+        SELECT id, name, price_per_ltr, mobile_number FROM customers
+        WHERE id IN (SELECT value FROM json_each(?)) ORDER BY name
+        """,
+        (json.dumps(np.unique(rollup[:, 0]).astype(np.int64).tolist()),)
+    )
+    customers = cursor.fetchall()
+    conn.close()
+
+    ids = np.array([c[0] for c in customers], dtype=np.int64)
+    rates = np.array([c[2] for c in customers], dtype=np.float64)
+    shape = (len(ids), len(months))
+    litres = np.zeros(shape)
+    deliveries = np.zeros(shape, dtype=np.int64)
+    amounts = np.zeros(shape)
+    invoiced = np.zeros(shape, dtype=bool)
+
+    if len(ids) and len(rollup):
+        rows, found = _lookup_rows(ids, rollup[:, 0].astype(np.int64))
+        cols = rollup[found, 1].astype(np.int64)
+        litres[rows, cols] = np.round(rollup[found, 2], 3)
+        deliveries[rows, cols] = rollup[found, 3].astype(np.int64)
+
+        # Each (customer, month) pair is priced on its own month total, slabs included
+        month_amounts, _ = price_litres(ids[rows], litres[rows, cols], rates[rows], load_slab_table(ids.tolist()))
+        amounts[rows, cols] = month_amounts
+
+    if len(ids) and len(snapshots):
+        rows, found = _lookup_rows(ids, snapshots[:, 0].astype(np.int64))
+        cols = snapshots[found, 1].astype(np.int64)
+        litres[rows, cols] = snapshots[found, 2]
+        amounts[rows, cols] = snapshots[found, 3]
+        invoiced[rows, cols] = True
+
+    deltas = np.full(shape, np.nan)
+    deltas[:, 1:] = np.diff(amounts, axis=1)
+
+    return {
+        'months': months,
+        'ids': ids,
+        'names': [c[1] for c in customers],
+        'mobiles': [c[3] or '' for c in customers],
+        'litres': litres,
+        'deliveries': deliveries,
+        'amounts': amounts,
+        'deltas': deltas,
+        'invoiced': invoiced,
+        'total_litres': litres.sum(axis=1),
+        'total_amounts': amounts.sum(axis=1),
+        'month_totals': amounts.sum(axis=0),
+        'grand_total': float(amounts.sum())
+    }
+
+def _lookup_rows(ids: np.ndarray, keys: np.ndarray):
+    """Row of each key in ids (any order); returns (rows of found keys, found mask)"""
+    order = np.argsort(ids)
+    sorted_ids = ids[order]
+    positions = np.minimum(np.searchsorted(sorted_ids, keys), len(ids) - 1)
+    found = sorted_ids[positions] == keys
+    return order[positions[found]], found
+
+def get_period_label_from_months(months: List[str]) -> str:
+    """Label of a month span, e.g. 'Apr 2025 - Mar 2026'"""
+    if not months:
+        return ''
+    first = datetime.strptime(months[0], '%Y-%m').strftime('%b %Y')
+    last = datetime.strptime(months[-1], '%Y-%m').strftime('%b %Y')
+    return first if first == last else f"{first} - {last}"
+
+def generate_period_statement_excel(statement: Dict, output_path: str = "statement.xlsx"):
+    """Generate the multi-month statement workbook: amounts, month-over-month change and litres"""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment
+
+    month_titles = [datetime.strptime(m, '%Y-%m').strftime('%b %Y') for m in statement['months']]
+    header_fill = PatternFill(start_color="2E86AB", end_color="2E86AB", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    total_font = Font(bold=True)
+
+    def styled_row(worksheet, values, font, fill=None):
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(worksheet, value=value)
+            cell.font = font
+            if fill is not None:
+                cell.fill = fill
+                cell.alignment = Alignment(horizontal='center')
+            cells.append(cell)
+        return cells
+
+    workbook = Workbook(write_only=True)
+    sheets = [
+        ('Amounts (₹)', statement['amounts'], statement['total_amounts'], statement['month_totals']),
+        ('Change vs Previous Month', statement['deltas'], None, None),
+        ('Litres', statement['litres'], statement['total_litres'], statement['litres'].sum(axis=0)),
+    ]
+    for title, matrix, row_totals, column_totals in sheets:
+        worksheet = workbook.create_sheet(title=title)
+        worksheet.freeze_panes = 'C2'
+        worksheet.column_dimensions['A'].width = 28
+        worksheet.column_dimensions['B'].width = 16
+        header = ['Customer Name', 'Mobile'] + month_titles + (['Total'] if row_totals is not None else [])
+        worksheet.append(styled_row(worksheet, header, header_font, header_fill))
+        matrix = np.round(matrix, 2)
+        for row in range(len(statement['ids'])):
+            values = [None if np.isnan(v) else v for v in matrix[row].tolist()]
+            if row_totals is not None:
+                values.append(round(float(row_totals[row]), 2))
+            worksheet.append([statement['names'][row], statement['mobiles'][row]] + values)
+        if column_totals is not None:
+            totals = np.round(column_totals, 2).tolist() + [round(float(np.sum(column_totals)), 2)]
+            worksheet.append(styled_row(worksheet, ['TOTAL', None] + totals, total_font))
+
+    workbook.save(output_path)
+    return output_path
+
+def generate_period_statement_pdf(statement: Dict, row: int, output) -> None:
+    """Render one customer's multi-month statement (e.g. for tax) into a path or file-like object"""
+    doc = SimpleDocTemplate(output, pagesize=A4, topMargin=0.6*inch, bottomMargin=0.6*inch)
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'PeriodStatementTitle',
+        parent=styles['Heading1'],
+        fontSize=20,
+        textColor=colors.HexColor('#2E86AB'),
+        spaceAfter=12,
+        alignment=TA_CENTER
+    )
+    story = [
+        Paragraph("SmartDairy - Statement of Account", title_style),
+        Paragraph(f"<b>Customer:</b> {escape(statement['names'][row])}", styles['Normal']),
+        Paragraph(f"<b>Period:</b> {get_period_label_from_months(statement['months'])}", styles['Normal']),
+        Paragraph(f"<b>Generated On:</b> {datetime.now().strftime('%d %B %Y')}", styles['Normal']),
+        Spacer(1, 0.25*inch)
+    ]
+
+    lines = [['Month', 'Deliveries', 'Litres', 'Amount (₹)', 'Change (₹)']]
+    for col, month in enumerate(statement['months']):
+        delta = statement['deltas'][row, col]
+        lines.append([
+            datetime.strptime(month, '%Y-%m').strftime('%B %Y') + (' *' if statement['invoiced'][row, col] else ''),
+            str(statement['deliveries'][row, col]),
+            f"{statement['litres'][row, col]:.2f}",
+            f"{statement['amounts'][row, col]:.2f}",
+            '' if np.isnan(delta) else f"{delta:+.2f}"
+        ])
+    lines.append(['TOTAL', str(statement['deliveries'][row].sum()), f"{statement['total_litres'][row]:.2f}",
+                  f"{statement['total_amounts'][row]:.2f}", ''])
+    table = Table(lines, colWidths=[2*inch, 1.1*inch, 1.2*inch, 1.4*inch, 1.3*inch], repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E86AB')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#F77F00')),
+        ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ]))
+    story.append(table)
+    story.append(Spacer(1, 0.2*inch))
+    if statement['invoiced'][row].any():
+        story.append(Paragraph("* Closed month: amount as invoiced.", styles['Normal']))
+    story.append(Paragraph(
+        "<i>This is a computer-generated statement. Thank you for using SmartDairy!</i>",
+        styles['Normal']
+    ))
+    doc.build(story)